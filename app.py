@@ -2,18 +2,27 @@ import streamlit as st
 import zipfile
 import os
 import io
+import sys
 from pptx import Presentation
 from pptx.enum.shapes import PP_PLACEHOLDER, MSO_SHAPE_TYPE
 import shutil
 from pptx.util import Inches
-import random
 from datetime import datetime, date
-from PIL import Image
-from PIL.ExifTags import TAGS
 import tempfile
+import time
+import threading
+import weakref
 import base64
 import streamlit.components.v1 as components
 
+# وحدات interactive_presentation مسطحة وتستورد بعضها مباشرة (مثل تشغيل app.py وcli.py من داخلها)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'interactive_presentation'))
+
+from engine import ORDER_ALPHABETICAL, ORDER_RANDOM, generate
+from processing_log import LEVELS, ProcessingLog
+from result_cache import file_digest, make_cache_key
+from sources import scan_directory
+
 
 # إعداد صفحة Streamlit
 st.set_page_config(
@@ -31,39 +40,79 @@ if 'slide_analysis' not in st.session_state:
     st.session_state.slide_analysis = None
 if 'placeholders_config' not in st.session_state:
     st.session_state.placeholders_config = {}
+# سجل المعالجة (processing_log.py) يحتفظ بآخر الرسائل فقط مع عدادات لكل مستوى
+DETAILS_PAGE_SIZE = 50
+# المهلة القصوى للمعالجة بالثواني (0 = بلا مهلة)
+JOB_TIMEOUT = int(os.environ.get('PPTX_JOB_TIMEOUT', 0))
+
 if 'processing_details' not in st.session_state:
-    st.session_state.processing_details = []
+    st.session_state.processing_details = ProcessingLog()
 if 'show_details_needed' not in st.session_state:
     st.session_state.show_details_needed = False
 
-def add_detail(message, detail_type="info"):
-    """إضافة تفصيل جديد إلى قائمة التفاصيل"""
-    st.session_state.processing_details.append({
-        'message': message,
-        'type': detail_type
-    })
-    
-    if detail_type in ['error', 'warning']:
+def add_detail(message, detail_type="info", details=None):
+    """إضافة تفصيل جديد إلى سجل التفاصيل (سجل الجلسة، أو سجل مهمة خلفية إذا تم تمريره)"""
+    own_session = details is None
+    if own_session:
+        details = st.session_state.processing_details
+    details.add(message, detail_type)
+    
+    if own_session and detail_type in ['error', 'warning']:
         st.session_state.show_details_needed = True
 
 def clear_details():
     """مسح جميع التفاصيل وإعادة تعيين حالة الإظهار"""
-    st.session_state.processing_details = []
+    st.session_state.processing_details = ProcessingLog()
     st.session_state.show_details_needed = False
 
+def render_detail(detail):
+    """عرض رسالة واحدة حسب مستواها"""
+    if detail['type'] == 'success':
+        st.success(detail['message'])
+    elif detail['type'] == 'warning':
+        st.warning(detail['message'])
+    elif detail['type'] == 'error':
+        st.error(detail['message'])
+    else:
+        st.info(detail['message'])
+
 def show_details_section():
-    """عرض قسم التفاصيل"""
-    if st.session_state.processing_details:
-        with st.expander("📋 تفاصيل المعالجة", expanded=False):
-            for detail in st.session_state.processing_details:
-                if detail['type'] == 'success':
-                    st.success(detail['message'])
-                elif detail['type'] == 'warning':
-                    st.warning(detail['message'])
-                elif detail['type'] == 'error':
-                    st.error(detail['message'])
-                else:
-                    st.info(detail['message'])
+    """عرض قسم التفاصيل: العدادات والأخطاء ثم صفحة واحدة من الرسائل"""
+    details = st.session_state.processing_details
+    summary = details.summary()
+    if not summary['total']:
+        return
+    
+    with st.expander("📋 تفاصيل المعالجة", expanded=False):
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("✅ نجاح", summary['counts']['success'])
+        col2.metric("ℹ️ معلومات", summary['counts']['info'])
+        col3.metric("⚠️ تحذيرات", summary['counts']['warning'])
+        col4.metric("❌ أخطاء", summary['counts']['error'])
+        
+        if summary['dropped']:
+            st.caption(f"تم الاحتفاظ بآخر {summary['retained']} رسالة من أصل {summary['total']}")
+        
+        for detail in details.errors():
+            render_detail(detail)
+        
+        level_filter = st.selectbox(
+            "عرض الرسائل:",
+            ("الكل",) + LEVELS,
+            key="details_level_filter"
+        )
+        levels = None if level_filter == "الكل" else [level_filter]
+        total = details.page(0, 1, levels)['total']
+        page_count = max(1, (total + DETAILS_PAGE_SIZE - 1) // DETAILS_PAGE_SIZE)
+        page = st.number_input(
+            f"الصفحة (من {page_count})",
+            min_value=1,
+            max_value=page_count,
+            value=1,
+            key="details_page"
+        )
+        for detail in details.page((page - 1) * DETAILS_PAGE_SIZE, DETAILS_PAGE_SIZE, levels)['entries']:
+            render_detail(detail)
 
 def analyze_slide_placeholders(prs):
     """تحليل جميع placeholders في الشريحة الأولى مع ضبط الإحداثيات"""
@@ -568,138 +617,223 @@ def step2_configure_placeholders():
                     elif config['type'] == 'اسم المجلد':
                         st.success(f"📁 اسم المجلد: سيتم استخدام اسم كل مجلد")
 
-# باقي الكود كما هو (لا تغيره)
-def get_image_date(image_path):
-    """استخراج تاريخ التقاط الصورة من metadata"""
+# حالات مهمة الإنشاء الخلفية
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+JOB_STOPPED = 'stopped'
+# الفترة بين تحديثات عرض التقدم بالثواني (يعاد تشغيل جزء التقدم فقط)
+PROGRESS_REFRESH_SECONDS = 1.0
+
+class JobStopped(Exception):
+    """أوقف المستخدم المهمة (ترفعها دالة الفحص بين المجلدات)"""
+
+class GenerationJob:
+    """مهمة إنشاء تعمل في خيط خلفي تملكه الجلسة
+
+    إعادة تشغيل الصفحة عند أي تفاعل لا توقف المهمة ولا تعيدها؛ الصفحة تقرأ
+    حالتها فقط. الملف المضغوط والعرض الناتج محفوظان في مجلد المهمة على القرص
+    وليس في st.session_state. المجلد يحذف عند discard_job، أو عند تحرير المهمة
+    إذا انتهت الجلسة دون ذلك (إغلاق المتصفح مثلاً).
+    """
+
+    def __init__(self):
+        self.work_dir = tempfile.mkdtemp(prefix='pptx_streamlit_')
+        self._finalizer = weakref.finalize(self, shutil.rmtree, self.work_dir, True)
+        self.details = ProcessingLog()
+        self.status = JOB_RUNNING
+        self.done = 0
+        self.total = 0
+        self.current_folder = ''
+        self.stats = None
+        self.output_path = None
+        self.output_filename = None
+        self.error = None
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def start(self, target, *args):
+        self._thread = threading.Thread(target=target, args=(self, *args), daemon=True)
+        self._thread.start()
+    
+    @property
+    def stopping(self):
+        return self._stop.is_set()
+    
+    def stop(self):
+        self._stop.set()
+    
+    def cleanup(self):
+        self._finalizer()
+
+    def check(self, started):
+        """فحص الإيقاف والمهلة؛ يستدعيه engine.generate قبل كل مجلد"""
+        if self.stopping:
+            raise JobStopped()
+        if JOB_TIMEOUT and time.monotonic() - started > JOB_TIMEOUT:
+            raise TimeoutError(f"تجاوزت المعالجة المهلة المحددة ({JOB_TIMEOUT} ثانية)")
+
+def save_upload(uploaded_file, path):
+    """نسخ الملف المرفوع إلى القرص على دفعات (مرة واحدة عند بدء المهمة)"""
+    uploaded_file.seek(0)
+    with open(path, 'wb') as f:
+        shutil.copyfileobj(uploaded_file, f)
+
+def run_generation(job, zip_path, pptx_data, slide_analysis, placeholders_config, random_order, skip_empty_folders):
+    """إنشاء العرض في الخيط الخلفي؛ لا تستخدم st.* هنا، فقط كائن المهمة
+
+    الإنشاء نفسه يتم عبر engine.generate كما في واجهة Flask وسطر الأوامر، فترتيب
+    الصور وتعبئة المواضع متطابقان في الواجهات الثلاث.
+    """
+    details = job.details
+    extract_dir = os.path.join(job.work_dir, 'photos')
     try:
-        with Image.open(image_path) as img:
-            exifdata = img.getexif()
-            for tag_id in exifdata:
-                tag = TAGS.get(tag_id, tag_id)
-                data = exifdata.get(tag_id)
-                
-                if tag in ['DateTime', 'DateTimeOriginal', 'DateTimeDigitized']:
-                    try:
-                        date_obj = datetime.strptime(str(data), '%Y:%m:%d %H:%M:%S')
-                        return date_obj.strftime('%Y-%m-%d')
-                    except:
-                        continue
+        image_order = ORDER_RANDOM if random_order else ORDER_ALPHABETICAL
+        # بذرة الترتيب العشوائي من المدخلات نفسها (مثل Flask) فتتكرر النتيجة لنفس الملفات
+        seed = make_cache_key(pptx_data, placeholders_config, file_digest(zip_path),
+                              {'image_order': image_order, 'skip_empty_folders': skip_empty_folders})
         
-        timestamp = os.path.getmtime(image_path)
-        return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d')
-    except:
-        return datetime.now().strftime('%Y-%m-%d')
-
-def apply_configured_placeholders(slide, folder_path, folder_name, slide_analysis, placeholders_config):
-    """تطبيق الإعدادات المحددة على الشريحة"""
-    
-    # الحصول على قائمة الصور في المجلد
-    imgs = [f for f in os.listdir(folder_path) 
-            if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff', '.webp'))]
-    imgs.sort()
-    
-    # تطبيق إعدادات الصور
-    image_config = placeholders_config.get('images', {})
-    
-    # إنشاء قاموس للصور حسب الترتيب المطلوب
-    image_assignments = {}
-    for config_key, config in image_config.items():
-        if config['use'] and config['order'] and config['order'] <= len(imgs):
-            image_path = os.path.join(folder_path, imgs[config['order'] - 1])
-            placeholder_info = config['placeholder_info']
-            
-            # العثور على الشكل المقابل في الشريحة الجديدة
-            target_shapes = []
-            for shape in slide.shapes:
-                if shape.is_placeholder and shape.placeholder_format.type == PP_PLACEHOLDER.PICTURE:
-                    target_shapes.append(shape)
-                elif shape.shape_type == MSO_SHAPE_TYPE.PICTURE and not shape.is_placeholder:
-                    target_shapes.append(shape)
-            
-            # مطابقة الشكل بناءً على الموقع
-            for shape in target_shapes:
-                shape_left_percent = (shape.left / slide_analysis['slide_dimensions']['width']) * 100
-                shape_top_percent = (shape.top / slide_analysis['slide_dimensions']['height']) * 100
-                
-                # تحمل اختلاف بسيط في الموقع
-                if (abs(shape_left_percent - placeholder_info['left_percent']) < 5 and 
-                    abs(shape_top_percent - placeholder_info['top_percent']) < 5):
-                    
-                    try:
-                        if shape.is_placeholder:
-                            with open(image_path, 'rb') as img_file:
-                                shape.insert_picture(img_file)
-                        else:
-                            # استبدال الصورة العادية
-                            original_left = shape.left
-                            original_top = shape.top
-                            original_width = shape.width
-                            original_height = shape.height
-                            
-                            shape_element = shape._element
-                            shape_element.getparent().remove(shape_element)
-                            
-                            slide.shapes.add_picture(image_path, original_left, original_top, original_width, original_height)
-                        
-                        add_detail(f"✅ تم استبدال الصورة {config['order']}: {os.path.basename(image_path)}", "success")
-                        break
-                    except Exception as e:
-                        add_detail(f"❌ فشل في استبدال الصورة: {e}", "error")
-    
-    # تطبيق إعدادات النصوص
-    text_config = placeholders_config.get('texts', {})
-    
-    text_shapes = []
-    for shape in slide.shapes:
-        if (shape.is_placeholder and 
-            shape.placeholder_format.type not in [PP_PLACEHOLDER.PICTURE, PP_PLACEHOLDER.TITLE] and
-            hasattr(shape, 'text_frame') and shape.text_frame):
-            text_shapes.append(shape)
-    
-    text_index = 0
-    for config_key, config in text_config.items():
-        if text_index < len(text_shapes):
-            shape = text_shapes[text_index]
-            
-            try:
-                if config['type'] == "ترك فارغ":
-                    shape.text_frame.text = ""
-                    
-                elif config['type'] == "نص ثابت":
-                    if config['value']:
-                        shape.text_frame.text = config['value']
-                        
-                elif config['type'] == "تاريخ":
-                    if config['value'] == "today":
-                        date_text = datetime.now().strftime('%Y-%m-%d')
-                    else:
-                        date_text = config['value']
-                    shape.text_frame.text = date_text
-                    
-                elif config['type'] == "تاريخ الصورة" and imgs:
-                    first_image_path = os.path.join(folder_path, imgs[0])
-                    image_date = get_image_date(first_image_path)
-                    shape.text_frame.text = image_date
-                    
-                elif config['type'] == "اسم المجلد":
-                    shape.text_frame.text = folder_name
-                
-                add_detail(f"✅ تم تطبيق النص: {config['type']}", "success")
-                
-            except Exception as e:
-                add_detail(f"⚠ خطأ في تطبيق النص: {e}", "warning")
-            
-            text_index += 1
+        # استخراج الملف المضغوط
+        with zipfile.ZipFile(zip_path, "r") as zip_ref:
+            zip_ref.extractall(extract_dir)
+        os.remove(zip_path)
+        add_detail("📂 تم استخراج الملف المضغوط بنجاح", "success", details)
+        
+        # المجلدات الأولى في الملف المضغوط التي تحتوي على صور
+        folders, empty = scan_directory(extract_dir, nested=False, include_root=False)
+        for folder in folders:
+            add_detail(f"📁 المجلد '{folder.name}' يحتوي على {len(folder.images)} صورة", "info", details)
+        if not skip_empty_folders:
+            for name in empty:
+                add_detail(f"⚠ المجلد '{name}' فارغ من الصور", "warning", details)
+        
+        if not folders:
+            raise ValueError("لا توجد مجلدات تحتوي على صور في الملف المضغوط.")
+        
+        job.total = len(folders)
+        add_detail(f"✅ تم العثور على {len(folders)} مجلد يحتوي على صور", "success", details)
+        
+        def folder_source():
+            for folder in folders:
+                job.current_folder = folder.name
+                yield folder.name, folder.open_images()
+        
+        # حفظ الملف على القرص؛ الصفحة تقرأه عند التحميل فقط
+        output_filename = f"PowerPoint_Updated_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pptx"
+        output_path = os.path.join(job.work_dir, output_filename)
+        started = time.monotonic()
+        for event in generate(pptx_data, placeholders_config, folder_source(), output=output_path,
+                              slide_analysis=slide_analysis, image_order=image_order, seed=seed,
+                              skip_empty_folders=skip_empty_folders, log=details,
+                              check=lambda: job.check(started)):
+            if event['event'] == 'folder':
+                job.done = event['index']
+            elif event['event'] == 'done':
+                job.stats = event['stats']
+        
+        if job.stats['created_slides'] == 0:
+            raise ValueError("لم يتم إضافة أي شرائح.")
+        
+        job.output_filename = output_filename
+        job.output_path = output_path
+        job.status = JOB_DONE
+    
+    except JobStopped:
+        job.status = JOB_STOPPED
+    except Exception as e:
+        add_detail(f"❌ خطأ عام أثناء المعالجة: {e}", "error", details)
+        job.error = str(e)
+        job.status = JOB_FAILED
+    finally:
+        # الإيقاف بعد الانتهاء مباشرة (أو عند بدء مهمة جديدة) يلغي النتيجة أيضاً
+        if job.stopping and job.status == JOB_DONE:
+            job.status = JOB_STOPPED
+        # الصور المستخرجة لا تلزم بعد الإنشاء في كل الحالات؛ يبقى العرض الناتج فقط
+        shutil.rmtree(extract_dir, ignore_errors=True)
+        if job.status == JOB_DONE:
+            add_detail("🧹 تم تنظيف الملفات المؤقتة", "info", details)
+        else:
+            job.cleanup()
+
+def publish_job_details(job):
+    """نقل سجل المهمة المنتهية إلى سجل الجلسة مرة واحدة"""
+    if st.session_state.get('published_job') is job:
+        return
+    st.session_state.processing_details = job.details
+    st.session_state.show_details_needed = job.details.needs_attention
+    st.session_state.published_job = job
+
+def discard_job():
+    """إيقاف مهمة الجلسة (إن وجدت) وحذف مجلدها"""
+    job = st.session_state.pop('generation_job', None)
+    if job:
+        job.stop()
+        if job.status != JOB_RUNNING:
+            job.cleanup()
+
+@st.fragment(run_every=PROGRESS_REFRESH_SECONDS)
+def show_job_progress():
+    """عرض تقدم المهمة الجارية؛ يتم تحديثه وحده دون إعادة تشغيل الصفحة كاملة"""
+    job = st.session_state.get('generation_job')
+    if job is None or job.status != JOB_RUNNING:
+        # انتهت المهمة: إعادة تشغيل الصفحة كاملة مرة واحدة لعرض النتيجة
+        st.rerun()
+    
+    st.progress(job.done / job.total if job.total else 0.0)
+    if job.stopping:
+        st.text("⏹ جاري إيقاف المعالجة...")
+    elif job.total:
+        st.text(f"🔄 معالجة المجلد {job.done + 1}/{job.total}: {job.current_folder}")
+    else:
+        st.text("📦 جاري استخراج الملفات...")
+    # يتم التحقق من الإيقاف بين المجلدات، ثم حذف الملفات المؤقتة
+    st.button("⏹ إيقاف المعالجة", key="stop_processing", on_click=job.stop, disabled=job.stopping)
+
+def show_job_result(job):
+    """عرض نتيجة المهمة المنتهية من القرص"""
+    publish_job_details(job)
+    
+    if job.status == JOB_FAILED:
+        st.error(f"❌ خطأ أثناء المعالجة: {job.error}")
+        if job.stats:
+            st.metric("الشرائح المُضافة", job.stats['created_slides'])
+        show_details_section()
+        return
     
-    # تطبيق العنوان (اسم المجلد)
-    title_shapes = [
-        shape for shape in slide.shapes
-        if shape.is_placeholder and shape.placeholder_format.type == PP_PLACEHOLDER.TITLE
-    ]
+    # عرض النتائج
+    st.success("🎉 تم الانتهاء من المعالجة بنجاح!")
     
-    if title_shapes:
-        title_shapes[0].text = folder_name
-        add_detail(f"✅ تم تحديث العنوان: {folder_name}", "success")
+    col1, col2, col3 = st.columns(3)
+    with col1: 
+        st.metric("الشرائح المُضافة", job.stats['created_slides'])
+    with col2: 
+        st.metric("المجلدات المُعالجة", job.stats['processed_folders'])
+    with col3:
+        st.metric("إجمالي الصور", job.stats['total_images'])
+    
+    with open(job.output_path, 'rb') as output_file:
+        st.download_button(
+            label="⬇️ تحميل الملف المُحدث",
+            data=output_file,
+            file_name=job.output_filename,
+            mime="application/vnd.openxmlformats-officedocument.presentationml.presentation",
+            type="primary"
+        )
+    
+    # خيار البدء من جديد
+    if st.button("🔄 بدء عملية جديدة"):
+        discard_job()
+        # إعادة تعيين جميع المتغيرات
+        for key in list(st.session_state.keys()):
+            del st.session_state[key]
+        st.rerun()
+    
+    # إظهار التفاصيل
+    if not st.session_state.show_details_needed:
+        if st.button("📋 إظهار تفاصيل المعالجة"):
+            show_details_section()
+    else:
+        show_details_section()
 
 def step3_process_files():
     """الخطوة الثالثة: رفع الصور ومعالجة الملفات"""
@@ -713,6 +847,9 @@ def step3_process_files():
             st.session_state.current_step = 2
             st.rerun()
     
+    if st.session_state.pop('processing_stopped', False):
+        st.warning("⏹ تم إيقاف المعالجة بطلب المستخدم وحذف الملفات المؤقتة")
+    
     st.markdown("### 📂 رفع ملف الصور")
     
     uploaded_zip = st.file_uploader(
@@ -775,159 +912,40 @@ def step3_process_files():
             help="تجاهل المجلدات التي لا تحتوي على صور"
         )
     
+    job = st.session_state.get('generation_job')
+    running = job is not None and job.status == JOB_RUNNING
+    
     if uploaded_zip:
-        if st.button("🚀 بدء المعالجة", type="primary"):
+        if st.button("🚀 بدء المعالجة", type="primary", disabled=running):
+            discard_job()
             clear_details()
+            st.session_state.pop('published_job', None)
             
-            temp_dir = None
-            try:
-                # استخراج الملف المضغوط
-                with st.spinner("📦 جاري استخراج الملفات..."):
-                    zip_bytes = io.BytesIO(uploaded_zip.read())
-                    with zipfile.ZipFile(zip_bytes, "r") as zip_ref:
-                        temp_dir = tempfile.mkdtemp()
-                        zip_ref.extractall(temp_dir)
-                
-                add_detail("📂 تم استخراج الملف المضغوط بنجاح", "success")
-                
-                # البحث عن المجلدات التي تحتوي على صور
-                all_items = os.listdir(temp_dir)
-                folder_paths = []
-                
-                for item in all_items:
-                    item_path = os.path.join(temp_dir, item)
-                    if os.path.isdir(item_path):
-                        imgs_in_folder = [f for f in os.listdir(item_path) 
-                                        if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff', '.webp'))]
-                        if imgs_in_folder:
-                            folder_paths.append(item_path)
-                            add_detail(f"📁 المجلد '{item}' يحتوي على {len(imgs_in_folder)} صورة", "info")
-                        elif not skip_empty_folders:
-                            add_detail(f"⚠ المجلد '{item}' فارغ من الصور", "warning")
-                
-                if not folder_paths:
-                    st.error("❌ لا توجد مجلدات تحتوي على صور في الملف المضغوط.")
-                    add_detail("❌ لا توجد مجلدات تحتوي على صور", "error")
-                    show_details_section()
-                    st.stop()
-                
-                folder_paths.sort()
-                add_detail(f"✅ تم العثور على {len(folder_paths)} مجلد يحتوي على صور", "success")
-
-                # تحميل ملف PowerPoint
-                with st.spinner("📄 جاري تحميل ملف PowerPoint..."):
-                    prs = Presentation(io.BytesIO(st.session_state.pptx_data))
-                    
-                    if len(prs.slides) == 0:
-                        st.error("❌ لا توجد شرائح في ملف PowerPoint")
-                        st.stop()
-                
-                first_slide = prs.slides[0]
-                slide_layout = first_slide.slide_layout
-                
-                # معالجة الشرائح
-                total_processed = 0
-                created_slides = 0
-                
-                progress_bar = st.progress(0)
-                status_text = st.empty()
-                
-                for folder_idx, folder_path in enumerate(folder_paths):
-                    folder_name = os.path.basename(folder_path)
-                    status_text.text(f"🔄 معالجة المجلد {folder_idx + 1}/{len(folder_paths)}: {folder_name}")
-                    
-                    try:
-                        # ترتيب الصور في المجلد
-                        imgs = [f for f in os.listdir(folder_path) 
-                               if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff', '.webp'))]
-                        
-                        if image_order_option == "عشوائي":
-                            random.shuffle(imgs)
-                            add_detail(f"🔀 تم ترتيب صور المجلد {folder_name} عشوائياً", "info")
-                        else:
-                            imgs.sort()
-                            add_detail(f"📋 تم ترتيب صور المجلد {folder_name} أبجدياً", "info")
-                        
-                        # إنشاء شريحة جديدة
-                        new_slide = prs.slides.add_slide(slide_layout)
-                        created_slides += 1
-                        
-                        # تطبيق الإعدادات المحددة
-                        apply_configured_placeholders(
-                            new_slide, 
-                            folder_path, 
-                            folder_name, 
-                            st.session_state.slide_analysis,
-                            st.session_state.placeholders_config
-                        )
-                        
-                        total_processed += len(imgs)
-                        add_detail(f"✅ تم إنشاء شريحة للمجلد '{folder_name}' مع {len(imgs)} صورة", "success")
-                    
-                    except Exception as e:
-                        add_detail(f"❌ خطأ في معالجة المجلد {folder_name}: {e}", "error")
-                    
-                    progress_bar.progress((folder_idx + 1) / len(folder_paths))
-                
-                progress_bar.empty()
-                status_text.empty()
-                
-                # عرض النتائج
-                st.success("🎉 تم الانتهاء من المعالجة بنجاح!")
-                
-                col1, col2, col3 = st.columns(3)
-                with col1: 
-                    st.metric("الشرائح المُضافة", created_slides)
-                with col2: 
-                    st.metric("المجلدات المُعالجة", len(folder_paths))
-                with col3:
-                    st.metric("إجمالي الصور", total_processed)
-                
-                if created_slides == 0:
-                    st.error("❌ لم يتم إضافة أي شرائح.")
-                    show_details_section()
-                    st.stop()
-                
-                # حفظ الملف وإتاحة التحميل
-                output_filename = f"PowerPoint_Updated_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pptx"
-                output_buffer = io.BytesIO()
-                prs.save(output_buffer)
-                output_buffer.seek(0)
-                
-                st.download_button(
-                    label="⬇️ تحميل الملف المُحدث",
-                    data=output_buffer.getvalue(),
-                    file_name=output_filename,
-                    mime="application/vnd.openxmlformats-officedocument.presentationml.presentation",
-                    type="primary"
-                )
-                
-                # خيار البدء من جديد
-                if st.button("🔄 بدء عملية جديدة"):
-                    # إعادة تعيين جميع المتغيرات
-                    for key in list(st.session_state.keys()):
-                        del st.session_state[key]
-                    st.rerun()
-                
-                # إظهار التفاصيل
-                if not st.session_state.show_details_needed:
-                    if st.button("📋 إظهار تفاصيل المعالجة"):
-                        show_details_section()
-                else:
-                    show_details_section()
-                
-            except Exception as e:
-                st.error(f"❌ خطأ أثناء المعالجة: {e}")
-                add_detail(f"❌ خطأ عام أثناء المعالجة: {e}", "error")
-                show_details_section()
-            finally:
-                # تنظيف الملفات المؤقتة
-                if temp_dir and os.path.exists(temp_dir):
-                    try:
-                        shutil.rmtree(temp_dir)
-                        add_detail("🧹 تم تنظيف الملفات المؤقتة", "info")
-                    except Exception as cleanup_error:
-                        add_detail(f"⚠ خطأ في تنظيف الملفات المؤقتة: {cleanup_error}", "warning")
+            # الملف المضغوط يكتب على القرص مرة واحدة، ثم تعمل المهمة في الخلفية
+            job = GenerationJob()
+            zip_path = os.path.join(job.work_dir, 'photos.zip')
+            save_upload(uploaded_zip, zip_path)
+            job.start(
+                run_generation,
+                zip_path,
+                st.session_state.pptx_data,
+                st.session_state.slide_analysis,
+                st.session_state.placeholders_config,
+                image_order_option == "عشوائي",
+                skip_empty_folders
+            )
+            st.session_state.generation_job = job
+    
+    if job is None:
+        return
+    if job.status == JOB_RUNNING:
+        show_job_progress()
+    elif job.status == JOB_STOPPED:
+        st.session_state.pop('generation_job', None)
+        st.session_state.processing_stopped = True
+        st.rerun()
+    else:
+        show_job_result(job)
 
 def main():
     """الدالة الرئيسية للتطبيق"""
@@ -0,0 +1,214 @@
+"""مرحلة القبول: فحص الملف المضغوط وحدود الموارد قبل أي معالجة"""
+import os
+import time
+
+from PIL import Image
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff', '.webp')
+
+# سياسات التعامل مع الصور التي تتجاوز حد البكسلات
+POLICY_DOWNSCALE = 'downscale'
+POLICY_REJECT = 'reject'
+
+MB = 1024 * 1024
+
+
+class AdmissionError(Exception):
+    """خطأ يعني رفض المهمة قبل البدء بسبب تجاوز حدود الموارد"""
+
+
+class ResourceLimits:
+    """حدود الموارد المسموح بها لكل مهمة، قابلة للضبط لكل بيئة تشغيل"""
+
+    def __init__(self,
+                 max_upload_bytes=512 * MB,
+                 max_uncompressed_bytes=2048 * MB,
+                 max_members=20000,
+                 max_compression_ratio=100,
+                 max_image_pixels=40_000_000,
+                 hard_image_pixels=160_000_000,
+                 oversize_policy=POLICY_DOWNSCALE):
+        self.max_upload_bytes = max_upload_bytes
+        self.max_uncompressed_bytes = max_uncompressed_bytes
+        self.max_members = max_members
+        self.max_compression_ratio = max_compression_ratio
+        self.max_image_pixels = max_image_pixels
+        self.hard_image_pixels = hard_image_pixels
+        self.oversize_policy = oversize_policy
+
+    @classmethod
+    def from_env(cls, environ=None):
+        """قراءة الحدود من متغيرات البيئة (PPTX_*) مع القيم الافتراضية"""
+        environ = os.environ if environ is None else environ
+        defaults = cls()
+
+        def read_int(name, default):
+            value = environ.get(name)
+            return int(value) if value not in (None, '') else default
+
+        return cls(
+            max_upload_bytes=read_int('PPTX_MAX_UPLOAD_MB', defaults.max_upload_bytes // MB) * MB,
+            max_uncompressed_bytes=read_int('PPTX_MAX_UNCOMPRESSED_MB', defaults.max_uncompressed_bytes // MB) * MB,
+            max_members=read_int('PPTX_MAX_MEMBERS', defaults.max_members),
+            max_compression_ratio=read_int('PPTX_MAX_COMPRESSION_RATIO', defaults.max_compression_ratio),
+            max_image_pixels=read_int('PPTX_MAX_IMAGE_PIXELS', defaults.max_image_pixels),
+            hard_image_pixels=read_int('PPTX_HARD_IMAGE_PIXELS', defaults.hard_image_pixels),
+            oversize_policy=environ.get('PPTX_OVERSIZE_IMAGE_POLICY', defaults.oversize_policy)
+        )
+
+
+class AdmissionReport:
+    """نتيجة فحص الملف المضغوط: ما سيتم استخراجه وما سيتم تصغيره أو تخطيه"""
+
+    def __init__(self):
+        self.member_count = 0
+        self.uncompressed_bytes = 0
+        self.image_count = 0
+        self.downscale = {}
+        self.skipped = {}
+        self.dimensions = {}
+        self.headers_complete = True
+
+    def to_dict(self):
+        return {
+            'member_count': self.member_count,
+            'uncompressed_bytes': self.uncompressed_bytes,
+            'image_count': self.image_count,
+            'downscaled_images': len(self.downscale),
+            'skipped_images': len(self.skipped)
+        }
+
+
+def is_image_name(name):
+    return name.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def is_safe_member(name):
+    """التأكد من أن مسار العنصر لا يخرج عن مجلد الاستخراج"""
+    normalized = name.replace('\\', '/')
+    if normalized.startswith('/') or (len(normalized) > 1 and normalized[1] == ':'):
+        return False
+    return '..' not in normalized.split('/')
+
+
+def read_image_size(zip_ref, info):
+    """قراءة أبعاد الصورة من الترويسة فقط دون فك ترميز البكسلات"""
+    with zip_ref.open(info) as member:
+        with Image.open(member) as img:
+            return img.size
+
+
+def admit_archive(zip_ref, limits, image_names=None, deadline=None):
+    """فحص الدليل المركزي للملف المضغوط وترويسات الصور مقابل الحدود
+
+    ترفع AdmissionError إذا تجاوز الملف أي حد لا يمكن معالجته بالتصغير.
+    image_names يحصر قراءة الترويسات في صور محددة، وdeadline (وقت time.monotonic)
+    يوقف قراءتها عند انتهاء المهلة مع headers_complete = False (يستخدمهما المخطط).
+    """
+    report = AdmissionReport()
+    members = [info for info in zip_ref.infolist() if not info.is_dir()]
+    report.member_count = len(members)
+
+    if report.member_count > limits.max_members:
+        raise AdmissionError(
+            f'الملف المضغوط يحتوي على {report.member_count} عنصر، والحد الأقصى هو {limits.max_members}'
+        )
+
+    for info in members:
+        if not is_safe_member(info.filename):
+            raise AdmissionError(f'مسار غير آمن داخل الملف المضغوط: {info.filename}')
+
+        report.uncompressed_bytes += info.file_size
+        if report.uncompressed_bytes > limits.max_uncompressed_bytes:
+            raise AdmissionError(
+                f'الحجم بعد فك الضغط يتجاوز الحد المسموح ({limits.max_uncompressed_bytes // MB} MB)'
+            )
+
+        # الملفات الصغيرة قد تنضغط بنسب عالية بشكل طبيعي، لذا يطبق الفحص على الكبيرة فقط
+        if (info.file_size > MB and info.compress_size and
+                info.file_size / info.compress_size > limits.max_compression_ratio):
+            raise AdmissionError(f'نسبة ضغط غير طبيعية للعنصر {info.filename}')
+
+    for info in members:
+        if not is_image_name(info.filename):
+            continue
+        report.image_count += 1
+        if image_names is not None and info.filename not in image_names:
+            continue
+        if deadline is not None and time.monotonic() > deadline:
+            report.headers_complete = False
+            continue
+
+        try:
+            width, height = read_image_size(zip_ref, info)
+        except Exception as e:
+            report.skipped[info.filename] = f'ترويسة صورة غير صالحة: {e}'
+            continue
+        report.dimensions[info.filename] = (width, height)
+
+        pixels = width * height
+        if pixels <= limits.max_image_pixels:
+            continue
+
+        if limits.oversize_policy == POLICY_REJECT:
+            raise AdmissionError(
+                f'الصورة {info.filename} ({width}×{height}) تتجاوز الحد الأقصى للبكسلات'
+            )
+        if pixels > limits.hard_image_pixels:
+            report.skipped[info.filename] = f'أبعاد كبيرة جداً ({width}×{height})'
+        else:
+            report.downscale[info.filename] = (width, height)
+
+    return report
+
+
+def downscale_member(zip_ref, info, target_path, max_pixels):
+    """فك ترميز صورة كبيرة بأقل دقة ممكنة وحفظها ضمن حد البكسلات"""
+    with zip_ref.open(info) as member:
+        with Image.open(member) as img:
+            width, height = img.size
+            scale = (max_pixels / float(width * height)) ** 0.5
+            target_size = (max(1, int(width * scale)), max(1, int(height * scale)))
+            # draft يسمح لمفكك JPEG بالتصغير أثناء القراءة بدلاً من فك الصورة كاملة
+            img.draft(img.mode, target_size)
+            image_format = img.format
+            img.thumbnail(target_size)
+            img.save(target_path, format=image_format)
+
+
+def extract_admitted(zip_ref, dest_dir, report, limits, check=None):
+    """استخراج العناصر المقبولة فقط مع مراقبة الحجم الفعلي المكتوب
+
+    check تستدعى قبل كل عنصر وترفع استثناءً لإيقاف الاستخراج (الإلغاء أو انتهاء المهلة).
+    """
+    written = 0
+    for info in zip_ref.infolist():
+        if info.filename in report.skipped:
+            continue
+        if check:
+            check()
+
+        target_path = os.path.join(dest_dir, *info.filename.replace('\\', '/').split('/'))
+        if info.is_dir():
+            os.makedirs(target_path, exist_ok=True)
+            continue
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+
+        if info.filename in report.downscale:
+            downscale_member(zip_ref, info, target_path, limits.max_image_pixels)
+            written += os.path.getsize(target_path)
+        else:
+            with zip_ref.open(info) as source, open(target_path, 'wb') as target:
+                # نسخ على دفعات مع التحقق من الحجم لأن الترويسات قد تكون مزيفة
+                while True:
+                    chunk = source.read(MB)
+                    if not chunk:
+                        break
+                    written += len(chunk)
+                    if written > limits.max_uncompressed_bytes:
+                        raise AdmissionError('الحجم الفعلي بعد فك الضغط يتجاوز الحد المسموح')
+                    target.write(chunk)
+        # الحفاظ على تاريخ الملف من الأرشيف بدلاً من وقت الاستخراج (يستخدم كتاريخ للصورة)
+        timestamp = time.mktime(info.date_time + (0, 0, -1))
+        os.utime(target_path, (timestamp, timestamp))
+    return written
@@ -1,276 +1,208 @@
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, Blueprint, Response, current_app, g, render_template, request, jsonify, send_file, session
+from werkzeug.local import LocalProxy
 import os
 import io
 import zipfile
 import tempfile
 import shutil
 import json
+import threading
+import functools
+import uuid
+import time
+import hashlib
+import hmac
+import contextlib
 from datetime import datetime, date
 from pptx import Presentation
-from pptx.enum.shapes import PP_PLACEHOLDER, MSO_SHAPE_TYPE
-from pptx.util import Inches
-import random
 from PIL import Image
-from PIL.ExifTags import TAGS
 import base64
 
-app = Flask(__name__)
+from processing_log import ProcessingLog, LEVELS
+from admission import ResourceLimits, AdmissionError, admit_archive, extract_admitted
+from scheduler import JobScheduler, estimate_job_memory, DONE, FAILED, CANCELLED
+from result_cache import ResultCache, file_digest, make_cache_key
+from image_cache import ImageCache
+from workspace import Workspace, CHECKPOINT_DIR_PREFIX
+from engine import (analyze_slide_placeholders, generate, generate_multi, configured_image_sizes,
+                    uses_image_dates, RENDER_DPI)
+from sources import scan_directory, directory_digest, resolve_source_path
+from parts import plan_parts, build_parts, write_manifest, load_manifest, stream_parts_zip, estimate_folder_bytes
+from planner import Calibration, plan_archive, plan_directory, used_images_selector
+from validation import POLICIES, POLICY_SKIP, validate_folders
+from duplicates import DUPLICATE_POLICIES, DUPLICATES_OFF, dedupe_folders
+from checkpoint import Checkpoint, checkpoint_interval_from_env
+from tracing import NULL_TRACER, Tracer, trace_jobs_from_env
+from profiling import JobProfiler, profile_token_from_env
+from archive_browser import ArchiveIndex, DEFAULT_PER_PAGE, THUMBNAIL_SIZE
+from blob_store import OWNER_PATTERN, BlobStore, Manifest, ManifestError
+from template_index import KIND_LAYOUT, KIND_SLIDE, TemplateIndex
 
-# Global variables to store session data
-session_data = {
-    'current_step': 1,
-    'pptx_data': None,
-    'slide_analysis': None,
-    'placeholders_config': {},
-    'processing_details': [],
-    'show_details_needed': False,
-    'temp_dir': None
-}
+bp = Blueprint('main', __name__)
+
+# جدولة مهام الإنتاج المشتركة بين جميع الجلسات
+scheduler = JobScheduler.from_env()
+
+# العروض الناتجة سابقاً، ومهام قيد التنفيذ لنفس المفتاح (لتجنب تكرار العمل عند الضغط مرتين)
+result_cache = ResultCache.from_env()
+inflight_jobs = {}
+
+# الصور المصغرة لمواضع القوالب، مشتركة بين المهام
+image_cache = ImageCache.from_env()
+
+# الصور المرفوعة حسب المحتوى (بصمة SHA-256)، مشتركة بين الجلسات
+blob_store = BlobStore.from_env()
+
+# فهرس مكتبة القوالب على الخادم (PPTX_TEMPLATE_LIBRARY)، محفوظ بين التشغيلات
+template_index = TemplateIndex.from_env()
+
+# مجلدات المهام المؤقتة: حذف بقايا التشغيل السابق في warm_up ثم حذف دوري حسب العمر والحصة
+workspace = Workspace.from_env()
+
+# الفترة بين نقاط حفظ المهام الطويلة (0 = بدون نقاط حفظ)
+checkpoint_interval = checkpoint_interval_from_env()
+
+# تسجيل تتبع زمني لكل المهام (وإلا فقط عند طلبه في نموذج المهمة)
+trace_jobs = trace_jobs_from_env()
+
+def new_session_data():
+    """حالة جلسة جديدة فارغة"""
+    return {
+        'current_step': 1,
+        'pptx_data': None,
+        'slide_analysis': None,
+        'placeholders_config': {},
+        'processing_log': ProcessingLog(),
+        'show_details_needed': False,
+        'temp_dir': None,
+        'job_id': None,
+        # الملف المضغوط المرفوع للتصفح قبل المعالجة (ArchiveIndex)
+        'archive': None,
+        # بيان الرفع حسب المحتوى (Manifest) في انتظار صوره الناقصة
+        'manifest': None,
+        # قوالب إضافية تنشأ عروضها من الصور نفسها في المهمة ذاتها
+        'extra_targets': [],
+        'last_seen': time.time()
+    }
+
+# Session data for every browser session, keyed by the id stored in the session cookie
+sessions = {}
+sessions_lock = threading.Lock()
+
+def current_session_id():
+    if 'sid' not in session:
+        session['sid'] = uuid.uuid4().hex
+    return session['sid']
+
+# معرف الرفع حسب المحتوى: ملف تعريف طويل العمر مستقل عن الجلسة، فيبقى للمستخدم
+# ما رفعه من صور بعد انتهاء الجلسة وإغلاق المتصفح
+UPLOADER_COOKIE = 'pptx_uploader'
+UPLOADER_COOKIE_MAX_AGE = 365 * 24 * 3600
+
+def current_uploader_id():
+    uploader = request.cookies.get(UPLOADER_COOKIE, '')
+    if not OWNER_PATTERN.fullmatch(uploader):
+        uploader = g.setdefault('new_uploader', uuid.uuid4().hex)
+    return uploader
+
+@bp.after_app_request
+def remember_uploader(response):
+    """حفظ معرف الرفع الجديد في المتصفح"""
+    if 'new_uploader' in g:
+        response.set_cookie(UPLOADER_COOKIE, g.new_uploader, max_age=UPLOADER_COOKIE_MAX_AGE,
+                            httponly=True, samesite='Lax')
+    return response
+
+def get_session_data():
+    """حالة الجلسة الحالية (يتم إنشاؤها عند أول طلب)"""
+    sid = current_session_id()
+    with sessions_lock:
+        if sid not in sessions:
+            sessions[sid] = new_session_data()
+        sessions[sid]['last_seen'] = time.time()
+        return sessions[sid]
+
+def reset_session_data():
+    """إعادة تعيين حالة الجلسة الحالية"""
+    sid = current_session_id()
+    with sessions_lock:
+        sessions[sid] = new_session_data()
+        return sessions[sid]
+
+session_data = LocalProxy(get_session_data)
+
+def prune_inflight_jobs():
+    """حذف المهام المنتهية من جدول المهام قيد التنفيذ"""
+    for key, job in list(inflight_jobs.items()):
+        if job.finished:
+            inflight_jobs.pop(key, None)
+
+def expire_idle_sessions():
+    """حذف الجلسات غير النشطة لفترة أطول من عمر مساحة العمل مع مجلداتها
+
+    وحذف المهام المنتهية منذ أكثر من مدة الاحتفاظ من سجل الجدولة.
+    """
+    scheduler.expire_finished()
+    prune_inflight_jobs()
+    cutoff = time.time() - workspace.ttl
+    with sessions_lock:
+        expired = [sid for sid, data in sessions.items() if data['last_seen'] < cutoff]
+        for sid in expired:
+            data = sessions.pop(sid)
+            if data['temp_dir']:
+                workspace.remove(data['temp_dir'])
+            if data['archive']:
+                release_archive(data['archive'])
+
+workspace.on_sweep = expire_idle_sessions
+
+# قياسات المهام السابقة لمعايرة تقديرات التشغيل التجريبي
+calibration = Calibration.from_env()
+
+@bp.before_app_request
+def start_background_services():
+    """تشغيل خيط الحذف الدوري في كل عامل عند أول طلب (بعد fork وليس قبله)"""
+    workspace.start_sweeper()
 
 def add_detail(message, detail_type="info"):
-    """إضافة تفصيل جديد إلى قائمة التفاصيل"""
-    session_data['processing_details'].append({
-        'message': message,
-        'type': detail_type
-    })
+    """إضافة تفصيل جديد إلى سجل المعالجة"""
+    session_data['processing_log'].add(message, detail_type)
     
     if detail_type in ['error', 'warning']:
         session_data['show_details_needed'] = True
 
 def clear_details():
-    """مسح جميع التفاصيل وإعادة تعيين حالة الإظهار"""
-    session_data['processing_details'] = []
+    """بدء سجل جديد وإعادة تعيين حالة الإظهار (سجل المهمة السابقة يبقى معها)"""
+    session_data['processing_log'] = ProcessingLog()
     session_data['show_details_needed'] = False
 
-def analyze_slide_placeholders(prs):
-    """تحليل جميع placeholders في الشريحة الأولى مع ضبط الإحداثيات"""
-    if len(prs.slides) == 0:
-        return None
-    
-    first_slide = prs.slides[0]
-    slide_width = prs.slide_width
-    slide_height = prs.slide_height
-    
-    placeholders = {
-        'image_placeholders': [],
-        'text_placeholders': [],
-        'title_placeholders': [],
-        'slide_dimensions': {
-            'width': slide_width,
-            'height': slide_height,
-            'width_inches': slide_width / 914400,
-            'height_inches': slide_height / 914400
-        }
+def release_session_workspace():
+    """حذف مجلد الجلسة السابق ما لم تكن هناك مهمة جارية تستخدمه"""
+    job = scheduler.get(session_data['job_id']) if session_data['job_id'] else None
+    if job and not job.finished:
+        return
+    if session_data['temp_dir']:
+        workspace.remove(session_data['temp_dir'])
+
+def release_archive(archive):
+    """إغلاق فهرس التصفح وحذف مجلده"""
+    archive.close()
+    workspace.remove(os.path.dirname(archive.zip_path))
+
+def details_response():
+    """ملخص السجل المرسل مع استجابة المعالجة: العدادات والأخطاء فقط"""
+    return {
+        'summary': session_data['processing_log'].summary(),
+        'errors': session_data['processing_log'].errors()
     }
-    
-    placeholder_id = 0
-    def clamp_percent(val):
-        # تأكد أن القيمة بين 0 و 100 دائماً
-        return max(0, min(val, 100))
-    
-    for shape in first_slide.shapes:
-        if shape.is_placeholder:
-            placeholder_type = shape.placeholder_format.type
-            left_percent = clamp_percent((shape.left / slide_width) * 100)
-            top_percent = clamp_percent((shape.top / slide_height) * 100)
-            width_percent = clamp_percent((shape.width / slide_width) * 100)
-            height_percent = clamp_percent((shape.height / slide_height) * 100)
-            placeholder_info = {
-                'id': placeholder_id,
-                'type': placeholder_type,
-                'left': shape.left,
-                'top': shape.top,
-                'width': shape.width,
-                'height': shape.height,
-                'left_percent': left_percent,
-                'top_percent': top_percent,
-                'width_percent': width_percent,
-                'height_percent': height_percent,
-                'rotation': getattr(shape, 'rotation', 0)
-            }
-            if placeholder_type == PP_PLACEHOLDER.PICTURE:
-                placeholder_info['current_content'] = "صورة"
-                placeholders['image_placeholders'].append(placeholder_info)
-            elif placeholder_type == PP_PLACEHOLDER.TITLE:
-                placeholder_info['current_content'] = shape.text_frame.text if hasattr(shape, 'text_frame') and shape.text_frame.text else "العنوان"
-                placeholders['title_placeholders'].append(placeholder_info)
-            else:
-                if hasattr(shape, 'text_frame') and shape.text_frame:
-                    placeholder_info['current_content'] = shape.text_frame.text if shape.text_frame.text else f"نص {placeholder_id + 1}"
-                    placeholders['text_placeholders'].append(placeholder_info)
-            placeholder_id += 1
-    for shape in first_slide.shapes:
-        if shape.shape_type == MSO_SHAPE_TYPE.PICTURE and not shape.is_placeholder:
-            left_percent = clamp_percent((shape.left / slide_width) * 100)
-            top_percent = clamp_percent((shape.top / slide_height) * 100)
-            width_percent = clamp_percent((shape.width / slide_width) * 100)
-            height_percent = clamp_percent((shape.height / slide_height) * 100)
-            image_info = {
-                'id': placeholder_id,
-                'type': 'regular_image',
-                'left': shape.left,
-                'top': shape.top,
-                'width': shape.width,
-                'height': shape.height,
-                'left_percent': left_percent,
-                'top_percent': top_percent,
-                'width_percent': width_percent,
-                'height_percent': height_percent,
-                'rotation': getattr(shape, 'rotation', 0),
-                'current_content': "صورة موجودة"
-            }
-            placeholders['image_placeholders'].append(image_info)
-            placeholder_id += 1
-    return placeholders
-
-def get_image_date(image_path):
-    """استخراج تاريخ التقاط الصورة من metadata"""
-    try:
-        with Image.open(image_path) as img:
-            exifdata = img.getexif()
-            for tag_id in exifdata:
-                tag = TAGS.get(tag_id, tag_id)
-                data = exifdata.get(tag_id)
-                
-                if tag in ['DateTime', 'DateTimeOriginal', 'DateTimeDigitized']:
-                    try:
-                        date_obj = datetime.strptime(str(data), '%Y:%m:%d %H:%M:%S')
-                        return date_obj.strftime('%Y-%m-%d')
-                    except:
-                        continue
-        
-        timestamp = os.path.getmtime(image_path)
-        return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d')
-    except:
-        return datetime.now().strftime('%Y-%m-%d')
-
-def apply_configured_placeholders(slide, folder_path, folder_name, slide_analysis, placeholders_config):
-    """تطبيق الإعدادات المحددة على الشريحة"""
-    
-    # الحصول على قائمة الصور في المجلد
-    imgs = [f for f in os.listdir(folder_path) 
-            if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff', '.webp'))]
-    imgs.sort()
-    
-    # تطبيق إعدادات الصور
-    image_config = placeholders_config.get('images', {})
-    
-    # إنشاء قاموس للصور حسب الترتيب المطلوب
-    image_assignments = {}
-    for config_key, config in image_config.items():
-        if config['use'] and config['order'] and config['order'] <= len(imgs):
-            image_path = os.path.join(folder_path, imgs[config['order'] - 1])
-            placeholder_info = config['placeholder_info']
-            
-            # العثور على الشكل المقابل في الشريحة الجديدة
-            target_shapes = []
-            for shape in slide.shapes:
-                if shape.is_placeholder and shape.placeholder_format.type == PP_PLACEHOLDER.PICTURE:
-                    target_shapes.append(shape)
-                elif shape.shape_type == MSO_SHAPE_TYPE.PICTURE and not shape.is_placeholder:
-                    target_shapes.append(shape)
-            
-            # مطابقة الشكل بناءً على الموقع
-            for shape in target_shapes:
-                shape_left_percent = (shape.left / slide_analysis['slide_dimensions']['width']) * 100
-                shape_top_percent = (shape.top / slide_analysis['slide_dimensions']['height']) * 100
-                
-                # تحمل اختلاف بسيط في الموقع
-                if (abs(shape_left_percent - placeholder_info['left_percent']) < 5 and 
-                    abs(shape_top_percent - placeholder_info['top_percent']) < 5):
-                    
-                    try:
-                        if shape.is_placeholder:
-                            with open(image_path, 'rb') as img_file:
-                                shape.insert_picture(img_file)
-                        else:
-                            # استبدال الصورة العادية
-                            original_left = shape.left
-                            original_top = shape.top
-                            original_width = shape.width
-                            original_height = shape.height
-                            
-                            shape_element = shape._element
-                            shape_element.getparent().remove(shape_element)
-                            
-                            slide.shapes.add_picture(image_path, original_left, original_top, original_width, original_height)
-                        
-                        add_detail(f"✅ تم استبدال الصورة {config['order']}: {os.path.basename(image_path)}", "success")
-                        break
-                    except Exception as e:
-                        add_detail(f"❌ فشل في استبدال الصورة: {e}", "error")
-    
-    # تطبيق إعدادات النصوص
-    text_config = placeholders_config.get('texts', {})
-    
-    text_shapes = []
-    for shape in slide.shapes:
-        if (shape.is_placeholder and 
-            shape.placeholder_format.type not in [PP_PLACEHOLDER.PICTURE, PP_PLACEHOLDER.TITLE] and
-            hasattr(shape, 'text_frame') and shape.text_frame):
-            text_shapes.append(shape)
-    
-    text_index = 0
-    for config_key, config in text_config.items():
-        if text_index < len(text_shapes):
-            shape = text_shapes[text_index]
-            
-            try:
-                if config['type'] == "ترك فارغ":
-                    shape.text_frame.text = ""
-                    
-                elif config['type'] == "نص ثابت":
-                    if config['value']:
-                        shape.text_frame.text = config['value']
-                        
-                elif config['type'] == "تاريخ":
-                    if config['value'] == "today":
-                        date_text = datetime.now().strftime('%Y-%m-%d')
-                    else:
-                        date_text = config['value']
-                    shape.text_frame.text = date_text
-                    
-                elif config['type'] == "تاريخ الصورة" and imgs:
-                    first_image_path = os.path.join(folder_path, imgs[0])
-                    image_date = get_image_date(first_image_path)
-                    shape.text_frame.text = image_date
-                    
-                elif config['type'] == "اسم المجلد":
-                    shape.text_frame.text = folder_name
-                
-                add_detail(f"✅ تم تطبيق النص: {config['type']}", "success")
-                
-            except Exception as e:
-                add_detail(f"⚠ خطأ في تطبيق النص: {e}", "warning")
-            
-            text_index += 1
-    
-    # تطبيق العنوان (اسم المجلد)
-    title_shapes = [
-        shape for shape in slide.shapes
-        if shape.is_placeholder and shape.placeholder_format.type == PP_PLACEHOLDER.TITLE
-    ]
-    
-    if title_shapes:
-        title_shapes[0].text = folder_name
-        add_detail(f"✅ تم تحديث العنوان: {folder_name}", "success")
 
-@app.route('/')
+@bp.route('/')
 def index():
     # Reset session data when accessing the home page
-    global session_data
-    session_data = {
-        'current_step': 1,
-        'pptx_data': None,
-        'slide_analysis': None,
-        'placeholders_config': {},
-        'processing_details': [],
-        'show_details_needed': False,
-        'temp_dir': None
-    }
+    reset_session_data()
     return render_template('index.html')
 
-@app.route('/upload-pptx', methods=['POST'])
+@bp.route('/upload-pptx', methods=['POST'])
 def upload_pptx():
     if 'pptx_file' not in request.files:
         return jsonify({'success': False, 'error': 'No file uploaded'})
@@ -284,29 +216,79 @@ def upload_pptx():
         return jsonify({'success': False, 'error': 'File must be a .pptx file'})
     
     try:
-        # Save the file data
-        pptx_data = pptx_file.read()
-        session_data['pptx_data'] = pptx_data
-        
-        # Analyze the slide
-        prs = Presentation(io.BytesIO(pptx_data))
-        slide_analysis = analyze_slide_placeholders(prs)
-        
-        if slide_analysis:
-            session_data['slide_analysis'] = slide_analysis
-            session_data['current_step'] = 2
-            return jsonify({
-                'success': True, 
-                'slide_analysis': slide_analysis,
-                'redirect': '/configure'
-            })
-        else:
-            return jsonify({'success': False, 'error': 'No slides found in the file or analysis error'})
-            
+        return use_template(pptx_file.read())
     except Exception as e:
         return jsonify({'success': False, 'error': f'Error analyzing file: {str(e)}'})
 
-@app.route('/configure')
+def use_template(pptx_data):
+    """حفظ القالب في الجلسة وتحليل شريحته الأولى ثم الانتقال إلى صفحة الإعداد"""
+    session_data['pptx_data'] = pptx_data
+    
+    # Analyze the slide
+    prs = Presentation(io.BytesIO(pptx_data))
+    slide_analysis = analyze_slide_placeholders(prs)
+    
+    if slide_analysis:
+        session_data['slide_analysis'] = slide_analysis
+        session_data['current_step'] = 2
+        return jsonify({
+            'success': True, 
+            'slide_analysis': slide_analysis,
+            'redirect': '/configure'
+        })
+    else:
+        return jsonify({'success': False, 'error': 'No slides found in the file or analysis error'})
+
+@bp.route('/templates')
+def find_templates():
+    """البحث في فهرس مكتبة القوالب عن شرائح وتخطيطات بعدد مواضع الصور المطلوب
+
+    المعاملات: images (مطلوب)، texts، aspect (نسبة أبعاد الصور)، kind
+    (slide أو layout)، limit. لا يتم فتح أي قالب، البحث في الفهرس فقط.
+    """
+    if not template_index.enabled:
+        return jsonify({'success': False, 'error': 'Template library is not configured'})
+    images = request.args.get('images', type=int)
+    if images is None:
+        return jsonify({'success': False, 'error': 'The images parameter is required'})
+    kind = request.args.get('kind')
+    if kind not in (None, KIND_SLIDE, KIND_LAYOUT):
+        return jsonify({'success': False, 'error': f'Unknown kind: {kind}'})
+    
+    matches = template_index.find(images,
+                                  texts=request.args.get('texts', type=int),
+                                  aspect=request.args.get('aspect', type=float),
+                                  kind=kind,
+                                  limit=min(max(request.args.get('limit', 20, type=int), 1), 200))
+    return jsonify({'success': True, 'matches': matches, 'index': template_index.stats()})
+
+@bp.route('/templates/reindex', methods=['POST'])
+def reindex_templates():
+    """تحديث الفهرس: تحليل القوالب الجديدة والمعدلة فقط بالتوازي"""
+    if not template_index.enabled:
+        return jsonify({'success': False, 'error': 'Template library is not configured'})
+    return jsonify({'success': True, **template_index.refresh()})
+
+@bp.route('/templates/select', methods=['POST'])
+def select_template():
+    """استخدام شريحة أو تخطيط من المكتبة كقالب الجلسة (بدلاً من رفع ملف)"""
+    if not template_index.enabled:
+        return jsonify({'success': False, 'error': 'Template library is not configured'})
+    data = request.json or {}
+    kind = data.get('kind', KIND_SLIDE)
+    if kind not in (KIND_SLIDE, KIND_LAYOUT):
+        return jsonify({'success': False, 'error': f'Unknown kind: {kind}'})
+    try:
+        pptx_data = template_index.template_bytes(data.get('template'), kind, int(data.get('index', 0)))
+    except (KeyError, IndexError, TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'Template not found in the library index'}), 404
+    
+    try:
+        return use_template(pptx_data)
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Error analyzing file: {str(e)}'})
+
+@bp.route('/configure')
 def configure():
     if session_data['current_step'] < 2 or not session_data['slide_analysis']:
         return render_template('error.html', message='Please upload a PowerPoint file first')
@@ -315,14 +297,35 @@ def configure():
                           slide_analysis=session_data['slide_analysis'],
                           current_step=session_data['current_step'])
 
-@app.route('/save-config', methods=['POST'])
+@bp.route('/save-config', methods=['POST'])
 def save_config():
     config_data = request.json
     session_data['placeholders_config'] = config_data
     session_data['current_step'] = 3
     return jsonify({'success': True, 'redirect': '/process'})
 
-@app.route('/use-previous-settings', methods=['POST'])
+@bp.route('/upload-sizes')
+def upload_sizes():
+    """أحجام مواضع الصور بالبكسل لتصغير الصور في المتصفح قبل رفعها
+
+    تشمل القالب الأساسي والقوالب الإضافية؛ image_dates يعني أن بيانات EXIF
+    يجب أن تبقى في الصور المصغرة.
+    """
+    if not session_data['pptx_data'] or not session_data['placeholders_config']:
+        return jsonify({'success': False, 'error': 'Please upload a PowerPoint file first'})
+    
+    configs = [session_data['placeholders_config']] + [
+        target['placeholders_config'] for target in session_data['extra_targets']
+    ]
+    sizes = sorted({tuple(size) for config in configs for size in configured_image_sizes(config)})
+    return jsonify({
+        'success': True,
+        'sizes': sizes,
+        'dpi': RENDER_DPI,
+        'image_dates': any(uses_image_dates(config) for config in configs)
+    })
+
+@bp.route('/use-previous-settings', methods=['POST'])
 def use_previous_settings():
     try:
         config_data = request.json
@@ -338,16 +341,196 @@ def use_previous_settings():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
-@app.route('/process')
+@bp.route('/process')
 def process():
     if session_data['current_step'] < 3 or not session_data['placeholders_config']:
         return render_template('error.html', message='Please configure placeholders first')
     
     return render_template('process.html', 
                           placeholders_config=session_data['placeholders_config'],
-                          current_step=session_data['current_step'])
+                          current_step=session_data['current_step'],
+                          directory_source_enabled=bool(current_app.config['SOURCE_ROOTS']),
+                          extra_targets=[target['name'] for target in session_data['extra_targets']])
+
+def targets_response():
+    return jsonify({
+        'success': True,
+        'targets': [target['name'] for target in session_data['extra_targets']]
+    })
+
+@bp.route('/targets', methods=['POST'])
+def add_target():
+    """إضافة قالب آخر مع ملف إعداداته (المصدّر من صفحة المعالجة) إلى المهمة التالية"""
+    pptx_file = request.files.get('pptx_file')
+    config_file = request.files.get('config_file')
+    if not pptx_file or not pptx_file.filename.endswith('.pptx'):
+        return jsonify({'success': False, 'error': 'File must be a .pptx file'})
+    if not config_file or config_file.filename == '':
+        return jsonify({'success': False, 'error': 'No configuration file provided'})
+    
+    try:
+        pptx_data = pptx_file.read()
+        placeholders_config = json.loads(config_file.read().decode('utf-8'))
+        slide_analysis = analyze_slide_placeholders(Presentation(io.BytesIO(pptx_data)))
+        if not slide_analysis:
+            return jsonify({'success': False, 'error': 'No slides found in the file or analysis error'})
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Error analyzing file: {str(e)}'})
+    
+    session_data['extra_targets'].append({
+        'name': pptx_file.filename,
+        'pptx_data': pptx_data,
+        'slide_analysis': slide_analysis,
+        'placeholders_config': placeholders_config
+    })
+    return targets_response()
+
+@bp.route('/targets/clear', methods=['POST'])
+def clear_targets():
+    session_data['extra_targets'] = []
+    return targets_response()
+
+def session_targets(options):
+    """القوالب الإضافية للجلسة مع إضافة بصمتها إلى الخيارات (فتدخل في مفتاح النتيجة)"""
+    extra_targets = list(session_data['extra_targets'])
+    if extra_targets:
+        options['extra_targets'] = [
+            hashlib.sha256(target['pptx_data']).hexdigest() + ':' +
+            hashlib.sha256(json.dumps(target['placeholders_config'], sort_keys=True).encode('utf-8')).hexdigest()
+            for target in extra_targets
+        ]
+    return extra_targets
+
+def generation_options(values):
+    """خيارات الإنتاج من نموذج الرفع أو من طلب JSON"""
+    def read_limit(name):
+        try:
+            return max(0, int(values.get(name) or 0))
+        except (TypeError, ValueError):
+            return 0
+    
+    invalid_images = values.get('invalid_images', POLICY_SKIP)
+    duplicates = values.get('duplicates', DUPLICATES_OFF)
+    return {
+        'image_order': values.get('image_order', 'alphabetical'),
+        'skip_empty_folders': values.get('skip_empty_folders', True) in (True, 'true'),
+        # 0 = عرض واحد بدون تقسيم
+        'max_slides_per_deck': read_limit('max_slides_per_deck'),
+        'max_deck_mb': read_limit('max_deck_mb'),
+        # ما يحدث للصور التالفة: abort أو skip أو substitute
+        'invalid_images': invalid_images if invalid_images in POLICIES else POLICY_SKIP,
+        # الصور شبه المتطابقة: off أو skip (أول إطار) أو best (أوضح إطار)
+        'duplicates': duplicates if duplicates in DUPLICATE_POLICIES else DUPLICATES_OFF
+    }
+
+def job_tracer(values):
+    """مسجل التتبع الزمني للمهمة إذا طلب (الحقل trace) أو كان مفعلاً للجميع، وإلا None"""
+    if trace_jobs or values.get('trace') in (True, 'true'):
+        return Tracer('pptx job')
+    return None
+
+def job_trace_path(temp_dir, job_id):
+    return os.path.join(temp_dir, f'trace_{job_id}.json')
+
+def write_job_trace(job, temp_dir, tracer):
+    """حفظ التتبع الزمني للمهمة (المكتملة أو الفاشلة) في مجلدها"""
+    if not tracer:
+        return
+    try:
+        tracer.write(job_trace_path(temp_dir, job.id))
+    except OSError:
+        # المهمة الملغاة يحذف مجلدها مع ملفاتها
+        pass
+
+def job_profiler(values, tracer):
+    """محلل الأداء للمهمة إذا أرسل رمز المشرف الصحيح (الحقل profile_token أو X-Profile-Token)
+
+    يعيد (المحلل أو None، رسالة الخطأ أو None). بدون رمز لا يتم إنشاء أي محلل.
+    """
+    supplied = values.get('profile_token') or request.headers.get('X-Profile-Token', '')
+    if not supplied:
+        return None, None
+    token = current_app.config['PROFILE_TOKEN']
+    if not token or not hmac.compare_digest(str(supplied), token):
+        return None, 'Invalid profiling token'
+    return JobProfiler(tracer), None
+
+def job_profile_paths(temp_dir, job_id):
+    """(التقرير النصي، ملف pstats الخام)"""
+    return (os.path.join(temp_dir, f'profile_{job_id}.txt'),
+            os.path.join(temp_dir, f'profile_{job_id}.prof'))
+
+def write_job_profile(job, temp_dir, profiler):
+    """حفظ تقرير تحليل الأداء مع ملفات المهمة"""
+    if not profiler:
+        return
+    try:
+        profiler.write(*job_profile_paths(temp_dir, job.id))
+    except OSError:
+        pass
+
+def follow_inflight_job(owner, cache_key):
+    """استجابة تتبع مهمة قيد التنفيذ لنفس الطلب، أو None"""
+    inflight = inflight_jobs.get((owner, cache_key))
+    if inflight and not inflight.finished:
+        return jsonify({
+            'success': True,
+            'job_id': inflight.id,
+            'status_url': f'/jobs/{inflight.id}',
+            'queue_position': scheduler.position(inflight.id)
+        })
+    inflight_jobs.pop((owner, cache_key), None)
+    return None
 
-@app.route('/upload-zip', methods=['POST'])
+def serve_cached_result(cache_key, temp_dir):
+    """نسخ نتيجة محفوظة إلى مجلد الجلسة وإرجاع استجابة مكتملة، أو None"""
+    cached = result_cache.get(cache_key)
+    if not cached:
+        return None
+    cached_path, metadata = cached
+    output_filename = f"PowerPoint_Updated_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pptx"
+    try:
+        shutil.copyfile(cached_path, os.path.join(temp_dir, output_filename))
+    except FileNotFoundError:
+        # حُذف المدخل (تجاوز حد الحجم) بين البحث والنسخ: يعامل كعدم وجود نتيجة ويعاد الإنتاج
+        return None
+    add_detail("♻️ تم استخدام نتيجة محفوظة مسبقاً لنفس القالب والإعدادات والصور", "success")
+    return jsonify({
+        'success': True,
+        'status': DONE,
+        'cached': True,
+        **metadata,
+        'output_filename': output_filename,
+        **details_response()
+    })
+
+def release_cancelled_job(temp_dir, cache_key, job):
+    """تحرير مساحة المهمة الملغاة فوراً
+
+    نقطة الحفظ تبقى إذا انتهت المهلة (إعادة الطلب تكمل منها)، وتحذف إذا ألغاها المستخدم.
+    """
+    workspace.unpin(temp_dir)
+    workspace.remove(temp_dir)
+    if not job.expired:
+        workspace.remove(os.path.join(workspace.root, CHECKPOINT_DIR_PREFIX + cache_key))
+
+def submit_generation_job(owner, cache_key, temp_dir, func, memory_estimate):
+    """حجز مجلد المهمة وإضافتها إلى الطابور وإرجاع رابط متابعتها"""
+    workspace.pin(temp_dir)
+    job = scheduler.submit(owner, func, memory_estimate=memory_estimate, log=session_data['processing_log'],
+                           on_cancel=functools.partial(release_cancelled_job, temp_dir, cache_key))
+    session_data['job_id'] = job.id
+    inflight_jobs[(owner, cache_key)] = job
+    add_detail("⏳ تمت إضافة المهمة إلى طابور المعالجة", "info")
+    
+    return jsonify({
+        'success': True,
+        'job_id': job.id,
+        'status_url': f'/jobs/{job.id}',
+        'queue_position': scheduler.position(job.id)
+    })
+
+@bp.route('/upload-zip', methods=['POST'])
 def upload_zip():
     if 'zip_file' not in request.files:
         return jsonify({'success': False, 'error': 'No file uploaded'})
@@ -360,132 +543,802 @@ def upload_zip():
     if not zip_file.filename.endswith('.zip'):
         return jsonify({'success': False, 'error': 'File must be a .zip file'})
     
-    options = {
-        'image_order': request.form.get('image_order', 'alphabetical'),
-        'skip_empty_folders': request.form.get('skip_empty_folders', 'true') == 'true'
-    }
-    
-    clear_details()
+    options = generation_options(request.form)
+    extra_targets = session_targets(options)
+    if extra_targets and (options['max_slides_per_deck'] or options['max_deck_mb']):
+        return jsonify({'success': False, 'error': 'Splitting is not supported with several templates'})
+    tracer = job_tracer(request.form)
+    profiler, error = job_profiler(request.form, tracer)
+    if error:
+        return jsonify({'success': False, 'error': error}), 403
     
     try:
-        # Extract the zip file
-        zip_bytes = io.BytesIO(zip_file.read())
+        limits = current_app.config['RESOURCE_LIMITS']
         
-        # Clean up previous temp directory if exists
-        if session_data['temp_dir'] and os.path.exists(session_data['temp_dir']):
-            shutil.rmtree(session_data['temp_dir'])
+        # Keep the uploaded archive on disk until the job runs
+        temp_dir = workspace.create()
+        zip_path = os.path.join(temp_dir, 'upload.zip')
+        zip_file.save(zip_path)
         
-        # Create new temp directory
-        temp_dir = tempfile.mkdtemp()
-        session_data['temp_dir'] = temp_dir
+        owner = current_session_id()
+        cache_key = make_cache_key(
+            session_data['pptx_data'],
+            session_data['placeholders_config'],
+            file_digest(zip_path),
+            options
+        )
         
-        with zipfile.ZipFile(zip_bytes, "r") as zip_ref:
-            zip_ref.extractall(temp_dir)
+        # The same request is already queued or running: follow that job instead
+        inflight = follow_inflight_job(owner, cache_key)
+        if inflight:
+            workspace.remove(temp_dir)
+            return inflight
         
-        add_detail("📂 تم استخراج الملف المضغوط بنجاح", "success")
+        clear_details()
+        release_session_workspace()
+        session_data['temp_dir'] = temp_dir
+        session_data['job_id'] = None
         
-        # Find folders with images
-        all_items = os.listdir(temp_dir)
-        folder_paths = []
+        # مع التتبع أو التحليل يتم تشغيل المهمة فعلاً حتى لو كانت نتيجتها محفوظة
+        cached = None if tracer or profiler else serve_cached_result(cache_key, temp_dir)
+        if cached:
+            os.remove(zip_path)
+            return cached
         
-        for item in all_items:
-            item_path = os.path.join(temp_dir, item)
-            if os.path.isdir(item_path):
-                imgs_in_folder = [f for f in os.listdir(item_path) 
-                                if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff', '.webp'))]
-                if imgs_in_folder:
-                    folder_paths.append(item_path)
-                    add_detail(f"📁 المجلد '{item}' يحتوي على {len(imgs_in_folder)} صورة", "info")
-                elif not options['skip_empty_folders']:
-                    add_detail(f"⚠ المجلد '{item}' فارغ من الصور", "warning")
+        with zipfile.ZipFile(zip_path, "r") as zip_ref:
+            # Check the archive against the resource limits before any work is done
+            try:
+                admission_report = admit_archive(zip_ref, limits)
+            except AdmissionError as e:
+                add_detail(f"❌ تم رفض الملف المضغوط: {e}", "error")
+                return jsonify({
+                    'success': False,
+                    'error': str(e),
+                    **details_response()
+                })
         
-        if not folder_paths:
+        # Make room for the extracted archive, evicting the oldest idle workspaces first
+        if not workspace.ensure_space(admission_report.uncompressed_bytes, keep=temp_dir):
+            error = 'لا توجد مساحة كافية على الخادم حالياً، يرجى المحاولة لاحقاً'
+            add_detail(f"❌ {error}", "error")
             return jsonify({
-                'success': False, 
-                'error': 'لا توجد مجلدات تحتوي على صور في الملف المضغوط.',
-                'details': session_data['processing_details']
+                'success': False,
+                'error': error,
+                **details_response()
             })
         
-        folder_paths.sort()
-        add_detail(f"✅ تم العثور على {len(folder_paths)} مجلد يحتوي على صور", "success")
+        for member_name, (width, height) in admission_report.downscale.items():
+            add_detail(f"⚠ سيتم تصغير الصورة {member_name} ({width}×{height}) لتجاوزها حد البكسلات", "warning")
+        for member_name, reason in admission_report.skipped.items():
+            add_detail(f"⚠ تم تخطي الصورة {member_name}: {reason}", "warning")
         
-        # Load PowerPoint file
-        prs = Presentation(io.BytesIO(session_data['pptx_data']))
+        return submit_generation_job(
+            owner,
+            cache_key,
+            temp_dir,
+            functools.partial(
+                run_generation_job,
+                temp_dir=temp_dir,
+                zip_path=zip_path,
+                admission_report=admission_report,
+                limits=limits,
+                pptx_data=session_data['pptx_data'],
+                slide_analysis=session_data['slide_analysis'],
+                placeholders_config=session_data['placeholders_config'],
+                options=options,
+                cache_key=cache_key,
+                extra_targets=extra_targets,
+                tracer=tracer,
+                profiler=profiler
+            ),
+            estimate_job_memory(admission_report.uncompressed_bytes * (1 + len(extra_targets)))
+        )
         
-        if len(prs.slides) == 0:
-            return jsonify({
-                'success': False, 
-                'error': 'لا توجد شرائح في ملف PowerPoint',
-                'details': session_data['processing_details']
-            })
+    except Exception as e:
+        add_detail(f"❌ خطأ عام أثناء المعالجة: {str(e)}", "error")
+        return jsonify({
+            'success': False,
+            'error': f'Error processing files: {str(e)}',
+            **details_response()
+        })
+
+@bp.route('/process-directory', methods=['POST'])
+def process_directory():
+    """إنشاء العرض مباشرة من مجلد على الخادم (مثل مشاركة NFS) دون رفع أو نسخ الصور"""
+    data = request.json or {}
+    source_path = resolve_source_path(data.get('path'), current_app.config['SOURCE_ROOTS'])
+    if not source_path:
+        return jsonify({'success': False, 'error': 'Directory not found or not allowed'})
+    
+    options = generation_options(data)
+    extra_targets = session_targets(options)
+    if extra_targets and (options['max_slides_per_deck'] or options['max_deck_mb']):
+        return jsonify({'success': False, 'error': 'Splitting is not supported with several templates'})
+    tracer = job_tracer(data)
+    profiler, error = job_profiler(data, tracer)
+    if error:
+        return jsonify({'success': False, 'error': error}), 403
+    
+    try:
+        with (tracer or NULL_TRACER).span('scan folders', path=source_path):
+            folders, empty = scan_directory(source_path)
+        if not folders:
+            return jsonify({'success': False, 'error': 'لا توجد مجلدات تحتوي على صور في المسار المحدد.'})
         
-        first_slide = prs.slides[0]
-        slide_layout = first_slide.slide_layout
+        owner = current_session_id()
+        cache_key = make_cache_key(
+            session_data['pptx_data'],
+            session_data['placeholders_config'],
+            directory_digest(folders),
+            options
+        )
         
-        # Process slides
-        total_processed = 0
-        created_slides = 0
+        inflight = follow_inflight_job(owner, cache_key)
+        if inflight:
+            return inflight
         
-        for folder_idx, folder_path in enumerate(folder_paths):
-            folder_name = os.path.basename(folder_path)
-            
-            try:
-                # Sort images in the folder
-                imgs = [f for f in os.listdir(folder_path) 
-                       if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff', '.webp'))]
-                
-                if options['image_order'] == 'random':
-                    random.shuffle(imgs)
-                    add_detail(f"🔀 تم ترتيب صور المجلد {folder_name} عشوائياً", "info")
-                else:
-                    imgs.sort()
-                    add_detail(f"📋 تم ترتيب صور المجلد {folder_name} أبجدياً", "info")
-                
-                # Create new slide
-                new_slide = prs.slides.add_slide(slide_layout)
-                created_slides += 1
-                
-                # Apply configured placeholders
-                apply_configured_placeholders(
-                    new_slide, 
-                    folder_path, 
-                    folder_name, 
-                    session_data['slide_analysis'],
-                    session_data['placeholders_config']
-                )
-                
-                total_processed += len(imgs)
-                add_detail(f"✅ تم إنشاء شريحة للمجلد '{folder_name}' مع {len(imgs)} صورة", "success")
-            
-            except Exception as e:
-                add_detail(f"❌ خطأ في معالجة المجلد {folder_name}: {str(e)}", "error")
+        clear_details()
+        release_session_workspace()
+        # The output goes to a job directory; the source tree is only read
+        temp_dir = workspace.create()
+        session_data['temp_dir'] = temp_dir
+        session_data['job_id'] = None
+        
+        cached = None if tracer or profiler else serve_cached_result(cache_key, temp_dir)
+        if cached:
+            return cached
         
-        # Save the file
-        output_filename = f"PowerPoint_Updated_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pptx"
-        output_path = os.path.join(temp_dir, output_filename)
-        prs.save(output_path)
+        return submit_generation_job(
+            owner,
+            cache_key,
+            temp_dir,
+            functools.partial(
+                run_directory_job,
+                temp_dir=temp_dir,
+                folders=folders,
+                empty=empty,
+                pptx_data=session_data['pptx_data'],
+                slide_analysis=session_data['slide_analysis'],
+                placeholders_config=session_data['placeholders_config'],
+                options=options,
+                cache_key=cache_key,
+                extra_targets=extra_targets,
+                tracer=tracer,
+                profiler=profiler
+            ),
+            estimate_job_memory(sum(folder.total_bytes for folder in folders) * (1 + len(extra_targets)))
+        )
         
+    except Exception as e:
+        add_detail(f"❌ خطأ عام أثناء المعالجة: {str(e)}", "error")
         return jsonify({
-            'success': True,
-            'message': 'تم الانتهاء من المعالجة بنجاح!',
-            'details': session_data['processing_details'],
-            'stats': {
-                'created_slides': created_slides,
-                'processed_folders': len(folder_paths),
-                'total_images': total_processed
-            },
-            'output_filename': output_filename
+            'success': False,
+            'error': f'Error processing files: {str(e)}',
+            **details_response()
         })
+
+@bp.route('/manifest', methods=['POST'])
+def upload_manifest():
+    """الرفع حسب المحتوى (1): بيان المجلدات وبصمات صورها، والرد بالبصمات غير الموجودة في المخزن"""
+    if not session_data['pptx_data']:
+        return jsonify({'success': False, 'error': 'Please upload a PowerPoint file first'})
+    try:
+        manifest = Manifest.parse(request.json, current_app.config['RESOURCE_LIMITS'])
+    except ManifestError as e:
+        return jsonify({'success': False, 'error': str(e)})
+    if not manifest.folders:
+        return jsonify({'success': False, 'error': 'لا توجد مجلدات تحتوي على صور في البيان.'})
+    
+    session_data['manifest'] = manifest
+    missing = blob_store.missing(manifest.sizes, current_uploader_id())
+    return jsonify({
+        'success': True,
+        'images': len(manifest.sizes),
+        'missing': missing,
+        'missing_bytes': sum(manifest.sizes[digest] for digest in missing),
+        'total_bytes': manifest.total_bytes
+    })
+
+@bp.route('/blobs/<digest>', methods=['PUT'])
+def upload_blob(digest):
+    """الرفع حسب المحتوى (2): محتوى صورة واحدة من البيان الحالي للجلسة"""
+    manifest = session_data['manifest']
+    if not manifest or digest not in manifest.sizes:
+        return jsonify({'success': False, 'error': 'Blob is not part of the current manifest'}), 404
+    try:
+        blob_store.put(digest, request.stream, manifest.sizes[digest], current_uploader_id())
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify({'success': True})
+
+@bp.route('/manifest/submit', methods=['POST'])
+def submit_manifest():
+    """الرفع حسب المحتوى (3): بناء المجلدات من المخزن في مجلد المهمة ثم بدء المهمة
+
+    يقبل خيارات الإنتاج نفسها مثل /process-directory. إذا لم ترفع الجلسة صورة
+    أو أزيلت من المخزن منذ إرسال البيان يعاد الحقل missing لرفعها ثم إعادة الطلب.
+    """
+    data = request.json or {}
+    manifest = session_data['manifest']
+    if not manifest:
+        return jsonify({'success': False, 'error': 'No manifest uploaded'})
+    # قبل البحث في ذاكرة النتائج: نتيجة البيان نفسه من جلسة أخرى تحتوي على صورها
+    missing = blob_store.missing(manifest.sizes, current_uploader_id())
+    if missing:
+        return jsonify({'success': False, 'error': 'Some images must be uploaded again', 'missing': missing})
+    
+    options = generation_options(data)
+    extra_targets = session_targets(options)
+    if extra_targets and (options['max_slides_per_deck'] or options['max_deck_mb']):
+        return jsonify({'success': False, 'error': 'Splitting is not supported with several templates'})
+    tracer = job_tracer(data)
+    profiler, error = job_profiler(data, tracer)
+    if error:
+        return jsonify({'success': False, 'error': error}), 403
+    
+    try:
+        owner = current_session_id()
+        cache_key = make_cache_key(
+            session_data['pptx_data'],
+            session_data['placeholders_config'],
+            manifest.digest(),
+            options
+        )
+        
+        inflight = follow_inflight_job(owner, cache_key)
+        if inflight:
+            return inflight
+        
+        clear_details()
+        release_session_workspace()
+        temp_dir = workspace.create()
+        session_data['temp_dir'] = temp_dir
+        session_data['job_id'] = None
+        
+        cached = None if tracer or profiler else serve_cached_result(cache_key, temp_dir)
+        if cached:
+            return cached
+        
+        with (tracer or NULL_TRACER).span('link blobs', images=len(manifest.sizes)):
+            missing = manifest.materialize(blob_store, temp_dir)
+        if missing:
+            workspace.remove(temp_dir)
+            session_data['temp_dir'] = None
+            return jsonify({'success': False, 'error': 'Some images must be uploaded again', 'missing': missing})
+        folders, empty = scan_directory(temp_dir, include_root=False)
+        
+        return submit_generation_job(
+            owner,
+            cache_key,
+            temp_dir,
+            functools.partial(
+                run_directory_job,
+                temp_dir=temp_dir,
+                folders=folders,
+                empty=empty,
+                pptx_data=session_data['pptx_data'],
+                slide_analysis=session_data['slide_analysis'],
+                placeholders_config=session_data['placeholders_config'],
+                options=options,
+                cache_key=cache_key,
+                extra_targets=extra_targets,
+                tracer=tracer,
+                profiler=profiler
+            ),
+            estimate_job_memory(manifest.total_bytes * (1 + len(extra_targets)))
+        )
         
     except Exception as e:
         add_detail(f"❌ خطأ عام أثناء المعالجة: {str(e)}", "error")
         return jsonify({
             'success': False,
             'error': f'Error processing files: {str(e)}',
-            'details': session_data['processing_details']
+            **details_response()
         })
 
-@app.route('/download/<filename>')
+def run_generation_job(job, temp_dir, zip_path, admission_report, limits,
+                       pptx_data, slide_analysis, placeholders_config, options, cache_key, extra_targets=(),
+                       tracer=None, profiler=None):
+    """تنفيذ مهمة الإنتاج في عامل الجدولة: الاستخراج ثم إنشاء الشرائح والحفظ
+
+    المحلل (إن وجد) يغلف المسجل فيستخدم مكانه في كل المراحل.
+    """
+    stages = profiler or tracer or NULL_TRACER
+    try:
+        with profiler or contextlib.nullcontext():
+            with stages.span('job', job_id=job.id):
+                return generate_presentation(job, temp_dir, zip_path, admission_report, limits,
+                                             pptx_data, slide_analysis, placeholders_config, options, cache_key,
+                                             extra_targets, stages)
+    finally:
+        write_job_trace(job, temp_dir, tracer)
+        write_job_profile(job, temp_dir, profiler)
+        workspace.unpin(temp_dir)
+
+def run_directory_job(job, temp_dir, folders, empty, pptx_data, slide_analysis,
+                      placeholders_config, options, cache_key, extra_targets=(), tracer=None, profiler=None):
+    """تنفيذ مهمة الإنتاج من مجلد المصدر مباشرة؛ الناتج فقط يكتب في مجلد المهمة"""
+    stages = profiler or tracer or NULL_TRACER
+    try:
+        with profiler or contextlib.nullcontext():
+            with stages.span('job', job_id=job.id):
+                return build_presentation(job, temp_dir, folders, empty, pptx_data, slide_analysis,
+                                          placeholders_config, options, cache_key, extra_targets, stages)
+    finally:
+        write_job_trace(job, temp_dir, tracer)
+        write_job_profile(job, temp_dir, profiler)
+        workspace.unpin(temp_dir)
+
+def generate_presentation(job, temp_dir, zip_path, admission_report, limits,
+                          pptx_data, slide_analysis, placeholders_config, options, cache_key, extra_targets=(),
+                          tracer=None):
+    """استخراج الأرشيف ثم إنشاء العرض من المجلدات المستخرجة"""
+    log = job.log
+    tracer = tracer or NULL_TRACER
+    
+    started = time.monotonic()
+    with tracer.span('extract', bytes=admission_report.uncompressed_bytes):
+        with zipfile.ZipFile(zip_path, "r") as zip_ref:
+            extract_admitted(zip_ref, temp_dir, admission_report, limits, check=job.check)
+    os.remove(zip_path)
+    calibration.record_extraction(admission_report.uncompressed_bytes, time.monotonic() - started)
+    
+    log.add("📂 تم استخراج الملف المضغوط بنجاح", "success")
+    
+    # Find folders with images at any depth (images at the archive root are not a folder)
+    with tracer.span('scan folders'):
+        folders, empty = scan_directory(temp_dir, include_root=False)
+    if not folders:
+        raise ValueError('لا توجد مجلدات تحتوي على صور في الملف المضغوط.')
+    
+    return build_presentation(job, temp_dir, folders, empty, pptx_data, slide_analysis,
+                              placeholders_config, options, cache_key, extra_targets, tracer)
+
+def build_presentation(job, output_dir, folders, empty, pptx_data, slide_analysis,
+                       placeholders_config, options, cache_key, extra_targets=(), tracer=None):
+    """إنشاء شريحة لكل مجلد ثم حفظ العرض وتخزينه في الذاكرة
+
+    مع extra_targets يتم إنشاء عرض لكل قالب في مرور واحد (build_multi_presentation).
+    """
+    log = job.log
+    tracer = tracer or NULL_TRACER
+    
+    for folder in folders:
+        log.add(f"📁 المجلد '{folder.name}' يحتوي على {len(folder.images)} صورة", "info")
+    if not options['skip_empty_folders']:
+        for name in empty:
+            log.add(f"⚠ المجلد '{name}' فارغ من الصور", "warning")
+    
+    log.add(f"✅ تم العثور على {len(folders)} مجلد يحتوي على صور", "success")
+    
+    # فحص الصور المستخدمة قبل أي إنشاء حتى لا تفشل المهمة في منتصفها (في كل القوالب)
+    targets = [{'name': 'template', 'pptx_data': pptx_data, 'slide_analysis': slide_analysis,
+                'placeholders_config': placeholders_config}] + list(extra_targets)
+    used_config = {'images': {
+        f"{number}:{key}": config
+        for number, target in enumerate(targets)
+        for key, config in target['placeholders_config'].get('images', {}).items()
+    }}
+    checks = {}
+    # حذف اللقطات المتكررة قبل الفحص حتى يتم فحص الصور التي ستأخذ مكانها
+    if options.get('duplicates', DUPLICATES_OFF) != DUPLICATES_OFF:
+        try:
+            with tracer.span('find duplicates'):
+                folders, duplicates = dedupe_folders(folders, used_config, options['duplicates'],
+                                                     options['image_order'], cache_key, log=log, check=job.check)
+            checks['duplicates'] = duplicates.to_dict()
+            log.add(f"🔁 تم حذف {duplicates.removed_images} صورة مشابهة من {len(duplicates.clusters)} مجموعة، "
+                    f"منها {duplicates.avoided_images} صورة ({duplicates.avoided_bytes} بايت) كانت ستدرج في العرض",
+                    "info")
+        except ImportError:
+            log.add("⚠ NumPy غير مثبت، تم تخطي كشف الصور المتشابهة", "warning")
+    
+    with tracer.span('validate images'):
+        folders, validation = validate_folders(folders, used_config, options['invalid_images'],
+                                               options['image_order'], cache_key, log=log, check=job.check)
+    log.add(f"🔍 تم فحص {validation.checked} صورة، التالفة منها: {len(validation.invalid)}",
+            "warning" if validation.invalid else "info")
+    if not folders:
+        raise ValueError('لا توجد مجلدات تحتوي على صور سليمة')
+    job.progress['total'] = len(folders)
+    checks['validation'] = validation.to_dict()
+    
+    if extra_targets:
+        result = build_multi_presentation(job, output_dir, folders, targets, options, cache_key, tracer)
+        return {**result, **checks}
+    
+    if options.get('max_slides_per_deck') or options.get('max_deck_mb'):
+        result = build_split_presentation(job, output_dir, folders, pptx_data,
+                                          placeholders_config, options, cache_key, tracer)
+        return {**result, **checks}
+    
+    # Folders are read lazily, one at a time, while the engine builds the slides
+    folder_source = ((folder.name, folder.open_images()) for folder in folders)
+    output_filename = f"PowerPoint_Updated_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pptx"
+    output_path = os.path.join(output_dir, output_filename)
+    started = time.monotonic()
+    
+    # نقطة الحفظ خارج مجلد المهمة حتى تبقى بعد تعطل العامل؛ إعادة الطلب نفسه تستأنف منها
+    checkpoint = None
+    resumed = False
+    if checkpoint_interval > 0:
+        checkpoint_dir = workspace.checkpoint_dir(cache_key)
+        workspace.pin(checkpoint_dir)
+        checkpoint = Checkpoint(checkpoint_dir, cache_key, checkpoint_interval)
+    try:
+        for event in generate(pptx_data, placeholders_config, folder_source,
+                              output=output_path,
+                              slide_analysis=slide_analysis,
+                              image_order=options['image_order'],
+                              seed=cache_key,
+                              log=log,
+                              checkpoint=checkpoint,
+                              check=job.check,
+                              tracer=tracer):
+            if event['event'] in ('folder', 'resumed'):
+                job.progress['done'] = event['index']
+                resumed = resumed or event['event'] == 'resumed'
+            elif event['event'] == 'done':
+                stats = event['stats']
+    finally:
+        if checkpoint:
+            workspace.unpin(checkpoint_dir)
+    if checkpoint:
+        workspace.remove(checkpoint_dir)
+    
+    # زمن المهمة المستأنفة لا يمثل كل الشرائح فلا يستخدم للمعايرة
+    if not resumed:
+        calibration.record_generation(
+            stats['created_slides'],
+            sum(estimate_folder_bytes(folder, placeholders_config, options['image_order'], cache_key)
+                for folder in folders),
+            len(pptx_data),
+            os.path.getsize(output_path),
+            time.monotonic() - started
+        )
+    
+    metadata = {
+        'message': 'تم الانتهاء من المعالجة بنجاح!',
+        'stats': stats,
+        **checks
+    }
+    result_cache.put(cache_key, output_path, metadata)
+    
+    return {
+        **metadata,
+        'output_filename': output_filename
+    }
+
+def build_split_presentation(job, output_dir, folders, pptx_data, placeholders_config, options, cache_key,
+                             tracer=None):
+    """إنشاء عدة عروض (كل منها في عملية مستقلة) حسب حد الشرائح أو الحجم، مع بيان بالمحتوى"""
+    log = job.log
+    groups = plan_parts(
+        folders,
+        placeholders_config,
+        max_slides=options['max_slides_per_deck'],
+        max_bytes=options['max_deck_mb'] * 1024 * 1024,
+        image_order=options['image_order'],
+        seed=cache_key,
+        base_bytes=len(pptx_data)
+    )
+    log.add(f"📚 سيتم تقسيم العرض إلى {len(groups)} ملف", "info")
+    
+    stem = f"PowerPoint_Updated_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    parts = []
+    for part in build_parts(pptx_data, placeholders_config, groups, output_dir, stem,
+                            image_order=options['image_order'], seed=cache_key, check=job.check,
+                            tracer=tracer):
+        for message, level in part['log']:
+            log.add(message, level)
+        log.add(f"✅ تم إنشاء الجزء {part['index']}: {part['filename']} ({len(part['folders'])} مجلد)", "success")
+        parts.append(part)
+        job.progress['done'] += len(part['folders'])
+    
+    stats = {
+        key: sum(part['stats'][key] for part in parts)
+        for key in ('created_slides', 'processed_folders', 'total_images')
+    }
+    output_filename = stem + '.zip'
+    manifest = write_manifest(output_dir, output_filename, parts, stats)
+    
+    # لا يتم حفظ الأجزاء في ذاكرة النتائج؛ كل جزء ملف مستقل يتم بثه عند التحميل
+    return {
+        'message': 'تم الانتهاء من المعالجة بنجاح!',
+        'stats': stats,
+        'parts': manifest['parts'],
+        'output_filename': output_filename
+    }
+
+def build_multi_presentation(job, output_dir, folders, targets, options, cache_key, tracer=None):
+    """إنشاء عرض لكل قالب في مرور واحد على الصور، وتسليمها معاً كملف ZIP مع بيان"""
+    log = job.log
+    stem = f"PowerPoint_Updated_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    outputs = [os.path.join(output_dir, f"{stem}_template{number}.pptx") for number in range(1, len(targets) + 1)]
+    log.add(f"🎨 سيتم إنشاء {len(targets)} عرض من الصور نفسها", "info")
+    
+    folder_source = ((folder.name, folder.open_images()) for folder in folders)
+    engine_targets = [
+        {'name': target['name'], 'template': target['pptx_data'], 'config': target['placeholders_config'],
+         'slide_analysis': target['slide_analysis'], 'output': output}
+        for target, output in zip(targets, outputs)
+    ]
+    for event in generate_multi(engine_targets, folder_source,
+                                image_order=options['image_order'],
+                                seed=cache_key,
+                                skip_empty_folders=options['skip_empty_folders'],
+                                log=log,
+                                check=job.check,
+                                image_cache=image_cache,
+                                tracer=tracer):
+        if event['event'] == 'folder':
+            job.progress['done'] = event['index']
+        elif event['event'] == 'done':
+            done = event
+    
+    counters = done['images']
+    log.add(f"🖼 تمت قراءة {counters['reads']} صورة مرة واحدة وفك ترميز {counters['decodes']} منها، "
+            f"وإنشاء {counters['resizes']} نسخة مصغرة مشتركة بين القوالب (الباقي من ذاكرة الصور المصغرة)", "info")
+    
+    parts = [
+        {
+            'index': number,
+            'filename': os.path.basename(output),
+            'template': target['name'],
+            'folders': [folder.name for folder in folders],
+            'stats': stats,
+            'bytes': os.path.getsize(output)
+        }
+        for number, (target, output, stats) in enumerate(zip(targets, outputs, done['stats']), 1)
+    ]
+    first = done['stats'][0]
+    stats = {
+        'created_slides': sum(part['stats']['created_slides'] for part in parts),
+        'processed_folders': first['processed_folders'],
+        'total_images': first['total_images']
+    }
+    output_filename = stem + '.zip'
+    manifest = write_manifest(output_dir, output_filename, parts, stats)
+    
+    # مثل الأجزاء: لا يتم حفظ العروض المتعددة في ذاكرة النتائج
+    return {
+        'message': 'تم الانتهاء من المعالجة بنجاح!',
+        'stats': stats,
+        'parts': manifest['parts'],
+        'output_filename': output_filename
+    }
+
+@bp.route('/archive', methods=['POST'])
+def browse_archive():
+    """رفع ملف مضغوط لتصفح مجلداته قبل المعالجة (من الدليل المركزي فقط، دون استخراج)"""
+    zip_file = request.files.get('zip_file')
+    if not zip_file or not zip_file.filename.endswith('.zip'):
+        return jsonify({'success': False, 'error': 'File must be a .zip file'})
+    
+    archive_dir = workspace.create()
+    try:
+        zip_path = os.path.join(archive_dir, 'archive.zip')
+        zip_file.save(zip_path)
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            # حدود الدليل المركزي فقط؛ ترويسات الصور تقرأ عند طلب صورتها المصغرة
+            admit_archive(zip_ref, current_app.config['RESOURCE_LIMITS'], image_names=set())
+        archive = ArchiveIndex(zip_path)
+    except AdmissionError as e:
+        workspace.remove(archive_dir)
+        return jsonify({'success': False, 'error': str(e)})
+    except zipfile.BadZipFile:
+        workspace.remove(archive_dir)
+        return jsonify({'success': False, 'error': 'Invalid ZIP file'})
+    
+    if session_data['archive']:
+        release_archive(session_data['archive'])
+    session_data['archive'] = archive
+    
+    folders, page = archive.folder_page(1, request.form.get('per_page', DEFAULT_PER_PAGE))
+    return jsonify({'success': True, 'summary': archive.summary(), 'folders': folders, 'pagination': page})
+
+def current_archive():
+    """فهرس التصفح للجلسة الحالية (مع تأخير حذف مجلده) أو None"""
+    archive = session_data['archive']
+    if archive:
+        workspace.touch(os.path.dirname(archive.zip_path))
+    return archive
+
+def page_args():
+    try:
+        return int(request.args.get('page', 1)), int(request.args.get('per_page', DEFAULT_PER_PAGE))
+    except ValueError:
+        return 1, DEFAULT_PER_PAGE
+
+@bp.route('/archive/folders')
+def archive_folders():
+    """صفحة من مجلدات الملف المضغوط مع عدد صور كل مجلد وحجمها"""
+    archive = current_archive()
+    if not archive:
+        return jsonify({'success': False, 'error': 'No archive uploaded'}), 404
+    folders, page = archive.folder_page(*page_args())
+    return jsonify({'success': True, 'folders': folders, 'pagination': page})
+
+@bp.route('/archive/images')
+def archive_images():
+    """صفحة من صور مجلد واحد (الحقل folder)"""
+    archive = current_archive()
+    if not archive:
+        return jsonify({'success': False, 'error': 'No archive uploaded'}), 404
+    try:
+        images, page = archive.image_page(request.args.get('folder', ''), *page_args())
+    except KeyError:
+        return jsonify({'success': False, 'error': 'Folder not found'}), 404
+    return jsonify({'success': True, 'folder': request.args.get('folder', ''), 'images': images,
+                    'pagination': page})
+
+@bp.route('/archive/thumbnail')
+def archive_thumbnail():
+    """صورة مصغرة لعنصر واحد (الحقلان folder وimage) تنشأ عند أول طلب ثم تحفظ"""
+    archive = current_archive()
+    if not archive:
+        return jsonify({'success': False, 'error': 'No archive uploaded'}), 404
+    try:
+        size = int(request.args.get('size', THUMBNAIL_SIZE))
+    except ValueError:
+        size = THUMBNAIL_SIZE
+    try:
+        thumbnail = archive.thumbnail(request.args.get('folder', ''), request.args.get('image', ''), size,
+                                      cache=image_cache,
+                                      max_pixels=current_app.config['RESOURCE_LIMITS'].hard_image_pixels)
+    except KeyError:
+        return jsonify({'success': False, 'error': 'Image not found'}), 404
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 422
+    response = Response(thumbnail, mimetype='image/jpeg')
+    response.headers['Cache-Control'] = 'private, max-age=3600'
+    return response
+
+@bp.route('/plan', methods=['POST'])
+def plan_job():
+    """تشغيل تجريبي: ربط المجلدات بالشرائح وتقدير الحجم والذاكرة والزمن دون إنشاء العرض
+    
+    يقبل ملفاً مضغوطاً (مثل /upload-zip) أو مسار مجلد على الخادم (مثل /process-directory).
+    """
+    if not session_data['pptx_data']:
+        return jsonify({'success': False, 'error': 'Please upload a PowerPoint file first'})
+    
+    template_bytes = len(session_data['pptx_data'])
+    placeholders_config = session_data['placeholders_config']
+    model = calibration.model()
+    
+    try:
+        if request.is_json:
+            data = request.json or {}
+            source_path = resolve_source_path(data.get('path'), current_app.config['SOURCE_ROOTS'])
+            if not source_path:
+                return jsonify({'success': False, 'error': 'Directory not found or not allowed'})
+            options = generation_options(data)
+            session_targets(options)
+            selector = used_images_selector(placeholders_config, options['image_order'])
+            folders, empty = scan_directory(source_path, dimensions=selector)
+            cache_key = make_cache_key(session_data['pptx_data'], placeholders_config,
+                                       directory_digest(folders), options)
+            result = plan_directory(folders, empty, placeholders_config, options, cache_key,
+                                    template_bytes, model)
+            return jsonify({'success': True, **result})
+        
+        zip_file = request.files.get('zip_file')
+        if not zip_file or not zip_file.filename.endswith('.zip'):
+            return jsonify({'success': False, 'error': 'File must be a .zip file'})
+        options = generation_options(request.form)
+        # القوالب الإضافية تدخل في مفتاح المهمة الحقيقية، فتدخل هنا أيضاً
+        session_targets(options)
+        
+        temp_dir = workspace.create()
+        try:
+            zip_path = os.path.join(temp_dir, 'upload.zip')
+            zip_file.save(zip_path)
+            # Same seed as the real job, so a random image order is planned exactly
+            cache_key = make_cache_key(session_data['pptx_data'], placeholders_config,
+                                       file_digest(zip_path), options)
+            with zipfile.ZipFile(zip_path, "r") as zip_ref:
+                result = plan_archive(zip_ref, current_app.config['RESOURCE_LIMITS'], placeholders_config,
+                                      options, cache_key, template_bytes, model)
+        finally:
+            workspace.remove(temp_dir)
+        
+        if not result['accepted']:
+            return jsonify({'success': False, **result})
+        return jsonify({'success': True, **result})
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Error planning job: {str(e)}'})
+
+@bp.route('/jobs/<job_id>')
+def job_status(job_id):
+    """حالة مهمة الإنتاج: الموقع في الطابور، التقدم، ثم النتيجة عند الانتهاء"""
+    job = scheduler.get(job_id)
+    if not job or job.owner != current_session_id():
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    
+    response = {
+        'success': job.status not in (FAILED, CANCELLED),
+        **job.to_dict(),
+        'queue_position': scheduler.position(job.id),
+        'summary': job.log.summary(),
+        'errors': job.log.errors()
+    }
+    if job.status == DONE:
+        response.update(job.result)
+    if job.finished:
+        prune_inflight_jobs()
+    if job.finished and session_data['temp_dir'] and os.path.isfile(job_trace_path(session_data['temp_dir'], job.id)):
+        response['trace_url'] = f'/jobs/{job.id}/trace'
+    if job.finished and session_data['temp_dir'] and os.path.isfile(job_profile_paths(session_data['temp_dir'], job.id)[0]):
+        response['profile_url'] = f'/jobs/{job.id}/profile'
+    return jsonify(response)
+
+@bp.route('/jobs/<job_id>/trace')
+def job_trace(job_id):
+    """تحميل التتبع الزمني للمهمة بتنسيق Chrome trace-event (يفتح في ui.perfetto.dev)"""
+    job = scheduler.get(job_id)
+    if not job or job.owner != current_session_id() or not session_data['temp_dir']:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    
+    trace_path = job_trace_path(session_data['temp_dir'], job.id)
+    if not os.path.isfile(trace_path):
+        return jsonify({'success': False, 'error': 'No trace recorded for this job'}), 404
+    workspace.touch(session_data['temp_dir'])
+    return send_file(trace_path, as_attachment=True, download_name=f'trace_{job.id}.json',
+                     mimetype='application/json')
+
+@bp.route('/jobs/<job_id>/profile')
+def job_profile(job_id):
+    """تحميل تقرير تحليل أداء المهمة (نصي، أو ملف pstats الخام مع format=pstats)"""
+    job = scheduler.get(job_id)
+    if not job or job.owner != current_session_id() or not session_data['temp_dir']:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    
+    report_path, stats_path = job_profile_paths(session_data['temp_dir'], job.id)
+    raw = request.args.get('format') == 'pstats'
+    path = stats_path if raw else report_path
+    if not os.path.isfile(path):
+        return jsonify({'success': False, 'error': 'No profile recorded for this job'}), 404
+    workspace.touch(session_data['temp_dir'])
+    return send_file(path, as_attachment=True, download_name=os.path.basename(path),
+                     mimetype='application/octet-stream' if raw else 'text/plain')
+
+@bp.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """إلغاء مهمة: تحذف من الطابور أو تتوقف عند المجلد التالي، ثم تحذف ملفاتها"""
+    job = scheduler.get(job_id)
+    if not job or job.owner != current_session_id():
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    
+    if not scheduler.cancel(job.id):
+        return jsonify({'success': False, 'error': 'Job already finished', 'status': job.status}), 409
+    return jsonify({'success': True, 'job_id': job.id, 'status': job.status})
+
+@bp.route('/cache/stats')
+def cache_stats():
+    """عدادات ذاكرة النتائج: الإصابات والإخفاقات ونسبة الإصابة والحجم، ومثلها لذاكرة الصور المصغرة"""
+    return jsonify({'success': True, **result_cache.stats(), 'images': image_cache.stats(),
+                    'blobs': blob_store.stats()})
+
+@bp.route('/processing-log')
+def get_processing_log():
+    """عرض سجل المعالجة على صفحات مع التصفية حسب المستوى"""
+    levels = [level for level in request.args.get('level', '').split(',') if level in LEVELS]
+    try:
+        offset = int(request.args.get('offset', 0))
+        limit = int(request.args.get('limit', 100))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'offset and limit must be integers'}), 400
+    
+    page = session_data['processing_log'].page(offset=offset, limit=limit, levels=levels)
+    return jsonify({
+        'success': True,
+        'summary': session_data['processing_log'].summary(),
+        **page
+    })
+
+@bp.route('/download/<filename>')
 def download_file(filename):
     if not session_data['temp_dir'] or not os.path.exists(session_data['temp_dir']):
         return render_template('error.html', message='No processed file available')
@@ -493,32 +1346,109 @@ def download_file(filename):
     file_path = os.path.join(session_data['temp_dir'], filename)
     
     if not os.path.exists(file_path):
-        return render_template('error.html', message='File not found')
+        # Split output: the parts are streamed as one ZIP built on the fly
+        manifest = load_manifest(session_data['temp_dir'], filename)
+        if manifest is None:
+            return render_template('error.html', message='File not found')
+        workspace.touch(session_data['temp_dir'])
+        return Response(
+            stream_parts_zip(session_data['temp_dir'], manifest),
+            mimetype='application/zip',
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+        )
+    
+    workspace.touch(session_data['temp_dir'])
     
     return send_file(file_path, as_attachment=True)
 
-@app.route('/reset')
+@bp.route('/reset')
 def reset():
-    global session_data
-    # Clean up temp directory
-    if session_data['temp_dir'] and os.path.exists(session_data['temp_dir']):
-        try:
-            shutil.rmtree(session_data['temp_dir'])
-        except:
-            pass
+    # Stop the session's job: its result would not be shown after the reset
+    if session_data['job_id']:
+        scheduler.cancel(session_data['job_id'])
+    
+    # Clean up temp directory (kept while a job is still using it)
+    release_session_workspace()
+    if session_data['archive']:
+        release_archive(session_data['archive'])
     
     # Reset session data
-    session_data = {
-        'current_step': 1,
-        'pptx_data': None,
-        'slide_analysis': None,
-        'placeholders_config': {},
-        'processing_details': [],
-        'show_details_needed': False,
-        'temp_dir': None
-    }
+    reset_session_data()
     
     return jsonify({'success': True, 'redirect': '/'})
 
+@bp.route('/healthz')
+def healthz():
+    """فحص الحياة: العملية تعمل وتستجيب"""
+    return jsonify({'status': 'ok', 'pid': os.getpid()})
+
+@bp.route('/readyz')
+def readyz():
+    """فحص الجاهزية: تم تجهيز العامل والطابور غير ممتلئ"""
+    stats = scheduler.stats()
+    max_queue = current_app.config['READY_MAX_QUEUE']
+    ready = current_app.config.get('WARMED_UP', False) and stats['queued'] <= max_queue
+    return jsonify({
+        'status': 'ready' if ready else 'not_ready',
+        'warmed_up': current_app.config.get('WARMED_UP', False),
+        'queue_depth': stats['queued'],
+        'max_queue': max_queue,
+        'scheduler': stats,
+        'workspace': workspace.usage()
+    }), 200 if ready else 503
+
+def create_app(config=None):
+    """إنشاء تطبيق Flask وتسجيل المسارات (Application Factory)"""
+    app = Flask(__name__)
+    app.secret_key = os.environ.get('SECRET_KEY') or os.urandom(24)
+    
+    # حدود الموارد لكل مهمة (قابلة للضبط عبر متغيرات البيئة PPTX_*)
+    app.config['RESOURCE_LIMITS'] = ResourceLimits.from_env()
+    app.config['MAX_CONTENT_LENGTH'] = app.config['RESOURCE_LIMITS'].max_upload_bytes
+    app.config['READY_MAX_QUEUE'] = int(os.environ.get('PPTX_READY_MAX_QUEUE', 50))
+    # المجلدات المسموح بإنشاء العروض منها مباشرة (فارغة = الميزة معطلة)
+    app.config['SOURCE_ROOTS'] = [
+        path for path in os.environ.get('PPTX_SOURCE_ROOTS', '').split(os.pathsep) if path
+    ]
+    # رمز المشرف لتحليل أداء مهمة بعينها (فارغ = الميزة معطلة)
+    app.config['PROFILE_TOKEN'] = profile_token_from_env()
+    if config:
+        app.config.update(config)
+    
+    app.register_blueprint(bp)
+    return app
+
+def warm_up(app):
+    """تحميل المكتبات الثقيلة والقوالب مسبقاً قبل إنشاء العمال (preload)
+
+    يتم ذلك مرة واحدة في العملية الرئيسية فتتشارك العمال الذاكرة نفسها
+    (copy-on-write) ولا يدفع كل عامل تكلفة الاستيراد عند أول طلب.
+    حذف بقايا مساحة العمل يتم هنا وليس عند الاستيراد، لأن عمليات spawn
+    (الأجزاء وفهرس القوالب) تعيد استيراد الوحدة الرئيسية أثناء عمل المهام.
+    """
+    workspace.sweep_leftovers()
+    
+    # Pillow: تسجيل جميع مفككات الصور
+    Image.init()
+    
+    # python-pptx: تحميل القالب الافتراضي ومخطط XML، مع إنشاء شريحة وحفظها
+    prs = Presentation()
+    prs.slides.add_slide(prs.slide_layouts[0])
+    prs.save(io.BytesIO())
+    
+    # Jinja: ترجمة قوالب الصفحات مرة واحدة
+    for template_name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(template_name)
+    
+    # مكتبة القوالب: تحليل القوالب الجديدة والمعدلة منذ آخر تشغيل فقط
+    if template_index.enabled:
+        template_index.refresh()
+    
+    app.config['WARMED_UP'] = True
+    return app
+
+app = create_app()
+
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    warm_up(app)
+    app.run(debug=os.environ.get('FLASK_DEBUG') == '1', host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,129 @@
+"""تصفح محتوى الملف المضغوط قبل المعالجة دون استخراجه
+
+قائمة المجلدات وعدد صورها مبنية من الدليل المركزي فقط (مثل التشغيل التجريبي)
+فتعود خلال أجزاء من الثانية مهما كان حجم الملف، مع تقسيمها إلى صفحات. الصورة
+المصغرة لكل صورة يتم إنشاؤها عند طلبها فقط بفك ضغط ذلك العنصر وحده، وتحفظ في
+ذاكرة الصور المصغرة (image_cache.py) فلا يتم فكها مرة ثانية.
+"""
+import hashlib
+import io
+import math
+import threading
+import zipfile
+
+from PIL import Image
+
+from image_cache import image_cache_key
+from planner import folders_from_archive
+
+DEFAULT_PER_PAGE = 100
+MAX_PER_PAGE = 1000
+
+THUMBNAIL_SIZE = 160
+MAX_THUMBNAIL_SIZE = 512
+THUMBNAIL_CODEC = 'thumbnail:jpeg:q80'
+# أكبر عنصر تنشأ منه صورة مصغرة (zipfile لا يقرأ أكثر من الحجم المعلن للعنصر)
+MAX_THUMBNAIL_SOURCE_BYTES = 64 * 1024 * 1024
+
+
+def paginate(items, page, per_page):
+    """(عناصر الصفحة، معلومات الصفحات)؛ الصفحات تبدأ من 1 والقيم خارج المدى تقرب إليه"""
+    per_page = min(max(int(per_page), 1), MAX_PER_PAGE)
+    pages = max(math.ceil(len(items) / per_page), 1)
+    page = min(max(int(page), 1), pages)
+    start = (page - 1) * per_page
+    return items[start:start + per_page], {
+        'page': page,
+        'per_page': per_page,
+        'pages': pages,
+        'total': len(items)
+    }
+
+
+class ArchiveIndex:
+    """فهرس ملف مضغوط مرفوع: المجلدات وصورها من الدليل المركزي، والصور المصغرة عند الطلب
+
+    الملف يبقى مفتوحاً طوال عمر الفهرس؛ فتح العنصر يتم تحت قفل ثم تتم قراءته
+    تدفقياً وفك الصورة وتصغيرها خارجه.
+    """
+
+    def __init__(self, zip_path):
+        self.zip_path = zip_path
+        self._zip = zipfile.ZipFile(zip_path, 'r')
+        self._lock = threading.Lock()
+        self.folders, self.empty, self._members = folders_from_archive(self._zip)
+        self._by_name = {folder.name: folder for folder in self.folders}
+
+    def close(self):
+        with self._lock:
+            self._zip.close()
+
+    def summary(self):
+        return {
+            'folders': len(self.folders),
+            'images': sum(len(folder.images) for folder in self.folders),
+            'image_bytes': sum(folder.total_bytes for folder in self.folders),
+            'empty_folders': self.empty
+        }
+
+    def folder_page(self, page=1, per_page=DEFAULT_PER_PAGE):
+        folders, meta = paginate(self.folders, page, per_page)
+        return [{
+            'name': folder.name,
+            'images': len(folder.images),
+            'bytes': folder.total_bytes
+        } for folder in folders], meta
+
+    def image_page(self, folder_name, page=1, per_page=DEFAULT_PER_PAGE):
+        """صور مجلد واحد؛ ترفع KeyError إذا لم يكن المجلد في الملف"""
+        images, meta = paginate(self._by_name[folder_name].images, page, per_page)
+        return [{'name': name, 'bytes': size} for name, size, _ in images], meta
+
+    def member(self, folder_name, image_name):
+        """العنصر داخل الملف المضغوط؛ ترفع KeyError إذا لم تكن الصورة في الملف"""
+        return self._zip.getinfo(self._members[(folder_name, image_name)])
+
+    def source_digest(self, info):
+        """بصمة العنصر من الدليل المركزي (المسار والحجم وCRC) دون قراءته
+
+        تكفي لمفتاح الصورة المصغرة للمعاينة، فتتم إعادة استخدامها عند رفع
+        الملف نفسه مرة أخرى.
+        """
+        digest = hashlib.sha256(f'{info.filename}\0{info.file_size}\0{info.CRC}'.encode('utf-8'))
+        return digest.hexdigest()
+
+    def thumbnail(self, folder_name, image_name, size=THUMBNAIL_SIZE, cache=None, max_pixels=None,
+                  max_bytes=MAX_THUMBNAIL_SOURCE_BYTES):
+        """صورة مصغرة بصيغة JPEG لا يتجاوز ضلعها size
+
+        ترفع KeyError إذا لم تكن الصورة في الملف، وValueError إذا تجاوز العنصر
+        max_bytes أو تجاوزت أبعاده (من ترويسة الصورة قبل فكها) max_pixels أو تعذر فكها.
+        """
+        size = min(max(int(size), 16), MAX_THUMBNAIL_SIZE)
+        info = self.member(folder_name, image_name)
+        key = image_cache_key(self.source_digest(info), (size, size), THUMBNAIL_CODEC)
+        if cache:
+            data = cache.get(key)
+            if data is not None:
+                return data
+
+        if max_bytes and info.file_size > max_bytes:
+            raise ValueError(f'الصورة كبيرة جداً ({info.file_size // (1024 * 1024)} MB)')
+        with self._lock:
+            member = self._zip.open(info)
+        try:
+            with member, Image.open(member) as img:
+                if max_pixels and img.width * img.height > max_pixels:
+                    raise ValueError(f'الصورة كبيرة جداً ({img.width}×{img.height})')
+                img.draft('RGB', (size, size))
+                img = img.convert('RGB')
+                img.thumbnail((size, size))
+                output = io.BytesIO()
+                img.save(output, 'JPEG', quality=80)
+        except (OSError, zipfile.BadZipFile, Image.DecompressionBombError) as e:
+            raise ValueError(f'تعذر فك الصورة: {e}')
+
+        thumbnail = output.getvalue()
+        if cache:
+            cache.put(key, thumbnail)
+        return thumbnail
@@ -0,0 +1,299 @@
+"""الرفع حسب المحتوى: مخزن الصور بالبصمة وبيان المجلدات
+
+يرسل المتصفح أولاً بياناً (manifest) بأسماء المجلدات وصورها وبصمة SHA-256
+وحجم كل صورة، فيرد الخادم بالبصمات غير الموجودة في المخزن، ثم يتم رفع تلك
+الصور فقط. عند بدء المهمة يتم بناء شجرة المجلدات في مجلد المهمة بروابط صلبة
+(hard links) إلى المخزن، فلا تنسخ الصور ولا تؤثر إزالتها لاحقاً من المخزن على
+المهمة. الرفع اليومي لنفس الصور تقريباً ينقل الصور الجديدة فقط.
+
+وجود البصمة في المخزن لا يكفي: كل مستخدم (معرف رفع دائم في ملف تعريف طويل
+العمر) يجب أن يرفع محتوى الصورة مرة واحدة على الأقل، وإلا لأمكن لأي مستخدم
+معرفة وجود صورة مستخدم آخر أو استخدامها. بصمات كل مستخدم محفوظة على القرص
+بجانب المخزن، فتبقى بعد انتهاء الجلسة وإعادة التشغيل وبين العمال.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+
+from admission import is_image_name
+
+MB = 1024 * 1024
+CHUNK_SIZE = MB
+
+DIGEST_PATTERN = re.compile(r'[0-9a-f]{64}')
+OWNER_PATTERN = re.compile(r'[0-9a-f]{32}')
+OWNERS_DIR = 'owners'
+
+
+class ManifestError(ValueError):
+    """بيان غير صالح أو يتجاوز حدود الموارد"""
+
+
+def is_safe_part(part):
+    return part not in ('', '.', '..') and not part.startswith('.') and '\\' not in part and '\0' not in part
+
+
+class Manifest:
+    """بيان المجلدات: قائمة (اسم المجلد، [(اسم الصورة، البصمة، الحجم)]) مع المجلدات الفارغة"""
+
+    def __init__(self, folders, empty=()):
+        self.folders = folders
+        self.empty = list(empty)
+        self.sizes = {digest: size for _, images in folders for _, digest, size in images}
+
+    @classmethod
+    def parse(cls, data, limits):
+        """قراءة البيان من JSON والتحقق من الأسماء والبصمات والحدود
+
+        الصيغة: {'folders': [{'name': 'a/b', 'images': [{'name', 'sha256', 'size'}]}], 'empty': [...]}
+        """
+        if not isinstance(data, dict) or not isinstance(data.get('folders'), list):
+            raise ManifestError('Manifest must contain a list of folders')
+
+        folders = []
+        seen = set()
+        image_count = 0
+        total_bytes = 0
+        for folder in data['folders']:
+            name = folder.get('name') if isinstance(folder, dict) else None
+            if not isinstance(name, str) or not all(is_safe_part(part) for part in name.split('/')):
+                raise ManifestError(f'Invalid folder name: {name!r}')
+            if name in seen:
+                raise ManifestError(f'Duplicate folder: {name}')
+            seen.add(name)
+
+            images = []
+            names = set()
+            for image in folder.get('images') or []:
+                image_name = image.get('name') if isinstance(image, dict) else None
+                digest = image.get('sha256') if isinstance(image, dict) else None
+                size = image.get('size') if isinstance(image, dict) else None
+                if (not isinstance(image_name, str) or '/' in image_name or not is_safe_part(image_name)
+                        or not is_image_name(image_name) or image_name in names):
+                    raise ManifestError(f'Invalid image name in {name}: {image_name!r}')
+                if not isinstance(digest, str) or not DIGEST_PATTERN.fullmatch(digest):
+                    raise ManifestError(f'Invalid digest for {name}/{image_name}')
+                if not isinstance(size, int) or size < 0:
+                    raise ManifestError(f'Invalid size for {name}/{image_name}')
+                names.add(image_name)
+                images.append((image_name, digest, size))
+                image_count += 1
+                total_bytes += size
+            if images:
+                folders.append((name, sorted(images)))
+
+        if image_count > limits.max_members:
+            raise ManifestError(f'البيان يحتوي على {image_count} صورة، والحد الأقصى هو {limits.max_members}')
+        if total_bytes > limits.max_uncompressed_bytes:
+            raise ManifestError(f'حجم الصور يتجاوز الحد المسموح ({limits.max_uncompressed_bytes // MB} MB)')
+
+        empty = [name for name in data.get('empty') or []
+                 if isinstance(name, str) and all(is_safe_part(part) for part in name.split('/'))]
+        return cls(sorted(folders), empty)
+
+    @property
+    def total_bytes(self):
+        return sum(size for _, images in self.folders for _, _, size in images)
+
+    def digest(self):
+        """بصمة البيان كاملاً (الأسماء والمحتوى)، تستخدم في مفتاح ذاكرة النتائج"""
+        canonical = json.dumps([self.folders, sorted(self.empty)], ensure_ascii=False, separators=(',', ':'))
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def materialize(self, store, root):
+        """بناء شجرة المجلدات تحت root من المخزن؛ يعيد البصمات التي لم تعد موجودة فيه"""
+        missing = []
+        for name, images in self.folders:
+            folder_path = os.path.join(root, *name.split('/'))
+            os.makedirs(folder_path, exist_ok=True)
+            for image_name, digest, _ in images:
+                if not store.link(digest, os.path.join(folder_path, image_name)):
+                    missing.append(digest)
+        for name in self.empty:
+            os.makedirs(os.path.join(root, *name.split('/')), exist_ok=True)
+        return sorted(set(missing))
+
+
+class BlobStore:
+    """مخزن على القرص للصور المرفوعة، عنوان كل صورة بصمة SHA-256 لمحتواها
+
+    مثل ImageCache: مدخلات موزعة حسب أول حرفين من البصمة، وكتابة ذرية، وحذف
+    الأقدم استخداماً عند تجاوز الحد. يتم التحقق من بصمة كل صورة وحجمها قبل
+    قبولها، والملفات للقراءة فقط لأنها مشتركة بالروابط الصلبة مع مجلدات المهام.
+    لكل مالك (معرف الرفع) ملف تحت owners/ بالبصمات التي رفع محتواها، سطر لكل
+    بصمة بالإضافة فقط، ولا تعتبر الصورة موجودة إلا لمن رفعها.
+    """
+
+    def __init__(self, root, max_bytes=4096 * MB):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.stores = 0
+        self.reused = 0
+        self.evictions = 0
+        self.owners_dir = os.path.join(root, OWNERS_DIR)
+        os.makedirs(self.owners_dir, exist_ok=True)
+        self._size = self.size()
+
+    @classmethod
+    def from_env(cls, environ=None):
+        environ = os.environ if environ is None else environ
+        root = environ.get('PPTX_BLOB_DIR') or os.path.join(tempfile.gettempdir(), 'pptx_blobs')
+        return cls(root, max_bytes=int(environ.get('PPTX_BLOB_MAX_MB', 4096)) * MB)
+
+    def _path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def _owner_path(self, owner):
+        if not isinstance(owner, str) or not OWNER_PATTERN.fullmatch(owner):
+            raise ValueError('Invalid uploader id')
+        return os.path.join(self.owners_dir, owner)
+
+    def owned(self, owner):
+        """البصمات التي رفع المالك محتواها (من أي جلسة أو عامل)"""
+        try:
+            with open(self._owner_path(owner), encoding='ascii') as f:
+                return {line.strip() for line in f if DIGEST_PATTERN.fullmatch(line.strip())}
+        except OSError:
+            return set()
+
+    def missing(self, digests, owner):
+        """البصمات التي يجب أن يرفعها المالك: غير الموجودة في المخزن أو التي لم يرفعها هو
+
+        الموجودة يتم تحديث وقت استخدامها.
+        """
+        owned = self.owned(owner)
+        missing = []
+        present = 0
+        for digest in sorted(set(digests)):
+            if digest not in owned:
+                missing.append(digest)
+                continue
+            try:
+                os.utime(self._path(digest))
+                present += 1
+            except OSError:
+                missing.append(digest)
+        with self._lock:
+            self.reused += present
+        return missing
+
+    def put(self, digest, stream, size, owner):
+        """حفظ صورة من تدفق مع التحقق من حجمها وبصمتها؛ ترفع ValueError عند عدم التطابق
+
+        إذا كانت الصورة موجودة (رفعها مالك آخر) يتم التحقق من المحتوى بالطريقة نفسها
+        ثم تسجيلها للمالك.
+        """
+        owner_path = self._owner_path(owner)
+        path = self._path(digest)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            hasher = hashlib.sha256()
+            written = 0
+            with os.fdopen(fd, 'wb') as f:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    written += len(chunk)
+                    if written > size:
+                        raise ValueError('Blob is larger than declared in the manifest')
+                    hasher.update(chunk)
+                    f.write(chunk)
+            if written != size:
+                raise ValueError('Blob size does not match the manifest')
+            if hasher.hexdigest() != digest:
+                raise ValueError('Blob content does not match its digest')
+            os.chmod(tmp_path, 0o444)
+            existed = os.path.exists(path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        if digest not in self.owned(owner):
+            # سطر قصير بوضع الإضافة: كتابة ذرية حتى مع عدة عمال
+            with open(owner_path, 'a', encoding='ascii') as f:
+                f.write(digest + '\n')
+        with self._lock:
+            if existed:
+                self.reused += 1
+                return
+            self.stores += 1
+            self._size += size
+            over = self._size > self.max_bytes
+        if over:
+            self.evict()
+
+    def link(self, digest, target):
+        """ربط الصورة في مسار داخل مجلد مهمة (نسخ إذا تعذر الربط)؛ False إذا لم تعد موجودة"""
+        path = self._path(digest)
+        try:
+            os.link(path, target)
+        except FileNotFoundError:
+            return False
+        except OSError:
+            try:
+                shutil.copyfile(path, target)
+            except FileNotFoundError:
+                return False
+        return True
+
+    def _entries(self):
+        entries = []
+        try:
+            shards = [entry.path for entry in os.scandir(self.root) if entry.is_dir()]
+        except OSError:
+            return entries
+        for shard in shards:
+            try:
+                with os.scandir(shard) as it:
+                    for entry in it:
+                        if DIGEST_PATTERN.fullmatch(entry.name):
+                            try:
+                                stat = entry.stat()
+                            except OSError:
+                                continue
+                            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            except OSError:
+                continue
+        return entries
+
+    def size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """حذف الأقدم استخداماً حتى يصبح الحجم ضمن الحد (المهام الجارية تحتفظ بروابطها)"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+            with self._lock:
+                self.evictions += 1
+        with self._lock:
+            self._size = total
+
+    def stats(self):
+        with self._lock:
+            return {
+                'stores': self.stores,
+                'reused': self.reused,
+                'evictions': self.evictions,
+                'size_bytes': self.size(),
+                'max_bytes': self.max_bytes
+            }
@@ -0,0 +1,85 @@
+"""نقاط الحفظ: حفظ العرض الجاري دورياً حتى تستأنف المهمة الطويلة بعد تعطل العامل
+
+نقطة الحفظ هي العرض بعد آخر مجلد مكتمل (الشرائح مع الوسائط) وملف حالة يحدد
+عدد المجلدات المكتملة والإحصائيات. المهمة التي يعاد تشغيلها بنفس المفتاح
+تكمل من المجلد التالي، والنتيجة مطابقة للتشغيل دون انقطاع.
+"""
+import json
+import os
+import time
+import uuid
+
+STATE_FILE = 'state.json'
+DECK_PREFIX = 'deck_'
+
+# الفترة بين نقطتي حفظ لا تقل عن هذا المضاعف لزمن آخر حفظ، حتى لا يتجاوز
+# زمن الحفظ نسبة صغيرة من زمن المهمة مهما كبر العرض
+SAVE_COST_FACTOR = 10
+
+
+def checkpoint_interval_from_env(environ=None):
+    """الفترة بين نقاط الحفظ بالثواني (PPTX_CHECKPOINT_INTERVAL)؛ 0 = بدون نقاط حفظ"""
+    environ = os.environ if environ is None else environ
+    return float(environ.get('PPTX_CHECKPOINT_INTERVAL', 60))
+
+
+class Checkpoint:
+    """نقطة حفظ مهمة واحدة داخل مجلد خاص بها
+
+    key يميز المدخلات (مفتاح النتيجة عادةً)؛ نقطة الحفظ بمفتاح مختلف يتم تجاهلها.
+    كل حفظ يكتب عرضاً باسم جديد ثم يستبدل ملف الحالة دفعة واحدة، فتبقى نقطة
+    الحفظ السابقة صالحة إذا توقفت العملية أثناء الكتابة.
+    """
+
+    def __init__(self, directory, key, interval=60.0):
+        self.directory = directory
+        self.key = key
+        self.interval = interval
+        self._last_save = time.monotonic()
+        self._last_cost = 0.0
+        self._deck = None
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def state_path(self):
+        return os.path.join(self.directory, STATE_FILE)
+
+    def restore(self):
+        """حالة آخر نقطة حفظ ({'folders', 'stats', 'deck'}) أو None"""
+        try:
+            with open(self.state_path, encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get('key') != self.key:
+            return None
+        deck = os.path.join(self.directory, state['deck'])
+        if not os.path.isfile(deck):
+            return None
+        self._deck = deck
+        return {'folders': state['folders'], 'stats': state['stats'], 'deck': deck}
+
+    def due(self):
+        elapsed = time.monotonic() - self._last_save
+        return elapsed >= max(self.interval, self._last_cost * SAVE_COST_FACTOR)
+
+    def save(self, prs, folders, stats):
+        """حفظ العرض بعد folders مجلد مكتمل"""
+        started = time.monotonic()
+        deck_name = f"{DECK_PREFIX}{uuid.uuid4().hex}.pptx"
+        deck = os.path.join(self.directory, deck_name)
+        prs.save(deck)
+
+        state_tmp = self.state_path + '.tmp'
+        with open(state_tmp, 'w', encoding='utf-8') as f:
+            json.dump({'key': self.key, 'folders': folders, 'stats': stats, 'deck': deck_name}, f)
+        os.replace(state_tmp, self.state_path)
+
+        if self._deck and self._deck != deck:
+            try:
+                os.remove(self._deck)
+            except OSError:
+                pass
+        self._deck = deck
+        self._last_save = time.monotonic()
+        self._last_cost = self._last_save - started
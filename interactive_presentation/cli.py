@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""إنشاء العرض من سطر الأوامر مباشرة من شجرة مجلدات محلية أو مركّبة
+
+    python cli.py template.pptx settings.json /mnt/photos -o output.pptx
+    python cli.py template.pptx settings.json /mnt/photos -o output.pptx --watch
+    python cli.py template.pptx settings.json /mnt/photos --plan
+    python cli.py wide.pptx wide.json /mnt/photos -o wide.pptx --target classic.pptx classic.json classic_out.pptx
+    python cli.py template.pptx settings.json /mnt/photos -o output.pptx --profile profile_out
+
+ملف الإعدادات هو نفسه الذي يتم تصديره من صفحة المعالجة ("تصدير إعدادات القالب").
+في وضع المراقبة يتم تحديث الشرائح المتأثرة فقط عند تغير المجلدات.
+مع --target يتم إنشاء عرض إضافي لكل قالب في المرور نفسه على الصور.
+مع --profile يتم حفظ تقرير زمن المعالج والذاكرة (profile.txt وprofile.prof) في المجلد المحدد.
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+
+from engine import ORDER_ALPHABETICAL, ORDER_RANDOM, generate, generate_multi
+from image_cache import ImageCache
+from planner import Calibration, plan_directory, used_images_selector
+from profiling import JobProfiler
+from tracing import NULL_TRACER
+from sources import WatchedDeck, scan_directory
+
+
+def load_config(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+class ConsoleLog:
+    """سجل يطبع الرسائل مباشرة بدلاً من الاحتفاظ بها"""
+
+    def __init__(self, verbose=False):
+        self.verbose = verbose
+
+    def add(self, message, level="info"):
+        if self.verbose or level in ('warning', 'error'):
+            print(f"[{level}] {message}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='إنشاء عرض PowerPoint من مجلدات الصور')
+    parser.add_argument('template', help='ملف القالب .pptx')
+    parser.add_argument('config', help='ملف إعدادات القالب .json')
+    parser.add_argument('source', help='المجلد الذي يحتوي على مجلدات الصور')
+    parser.add_argument('-o', '--output', help='مسار العرض الناتج')
+    parser.add_argument('--order', choices=[ORDER_ALPHABETICAL, ORDER_RANDOM], default=ORDER_ALPHABETICAL,
+                        help='ترتيب الصور داخل كل مجلد')
+    parser.add_argument('--seed', default='', help='بذرة الترتيب العشوائي')
+    parser.add_argument('--top-level-only', action='store_true',
+                        help='عدم البحث في المجلدات الفرعية المتداخلة')
+    parser.add_argument('--watch', action='store_true',
+                        help='مراقبة المجلد وتحديث الشرائح المتأثرة عند التغيير')
+    parser.add_argument('--interval', type=float, default=2.0, help='الفترة بين فحوص المراقبة بالثواني')
+    parser.add_argument('--plan', action='store_true',
+                        help='تشغيل تجريبي: طباعة خطة المهمة وتقديراتها دون إنشاء العرض')
+    parser.add_argument('--target', nargs=3, action='append', default=[],
+                        metavar=('TEMPLATE', 'CONFIG', 'OUTPUT'),
+                        help='قالب إضافي مع إعداداته ومسار عرضه (يمكن تكراره)')
+    parser.add_argument('--profile', metavar='DIR',
+                        help='تحليل زمن المعالج والذاكرة وحفظ التقرير في المجلد')
+    parser.add_argument('-v', '--verbose', action='store_true', help='طباعة كل رسائل المعالجة')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = load_config(args.config)
+    log = ConsoleLog(args.verbose)
+
+    if args.plan:
+        folders, empty = scan_directory(args.source, nested=not args.top_level_only,
+                                        dimensions=used_images_selector(config, args.order))
+        plan = plan_directory(folders, empty, config, {'image_order': args.order}, args.seed,
+                              os.path.getsize(args.template), Calibration.from_env().model())
+        print(json.dumps(plan, ensure_ascii=False, indent=2))
+        return 0
+
+    if not args.output:
+        print("❌ يجب تحديد مسار العرض الناتج (-o)", file=sys.stderr)
+        return 2
+
+    if args.watch:
+        deck = WatchedDeck(args.template, config, args.source, args.output,
+                           image_order=args.order, seed=args.seed,
+                           nested=not args.top_level_only, log=log)
+        changes = deck.refresh()
+        print(f"✅ {len(changes['added'])} شريحة → {args.output}")
+
+        def report(changes):
+            print(f"🔄 مضافة: {len(changes['added'])}، معدلة: {len(changes['changed'])}، "
+                  f"محذوفة: {len(changes['removed'])} → {args.output}")
+
+        try:
+            deck.watch(args.interval, on_change=report)
+        except KeyboardInterrupt:
+            deck.stop()
+        return 0
+
+    profiler = JobProfiler() if args.profile else None
+    try:
+        with profiler or contextlib.nullcontext():
+            return run_generation(args, config, log, profiler)
+    finally:
+        if profiler:
+            os.makedirs(args.profile, exist_ok=True)
+            profiler.write(os.path.join(args.profile, 'profile.txt'), os.path.join(args.profile, 'profile.prof'))
+            print(f"📊 تقرير التحليل → {os.path.join(args.profile, 'profile.txt')}")
+
+
+def run_generation(args, config, log, profiler=None):
+    """إنشاء العرض (أو العروض مع --target) وطباعة التقدم"""
+    with (profiler or NULL_TRACER).span('scan folders'):
+        folders, _ = scan_directory(args.source, nested=not args.top_level_only)
+    folder_source = ((folder.name, folder.open_images()) for folder in folders)
+    try:
+        if args.target:
+            targets = [{'template': args.template, 'config': config, 'output': args.output}] + [
+                {'template': template, 'config': load_config(target_config), 'output': output}
+                for template, target_config, output in args.target
+            ]
+            events = generate_multi(targets, folder_source, image_order=args.order, seed=args.seed, log=log,
+                                    image_cache=ImageCache.from_env(), tracer=profiler)
+        else:
+            events = generate(args.template, config, folder_source, output=args.output,
+                              image_order=args.order, seed=args.seed, log=log, tracer=profiler)
+        for event in events:
+            if event['event'] == 'folder':
+                print(f"[{event['index']}/{len(folders)}] {event['folder']}")
+            elif args.target:
+                for stats, output in zip(event['stats'], event['outputs']):
+                    print(f"✅ {stats['created_slides']} شريحة، {stats['total_images']} صورة → {output}")
+            else:
+                stats = event['stats']
+                print(f"✅ {stats['created_slides']} شريحة، {stats['total_images']} صورة → {args.output}")
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
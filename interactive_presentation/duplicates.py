@@ -0,0 +1,213 @@
+"""كشف الصور شبه المتطابقة (اللقطات المتتالية) بالبصمات الإدراكية قبل إنشاء العرض
+
+يتم فك ترميز نسخة مصغرة رمادية من كل صورة (مع draft في JPEG لا تفك الصورة
+كاملة)، ثم حساب البصمة المتوسطة (aHash) وبصمة الفروق (dHash) ومقياس الحدة
+لدفعات من الصور معاً بـ NumPy. الصور التي تتقارب بصمتاها داخل المجلد نفسه
+تكون مجموعة واحدة، ويبقى منها إطار واحد فقط في ترتيب الصور.
+
+NumPy اختياري: يتم استيراده فقط عند تفعيل المرحلة.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from engine import ORDER_ALPHABETICAL
+from planner import select_images
+from sources import SourceFolder
+from validation import validation_workers_from_env
+
+# ما يحدث للصور شبه المتطابقة
+DUPLICATES_OFF = 'off'
+DUPLICATES_SKIP = 'skip'    # الإبقاء على أول إطار حسب الاسم
+DUPLICATES_BEST = 'best'    # الإبقاء على أوضح إطار
+DUPLICATE_POLICIES = (DUPLICATES_OFF, DUPLICATES_SKIP, DUPLICATES_BEST)
+
+HASH_SIZE = 8
+THUMBNAIL_SIZE = 64
+BATCH_SIZE = 256
+# عدد الصفوف المقارنة معاً: الذاكرة تتناسب مع COMPARE_BLOCK × عدد صور المجلد وليس مع مربعه
+COMPARE_BLOCK = 256
+
+# عدد المجموعات المرسلة في النتيجة (السجل يحتفظ بالباقي)
+MAX_REPORTED = 100
+
+
+def duplicate_threshold_from_env(environ=None):
+    """أقصى عدد بتات مختلفة (من 64) في كل بصمة لاعتبار صورتين متشابهتين (PPTX_DUPLICATE_THRESHOLD)"""
+    environ = os.environ if environ is None else environ
+    return int(environ.get('PPTX_DUPLICATE_THRESHOLD', 6))
+
+
+class DuplicateReport:
+    """نتيجة الكشف: المجموعات والصور المحذوفة من الترتيب وما كان سيدرج منها في العرض"""
+
+    def __init__(self):
+        self.hashed = 0
+        self.clusters = []
+        self.removed_images = 0
+        self.removed_bytes = 0
+        self.avoided_images = 0
+        self.avoided_bytes = 0
+
+    def to_dict(self):
+        return {
+            'hashed': self.hashed,
+            'clusters': len(self.clusters),
+            'removed_images': self.removed_images,
+            'removed_bytes': self.removed_bytes,
+            'avoided_images': self.avoided_images,
+            'avoided_bytes': self.avoided_bytes,
+            'details': self.clusters[:MAX_REPORTED]
+        }
+
+
+def load_thumbnail(path):
+    """نسخة رمادية THUMBNAIL_SIZE × THUMBNAIL_SIZE كبايتات، أو None إذا تعذر فك الصورة"""
+    try:
+        with Image.open(path) as img:
+            img.draft('L', (THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+            return img.convert('L').resize((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.BILINEAR).tobytes()
+    except Exception:
+        # الصور التالفة تبقى كما هي ويتعامل معها فحص الصور
+        return None
+
+
+def hash_batch(np, thumbnails):
+    """(بتات aHash، بتات dHash، الحدة) لدفعة من النسخ المصغرة معاً"""
+    pixels = np.frombuffer(b''.join(thumbnails), dtype=np.uint8).reshape(
+        len(thumbnails), THUMBNAIL_SIZE, THUMBNAIL_SIZE).astype(np.float32)
+    block = THUMBNAIL_SIZE // HASH_SIZE
+
+    # aHash: متوسط كل مربع مقارنة بمتوسط الصورة
+    means = pixels.reshape(len(thumbnails), HASH_SIZE, block, HASH_SIZE, block).mean(axis=(2, 4))
+    average_bits = means > means.mean(axis=(1, 2), keepdims=True)
+
+    # dHash: مقارنة كل عمود بالعمود التالي في شبكة HASH_SIZE × (HASH_SIZE + 1)
+    rows = pixels.reshape(len(thumbnails), HASH_SIZE, block, THUMBNAIL_SIZE).mean(axis=2)
+    starts = np.linspace(0, THUMBNAIL_SIZE, HASH_SIZE + 2).astype(int)[:-1]
+    columns = np.add.reduceat(rows, starts, axis=2) / np.diff(np.append(starts, THUMBNAIL_SIZE))
+    difference_bits = columns[:, :, 1:] > columns[:, :, :-1]
+
+    # الحدة: تباين مرشح لابلاس على النسخة المصغرة
+    laplacian = (4 * pixels[:, 1:-1, 1:-1] - pixels[:, :-2, 1:-1] - pixels[:, 2:, 1:-1]
+                 - pixels[:, 1:-1, :-2] - pixels[:, 1:-1, 2:])
+    sharpness = laplacian.reshape(len(thumbnails), -1).var(axis=1)
+
+    return (average_bits.reshape(len(thumbnails), -1), difference_bits.reshape(len(thumbnails), -1),
+            sharpness)
+
+
+def pack_hashes(np, bits):
+    """كل بصمة من 64 بتاً في بايتاتها الثمانية (مصفوفة uint8 بشكل n × 8)"""
+    return np.packbits(bits.astype(np.uint8), axis=1)
+
+
+def hamming_distances(np, rows, columns):
+    """عدد البتات المختلفة بين كل بصمة في rows وكل بصمة في columns (بصمات مضغوطة)"""
+    table = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+    return table[rows[:, None, :] ^ columns[None, :, :]].sum(axis=2, dtype=np.uint16)
+
+
+def similar_pairs(np, average_hashes, difference_hashes, threshold):
+    """أزواج الفهارس (i < j) المتشابهة في البصمتين، بمقارنة COMPARE_BLOCK صفاً في كل مرة
+
+    كل صف يقارن فقط بالصور التي بعده، فلا تنشأ أي مصفوفة n × n.
+    """
+    count = len(average_hashes)
+    for start in range(0, count, COMPARE_BLOCK):
+        stop = min(start + COMPARE_BLOCK, count)
+        similar = ((hamming_distances(np, average_hashes[start:stop], average_hashes[start:]) <= threshold) &
+                   (hamming_distances(np, difference_hashes[start:stop], difference_hashes[start:]) <= threshold))
+        for i, j in zip(*np.nonzero(similar)):
+            if i < j:
+                yield start + int(i), start + int(j)
+
+
+def find_clusters(np, average_bits, difference_bits, threshold):
+    """مجموعات الصور المتشابهة (ربط مفرد) كقوائم من الفهارس؛ المجموعات ذات الصورة الواحدة مستبعدة"""
+    parent = list(range(len(average_bits)))
+
+    def root(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j in similar_pairs(np, pack_hashes(np, average_bits), pack_hashes(np, difference_bits), threshold):
+        parent[root(i)] = root(j)
+
+    groups = {}
+    for i in range(len(parent)):
+        groups.setdefault(root(i), []).append(i)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def dedupe_folders(folders, placeholders_config, policy=DUPLICATES_SKIP, image_order=ORDER_ALPHABETICAL,
+                   seed='', threshold=None, max_workers=None, log=None, check=None):
+    """حذف الصور شبه المتطابقة من كل مجلد مع الإبقاء على إطار واحد من كل مجموعة
+
+    يعيد (المجلدات بعد الحذف، التقرير). الإطار المتبقي هو الأول حسب الاسم مع
+    سياسة skip، والأوضح مع سياسة best. الصور البديلة (replacements) والصور
+    التي تعذر فكها لا تدخل في المقارنة. ترفع ImportError إذا لم يكن NumPy مثبتاً.
+    """
+    import numpy as np
+
+    threshold = duplicate_threshold_from_env() if threshold is None else threshold
+    report = DuplicateReport()
+    tasks = [(folder, image) for folder in folders for image in folder.images
+             if image[0] not in folder.replacements]
+
+    hashes = {}
+    with ThreadPoolExecutor(max_workers=max_workers or validation_workers_from_env()) as executor:
+        for start in range(0, len(tasks), BATCH_SIZE):
+            if check:
+                check()
+            batch = tasks[start:start + BATCH_SIZE]
+            paths = [os.path.join(folder.path, image[0]) for folder, image in batch]
+            decoded = [(task, thumbnail) for task, thumbnail in zip(batch, executor.map(load_thumbnail, paths))
+                       if thumbnail is not None]
+            if not decoded:
+                continue
+            average_bits, difference_bits, sharpness = hash_batch(np, [thumbnail for _, thumbnail in decoded])
+            for i, ((folder, image), _) in enumerate(decoded):
+                hashes[(folder.name, image[0])] = (average_bits[i], difference_bits[i], float(sharpness[i]))
+            report.hashed += len(decoded)
+
+    result = []
+    for folder in folders:
+        hashed = [image for image in folder.images if (folder.name, image[0]) in hashes]
+        if len(hashed) < 2:
+            result.append(folder)
+            continue
+
+        entries = [hashes[(folder.name, image[0])] for image in hashed]
+        removed = set()
+        for cluster in find_clusters(np, np.stack([entry[0] for entry in entries]),
+                                     np.stack([entry[1] for entry in entries]), threshold):
+            if policy == DUPLICATES_BEST:
+                # عند التساوي يبقى الأول حسب الاسم
+                kept = max(cluster, key=lambda i: (entries[i][2], -i))
+            else:
+                kept = min(cluster)
+            dropped = [hashed[i][0] for i in cluster if i != kept]
+            removed.update(dropped)
+            report.clusters.append({'folder': folder.name, 'kept': hashed[kept][0], 'removed': dropped})
+            if log:
+                log.add(f"🔁 المجلد '{folder.name}': تم الإبقاء على {hashed[kept][0]} "
+                        f"بدلاً من {len(dropped)} صورة مشابهة", "info")
+        if not removed:
+            result.append(folder)
+            continue
+
+        sizes = {name: size for name, size, _ in folder.images}
+        fills, _ = select_images(folder, placeholders_config, image_order, seed)
+        used = {fill['image'] for fill in fills}
+        report.removed_images += len(removed)
+        report.removed_bytes += sum(sizes[name] for name in removed)
+        report.avoided_images += len(removed & used)
+        report.avoided_bytes += sum(sizes[name] for name in removed & used)
+        result.append(SourceFolder(folder.name, folder.path,
+                                   [image for image in folder.images if image[0] not in removed],
+                                   folder.replacements, folder.dimensions))
+    return result, report
@@ -0,0 +1,741 @@
+"""محرك الإنتاج: إنشاء العرض من أي مصدر للمجلدات والصور دون الاعتماد على القرص
+
+يمكن استيراده كمكتبة مستقلة عن Flask:
+
+    for event in generate(template_bytes, config, folders, output='out.pptx'):
+        print(event)
+
+حيث folders مكرر كسول من أزواج (اسم المجلد، مكرر الصور)، وكل صورة زوج
+(اسم الملف، تدفق ثنائي). يتم استهلاك مجلد واحد في كل مرة، ولا تتم قراءة
+إلا الصور المستخدمة فعلاً في الشريحة.
+
+generate_multi تنشئ عدة عروض من قوالب مختلفة في مرور واحد على المجلدات.
+"""
+import hashlib
+import io
+import itertools
+import math
+import os
+import random
+from datetime import datetime
+
+from PIL import Image
+from PIL.ExifTags import TAGS
+from pptx import Presentation
+from pptx.enum.shapes import PP_PLACEHOLDER, MSO_SHAPE_TYPE
+from pptx.presentation import Presentation as PresentationDocument
+
+from admission import is_image_name
+from image_cache import image_cache_key
+from processing_log import ProcessingLog
+from tracing import NULL_TRACER
+from result_cache import normalize_zip_timestamps
+
+# ترتيب الصور داخل المجلد
+ORDER_ALPHABETICAL = 'alphabetical'
+ORDER_RANDOM = 'random'
+
+# دقة الصور بعد تصغيرها إلى حجم الموضع (نفس دقة "الطباعة" في PowerPoint)
+RENDER_DPI = 220
+EMU_PER_INCH = 914400
+JPEG_QUALITY = 90
+# إعدادات الترميز في مفتاح ذاكرة الصور المصغرة؛ تغييرها يبطل المدخلات القديمة
+RESIZE_CODEC = f'lanczos/jpeg-q{JPEG_QUALITY}/png'
+
+
+class LazyFile:
+    """ملف صورة على القرص لا يتم فتحه إلا عند أول قراءة
+
+    يسمح بتمرير مجلد يحتوي على آلاف الصور دون حجز واصف ملف لكل منها.
+    mtime_ns وقت التعديل من المسح إن وجد (فلا يحتاج تاريخ الصورة إلى stat آخر).
+    """
+
+    def __init__(self, path, mtime_ns=None):
+        self.name = path
+        self.mtime_ns = mtime_ns
+        self._file = None
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.name, 'rb')
+        return self._file
+
+    def read(self, size=-1):
+        return self._open().read(size)
+
+    def seek(self, offset, whence=0):
+        return self._open().seek(offset, whence)
+
+    def tell(self):
+        return self._open().tell()
+
+    def seekable(self):
+        return True
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def iter_folder_images(folder_path):
+    """صور مجلد على القرص كأزواج (اسم الملف، تدفق كسول)"""
+    for entry in os.scandir(folder_path):
+        if entry.is_file() and is_image_name(entry.name):
+            yield entry.name, LazyFile(entry.path)
+
+
+def analyze_slide_placeholders(prs):
+    """تحليل جميع placeholders في الشريحة الأولى مع ضبط الإحداثيات"""
+    if len(prs.slides) == 0:
+        return None
+
+    first_slide = prs.slides[0]
+    slide_width = prs.slide_width
+    slide_height = prs.slide_height
+
+    placeholders = {
+        'image_placeholders': [],
+        'text_placeholders': [],
+        'title_placeholders': [],
+        'slide_dimensions': {
+            'width': slide_width,
+            'height': slide_height,
+            'width_inches': slide_width / 914400,
+            'height_inches': slide_height / 914400
+        }
+    }
+
+    placeholder_id = 0
+    def clamp_percent(val):
+        # تأكد أن القيمة بين 0 و 100 دائماً
+        return max(0, min(val, 100))
+
+    for shape in first_slide.shapes:
+        if shape.is_placeholder:
+            placeholder_type = shape.placeholder_format.type
+            left_percent = clamp_percent((shape.left / slide_width) * 100)
+            top_percent = clamp_percent((shape.top / slide_height) * 100)
+            width_percent = clamp_percent((shape.width / slide_width) * 100)
+            height_percent = clamp_percent((shape.height / slide_height) * 100)
+            placeholder_info = {
+                'id': placeholder_id,
+                'type': placeholder_type,
+                'left': shape.left,
+                'top': shape.top,
+                'width': shape.width,
+                'height': shape.height,
+                'left_percent': left_percent,
+                'top_percent': top_percent,
+                'width_percent': width_percent,
+                'height_percent': height_percent,
+                'rotation': getattr(shape, 'rotation', 0)
+            }
+            if placeholder_type == PP_PLACEHOLDER.PICTURE:
+                placeholder_info['current_content'] = "صورة"
+                placeholders['image_placeholders'].append(placeholder_info)
+            elif placeholder_type == PP_PLACEHOLDER.TITLE:
+                placeholder_info['current_content'] = shape.text_frame.text if hasattr(shape, 'text_frame') and shape.text_frame.text else "العنوان"
+                placeholders['title_placeholders'].append(placeholder_info)
+            else:
+                if hasattr(shape, 'text_frame') and shape.text_frame:
+                    placeholder_info['current_content'] = shape.text_frame.text if shape.text_frame.text else f"نص {placeholder_id + 1}"
+                    placeholders['text_placeholders'].append(placeholder_info)
+            placeholder_id += 1
+    for shape in first_slide.shapes:
+        if shape.shape_type == MSO_SHAPE_TYPE.PICTURE and not shape.is_placeholder:
+            left_percent = clamp_percent((shape.left / slide_width) * 100)
+            top_percent = clamp_percent((shape.top / slide_height) * 100)
+            width_percent = clamp_percent((shape.width / slide_width) * 100)
+            height_percent = clamp_percent((shape.height / slide_height) * 100)
+            image_info = {
+                'id': placeholder_id,
+                'type': 'regular_image',
+                'left': shape.left,
+                'top': shape.top,
+                'width': shape.width,
+                'height': shape.height,
+                'left_percent': left_percent,
+                'top_percent': top_percent,
+                'width_percent': width_percent,
+                'height_percent': height_percent,
+                'rotation': getattr(shape, 'rotation', 0),
+                'current_content': "صورة موجودة"
+            }
+            placeholders['image_placeholders'].append(image_info)
+            placeholder_id += 1
+    return placeholders
+
+
+def get_image_date(image, fallback_path=None, fallback_mtime_ns=None):
+    """استخراج تاريخ التقاط الصورة من metadata
+
+    image مسار أو تدفق؛ عند غياب EXIF يستخدم fallback_mtime_ns (وقت التعديل
+    من المسح) أو تاريخ تعديل fallback_path إن وجد.
+    """
+    if fallback_path is None and isinstance(image, str):
+        fallback_path = image
+    try:
+        with Image.open(image) as img:
+            exifdata = img.getexif()
+            for tag_id in exifdata:
+                tag = TAGS.get(tag_id, tag_id)
+                data = exifdata.get(tag_id)
+
+                if tag in ['DateTime', 'DateTimeOriginal', 'DateTimeDigitized']:
+                    try:
+                        date_obj = datetime.strptime(str(data), '%Y:%m:%d %H:%M:%S')
+                        return date_obj.strftime('%Y-%m-%d')
+                    except:
+                        continue
+
+        if fallback_mtime_ns is not None:
+            timestamp = fallback_mtime_ns / 1e9
+        else:
+            timestamp = os.path.getmtime(fallback_path)
+        return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d')
+    except:
+        return datetime.now().strftime('%Y-%m-%d')
+
+
+def placeholder_pixels(width, height):
+    """حجم الموضع بالبكسل بدقة RENDER_DPI (العرض والارتفاع بوحدة EMU)"""
+    return (math.ceil(width / EMU_PER_INCH * RENDER_DPI), math.ceil(height / EMU_PER_INCH * RENDER_DPI))
+
+
+def configured_image_sizes(placeholders_config):
+    """أحجام مواضع الصور المستخدمة في الإعدادات بالبكسل، دون تكرار"""
+    sizes = set()
+    for config in placeholders_config.get('images', {}).values():
+        info = config.get('placeholder_info') or {}
+        if config.get('use') and info.get('width') and info.get('height'):
+            sizes.add(placeholder_pixels(info['width'], info['height']))
+    return sorted(sizes)
+
+
+def uses_image_dates(placeholders_config):
+    """هل يقرأ أي نص في الإعدادات تاريخ الصورة (EXIF)"""
+    return any(config.get('type') == "تاريخ الصورة" for config in placeholders_config.get('texts', {}).values())
+
+
+def order_images(images, folder_name, image_order=ORDER_ALPHABETICAL, seed=''):
+    """ترتيب صور المجلد؛ الترتيب العشوائي ثابت لنفس البذرة واسم المجلد"""
+    images = sorted(images, key=lambda item: item[0])
+    if image_order == ORDER_RANDOM:
+        random.Random(f"{seed}:{folder_name}").shuffle(images)
+    return images
+
+
+def close_streams(images):
+    for _, stream in images:
+        close = getattr(stream, 'close', None)
+        if close:
+            try:
+                close()
+            except Exception:
+                pass
+
+
+class FolderImages:
+    """صور مجلد واحد مرتبة: كل صورة تقرأ مرة واحدة عند أول استخدام
+
+    يمكن مشاركتها بين شرائح عدة قوالب. مع fit=True يتم فك ترميز الصورة مرة
+    واحدة وتصغيرها مرة واحدة لكل حجم موضع مختلف (بدقة RENDER_DPI)، ثم يعاد
+    استخدام الناتج في كل العروض التي لها الحجم نفسه. الصورة الأصغر من الموضع
+    تستخدم كما هي. مع cache (ImageCache) يتم البحث عن الصورة المصغرة في ذاكرة
+    القرص قبل فك ترميزها، فلا تعاد معالجة الصور نفسها بين المهام.
+    """
+
+    def __init__(self, images, fit=False, cache=None):
+        self.images = images
+        self.fit = fit
+        self.cache = cache
+        self.counters = {'reads': 0, 'decodes': 0, 'resizes': 0}
+        self._bytes = {}
+        self._digests = {}
+        self._opened = {}
+        self._loaded = set()
+        self._fitted = {}
+
+    def __len__(self):
+        return len(self.images)
+
+    def __getitem__(self, index):
+        return self.images[index]
+
+    def read(self, index):
+        if index not in self._bytes:
+            self._bytes[index] = self.images[index][1].read()
+            self.counters['reads'] += 1
+        return self._bytes[index]
+
+    def digest(self, index):
+        if index not in self._digests:
+            self._digests[index] = hashlib.sha256(self.read(index)).hexdigest()
+        return self._digests[index]
+
+    def _open(self, index):
+        """الصورة مفتوحة دون فك ترميز البكسلات (الأبعاد من الترويسة فقط)"""
+        if index not in self._opened:
+            self._opened[index] = Image.open(io.BytesIO(self.read(index)))
+        return self._opened[index]
+
+    def _decode(self, index):
+        img = self._open(index)
+        if index not in self._loaded:
+            img.load()
+            self._loaded.add(index)
+            self.counters['decodes'] += 1
+        return img
+
+    def picture(self, index, width, height):
+        """بايتات الصورة لموضع بحجم width × height (EMU)"""
+        if not self.fit or not width or not height:
+            return self.read(index)
+        size = placeholder_pixels(width, height)
+        key = (index, size)
+        if key not in self._fitted:
+            self._fitted[key] = self._cached_resize(index, size)
+        return self._fitted[key]
+
+    def _cached_resize(self, index, size):
+        if self.cache is None:
+            return self._resize(index, size)
+        cache_key = image_cache_key(self.digest(index), size, RESIZE_CODEC)
+        data = self.cache.get(cache_key)
+        if data is None:
+            data = self._resize(index, size)
+            # الصورة الأصغر من الموضع تستخدم كما هي، فلا داعي لنسخها في الذاكرة
+            if data is not self.read(index):
+                self.cache.put(cache_key, data)
+        return data
+
+    def _resize(self, index, size):
+        img = self._open(index)
+        # التصغير يحافظ على نسبة الأبعاد ويغطي الموضع كاملاً، فيبقى القص كما هو
+        scale = max(size[0] / img.width, size[1] / img.height)
+        if scale >= 1:
+            return self.read(index)
+
+        img = self._decode(index)
+        source_format = img.format
+        exif = img.info.get('exif')
+        if img.mode in ('1', 'P'):
+            img = img.convert('RGBA')
+        resized = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))),
+                             Image.LANCZOS)
+        self.counters['resizes'] += 1
+
+        buffer = io.BytesIO()
+        if source_format == 'JPEG':
+            resized.save(buffer, format='JPEG', quality=JPEG_QUALITY, **({'exif': exif} if exif else {}))
+        else:
+            resized.save(buffer, format='PNG')
+        return buffer.getvalue()
+
+    def close(self):
+        close_streams(self.images)
+        self._opened.clear()
+
+
+def apply_configured_placeholders(slide, images, folder_name, slide_analysis, placeholders_config, log,
+                                  tracer=None):
+    """تطبيق الإعدادات المحددة على الشريحة
+
+    images كائن FolderImages أو قائمة مرتبة من (اسم الصورة، تدفق)؛ تتم قراءة
+    الصورة فقط إذا استخدمت في أحد المواضع أو كمصدر للتاريخ.
+    """
+    if not isinstance(images, FolderImages):
+        images = FolderImages(images)
+    image_bytes = images.read
+    tracer = tracer or NULL_TRACER
+
+    # تطبيق إعدادات الصور
+    image_config = placeholders_config.get('images', {})
+
+    for config_key, config in image_config.items():
+        if config['use'] and config['order'] and config['order'] <= len(images):
+            image_name = images[config['order'] - 1][0]
+            placeholder_info = config['placeholder_info']
+
+            # العثور على الشكل المقابل في الشريحة الجديدة
+            target_shapes = []
+            for shape in slide.shapes:
+                if shape.is_placeholder and shape.placeholder_format.type == PP_PLACEHOLDER.PICTURE:
+                    target_shapes.append(shape)
+                elif shape.shape_type == MSO_SHAPE_TYPE.PICTURE and not shape.is_placeholder:
+                    target_shapes.append(shape)
+
+            # مطابقة الشكل بناءً على الموقع
+            for shape in target_shapes:
+                shape_left_percent = (shape.left / slide_analysis['slide_dimensions']['width']) * 100
+                shape_top_percent = (shape.top / slide_analysis['slide_dimensions']['height']) * 100
+
+                # تحمل اختلاف بسيط في الموقع
+                if (abs(shape_left_percent - placeholder_info['left_percent']) < 5 and
+                    abs(shape_top_percent - placeholder_info['top_percent']) < 5):
+
+                    try:
+                        with tracer.span('insert picture', 'image', image=image_name, order=config['order']):
+                            image_file = io.BytesIO(images.picture(config['order'] - 1, shape.width, shape.height))
+                            if shape.is_placeholder:
+                                shape.insert_picture(image_file)
+                            else:
+                                # استبدال الصورة العادية
+                                original_left = shape.left
+                                original_top = shape.top
+                                original_width = shape.width
+                                original_height = shape.height
+
+                                shape_element = shape._element
+                                shape_element.getparent().remove(shape_element)
+
+                                slide.shapes.add_picture(image_file, original_left, original_top, original_width, original_height)
+
+                        log.add(f"✅ تم استبدال الصورة {config['order']}: {os.path.basename(image_name)}", "success")
+                        break
+                    except Exception as e:
+                        log.add(f"❌ فشل في استبدال الصورة: {e}", "error")
+
+    # تطبيق إعدادات النصوص
+    text_config = placeholders_config.get('texts', {})
+
+    text_shapes = []
+    for shape in slide.shapes:
+        if (shape.is_placeholder and
+            shape.placeholder_format.type not in [PP_PLACEHOLDER.PICTURE, PP_PLACEHOLDER.TITLE] and
+            hasattr(shape, 'text_frame') and shape.text_frame):
+            text_shapes.append(shape)
+
+    text_index = 0
+    for config_key, config in text_config.items():
+        if text_index < len(text_shapes):
+            shape = text_shapes[text_index]
+
+            try:
+                if config['type'] == "ترك فارغ":
+                    shape.text_frame.text = ""
+
+                elif config['type'] == "نص ثابت":
+                    if config['value']:
+                        shape.text_frame.text = config['value']
+
+                elif config['type'] == "تاريخ":
+                    if config['value'] == "today":
+                        date_text = datetime.now().strftime('%Y-%m-%d')
+                    else:
+                        date_text = config['value']
+                    shape.text_frame.text = date_text
+
+                elif config['type'] == "تاريخ الصورة" and images:
+                    with tracer.span('read image date', 'image', image=images[0][0]):
+                        image_date = get_image_date(
+                            io.BytesIO(image_bytes(0)),
+                            fallback_path=getattr(images[0][1], 'name', None),
+                            fallback_mtime_ns=getattr(images[0][1], 'mtime_ns', None)
+                        )
+                    shape.text_frame.text = image_date
+
+                elif config['type'] == "اسم المجلد":
+                    shape.text_frame.text = folder_name
+
+                log.add(f"✅ تم تطبيق النص: {config['type']}", "success")
+
+            except Exception as e:
+                log.add(f"⚠ خطأ في تطبيق النص: {e}", "warning")
+
+            text_index += 1
+
+    # تطبيق العنوان (اسم المجلد)
+    title_shapes = [
+        shape for shape in slide.shapes
+        if shape.is_placeholder and shape.placeholder_format.type == PP_PLACEHOLDER.TITLE
+    ]
+
+    if title_shapes:
+        title_shapes[0].text = folder_name
+        log.add(f"✅ تم تحديث العنوان: {folder_name}", "success")
+
+
+def load_template(template):
+    """القالب كبايتات أو مسار أو تدفق أو كائن Presentation جاهز"""
+    if isinstance(template, PresentationDocument):
+        return template
+    if isinstance(template, (bytes, bytearray)):
+        return Presentation(io.BytesIO(template))
+    return Presentation(template)
+
+
+def collect_images(folder_images):
+    """استهلاك مكرر صور مجلد واحد مع إغلاق ما ليس صورة"""
+    images = []
+    for image_name, stream in folder_images:
+        if is_image_name(image_name):
+            images.append((image_name, stream))
+        else:
+            close_streams([(image_name, stream)])
+    return images
+
+
+def log_image_order(folder_name, image_order, log):
+    if image_order == ORDER_RANDOM:
+        log.add(f"🔀 تم ترتيب صور المجلد {folder_name} عشوائياً", "info")
+    else:
+        log.add(f"📋 تم ترتيب صور المجلد {folder_name} أبجدياً", "info")
+
+
+def add_folder_slide(prs, slide_layout, folder_name, images, slide_analysis, config, log, tracer=None):
+    """إضافة شريحة لمجلد صوره مرتبة مسبقاً (FolderImages) في نهاية العرض"""
+    new_slide = prs.slides.add_slide(slide_layout)
+
+    apply_configured_placeholders(
+        new_slide,
+        images,
+        folder_name,
+        slide_analysis,
+        config,
+        log,
+        tracer
+    )
+
+    log.add(f"✅ تم إنشاء شريحة للمجلد '{folder_name}' مع {len(images)} صورة", "success")
+    return new_slide
+
+
+def build_folder_slide(prs, slide_layout, folder_name, images, slide_analysis, config,
+                       image_order=ORDER_ALPHABETICAL, seed='', log=None, tracer=None):
+    """إضافة شريحة لمجلد واحد في نهاية العرض وإرجاعها (يغلق تدفقات الصور)"""
+    log = log if log is not None else ProcessingLog()
+    try:
+        images = FolderImages(order_images(images, folder_name, image_order, seed))
+        log_image_order(folder_name, image_order, log)
+        return add_folder_slide(prs, slide_layout, folder_name, images, slide_analysis, config, log, tracer)
+    finally:
+        close_streams(images)
+
+
+def remove_slide(prs, slide):
+    """حذف شريحة من العرض مع علاقتها، ثم إعادة ترقيم أجزاء الشرائح"""
+    slide_ids = prs.slides._sldIdLst
+    for slide_id in list(slide_ids):
+        if prs.part.related_part(slide_id.rId) is slide.part:
+            slide_ids.remove(slide_id)
+            prs.part.drop_rel(slide_id.rId)
+            break
+    prs.part.rename_slide_parts([slide_id.rId for slide_id in slide_ids])
+
+
+def move_slide(prs, slide, position):
+    """نقل شريحة إلى الموضع المحدد (يبدأ من 0)"""
+    slide_ids = prs.slides._sldIdLst
+    for slide_id in list(slide_ids):
+        if prs.part.related_part(slide_id.rId) is slide.part:
+            slide_ids.remove(slide_id)
+            slide_ids.insert(position, slide_id)
+            break
+    prs.part.rename_slide_parts([slide_id.rId for slide_id in slide_ids])
+
+
+def save_presentation(prs, output):
+    """حفظ العرض؛ عند الحفظ في مسار يتم تثبيت التواريخ حتى تتطابق النتيجة لنفس المدخلات"""
+    prs.save(output)
+    if isinstance(output, str):
+        normalize_zip_timestamps(output)
+
+
+def generate(template, config, folders, output=None, slide_analysis=None,
+             image_order=ORDER_ALPHABETICAL, seed='', skip_empty_folders=True, log=None,
+             checkpoint=None, check=None, tracer=None):
+    """إنشاء شريحة لكل مجلد وإرجاع أحداث التقدم أثناء العمل
+
+    يعيد مولداً يصدر حدثاً لكل مجلد:
+        {'event': 'folder', 'index', 'folder', 'images', 'created'}
+    ثم حدثاً أخيراً بعد الحفظ:
+        {'event': 'done', 'stats', 'output'}
+    إذا لم يحدد output يحتوي الحدث الأخير على الكائن 'presentation' بدلاً من حفظه.
+
+    مع checkpoint (انظر checkpoint.py) يتم حفظ العرض دورياً، وإذا وجدت نقطة حفظ
+    سابقة يتم تخطي المجلدات المكتملة فيها وإصدار {'event': 'resumed', 'index'} أولاً.
+    check تستدعى قبل كل مجلد وترفع استثناءً لإيقاف الإنشاء (الإلغاء أو انتهاء المهلة).
+    tracer (انظر tracing.py) يسجل فترات تحميل القالب وكل شريحة وكل صورة والحفظ.
+
+    ترفع ValueError إذا كان القالب بلا شرائح أو لم يحتوِ أي مجلد على صور.
+    """
+    log = log if log is not None else ProcessingLog()
+    tracer = tracer or NULL_TRACER
+    resumed = checkpoint.restore() if checkpoint else None
+    with tracer.span('load template'):
+        prs = load_template(resumed['deck'] if resumed else template)
+
+    if len(prs.slides) == 0:
+        raise ValueError('لا توجد شرائح في ملف PowerPoint')
+    if slide_analysis is None:
+        slide_analysis = analyze_slide_placeholders(prs)
+
+    slide_layout = prs.slides[0].slide_layout
+
+    processed_folders = 0
+    total_processed = 0
+    created_slides = 0
+    folders = iter(folders)
+    start = 1
+
+    if resumed:
+        # المجلدات المكتملة موجودة في عرض نقطة الحفظ؛ يتم تجاوزها دون قراءة صورها
+        for _ in itertools.islice(folders, resumed['folders']):
+            pass
+        created_slides = resumed['stats']['created_slides']
+        processed_folders = resumed['stats']['processed_folders']
+        total_processed = resumed['stats']['total_images']
+        start = resumed['folders'] + 1
+        log.add(f"↩ تم استئناف المهمة من نقطة الحفظ بعد {resumed['folders']} مجلد", "info")
+        yield {'event': 'resumed', 'index': resumed['folders']}
+
+    for index, (folder_name, folder_images) in enumerate(folders, start):
+        if check:
+            check()
+        images = collect_images(folder_images)
+
+        created = False
+        if not images:
+            if not skip_empty_folders:
+                log.add(f"⚠ المجلد '{folder_name}' فارغ من الصور", "warning")
+        else:
+            processed_folders += 1
+            try:
+                with tracer.span('build slide', 'folder', folder=folder_name, images=len(images)):
+                    build_folder_slide(prs, slide_layout, folder_name, images, slide_analysis,
+                                       config, image_order, seed, log, tracer)
+                created_slides += 1
+                created = True
+                total_processed += len(images)
+            except Exception as e:
+                log.add(f"❌ خطأ في معالجة المجلد {folder_name}: {str(e)}", "error")
+
+        if checkpoint and checkpoint.due():
+            try:
+                with tracer.span('save checkpoint', folders=index):
+                    checkpoint.save(prs, index, {
+                        'created_slides': created_slides,
+                        'processed_folders': processed_folders,
+                        'total_images': total_processed
+                    })
+            except OSError as e:
+                log.add(f"⚠ تعذر حفظ نقطة الاستئناف: {e}", "warning")
+
+        yield {
+            'event': 'folder',
+            'index': index,
+            'folder': folder_name,
+            'images': len(images),
+            'created': created
+        }
+
+    if not processed_folders:
+        raise ValueError('لا توجد مجلدات تحتوي على صور.')
+
+    done = {
+        'event': 'done',
+        'stats': {
+            'created_slides': created_slides,
+            'processed_folders': processed_folders,
+            'total_images': total_processed
+        },
+        'output': output
+    }
+    if output is None:
+        done['presentation'] = prs
+    else:
+        with tracer.span('save'):
+            save_presentation(prs, output)
+    yield done
+
+
+def generate_multi(targets, folders, image_order=ORDER_ALPHABETICAL, seed='', skip_empty_folders=True,
+                   log=None, check=None, image_cache=None, tracer=None):
+    """إنشاء عدة عروض من قوالب وإعدادات مختلفة في مرور واحد على المجلدات
+
+    targets قائمة قواميس {'template', 'config', 'output'، واختيارياً 'slide_analysis' و'name'}.
+    صور كل مجلد تقرأ مرة واحدة وتفك مرة واحدة وتصغر مرة واحدة لكل حجم موضع
+    مختلف، ثم تستخدم في شرائح كل القوالب (انظر FolderImages). image_cache
+    (ImageCache) ذاكرة اختيارية على القرص للصور المصغرة بين المهام.
+
+    الأحداث مثل generate، والحدث الأخير:
+        {'event': 'done', 'stats': [إحصائيات كل عرض], 'outputs', 'images': عدادات القراءة والتصغير}
+    إذا لم يحدد output لعرض ما يحتوي الحدث الأخير على 'presentations' بدلاً من حفظه.
+    """
+    log = log if log is not None else ProcessingLog()
+    tracer = tracer or NULL_TRACER
+    decks = []
+    for number, target in enumerate(targets, 1):
+        with tracer.span('load template', template=number):
+            prs = load_template(target['template'])
+        if len(prs.slides) == 0:
+            raise ValueError(f"لا توجد شرائح في ملف PowerPoint رقم {number}")
+        decks.append({
+            'name': target.get('name') or f'template_{number}',
+            'prs': prs,
+            'layout': prs.slides[0].slide_layout,
+            'analysis': target.get('slide_analysis') or analyze_slide_placeholders(prs),
+            'config': target['config'],
+            'stats': {'created_slides': 0, 'processed_folders': 0, 'total_images': 0}
+        })
+
+    processed_folders = 0
+    counters = {'reads': 0, 'decodes': 0, 'resizes': 0}
+
+    for index, (folder_name, folder_images) in enumerate(folders, 1):
+        if check:
+            check()
+        images = collect_images(folder_images)
+
+        created = 0
+        if not images:
+            if not skip_empty_folders:
+                log.add(f"⚠ المجلد '{folder_name}' فارغ من الصور", "warning")
+        else:
+            processed_folders += 1
+            shared = FolderImages(order_images(images, folder_name, image_order, seed), fit=True,
+                                  cache=image_cache)
+            try:
+                log_image_order(folder_name, image_order, log)
+                for deck in decks:
+                    deck['stats']['processed_folders'] += 1
+                    try:
+                        with tracer.span('build slide', 'folder', folder=folder_name, template=deck['name']):
+                            add_folder_slide(deck['prs'], deck['layout'], folder_name, shared,
+                                             deck['analysis'], deck['config'], log, tracer)
+                        deck['stats']['created_slides'] += 1
+                        deck['stats']['total_images'] += len(shared)
+                        created += 1
+                    except Exception as e:
+                        log.add(f"❌ خطأ في معالجة المجلد {folder_name} ({deck['name']}): {str(e)}", "error")
+            finally:
+                for key in counters:
+                    counters[key] += shared.counters[key]
+                shared.close()
+
+        yield {
+            'event': 'folder',
+            'index': index,
+            'folder': folder_name,
+            'images': len(images),
+            'created': created
+        }
+
+    if not processed_folders:
+        raise ValueError('لا توجد مجلدات تحتوي على صور.')
+
+    done = {
+        'event': 'done',
+        'stats': [deck['stats'] for deck in decks],
+        'outputs': [target.get('output') for target in targets],
+        'images': counters
+    }
+    for deck, target in zip(decks, targets):
+        if target.get('output') is not None:
+            with tracer.span('save', template=deck['name']):
+                save_presentation(deck['prs'], target['output'])
+    if any(target.get('output') is None for target in targets):
+        done['presentations'] = [deck['prs'] for deck in decks]
+    yield done
@@ -0,0 +1,27 @@
+"""إعدادات gunicorn لتشغيل التطبيق في بيئة الإنتاج
+
+التطبيق يُحمّل ويُجهّز مرة واحدة في العملية الرئيسية (preload_app) ثم يتم
+إنشاء العمال منها، فتتشارك العمال المكتبات المحمّلة بدلاً من تحميلها في كل عامل.
+"""
+import os
+
+bind = os.environ.get('PPTX_BIND', '0.0.0.0:5000')
+
+# حالة الجلسات والمهام محفوظة في ذاكرة العامل، لذلك عند زيادة عدد العمال
+# يجب توجيه كل جلسة إلى نفس العامل (sticky sessions) من موازن الأحمال.
+workers = int(os.environ.get('PPTX_WEB_WORKERS', 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('PPTX_WEB_THREADS', 8))
+
+preload_app = True
+timeout = int(os.environ.get('PPTX_WEB_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+
+# إعادة تدوير العامل بعد عدد من الطلبات للحد من تراكم الذاكرة (معطلة افتراضياً
+# لأن إعادة التدوير تفقد الجلسات والمهام الجارية في ذاكرة العامل)
+max_requests = int(os.environ.get('PPTX_WEB_MAX_REQUESTS', 0))
+max_requests_jitter = 100 if max_requests else 0
+
+accesslog = '-'
+errorlog = '-'
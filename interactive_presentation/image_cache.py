@@ -0,0 +1,150 @@
+"""ذاكرة على القرص للصور المصغرة، مشتركة بين المهام
+
+مفتاح كل مدخل هو بصمة محتوى الصورة الأصلية مع الحجم المطلوب بالبكسل وإعدادات
+الترميز، فتعاد الصورة المصغرة نفسها عند إعادة معالجة الصور نفسها للمواضع نفسها
+دون فك ترميزها أو تصغيرها من جديد.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+
+MB = 1024 * 1024
+
+ENTRY_SUFFIX = '.img'
+
+
+def image_cache_key(source_digest, size, codec):
+    """مفتاح الصورة المصغرة: بصمة الأصل والحجم (عرض، ارتفاع) وإعدادات الترميز"""
+    digest = hashlib.sha256()
+    digest.update(source_digest.encode('ascii'))
+    digest.update(f'\0{size[0]}x{size[1]}\0{codec}'.encode('ascii'))
+    return digest.hexdigest()
+
+
+class ImageCache:
+    """ذاكرة LRU على القرص للصور المصغرة مع حد أقصى للحجم وعدادات الإصابة
+
+    مثل ResultCache: يتم تحديث وقت تعديل الملف عند كل قراءة وحذف الأقدم
+    استخداماً عند تجاوز الحد، والكتابة في ملف مؤقت ثم إعادة تسمية ذرية حتى
+    تكون آمنة بين عدة عمليات. المدخلات موزعة على مجلدات فرعية حسب أول حرفين
+    من المفتاح، والحجم الكلي محفوظ تقريبياً في الذاكرة فلا يتم مسح المجلد
+    إلا عند تجاوز الحد.
+    """
+
+    def __init__(self, root, max_bytes=512 * MB):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        os.makedirs(root, exist_ok=True)
+        self._size = self.size()
+
+    @classmethod
+    def from_env(cls, environ=None):
+        environ = os.environ if environ is None else environ
+        root = environ.get('PPTX_IMAGE_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'pptx_image_cache')
+        return cls(root, max_bytes=int(environ.get('PPTX_IMAGE_CACHE_MAX_MB', 512)) * MB)
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key + ENTRY_SUFFIX)
+
+    def get(self, key):
+        """بايتات الصورة المصغرة أو None"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key, data):
+        """حفظ الصورة المصغرة ثم تطبيق حد الحجم
+
+        إذا كتبت عمليتان المفتاح نفسه في الوقت نفسه فالمحتوى متطابق، وآخر
+        إعادة تسمية تفوز دون أن يرى القارئ ملفاً ناقصاً.
+        """
+        path = self._path(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        with self._lock:
+            self.stores += 1
+            self._size += len(data)
+            over = self._size > self.max_bytes
+        if over:
+            self.evict()
+
+    def _entries(self):
+        entries = []
+        try:
+            shards = [entry.path for entry in os.scandir(self.root) if entry.is_dir()]
+        except OSError:
+            return entries
+        for shard in shards:
+            try:
+                with os.scandir(shard) as it:
+                    for entry in it:
+                        if entry.name.endswith(ENTRY_SUFFIX):
+                            try:
+                                stat = entry.stat()
+                            except OSError:
+                                continue
+                            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            except OSError:
+                continue
+        return entries
+
+    def size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """حذف الأقدم استخداماً حتى يصبح الحجم ضمن الحد"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+            with self._lock:
+                self.evictions += 1
+        with self._lock:
+            self._size = total
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'stores': self.stores,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'size_bytes': self.size(),
+                'max_bytes': self.max_bytes
+            }
@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""اختبار الحمل لمسارات التطبيق دون أي خدمة خارجية
+
+    python loadtest.py --users 1,5,10,20 --duration 30
+    python loadtest.py --url http://localhost:5000 --server-pid 1234 --users 20 --json report.json
+
+كل مستخدم افتراضي له جلسته الخاصة ويكرر السيناريو: رفع قالب اصطناعي، حفظ
+الإعدادات، رفع ملف ZIP اصطناعي، متابعة المهمة حتى تنتهي، ثم تحميل الناتج.
+يتم رفع عدد المستخدمين على مراحل، ولكل مرحلة يتم حساب زمن الاستجابة
+(p50/p95/p99) لكل مسار، والإنتاجية، ونسبة الأخطاء، مع قياس ذاكرة الخادم (RSS)
+على فترات. بدون --url يتم تشغيل التطبيق داخل العملية نفسها.
+"""
+import argparse
+import http.cookiejar
+import io
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+import zipfile
+
+from PIL import Image
+from pptx import Presentation
+
+JOB_POLL_INTERVAL = 0.1
+JOB_FINISHED = ('done', 'failed', 'cancelled')
+
+
+def percentile(values, q):
+    """النسبة المئوية q (0-100) بطريقة الرتبة الأقرب"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+
+def read_rss(pid=None):
+    """ذاكرة العملية المقيمة بالبايت من /proc، أو None إذا لم تكن متاحة"""
+    try:
+        with open(f"/proc/{pid or 'self'}/status") as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def make_template():
+    prs = Presentation()
+    prs.slides.add_slide(prs.slide_layouts[8])
+    buffer = io.BytesIO()
+    prs.save(buffer)
+    return buffer.getvalue()
+
+
+def make_archive(folders, images_per_folder, image_size, rng):
+    """ملف ZIP اصطناعي بألوان عشوائية، فلا تخدمه ذاكرة النتائج من طلب سابق"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as zf:
+        for i in range(folders):
+            for j in range(images_per_folder):
+                image = io.BytesIO()
+                color = tuple(rng.randrange(256) for _ in range(3))
+                Image.new('RGB', image_size, color).save(image, format='JPEG')
+                zf.writestr(f'folder_{i}/photo_{j}.jpg', image.getvalue())
+    return buffer.getvalue()
+
+
+def encode_multipart(fields, files):
+    """ترميز multipart/form-data لـ urllib؛ files قاموس من الاسم إلى (اسم الملف، البايتات)"""
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    for name, value in fields.items():
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+                   .encode('utf-8'))
+    for name, (filename, data) in files.items():
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                   f'Content-Type: application/octet-stream\r\n\r\n'.encode('utf-8'))
+        body.write(data)
+        body.write(b'\r\n')
+    body.write(f'--{boundary}--\r\n'.encode('utf-8'))
+    return body.getvalue(), f'multipart/form-data; boundary={boundary}'
+
+
+class InProcessClient:
+    """جلسة مستخدم على تطبيق Flask داخل العملية نفسها"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, json_body=None, fields=None, files=None):
+        if files is not None:
+            data = dict(fields or {})
+            data.update({name: (io.BytesIO(content), filename) for name, (filename, content) in files.items()})
+            response = self.client.open(path, method=method, data=data, content_type='multipart/form-data')
+        else:
+            response = self.client.open(path, method=method, json=json_body)
+        return response.status_code, response.data
+
+
+class HttpClient:
+    """جلسة مستخدم على خادم يعمل (مثل localhost) مع ملفات تعريف الارتباط الخاصة بها"""
+
+    def __init__(self, base_url, timeout=300):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def request(self, method, path, json_body=None, fields=None, files=None):
+        headers = {}
+        data = None
+        if files is not None:
+            data, headers['Content-Type'] = encode_multipart(fields or {}, files)
+        elif json_body is not None:
+            data = json.dumps(json_body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        request = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+
+class Recorder:
+    """أزمنة الاستجابة والأخطاء لكل مسار في المرحلة الحالية (آمن بين الخيوط)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.scenarios = 0
+
+    def add(self, name, seconds, ok):
+        with self._lock:
+            self.latencies.setdefault(name, []).append(seconds)
+            if not ok:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+    def scenario_done(self):
+        with self._lock:
+            self.scenarios += 1
+
+    def report(self, elapsed):
+        with self._lock:
+            endpoints = {}
+            for name, values in sorted(self.latencies.items()):
+                errors = self.errors.get(name, 0)
+                endpoints[name] = {
+                    'requests': len(values),
+                    'errors': errors,
+                    'error_rate': errors / len(values),
+                    'p50_ms': percentile(values, 50) * 1000,
+                    'p95_ms': percentile(values, 95) * 1000,
+                    'p99_ms': percentile(values, 99) * 1000,
+                    'throughput_rps': len(values) / elapsed if elapsed else 0.0
+                }
+            total = sum(len(values) for values in self.latencies.values())
+            errors = sum(self.errors.values())
+            return {
+                'elapsed_s': elapsed,
+                'scenarios': self.scenarios,
+                'scenarios_per_s': self.scenarios / elapsed if elapsed else 0.0,
+                'requests': total,
+                'error_rate': errors / total if total else 0.0,
+                'endpoints': endpoints
+            }
+
+
+class RssSampler:
+    """قياس ذاكرة الخادم على فترات في خيط منفصل"""
+
+    def __init__(self, pid=None, interval=0.5):
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self._started = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            rss = read_rss(self.pid)
+            if rss is not None:
+                self.samples.append({'t': round(time.monotonic() - self._started, 3), 'rss_bytes': rss})
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+
+class Scenario:
+    """سيناريو المستخدم: القالب ثم الإعدادات ثم ZIP ثم متابعة المهمة ثم التحميل"""
+
+    def __init__(self, template, folders=3, images_per_folder=2, image_size=(640, 480), seed=None):
+        self.template = template
+        self.folders = folders
+        self.images_per_folder = images_per_folder
+        self.image_size = image_size
+        self.seed = seed
+
+    def timed(self, recorder, name, call, expect=200):
+        started = time.monotonic()
+        try:
+            status, body = call()
+        except Exception:
+            recorder.add(name, time.monotonic() - started, False)
+            return None
+        ok = status == expect
+        if ok and body[:1] == b'{':
+            ok = json.loads(body).get('success', True)
+        recorder.add(name, time.monotonic() - started, ok)
+        return body if ok else None
+
+    def run(self, client, recorder, rng):
+        self.timed(recorder, 'GET /', lambda: client.request('GET', '/'))
+        body = self.timed(recorder, 'POST /upload-pptx', lambda: client.request(
+            'POST', '/upload-pptx', files={'pptx_file': ('template.pptx', self.template)}))
+        if body is None:
+            return False
+
+        analysis = json.loads(body)['slide_analysis']
+        config = {
+            'images': {f"image_{p['id']}": {'use': True, 'order': 1, 'placeholder_info': p}
+                       for p in analysis['image_placeholders']},
+            'texts': {f"text_{p['id']}": {'type': 'اسم المجلد', 'value': 'folder_name'}
+                      for p in analysis['text_placeholders']}
+        }
+        if self.timed(recorder, 'POST /save-config',
+                      lambda: client.request('POST', '/save-config', json_body=config)) is None:
+            return False
+
+        archive = make_archive(self.folders, self.images_per_folder, self.image_size, rng)
+        submitted = time.monotonic()
+        body = self.timed(recorder, 'POST /upload-zip', lambda: client.request(
+            'POST', '/upload-zip', files={'zip_file': ('photos.zip', archive)}))
+        if body is None:
+            return False
+
+        result = json.loads(body)
+        while result.get('status') not in JOB_FINISHED:
+            time.sleep(JOB_POLL_INTERVAL)
+            body = self.timed(recorder, 'GET /jobs/<id>',
+                              lambda: client.request('GET', f"/jobs/{result['job_id']}"), expect=200)
+            if body is None:
+                recorder.add('job', time.monotonic() - submitted, False)
+                return False
+            result = json.loads(body)
+        # زمن المهمة كاملة من الرفع حتى انتهاء الإنشاء (بما فيه الانتظار في الطابور)
+        recorder.add('job', time.monotonic() - submitted, result['status'] == 'done')
+        if result['status'] != 'done':
+            return False
+
+        return self.timed(recorder, 'GET /download/<filename>', lambda: client.request(
+            'GET', f"/download/{result['output_filename']}")) is not None
+
+
+def run_stage(make_client, scenario, users, duration=None, iterations=None, seed=0):
+    """تشغيل users مستخدماً متزامناً حتى انتهاء المدة أو عدد التكرارات لكل مستخدم"""
+    recorder = Recorder()
+    deadline = time.monotonic() + duration if duration else None
+
+    def user(number):
+        client = make_client()
+        rng = random.Random(f'{seed}:{number}')
+        done = 0
+        while (iterations is None or done < iterations) and (deadline is None or time.monotonic() < deadline):
+            scenario.run(client, recorder, rng)
+            recorder.scenario_done()
+            done += 1
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=user, args=(number,), daemon=True) for number in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder.report(time.monotonic() - started)
+
+
+def run_load_test(make_client, scenario, stages, duration=None, iterations=None, server_pid=None,
+                  sample_interval=0.5, on_stage=None):
+    """تشغيل المراحل بالترتيب (عدد المستخدمين في كل مرحلة) مع قياس الذاكرة طوال الاختبار"""
+    sampler = RssSampler(server_pid, sample_interval).start()
+    results = []
+    try:
+        for number, users in enumerate(stages):
+            stage_started = len(sampler.samples)
+            result = run_stage(make_client, scenario, users, duration, iterations, seed=number)
+            stage_samples = [sample['rss_bytes'] for sample in sampler.samples[stage_started:]]
+            rss = read_rss(server_pid)
+            result.update({
+                'users': users,
+                'rss_peak_bytes': max(stage_samples + ([rss] if rss else []), default=None),
+                'rss_end_bytes': rss
+            })
+            results.append(result)
+            if on_stage:
+                on_stage(result)
+    finally:
+        samples = sampler.stop()
+    return {'stages': results, 'rss_samples': samples}
+
+
+def format_stage(stage):
+    mb = 1024 * 1024
+    lines = [f"== {stage['users']} مستخدم: {stage['scenarios']} سيناريو في {stage['elapsed_s']:.1f} ث "
+             f"({stage['scenarios_per_s']:.2f}/ث)، الأخطاء {stage['error_rate']:.1%}، "
+             f"RSS الأقصى {(stage['rss_peak_bytes'] or 0) / mb:.0f} MB"]
+    for name, endpoint in stage['endpoints'].items():
+        lines.append(f"   {name:<26} n={endpoint['requests']:<5} p50={endpoint['p50_ms']:8.1f}ms "
+                     f"p95={endpoint['p95_ms']:8.1f}ms p99={endpoint['p99_ms']:8.1f}ms "
+                     f"{endpoint['throughput_rps']:6.2f} req/s  أخطاء {endpoint['error_rate']:.1%}")
+    return '\n'.join(lines)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='اختبار الحمل لمسارات تطبيق العروض')
+    parser.add_argument('--url', help='عنوان خادم يعمل (مثل http://localhost:5000)؛ بدونه يعمل التطبيق داخل العملية')
+    parser.add_argument('--server-pid', type=int, help='رقم عملية الخادم لقياس ذاكرته مع --url')
+    parser.add_argument('--users', default='1,5,10,20', help='عدد المستخدمين في كل مرحلة مفصولاً بفواصل')
+    parser.add_argument('--duration', type=float, default=30.0, help='مدة كل مرحلة بالثواني')
+    parser.add_argument('--iterations', type=int, help='عدد السيناريوهات لكل مستخدم بدلاً من المدة')
+    parser.add_argument('--folders', type=int, default=3, help='عدد المجلدات في كل ملف ZIP')
+    parser.add_argument('--images', type=int, default=2, help='عدد الصور في كل مجلد')
+    parser.add_argument('--image-size', default='640x480', help='أبعاد الصور الاصطناعية')
+    parser.add_argument('--sample-interval', type=float, default=0.5, help='الفترة بين قياسات الذاكرة بالثواني')
+    parser.add_argument('--json', help='حفظ التقرير الكامل في ملف JSON')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    stages = [int(users) for users in args.users.split(',') if users.strip()]
+    width, height = (int(value) for value in args.image_size.lower().split('x'))
+    scenario = Scenario(make_template(), args.folders, args.images, (width, height))
+
+    if args.url:
+        def make_client():
+            return HttpClient(args.url)
+        server_pid = args.server_pid
+        if server_pid is None:
+            print('ℹ️ بدون --server-pid لن يتم قياس ذاكرة الخادم', file=sys.stderr)
+    else:
+        from app import app
+
+        def make_client():
+            return InProcessClient(app)
+        server_pid = os.getpid()
+
+    report = run_load_test(make_client, scenario, stages,
+                           duration=None if args.iterations else args.duration,
+                           iterations=args.iterations,
+                           server_pid=server_pid,
+                           sample_interval=args.sample_interval,
+                           on_stage=lambda stage: print(format_stage(stage), flush=True))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    failed = any(stage['error_rate'] for stage in report['stages'])
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
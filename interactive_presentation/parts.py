@@ -0,0 +1,239 @@
+"""تقسيم العرض الناتج إلى عدة ملفات حسب عدد الشرائح أو الحجم التقديري
+
+كل جزء يتم إنشاؤه في عملية مستقلة من القالب نفسه، ثم يتم تسليم الأجزاء معاً
+كملف ZIP يُبث أثناء التحميل مع بيان (manifest) يوضح المجلدات في كل جزء.
+"""
+import json
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from engine import ORDER_ALPHABETICAL, generate, order_images
+from scheduler import JobCancelled
+from tracing import NULL_TRACER, Tracer
+
+MB = 1024 * 1024
+MANIFEST_NAME = 'manifest.json'
+
+# تاريخ ثابت لعناصر ملف التحميل حتى يتطابق لنفس الأجزاء
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+# الفترة بين فحوص الإلغاء أثناء انتظار الأجزاء بالثواني
+CANCEL_POLL_INTERVAL = 0.5
+
+# حدث الإلغاء المشترك داخل عملية الجزء (يتم تمريره عند إنشاء العملية)
+_cancel_event = None
+
+
+def part_workers_from_env(environ=None):
+    """عدد العمليات المستخدمة لإنشاء الأجزاء (PPTX_PART_WORKERS، الافتراضي عدد المعالجات)"""
+    environ = os.environ if environ is None else environ
+    value = environ.get('PPTX_PART_WORKERS')
+    return int(value) if value else (os.cpu_count() or 1)
+
+
+def used_image_orders(placeholders_config):
+    """أرقام الصور (تبدأ من 1) التي تستخدمها إعدادات المواضع"""
+    return sorted({
+        config['order'] for config in placeholders_config.get('images', {}).values()
+        if config.get('use') and config.get('order')
+    })
+
+
+def estimate_folder_bytes(folder, placeholders_config, image_order=ORDER_ALPHABETICAL, seed=''):
+    """الحجم التقديري لما تضيفه شريحة المجلد: أحجام الصور المستخدمة فعلاً"""
+    images = order_images([(name, size) for name, size, _ in folder.images], folder.name, image_order, seed)
+    return sum(images[order - 1][1] for order in used_image_orders(placeholders_config)
+               if order <= len(images))
+
+
+def plan_parts(folders, placeholders_config, max_slides=0, max_bytes=0,
+               image_order=ORDER_ALPHABETICAL, seed='', base_bytes=0):
+    """توزيع المجلدات بالترتيب على أجزاء لا يتجاوز أي منها الحدود (0 = بلا حد)
+
+    base_bytes حجم القالب نفسه ويحسب ضمن كل جزء. المجلد الذي يتجاوز الحد
+    وحده يوضع في جزء مستقل.
+    """
+    parts = [[]]
+    slides = 0
+    size = base_bytes
+    for folder in folders:
+        folder_bytes = estimate_folder_bytes(folder, placeholders_config, image_order, seed)
+        if parts[-1] and ((max_slides and slides + 1 > max_slides) or
+                          (max_bytes and size + folder_bytes > max_bytes)):
+            parts.append([])
+            slides = 0
+            size = base_bytes
+        parts[-1].append(folder)
+        slides += 1
+        size += folder_bytes
+    return [part for part in parts if part]
+
+
+class CollectingLog:
+    """سجل بسيط داخل عملية الجزء؛ تتم إعادة رسائله إلى سجل المهمة بعد الانتهاء"""
+
+    def __init__(self):
+        self.entries = []
+
+    def add(self, message, level="info"):
+        self.entries.append((message, level))
+
+
+def _init_part_worker(cancel_event):
+    global _cancel_event
+    _cancel_event = cancel_event
+
+
+def _check_cancelled():
+    if _cancel_event is not None and _cancel_event.is_set():
+        raise JobCancelled('تم إيقاف إنشاء الجزء')
+
+
+def build_part(template, placeholders_config, folders, output_path, image_order=ORDER_ALPHABETICAL, seed='',
+               trace=False):
+    """إنشاء جزء واحد (يعمل داخل عملية مستقلة)؛ يعيد الإحصائيات ورسائل السجل وفترات التتبع"""
+    log = CollectingLog()
+    tracer = Tracer('part worker') if trace else NULL_TRACER
+    stats = None
+    folder_source = ((folder.name, folder.open_images()) for folder in folders)
+    with tracer.span('build part', 'part', output=os.path.basename(output_path)):
+        for event in generate(template, placeholders_config, folder_source, output=output_path,
+                              image_order=image_order, seed=seed, log=log, check=_check_cancelled,
+                              tracer=tracer):
+            if event['event'] == 'done':
+                stats = event['stats']
+    return {'stats': stats, 'log': log.entries, 'trace': list(tracer.events)}
+
+
+def part_filename(stem, index, count):
+    width = max(3, len(str(count)))
+    return f"{stem}_part{index:0{width}d}.pptx"
+
+
+def build_parts(template, placeholders_config, groups, output_dir, stem,
+                image_order=ORDER_ALPHABETICAL, seed='', max_workers=None, check=None, tracer=None):
+    """إنشاء الأجزاء بالتوازي وإرجاع حدث لكل جزء عند اكتماله
+
+    يتم استخدام spawn بدلاً من fork لأن العملية الأم تحتوي على خيوط
+    (الجدولة ومساحة العمل) وfork مع الخيوط غير آمن.
+    check تستدعى أثناء الانتظار؛ إذا رفعت استثناءً تتوقف العمليات عند المجلد
+    التالي ولا تبدأ الأجزاء المتبقية. مع tracer يتم دمج فترات كل عملية جزء فيه.
+    """
+    max_workers = min(len(groups), max_workers or part_workers_from_env())
+    context = multiprocessing.get_context('spawn')
+    cancel_event = context.Event()
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context,
+                             initializer=_init_part_worker, initargs=(cancel_event,)) as executor:
+        futures = {}
+        for index, folders in enumerate(groups, 1):
+            filename = part_filename(stem, index, len(groups))
+            future = executor.submit(build_part, template, placeholders_config, folders,
+                                     os.path.join(output_dir, filename), image_order, seed, bool(tracer))
+            futures[future] = (index, filename, folders)
+
+        pending = set(futures)
+        while pending:
+            completed, pending = wait(pending, timeout=CANCEL_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+            try:
+                if check:
+                    check()
+            except Exception:
+                # العمليات الجارية تتوقف عند المجلد التالي، والأجزاء التي لم تبدأ تُلغى
+                cancel_event.set()
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+            for future in completed:
+                index, filename, folders = futures[future]
+                result = future.result()
+                if tracer:
+                    tracer.extend(result['trace'])
+                yield {
+                    'event': 'part',
+                    'index': index,
+                    'filename': filename,
+                    'folders': [folder.name for folder in folders],
+                    'stats': result['stats'],
+                    'bytes': os.path.getsize(os.path.join(output_dir, filename)),
+                    'log': result['log']
+                }
+
+
+def manifest_path(output_dir, bundle_name):
+    stem = bundle_name[:-len('.zip')] if bundle_name.endswith('.zip') else bundle_name
+    return os.path.join(output_dir, stem + '.' + MANIFEST_NAME)
+
+
+def write_manifest(output_dir, bundle_name, parts, stats):
+    """حفظ بيان الأجزاء بجانبها؛ الأجزاء مرتبة حسب رقمها"""
+    manifest = {
+        'bundle': bundle_name,
+        'stats': stats,
+        'parts': [
+            {
+                'filename': part['filename'],
+                'slides': part['stats']['created_slides'],
+                'images': part['stats']['total_images'],
+                'bytes': part['bytes'],
+                'folders': part['folders'],
+                **({'template': part['template']} if 'template' in part else {})
+            }
+            for part in sorted(parts, key=lambda part: part['index'])
+        ]
+    }
+    with open(manifest_path(output_dir, bundle_name), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def load_manifest(output_dir, bundle_name):
+    try:
+        with open(manifest_path(output_dir, bundle_name), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class _StreamBuffer:
+    """هدف كتابة لـ ZipFile يحتفظ بالبايتات حتى يتم إرسالها"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_parts_zip(output_dir, manifest, chunk_size=MB):
+    """مولد يبث ملف ZIP يحتوي على البيان والأجزاء دون إنشائه على القرص
+
+    الأجزاء مضغوطة أصلاً (pptx) فيتم تخزينها دون ضغط إضافي.
+    """
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as zf:
+        manifest_info = zipfile.ZipInfo(MANIFEST_NAME, ZIP_DATE_TIME)
+        zf.writestr(manifest_info, json.dumps(manifest, ensure_ascii=False, indent=2))
+        yield buffer.pop()
+
+        for part in manifest['parts']:
+            path = os.path.join(output_dir, part['filename'])
+            info = zipfile.ZipInfo(part['filename'], ZIP_DATE_TIME)
+            with open(path, 'rb') as source, \
+                    zf.open(info, 'w', force_zip64=os.path.getsize(path) > zipfile.ZIP64_LIMIT) as target:
+                for chunk in iter(lambda: source.read(chunk_size), b''):
+                    target.write(chunk)
+                    data = buffer.pop()
+                    if data:
+                        yield data
+            yield buffer.pop()
+    yield buffer.pop()
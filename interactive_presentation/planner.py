@@ -0,0 +1,322 @@
+"""مخطط التشغيل التجريبي: توقع نتيجة المهمة وتكلفتها دون إنشاء العرض
+
+يعتمد فقط على الدليل المركزي للملف المضغوط (أو قائمة ملفات المجلد)، وعلى
+ترويسات الصور التي ستستخدم فعلاً، وعلى إعدادات المواضع. التقديرات تتم
+معايرتها من قياسات المهام السابقة المحفوظة في ملف صغير.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+
+from PIL import Image
+
+from admission import AdmissionError, admit_archive, is_image_name
+from engine import ORDER_ALPHABETICAL, order_images
+from parts import estimate_folder_bytes, plan_parts
+from sources import SourceFolder
+
+MB = 1024 * 1024
+
+# المدة القصوى لقراءة ترويسات الصور؛ بعدها تبقى الأبعاد غير معروفة
+DEFAULT_HEADER_BUDGET = 5.0
+
+# قيم افتراضية قبل توفر أي قياسات
+DEFAULT_SECONDS_PER_SLIDE = 0.05
+DEFAULT_SECONDS_PER_MB = 0.02
+DEFAULT_EXTRACT_SECONDS_PER_MB = 0.01
+DEFAULT_OUTPUT_RATIO = 1.0
+
+# الذاكرة: العرض يحتفظ بكل الصور المستخدمة حتى الحفظ، مع هامش للقالب والحفظ
+MEMORY_BASE = 64 * MB
+MEMORY_PER_OUTPUT_BYTE = 1.5
+
+
+def fit_two_rates(samples):
+    """مربعات صغرى بلا ثابت للنموذج: الزمن = a × الشرائح + b × الميجابايت"""
+    s2 = sum(s * s for s, _, _ in samples)
+    m2 = sum(m * m for _, m, _ in samples)
+    sm = sum(s * m for s, m, _ in samples)
+    st = sum(s * t for s, _, t in samples)
+    mt = sum(m * t for _, m, t in samples)
+    det = s2 * m2 - sm * sm
+    if det > 1e-9:
+        a = (st * m2 - mt * sm) / det
+        b = (mt * s2 - st * sm) / det
+        if a >= 0 and b >= 0:
+            return a, b
+    # قياسات غير كافية لفصل العاملين: نسبة الزمن إلى عدد الشرائح فقط
+    slides = sum(s for s, _, _ in samples)
+    return (sum(t for _, _, t in samples) / slides if slides else DEFAULT_SECONDS_PER_SLIDE), 0.0
+
+
+class Calibration:
+    """قياسات المهام السابقة (آخر max_samples لكل نوع) لمعايرة تقديرات المخطط
+
+    الكتابة تتم في ملف مؤقت ثم إعادة تسمية ذرية؛ عند تزامن عدة عمليات قد
+    يضيع قياس، وهذا مقبول لأن القياسات تقريبية أصلاً.
+    """
+
+    def __init__(self, path, max_samples=50):
+        self.path = path
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, environ=None):
+        environ = os.environ if environ is None else environ
+        path = environ.get('PPTX_CALIBRATION_FILE') or os.path.join(tempfile.gettempdir(), 'pptx_calibration.json')
+        return cls(path)
+
+    def load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        for key in ('generate', 'extract', 'output'):
+            data.setdefault(key, [])
+        return data
+
+    def _record(self, key, sample):
+        with self._lock:
+            data = self.load()
+            data[key] = (data[key] + [sample])[-self.max_samples:]
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+
+    def record_generation(self, slides, used_bytes, template_bytes, output_bytes, seconds):
+        """قياس مرحلة إنشاء الشرائح والحفظ لعرض واحد"""
+        self._record('generate', [slides, used_bytes / MB, seconds])
+        self._record('output', [template_bytes + used_bytes, output_bytes])
+
+    def record_extraction(self, uncompressed_bytes, seconds):
+        self._record('extract', [uncompressed_bytes / MB, seconds])
+
+    def model(self):
+        """معاملات التقدير الحالية مع عدد القياسات التي بنيت عليها"""
+        data = self.load()
+        if data['generate']:
+            seconds_per_slide, seconds_per_mb = fit_two_rates(data['generate'])
+        else:
+            seconds_per_slide, seconds_per_mb = DEFAULT_SECONDS_PER_SLIDE, DEFAULT_SECONDS_PER_MB
+
+        extract_mb = sum(mb for mb, _ in data['extract'])
+        extract_rate = (sum(t for _, t in data['extract']) / extract_mb
+                        if extract_mb else DEFAULT_EXTRACT_SECONDS_PER_MB)
+
+        output_input = sum(i for i, _ in data['output'])
+        output_ratio = (sum(o for _, o in data['output']) / output_input
+                        if output_input else DEFAULT_OUTPUT_RATIO)
+
+        return {
+            'seconds_per_slide': seconds_per_slide,
+            'seconds_per_mb': seconds_per_mb,
+            'extract_seconds_per_mb': extract_rate,
+            'output_ratio': output_ratio,
+            'samples': len(data['generate'])
+        }
+
+
+def estimate_costs(model, slides, used_bytes, template_bytes, input_bytes=0):
+    """تقدير حجم الناتج وذروة الذاكرة وزمن التشغيل من معاملات المعايرة"""
+    output_bytes = int((template_bytes + used_bytes) * model['output_ratio'])
+    runtime = (input_bytes / MB * model['extract_seconds_per_mb'] +
+               slides * model['seconds_per_slide'] +
+               used_bytes / MB * model['seconds_per_mb'])
+    return {
+        'output_bytes': output_bytes,
+        'peak_memory_bytes': int(MEMORY_BASE + output_bytes * MEMORY_PER_OUTPUT_BYTE),
+        'runtime_seconds': round(runtime, 2),
+        'calibrated': model['samples'] > 0,
+        'calibration_samples': model['samples']
+    }
+
+
+def image_configs(placeholders_config):
+    """إعدادات مواضع الصور المستخدمة: أزواج (المفتاح، رقم الصورة)"""
+    return [
+        (key, config['order']) for key, config in placeholders_config.get('images', {}).items()
+        if config.get('use') and config.get('order')
+    ]
+
+
+def select_images(folder, placeholders_config, image_order, seed):
+    """الصورة التي سيأخذها كل موضع في شريحة المجلد، والمواضع التي لن تمتلئ"""
+    ordered = order_images([(name, size) for name, size, _ in folder.images], folder.name, image_order, seed)
+    fills = []
+    missing = []
+    for key, order in image_configs(placeholders_config):
+        if order <= len(ordered):
+            fills.append({'placeholder': key, 'order': order, 'image': ordered[order - 1][0]})
+        else:
+            missing.append({'placeholder': key, 'order': order})
+    return fills, missing
+
+
+def folders_from_archive(zip_ref):
+    """المجلدات كما ستظهر بعد الاستخراج (مثل scan_directory) من الدليل المركزي فقط
+
+    يعيد (المجلدات، المجلدات الفارغة، قاموس من (المجلد، الصورة) إلى اسم العنصر).
+    """
+    images = {}
+    members = {}
+    dirs = set()
+    for info in zip_ref.infolist():
+        parts = [part for part in info.filename.replace('\\', '/').split('/') if part]
+        if not parts or any(part.startswith('.') for part in parts):
+            continue
+        depth = len(parts) if info.is_dir() else len(parts) - 1
+        for i in range(1, depth + 1):
+            dirs.add('/'.join(parts[:i]))
+        if info.is_dir() or len(parts) < 2 or not is_image_name(parts[-1]):
+            continue
+        folder_name = '/'.join(parts[:-1])
+        images.setdefault(folder_name, []).append((parts[-1], info.file_size, 0))
+        members[(folder_name, parts[-1])] = info.filename
+
+    parents = {name.rsplit('/', 1)[0] for name in dirs if '/' in name}
+    empty = sorted(name for name in dirs if name not in images and name not in parents)
+    folders = [SourceFolder(name, None, sorted(items)) for name, items in sorted(images.items())]
+    return folders, empty, members
+
+
+def read_file_dimensions(path):
+    with Image.open(path) as img:
+        return img.size
+
+
+def assemble_plan(folders, empty, placeholders_config, options, seed, template_bytes, input_bytes,
+                  model, dimensions, skipped_images=None):
+    """تجميع الخطة: ربط المجلدات بالشرائح والمواضع، والمجلدات المتخطاة، والتقديرات"""
+    image_order = options.get('image_order', ORDER_ALPHABETICAL)
+    skipped_images = skipped_images or {}
+
+    planned = []
+    used_bytes = 0
+    for slide_number, folder in enumerate(folders, 2):
+        fills, missing = select_images(folder, placeholders_config, image_order, seed)
+        for fill in fills:
+            size = dimensions.get((folder.name, fill['image']))
+            fill['width'], fill['height'] = size if size else (None, None)
+            reason = skipped_images.get((folder.name, fill['image']))
+            if reason:
+                fill['skipped'] = reason
+        used_bytes += estimate_folder_bytes(folder, placeholders_config, image_order, seed)
+        planned.append({
+            'folder': folder.name,
+            'slide': slide_number,
+            'images': len(folder.images),
+            'fills': fills,
+            'missing': missing
+        })
+
+    skipped = [{'folder': name, 'reason': 'لا يحتوي على صور'} for name in empty]
+
+    plan = {
+        'slides': planned,
+        'skipped_folders': skipped,
+        'texts': [
+            {'placeholder': key, 'type': config.get('type')}
+            for key, config in placeholders_config.get('texts', {}).items()
+        ],
+        'estimates': estimate_costs(model, len(folders), used_bytes, template_bytes, input_bytes)
+    }
+
+    if options.get('max_slides_per_deck') or options.get('max_deck_mb'):
+        groups = plan_parts(folders, placeholders_config,
+                            max_slides=options.get('max_slides_per_deck', 0),
+                            max_bytes=options.get('max_deck_mb', 0) * MB,
+                            image_order=image_order, seed=seed, base_bytes=template_bytes)
+        plan['parts'] = [[folder.name for folder in group] for group in groups]
+    return plan
+
+
+def plan_archive(zip_ref, limits, placeholders_config, options, seed, template_bytes,
+                 model, header_budget=DEFAULT_HEADER_BUDGET):
+    """خطة مهمة من ملف مضغوط: الدليل المركزي وترويسات الصور المستخدمة فقط"""
+    started = time.monotonic()
+    folders, empty, members = folders_from_archive(zip_ref)
+    image_order = options.get('image_order', ORDER_ALPHABETICAL)
+
+    selected = {}
+    for folder in folders:
+        fills, _ = select_images(folder, placeholders_config, image_order, seed)
+        for fill in fills:
+            selected[members[(folder.name, fill['image'])]] = (folder.name, fill['image'])
+
+    try:
+        report = admit_archive(zip_ref, limits, image_names=set(selected),
+                               deadline=started + header_budget)
+    except AdmissionError as e:
+        return {'accepted': False, 'error': str(e), 'elapsed_seconds': round(time.monotonic() - started, 3)}
+
+    dimensions = {selected[name]: size for name, size in report.dimensions.items()}
+    skipped_images = {selected[name]: reason for name, reason in report.skipped.items() if name in selected}
+
+    plan = assemble_plan(folders, empty, placeholders_config, options, seed, template_bytes,
+                         report.uncompressed_bytes, model, dimensions, skipped_images)
+    plan.update({
+        'accepted': True,
+        'admission': report.to_dict(),
+        'headers_complete': report.headers_complete,
+        'elapsed_seconds': round(time.monotonic() - started, 3)
+    })
+    return plan
+
+
+def used_images_selector(placeholders_config, image_order=ORDER_ALPHABETICAL):
+    """دالة لـ scan_directory(dimensions=...) تختار الصور التي ستستخدمها المواضع في كل مجلد
+
+    مع الترتيب العشوائي تعيد None: البذرة هي مفتاح النتيجة الذي يحسب من المسح
+    نفسه، فتقرأ الترويسات في الخطة كالمعتاد.
+    """
+    if image_order != ORDER_ALPHABETICAL:
+        return None
+
+    def select(name, images):
+        fills, _ = select_images(SourceFolder(name, None, images), placeholders_config, image_order, '')
+        return list(dict.fromkeys(fill['image'] for fill in fills))
+    return select
+
+
+def plan_directory(folders, empty, placeholders_config, options, seed, template_bytes,
+                   model, header_budget=DEFAULT_HEADER_BUDGET):
+    """خطة مهمة من مجلد على الخادم (نتيجة scan_directory)؛ لا يوجد استخراج
+
+    الأبعاد المقروءة أثناء المسح (scan_directory مع dimensions=True) تستخدم
+    مباشرة، ولا تقرأ هنا إلا ترويسات الصور الناقصة ضمن header_budget.
+    """
+    started = time.monotonic()
+    image_order = options.get('image_order', ORDER_ALPHABETICAL)
+    dimensions = {}
+    skipped_images = {}
+    headers_complete = True
+    for folder in folders:
+        fills, _ = select_images(folder, placeholders_config, image_order, seed)
+        for fill in fills:
+            if time.monotonic() > started + header_budget:
+                headers_complete = False
+                break
+            if fill['image'] in folder.dimensions:
+                dimensions[(folder.name, fill['image'])] = folder.dimensions[fill['image']]
+                continue
+            try:
+                dimensions[(folder.name, fill['image'])] = read_file_dimensions(
+                    os.path.join(folder.path, fill['image']))
+            except Exception as e:
+                skipped_images[(folder.name, fill['image'])] = f'ترويسة صورة غير صالحة: {e}'
+
+    plan = assemble_plan(folders, empty, placeholders_config, options, seed, template_bytes,
+                         0, model, dimensions, skipped_images)
+    plan.update({
+        'accepted': True,
+        'headers_complete': headers_complete,
+        'elapsed_seconds': round(time.monotonic() - started, 3)
+    })
+    return plan
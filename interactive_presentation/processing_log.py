@@ -0,0 +1,97 @@
+"""سجل المعالجة: حلقة محدودة الحجم مع عدادات ملخصة لكل مستوى"""
+import threading
+import time
+from collections import deque
+
+# مستويات الرسائل المدعومة بالترتيب من الأقل إلى الأعلى خطورة
+LEVELS = ('info', 'success', 'warning', 'error')
+
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_MAX_ERRORS = 200
+MAX_PAGE_SIZE = 500
+
+
+class ProcessingLog:
+    """سجل رسائل المعالجة مع حد أقصى لعدد الرسائل المحفوظة
+
+    يتم الاحتفاظ بآخر max_entries رسالة فقط، بينما تبقى العدادات دقيقة
+    لكل الرسائل التي أضيفت منذ آخر مسح. الأخطاء تحفظ في قائمة منفصلة
+    حتى لا تضيع وسط رسائل النجاح الكثيرة.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_errors=DEFAULT_MAX_ERRORS):
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+        self._max_errors = max_errors
+        self.clear()
+
+    def clear(self):
+        """مسح جميع الرسائل والعدادات"""
+        with self._lock:
+            self._entries = deque(maxlen=self._max_entries)
+            self._errors = deque(maxlen=self._max_errors)
+            self._counts = {level: 0 for level in LEVELS}
+            self._seq = 0
+
+    def add(self, message, level="info"):
+        """إضافة رسالة جديدة إلى السجل"""
+        if level not in self._counts:
+            level = 'info'
+        with self._lock:
+            self._seq += 1
+            entry = {
+                'seq': self._seq,
+                'message': message,
+                'type': level,
+                'time': time.time()
+            }
+            self._entries.append(entry)
+            self._counts[level] += 1
+            if level == 'error':
+                self._errors.append(entry)
+        return entry
+
+    @property
+    def needs_attention(self):
+        """هل توجد تحذيرات أو أخطاء تستدعي إظهار التفاصيل"""
+        with self._lock:
+            return self._counts['warning'] > 0 or self._counts['error'] > 0
+
+    def summary(self):
+        """ملخص العدادات دون محتوى الرسائل"""
+        with self._lock:
+            total = self._seq
+            retained = len(self._entries)
+            return {
+                'counts': dict(self._counts),
+                'total': total,
+                'retained': retained,
+                'dropped': total - retained,
+                'needs_attention': self._counts['warning'] > 0 or self._counts['error'] > 0
+            }
+
+    def errors(self):
+        """قائمة الأخطاء المحفوظة (محدودة بـ max_errors)"""
+        with self._lock:
+            return list(self._errors)
+
+    def page(self, offset=0, limit=100, levels=None):
+        """إرجاع صفحة من الرسائل المحفوظة مع إمكانية التصفية حسب المستوى"""
+        offset = max(0, int(offset))
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        if levels:
+            levels = {level for level in levels if level in LEVELS}
+
+        with self._lock:
+            if levels:
+                entries = [entry for entry in self._entries if entry['type'] in levels]
+            else:
+                entries = list(self._entries)
+
+        return {
+            'entries': entries[offset:offset + limit],
+            'offset': offset,
+            'limit': limit,
+            'total': len(entries),
+            'has_more': offset + limit < len(entries)
+        }
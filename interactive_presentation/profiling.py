@@ -0,0 +1,146 @@
+"""تحليل أداء مهمة واحدة عند الطلب: زمن المعالج (cProfile) والذاكرة (tracemalloc)
+
+يغلف JobProfiler مسجل التتبع (tracing.py) فيستخدم مكانه في مراحل الإنتاج:
+عند نهاية كل مرحلة (الاستخراج، مسح المجلدات، فحص الصور، تحميل القالب،
+الحفظ...) يتم أخذ لقطة للذاكرة ومقارنتها بالسابقة. التقرير النصي يتضمن شجرة
+الاستدعاءات مرتبة بالزمن التراكمي وأكبر مواقع الحجز في كل مرحلة، وملف
+pstats الخام يفتح في snakeviz أو `python -m pstats`.
+
+cProfile يقيس خيط المهمة فقط (لا عمال فحص الصور ولا عمليات الأجزاء)، و
+tracemalloc يقيس العملية كلها، لذلك يتم تحليل مهمة واحدة فقط في كل مرة.
+بدون الطلب لا يتم إنشاء أي محلل فلا توجد أي تكلفة إضافية.
+"""
+import contextlib
+import cProfile
+import io
+import os
+import pstats
+import threading
+import tracemalloc
+
+from tracing import NULL_TRACER
+
+# عدد الدوال ومواقع الحجز في كل قسم من التقرير
+TOP_ENTRIES = 30
+TOP_ALLOCATIONS = 10
+
+# تحليل مهمة واحدة فقط في كل مرة في العملية
+_active = threading.Lock()
+
+
+def profile_token_from_env(environ=None):
+    """رمز المشرف لطلب تحليل مهمة من الواجهة (PPTX_PROFILE_TOKEN)؛ فارغ = الميزة معطلة"""
+    environ = os.environ if environ is None else environ
+    return environ.get('PPTX_PROFILE_TOKEN', '')
+
+
+def format_bytes(size):
+    return f'{size / 1024 / 1024:.2f} MB'
+
+
+class JobProfiler:
+    """محلل أداء لمهمة واحدة يستخدم كسياق (with) وكمسجل تتبع في الوقت نفسه
+
+    الفترات تمرر إلى tracer، والفترات من فئة 'job' (مراحل المهمة) تأخذ لقطة
+    ذاكرة عند نهايتها. إذا كانت مهمة أخرى قيد التحليل يتم تنفيذ المهمة دون
+    تحليل (active = False) ويذكر ذلك في التقرير.
+    """
+
+    def __init__(self, tracer=None, top=TOP_ENTRIES):
+        self.tracer = tracer or NULL_TRACER
+        self.top = top
+        self.active = False
+        self.stages = []
+        self._profile = None
+        self._previous = None
+        self._final = None
+        self._started_tracemalloc = False
+
+    def __enter__(self):
+        self.active = _active.acquire(blocking=False)
+        if not self.active:
+            return self
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        tracemalloc.reset_peak()
+        self._previous = tracemalloc.take_snapshot()
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        if not self.active:
+            return False
+        try:
+            self._profile.disable()
+            self._final = tracemalloc.take_snapshot()
+            self._previous = None
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+        finally:
+            _active.release()
+        return False
+
+    @property
+    def events(self):
+        return self.tracer.events
+
+    def extend(self, events):
+        self.tracer.extend(events)
+
+    @contextlib.contextmanager
+    def span(self, name, category='job', **args):
+        with self.tracer.span(name, category, **args):
+            yield
+        if category == 'job':
+            self.stage(name)
+
+    def stage(self, name):
+        """لقطة ذاكرة عند نهاية مرحلة: الذاكرة الحالية والذروة وأكبر زيادات الحجز منذ المرحلة السابقة"""
+        if not self.active or self._previous is None:
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        growth = [diff for diff in snapshot.compare_to(self._previous, 'lineno') if diff.size_diff > 0]
+        self.stages.append({
+            'stage': name,
+            'current_bytes': current,
+            'peak_bytes': peak,
+            'allocations': [str(diff) for diff in growth[:TOP_ALLOCATIONS]]
+        })
+        self._previous = snapshot
+        tracemalloc.reset_peak()
+
+    def report(self):
+        """التقرير النصي: شجرة الاستدعاءات ثم الذاكرة لكل مرحلة ثم أكبر مواقع الحجز المتبقية"""
+        out = io.StringIO()
+        if not self._profile or not self._final:
+            out.write('Profiling skipped: another job was being profiled in this process.\n')
+            return out.getvalue()
+
+        stats = pstats.Stats(self._profile, stream=out)
+        stats.strip_dirs().sort_stats(pstats.SortKey.CUMULATIVE)
+        out.write(f'== CPU (job thread), top {self.top} by cumulative time ==\n')
+        stats.print_stats(self.top)
+        out.write('== Call tree (callees of the functions above) ==\n')
+        stats.print_callees(self.top)
+
+        out.write('== Memory per stage (tracemalloc, whole process) ==\n')
+        for stage in self.stages:
+            out.write(f"{stage['stage']}: current {format_bytes(stage['current_bytes'])}, "
+                      f"peak {format_bytes(stage['peak_bytes'])}\n")
+            for line in stage['allocations']:
+                out.write(f'    {line}\n')
+
+        out.write(f'\n== Top {TOP_ALLOCATIONS} allocation sites still held at the end ==\n')
+        for statistic in self._final.statistics('lineno')[:TOP_ALLOCATIONS]:
+            out.write(f'{statistic}\n')
+        return out.getvalue()
+
+    def write(self, report_path, stats_path=None):
+        """حفظ التقرير النصي وملف pstats الخام (إن تم التحليل)"""
+        with open(report_path, 'w', encoding='utf-8') as f:
+            f.write(self.report())
+        if stats_path and self._profile:
+            self._profile.dump_stats(stats_path)
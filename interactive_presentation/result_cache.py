@@ -0,0 +1,180 @@
+"""ذاكرة تخزين مؤقت للعروض الناتجة، مفتاحها القالب والإعدادات ومحتوى الأرشيف"""
+import hashlib
+import json
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import zipfile
+from datetime import date
+
+MB = 1024 * 1024
+
+# أقدم تاريخ يدعمه تنسيق ZIP (1980-01-01 00:00) بصيغة DOS
+DOS_EPOCH_DATE = (0 << 9) | (1 << 5) | 1
+DOS_EPOCH_TIME = 0
+
+
+def file_digest(path, chunk_size=MB):
+    """بصمة SHA-256 لمحتوى ملف دون تحميله كاملاً في الذاكرة"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def uses_current_date(placeholders_config):
+    """هل تعتمد الإعدادات على تاريخ اليوم (فتتغير النتيجة من يوم لآخر)"""
+    for config in placeholders_config.get('texts', {}).values():
+        if config.get('type') == "تاريخ" and config.get('value') == "today":
+            return True
+    return False
+
+
+def make_cache_key(template_bytes, placeholders_config, archive_digest, options):
+    """مفتاح النتيجة: كل ما يؤثر على محتوى العرض الناتج"""
+    digest = hashlib.sha256()
+    digest.update(hashlib.sha256(template_bytes).digest())
+    digest.update(json.dumps(placeholders_config, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+    digest.update(archive_digest.encode('ascii'))
+    digest.update(json.dumps(options, sort_keys=True).encode('utf-8'))
+    if uses_current_date(placeholders_config):
+        digest.update(date.today().isoformat().encode('ascii'))
+    return digest.hexdigest()
+
+
+def normalize_zip_timestamps(path):
+    """تثبيت تواريخ عناصر ملف ZIP حتى تكون النتيجة متطابقة بايت ببايت
+
+    يتم تعديل حقلي الوقت والتاريخ في الترويسة المحلية وفي الدليل المركزي
+    مباشرة دون إعادة ضغط البيانات.
+    """
+    with zipfile.ZipFile(path) as zf:
+        infos = zf.infolist()
+        central_dir_offset = zf.start_dir
+
+    date_time = struct.pack('<HH', DOS_EPOCH_TIME, DOS_EPOCH_DATE)
+    with open(path, 'r+b') as f:
+        for info in infos:
+            # الترويسة المحلية: التوقيع(4) الإصدار(2) الأعلام(2) الطريقة(2) ثم الوقت والتاريخ
+            f.seek(info.header_offset + 10)
+            f.write(date_time)
+
+        offset = central_dir_offset
+        for _ in infos:
+            f.seek(offset)
+            header = f.read(46)
+            if header[:4] != b'PK\x01\x02':
+                raise ValueError('Unexpected central directory record')
+            name_len, extra_len, comment_len = struct.unpack('<HHH', header[28:34])
+            f.seek(offset + 12)
+            f.write(date_time)
+            offset += 46 + name_len + extra_len + comment_len
+
+
+class ResultCache:
+    """ذاكرة LRU على القرص للعروض الناتجة مع حد أقصى للحجم وعدادات الإصابة
+
+    يتم تحديث وقت تعديل الملف عند كل قراءة، ويتم حذف الأقدم استخداماً عند
+    تجاوز الحد. الكتابة تتم في ملف مؤقت ثم إعادة تسمية ذرية حتى تكون آمنة
+    بين عدة عمليات تتشارك المجلد نفسه.
+    """
+
+    def __init__(self, root, max_bytes=1024 * MB):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        os.makedirs(root, exist_ok=True)
+
+    @classmethod
+    def from_env(cls, environ=None):
+        environ = os.environ if environ is None else environ
+        root = environ.get('PPTX_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'pptx_result_cache')
+        return cls(root, max_bytes=int(environ.get('PPTX_CACHE_MAX_MB', 1024)) * MB)
+
+    def _paths(self, key):
+        base = os.path.join(self.root, key)
+        return base + '.pptx', base + '.json'
+
+    def get(self, key):
+        """إرجاع (مسار العرض، البيانات الوصفية) أو None"""
+        pptx_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                metadata = json.load(f)
+            os.utime(pptx_path)
+            os.utime(meta_path)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return pptx_path, metadata
+
+    def put(self, key, source_path, metadata):
+        """نسخ العرض الناتج إلى الذاكرة المؤقتة ثم تطبيق حد الحجم"""
+        pptx_path, meta_path = self._paths(key)
+        fd, tmp_pptx = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        os.close(fd)
+        shutil.copyfile(source_path, tmp_pptx)
+        fd, tmp_meta = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, ensure_ascii=False)
+        # العرض أولاً ثم البيانات الوصفية: وجود ملف json يعني أن المدخل مكتمل
+        os.replace(tmp_pptx, pptx_path)
+        os.replace(tmp_meta, meta_path)
+
+        with self._lock:
+            self.stores += 1
+        self.evict()
+
+    def _entries(self):
+        entries = []
+        for entry in os.scandir(self.root):
+            if entry.name.endswith('.pptx'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.name[:-len('.pptx')]))
+        return entries
+
+    def size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """حذف الأقدم استخداماً حتى يصبح الحجم ضمن الحد"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            for path in self._paths(key):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+            with self._lock:
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'stores': self.stores,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'size_bytes': self.size(),
+                'max_bytes': self.max_bytes
+            }
@@ -1,5 +1,9 @@
 #!/usr/bin/env python3
-from app import app
+import os
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    # الاستيراد هنا: عمليات spawn تعيد استيراد هذا الملف ولا تحتاج التطبيق
+    from app import app, warm_up
+    # Development server only; use gunicorn with gunicorn.conf.py in production
+    warm_up(app)
+    app.run(debug=os.environ.get('FLASK_DEBUG') == '1', host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,304 @@
+"""جدولة مهام الإنتاج: حد للتزامن حسب المعالج والذاكرة مع توزيع عادل بين الجلسات"""
+import itertools
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+from processing_log import ProcessingLog
+
+MB = 1024 * 1024
+
+# حالات المهمة
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+CANCELLED_BY_USER = 'تم إلغاء المهمة بطلب المستخدم'
+DEADLINE_EXCEEDED = 'تجاوزت المهمة المهلة المحددة لها'
+
+DEFAULT_MEMORY_BUDGET = 2048 * MB
+DEFAULT_JOB_MEMORY = 256 * MB
+# مدة الاحتفاظ بالمهام المنتهية (لاستعلام الحالة والتحميل) قبل حذفها من السجل
+DEFAULT_JOB_RETENTION = 3600
+
+
+def estimate_job_memory(uncompressed_bytes):
+    """تقدير ذاكرة المهمة: العرض يحتفظ بكل الصور في الذاكرة حتى الحفظ"""
+    return 64 * MB + int(uncompressed_bytes * 1.5)
+
+
+class JobCancelled(Exception):
+    """توقف المهمة لإلغائها أو لتجاوز مهلتها (يتم فحصه بين المجلدات)"""
+
+
+class Job:
+    """مهمة إنتاج واحدة مع حالتها وسجلها الخاص"""
+
+    def __init__(self, owner, func, memory_estimate=DEFAULT_JOB_MEMORY, label=None, log=None,
+                 timeout=None, on_cancel=None):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.func = func
+        self.memory_estimate = memory_estimate
+        self.label = label
+        self.status = QUEUED
+        self.log = log if log is not None else ProcessingLog()
+        self.progress = {'done': 0, 'total': 0}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        # المهلة بالثواني من بدء التشغيل (None = بلا مهلة)
+        self.timeout = timeout
+        self.deadline = None
+        self.on_cancel = on_cancel
+        self.cancel_reason = None
+        self._cancel = threading.Event()
+
+    def release(self):
+        """تحرير ما تحتفظ به المهمة المنتهية من دوال (وما تربطه من بيانات الجلسة)"""
+        self.func = None
+        self.on_cancel = None
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    @property
+    def expired(self):
+        return self.cancel_reason == DEADLINE_EXCEEDED
+
+    def cancel(self, reason=CANCELLED_BY_USER):
+        if not self._cancel.is_set():
+            self.cancel_reason = reason
+            self._cancel.set()
+
+    def check(self):
+        """ترفع JobCancelled إذا طُلب الإلغاء أو انتهت المهلة؛ تستدعيها المهمة بين خطوات العمل"""
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            self.cancel(DEADLINE_EXCEEDED)
+        if self._cancel.is_set():
+            raise JobCancelled(self.cancel_reason)
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'progress': dict(self.progress),
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+
+class JobScheduler:
+    """طابور مهام مع حد أقصى للمهام المتزامنة وتوزيع عادل بين المالكين
+
+    عند توفر مكان، يتم اختيار المالك صاحب أقل عدد من المهام الجارية، ثم
+    الأقدم انتظاراً بينهم؛ وبذلك لا تمنع مهمة كبيرة لمستخدم واحد مهمة
+    صغيرة لمستخدم آخر من البدء.
+    """
+
+    def __init__(self, max_workers=None, memory_budget=DEFAULT_MEMORY_BUDGET,
+                 job_memory=DEFAULT_JOB_MEMORY, job_timeout=None, retention=DEFAULT_JOB_RETENTION):
+        cpu_slots = max_workers or os.cpu_count() or 1
+        memory_slots = max(1, memory_budget // job_memory)
+        self.max_concurrent = max(1, min(cpu_slots, memory_slots))
+        self.memory_budget = memory_budget
+        self.job_timeout = job_timeout
+        self.retention = retention
+        self._queues = OrderedDict()
+        self._running = {}
+        self._jobs = {}
+        self._order = itertools.count()
+        self._last_served = {}
+        self._served_turn = 0
+        self._cond = threading.Condition()
+        self._threads = []
+
+    @classmethod
+    def from_env(cls, environ=None):
+        """قراءة إعدادات الجدولة من متغيرات البيئة"""
+        environ = os.environ if environ is None else environ
+        max_workers = environ.get('PPTX_MAX_CONCURRENT_JOBS')
+        job_timeout = int(environ.get('PPTX_JOB_TIMEOUT', 0))
+        return cls(
+            max_workers=int(max_workers) if max_workers else None,
+            memory_budget=int(environ.get('PPTX_MEMORY_BUDGET_MB', DEFAULT_MEMORY_BUDGET // MB)) * MB,
+            job_memory=int(environ.get('PPTX_JOB_MEMORY_MB', DEFAULT_JOB_MEMORY // MB)) * MB,
+            job_timeout=job_timeout or None,
+            retention=int(environ.get('PPTX_JOB_RETENTION', DEFAULT_JOB_RETENTION))
+        )
+
+    def _ensure_workers(self):
+        if self._threads:
+            return
+        for i in range(self.max_concurrent):
+            thread = threading.Thread(target=self._worker, name=f'pptx-job-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, owner, func, memory_estimate=DEFAULT_JOB_MEMORY, label=None, log=None,
+               timeout=None, on_cancel=None):
+        """إضافة مهمة إلى طابور المالك؛ func تستقبل المهمة وتعيد نتيجتها
+
+        on_cancel تستقبل المهمة بعد إلغائها (قبل البدء أو بعد توقفها) لتحرير مواردها.
+        """
+        job = Job(owner, func, memory_estimate=memory_estimate, label=label, log=log,
+                  timeout=timeout or self.job_timeout, on_cancel=on_cancel)
+        with self._cond:
+            self._ensure_workers()
+            self._jobs[job.id] = job
+            self._queues.setdefault(owner, deque()).append((next(self._order), job))
+            self._cond.notify()
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id, reason=CANCELLED_BY_USER):
+        """إلغاء مهمة؛ المنتظرة تحذف من الطابور فوراً، والجارية تتوقف عند الفحص التالي
+
+        يعيد False إذا كانت المهمة غير موجودة أو منتهية.
+        """
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if not job or job.finished:
+                return False
+            job.cancel(reason)
+            if job.status != QUEUED:
+                return True
+            queue = self._queues.get(job.owner)
+            if queue:
+                self._queues[job.owner] = deque(entry for entry in queue if entry[1] is not job)
+                if not self._queues[job.owner]:
+                    del self._queues[job.owner]
+            job.status = CANCELLED
+            job.error = reason
+            job.finished_at = time.time()
+            self._cond.notify_all()
+        job.log.add(f"⏹ {reason}", "warning")
+        if job.on_cancel:
+            job.on_cancel(job)
+        job.release()
+        return True
+
+    def forget(self, job_id):
+        """حذف مهمة منتهية من السجل"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job and job.finished:
+                del self._jobs[job_id]
+
+    def expire_finished(self, now=None):
+        """حذف المهام التي انتهت منذ أكثر من مدة الاحتفاظ؛ يعيد عدد المهام المحذوفة"""
+        cutoff = (time.time() if now is None else now) - self.retention
+        with self._cond:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.finished and job.finished_at is not None and job.finished_at < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+        return len(expired)
+
+    def _running_count(self, owner):
+        return sum(1 for job in self._running.values() if job.owner == owner)
+
+    def _running_memory(self):
+        return sum(job.memory_estimate for job in self._running.values())
+
+    def _dispatch_order(self):
+        """ترتيب المهام المنتظرة كما سيتم تشغيلها (دون تغيير الطوابير)
+
+        الأولوية للمالك صاحب أقل عدد من المهام الجارية، ثم لمن خُدم منذ
+        أطول مدة (تناوب دوري)، ثم للأقدم انتظاراً.
+        """
+        running = {owner: self._running_count(owner) for owner in self._queues}
+        served = {owner: self._last_served.get(owner, -1) for owner in self._queues}
+        queues = {owner: list(queue) for owner, queue in self._queues.items() if queue}
+        turn = itertools.count(self._served_turn)
+        order = []
+        while queues:
+            owner = min(queues, key=lambda o: (running[o], served[o], queues[o][0][0]))
+            order.append(queues[owner].pop(0)[1])
+            running[owner] += 1
+            served[owner] = next(turn)
+            if not queues[owner]:
+                del queues[owner]
+        return order
+
+    def _next_job(self):
+        order = self._dispatch_order()
+        if not order:
+            return None
+        job = order[0]
+        # مهمة واحدة على الأقل تعمل دائماً حتى لو تجاوز تقديرها ميزانية الذاكرة
+        if self._running and self._running_memory() + job.memory_estimate > self.memory_budget:
+            return None
+        self._queues[job.owner].popleft()
+        if not self._queues[job.owner]:
+            del self._queues[job.owner]
+        self._last_served[job.owner] = self._served_turn
+        self._served_turn += 1
+        return job
+
+    def position(self, job_id):
+        """موقع المهمة في الطابور (1 = التالية)، أو 0 إذا لم تكن منتظرة"""
+        with self._cond:
+            for index, job in enumerate(self._dispatch_order()):
+                if job.id == job_id:
+                    return index + 1
+        return 0
+
+    def stats(self):
+        with self._cond:
+            return {
+                'max_concurrent': self.max_concurrent,
+                'running': len(self._running),
+                'queued': sum(len(queue) for queue in self._queues.values()),
+                'memory_budget': self.memory_budget,
+                'running_memory': self._running_memory()
+            }
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job = None
+                while job is None:
+                    if len(self._running) < self.max_concurrent:
+                        job = self._next_job()
+                    if job is None:
+                        self._cond.wait()
+                job.status = RUNNING
+                job.started_at = time.time()
+                if job.timeout:
+                    job.deadline = time.monotonic() + job.timeout
+                self._running[job.id] = job
+
+            try:
+                job.result = job.func(job)
+                job.status = DONE
+            except JobCancelled as e:
+                job.error = str(e)
+                job.log.add(f"⏹ {e}", "warning")
+                job.status = CANCELLED
+                if job.on_cancel:
+                    try:
+                        job.on_cancel(job)
+                    except Exception:
+                        pass
+            except Exception as e:
+                job.error = str(e)
+                job.log.add(f"❌ خطأ عام أثناء المعالجة: {e}", "error")
+                job.status = FAILED
+            finally:
+                job.release()
+                job.finished_at = time.time()
+                with self._cond:
+                    self._running.pop(job.id, None)
+                    self._cond.notify_all()
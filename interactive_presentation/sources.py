@@ -0,0 +1,251 @@
+"""مصادر المجلدات: قراءة شجرة مجلدات محلية أو مركّبة (NFS) في مكانها دون نسخ
+
+كل مجلد يحتوي على صور مباشرة يصبح شريحة، مهما كان عمقه في الشجرة؛
+اسم الشريحة هو المسار النسبي للمجلد (مثل 'رحلات/2024').
+"""
+import hashlib
+import io
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from PIL import Image
+
+from admission import is_image_name
+from engine import (ORDER_ALPHABETICAL, LazyFile, analyze_slide_placeholders, build_folder_slide,
+                    load_template, move_slide, remove_slide, save_presentation)
+from processing_log import ProcessingLog
+
+
+class SourceFolder:
+    """مجلد صور واحد مع بصمة محتواه (الأسماء والأحجام وأوقات التعديل)
+
+    الصور صفوف ثابتة (الاسم، الحجم، وقت التعديل بالنانوثانية) من المسح، فيمكن
+    مشاركة المجلد بين كل المراحل دون نسخه؛ المراحل التي تغير الصور تنشئ مجلداً
+    جديداً. dimensions أبعاد الصور المقروءة أثناء المسح (إن طلبت)، للقراءة فقط.
+    replacements قاموس من اسم الصورة إلى بايتات تستخدم بدلاً من الملف (صورة بديلة).
+    """
+
+    def __init__(self, name, path, images, replacements=None, dimensions=None):
+        self.name = name
+        self.path = path
+        self.images = tuple(images)
+        self.replacements = replacements or {}
+        self.dimensions = dict(dimensions or {})
+
+    @property
+    def signature(self):
+        return self.images
+
+    @property
+    def total_bytes(self):
+        return sum(size for _, size, _ in self.images)
+
+    def open_images(self):
+        """الصور كأزواج (اسم الملف، تدفق كسول) كما يتوقعها المحرك"""
+        for image_name, _, mtime_ns in self.images:
+            if image_name in self.replacements:
+                yield image_name, io.BytesIO(self.replacements[image_name])
+            else:
+                yield image_name, LazyFile(os.path.join(self.path, image_name), mtime_ns)
+
+
+def scan_workers_from_env(environ=None):
+    """عدد خيوط المسح (PPTX_SCAN_WORKERS)؛ المسح ينتظر الشبكة أو القرص أساساً"""
+    environ = os.environ if environ is None else environ
+    value = environ.get('PPTX_SCAN_WORKERS')
+    return int(value) if value else min(32, (os.cpu_count() or 1) * 4)
+
+
+def list_directory(path):
+    """قائمة مجلد واحد: (الصور، المجلدات الفرعية) أو None إذا تعذرت قراءته
+
+    الروابط الرمزية (ملفات أو مجلدات) لا تدخل في القائمة.
+    """
+    images = []
+    subdirs = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                # الروابط الرمزية لا تتبع: قد تشير إلى ملف خارج الجذر المسموح به
+                elif entry.is_file(follow_symlinks=False) and is_image_name(entry.name):
+                    stat = entry.stat(follow_symlinks=False)
+                    images.append((entry.name, stat.st_size, stat.st_mtime_ns))
+    except OSError:
+        return None
+    return images, subdirs
+
+
+def read_image_dimensions(path):
+    """(العرض، الارتفاع) من ترويسة الصورة فقط، أو None إذا تعذرت قراءتها"""
+    try:
+        with Image.open(path) as img:
+            return img.size
+    except Exception:
+        return None
+
+
+def folder_name(root, path):
+    """اسم الشريحة: المسار النسبي للمجلد، أو اسم الجذر نفسه"""
+    if path == root:
+        return os.path.basename(root)
+    return os.path.relpath(path, root).replace(os.sep, '/')
+
+
+def scan_directory(root, nested=True, include_root=True, dimensions=None, max_workers=None):
+    """مسح الشجرة وإرجاع (المجلدات مرتبة حسب الاسم، المجلدات الفارغة)
+
+    قوائم المجلدات وترويسات الصور تطلب بالتوازي من عدد محدود من الخيوط، فعلى
+    NFS أو SMB لا ينتظر كل طلب انتهاء السابق. dimensions يحدد الصور التي تقرأ
+    أبعادها في المرور نفسه: True لكل الصور، أو دالة (اسم المجلد، صوره) تعيد
+    أسماء الصور المطلوبة (مثل الصور التي ستستخدمها المواضع فقط). كل مجلد
+    يقرأ مرة واحدة، والنتيجة تستخدمها كل المراحل التالية (البصمة والخطة
+    والفحص والإنشاء) دون قراءة المجلدات مرة أخرى.
+    المجلدات الفارغة هي المجلدات النهائية التي لا تحتوي على صور ولا على مجلدات فرعية.
+    """
+    root = os.path.abspath(root)
+    listings = {}
+    headers = {}
+    with ThreadPoolExecutor(max_workers=max_workers or scan_workers_from_env()) as executor:
+        pending = {executor.submit(list_directory, root): root}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = pending.pop(future)
+                listing = future.result()
+                if listing is None:
+                    continue
+                images, subdirs = listing
+                if path == root and not include_root:
+                    images = []
+                listings[path] = (images, subdirs)
+                if dimensions and images:
+                    if dimensions is True:
+                        wanted = [image_name for image_name, _, _ in images]
+                    else:
+                        wanted = dimensions(folder_name(root, path), sorted(images))
+                    for image_name in wanted:
+                        headers[(path, image_name)] = executor.submit(
+                            read_image_dimensions, os.path.join(path, image_name))
+                if nested or path == root:
+                    for subdir in subdirs:
+                        pending[executor.submit(list_directory, subdir)] = subdir
+
+    folders = []
+    empty = []
+    for path, (images, subdirs) in listings.items():
+        name = folder_name(root, path)
+        if images:
+            sizes = {}
+            for image_name, _, _ in images:
+                future = headers.get((path, image_name))
+                if future and future.result():
+                    sizes[image_name] = future.result()
+            folders.append(SourceFolder(name, path, sorted(images), dimensions=sizes))
+        elif not subdirs and path != root:
+            empty.append(name)
+
+    folders.sort(key=lambda folder: folder.name)
+    empty.sort()
+    return folders, empty
+
+
+def directory_digest(folders):
+    """بصمة محتوى الشجرة دون قراءة الصور (تكفي لمفتاح ذاكرة النتائج)"""
+    digest = hashlib.sha256()
+    for folder in folders:
+        digest.update(folder.name.encode('utf-8'))
+        for image_name, size, mtime_ns in folder.images:
+            digest.update(f'\0{image_name}\0{size}\0{mtime_ns}'.encode('utf-8'))
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+
+def resolve_source_path(path, allowed_roots):
+    """التحقق من أن المسار المطلوب يقع داخل أحد الجذور المسموح بها وإرجاع مساره الحقيقي"""
+    if not path or not allowed_roots:
+        return None
+    real_path = os.path.realpath(path)
+    for allowed in allowed_roots:
+        allowed = os.path.realpath(allowed)
+        if real_path == allowed or real_path.startswith(allowed + os.sep):
+            return real_path if os.path.isdir(real_path) else None
+    return None
+
+
+class WatchedDeck:
+    """عرض مرتبط بمجلد: يتم إنشاؤه كاملاً مرة واحدة ثم تحديث الشرائح المتأثرة فقط
+
+    عند كل تحديث تتم مقارنة بصمة كل مجلد بالبصمة السابقة؛ المجلدات المعدلة
+    يعاد بناء شرائحها، والجديدة تضاف في موضعها، والمحذوفة تحذف شرائحها.
+    """
+
+    def __init__(self, template, config, root, output, slide_analysis=None,
+                 image_order=ORDER_ALPHABETICAL, seed='', nested=True, log=None):
+        self.prs = load_template(template)
+        if len(self.prs.slides) == 0:
+            raise ValueError('لا توجد شرائح في ملف PowerPoint')
+        self.config = config
+        self.root = root
+        self.output = output
+        self.slide_analysis = slide_analysis or analyze_slide_placeholders(self.prs)
+        self.image_order = image_order
+        self.seed = seed
+        self.nested = nested
+        self.log = log if log is not None else ProcessingLog()
+        self.slide_layout = self.prs.slides[0].slide_layout
+        self._slides = {}
+        self._signatures = {}
+        self._stop = threading.Event()
+
+    def _build(self, folder):
+        return build_folder_slide(self.prs, self.slide_layout, folder.name, list(folder.open_images()),
+                                  self.slide_analysis, self.config, self.image_order, self.seed, self.log)
+
+    def refresh(self):
+        """مزامنة العرض مع المجلد وحفظه إذا تغير؛ يعيد المجلدات المضافة والمعدلة والمحذوفة"""
+        folders, _ = scan_directory(self.root, nested=self.nested)
+        current = {folder.name: folder for folder in folders}
+        changes = {
+            'added': sorted(set(current) - set(self._slides)),
+            'changed': sorted(name for name in current
+                              if name in self._signatures and current[name].signature != self._signatures[name]),
+            'removed': sorted(set(self._slides) - set(current))
+        }
+
+        for name in changes['removed'] + changes['changed']:
+            remove_slide(self.prs, self._slides.pop(name))
+            del self._signatures[name]
+            if name in changes['removed']:
+                self.log.add(f"🗑 تم حذف شريحة المجلد '{name}'", "info")
+
+        for name in changes['changed'] + changes['added']:
+            try:
+                self._slides[name] = self._build(current[name])
+                self._signatures[name] = current[name].signature
+            except Exception as e:
+                self.log.add(f"❌ خطأ في معالجة المجلد {name}: {str(e)}", "error")
+
+        if not any(changes.values()):
+            return changes
+
+        # الشرائح بعد شريحة القالب بنفس ترتيب أسماء المجلدات
+        for position, name in enumerate(sorted(self._slides), 1):
+            move_slide(self.prs, self._slides[name], position)
+        save_presentation(self.prs, self.output)
+        return changes
+
+    def watch(self, interval=2.0, on_change=None):
+        """تحديث دوري حتى استدعاء stop(); on_change يستقبل التغييرات بعد كل حفظ"""
+        while not self._stop.is_set():
+            changes = self.refresh()
+            if on_change and any(changes.values()):
+                on_change(changes)
+            self._stop.wait(interval)
+
+    def stop(self):
+        self._stop.set()
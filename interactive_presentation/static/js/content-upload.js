@@ -0,0 +1,153 @@
+/**
+ * Content Upload JavaScript
+ * Hashes every photo of the selected ZIP in the browser, sends the folder manifest
+ * first and uploads only the photos the server does not already have
+ */
+
+// Same extensions as the server (admission.IMAGE_EXTENSIONS)
+const CONTENT_IMAGE_EXTENSIONS = ['png', 'jpg', 'jpeg', 'gif', 'bmp', 'tiff', 'webp'];
+const MAX_BLOB_UPLOADS = 4;
+
+/**
+ * Check that the browser can hash and read the archive entries
+ * (crypto.subtle is only available on https and localhost)
+ * @returns {boolean}
+ */
+function canUploadByContent() {
+    return typeof crypto !== 'undefined' && !!crypto.subtle &&
+        typeof DecompressionStream !== 'undefined';
+}
+
+/**
+ * Hex SHA-256 of a buffer
+ * @param {ArrayBuffer} buffer
+ * @returns {Promise<string>}
+ */
+async function sha256Hex(buffer) {
+    const digest = new Uint8Array(await crypto.subtle.digest('SHA-256', buffer));
+    return Array.from(digest, byte => byte.toString(16).padStart(2, '0')).join('');
+}
+
+/**
+ * The folders as they appear after extraction (same rules as planner.folders_from_archive)
+ * @param {Array} entries - The archive entries from readZipEntries
+ * @returns {{images: Map, empty: Array}} Folder name -> image entries, and the empty folders
+ */
+function contentFolders(entries) {
+    const images = new Map();
+    const dirs = new Set();
+    for (const entry of entries) {
+        const parts = entry.name.replace(/\\/g, '/').split('/').filter(part => part);
+        if (!parts.length || parts.some(part => part.startsWith('.'))) continue;
+        const isDir = entry.name.endsWith('/');
+        const depth = isDir ? parts.length : parts.length - 1;
+        for (let i = 1; i <= depth; i++) {
+            dirs.add(parts.slice(0, i).join('/'));
+        }
+        const extension = parts[parts.length - 1].split('.').pop().toLowerCase();
+        if (isDir || parts.length < 2 || !CONTENT_IMAGE_EXTENSIONS.includes(extension)) continue;
+        const folder = parts.slice(0, -1).join('/');
+        if (!images.has(folder)) images.set(folder, []);
+        images.get(folder).push({ name: parts[parts.length - 1], entry });
+    }
+
+    const parents = new Set([...dirs].filter(name => name.includes('/'))
+        .map(name => name.slice(0, name.lastIndexOf('/'))));
+    const empty = [...dirs].filter(name => !images.has(name) && !parents.has(name)).sort();
+    return { images, empty };
+}
+
+/**
+ * Hash every photo and build the manifest, keeping the bytes of each digest for upload
+ * @param {File} file - The archive
+ * @param {Function} onProgress - Called with (done, total)
+ * @returns {Promise<{manifest: Object, blobs: Map}>}
+ */
+async function buildContentManifest(file, onProgress) {
+    const { images, empty } = contentFolders(await readZipEntries(file));
+    const jobs = [];
+    const folders = [...images.entries()].map(([name, items]) => ({
+        name,
+        images: items.map(item => {
+            const image = { name: item.name };
+            jobs.push({ image, entry: item.entry });
+            return image;
+        })
+    }));
+
+    // Only the location of each digest is kept, the bytes are read again on upload
+    const blobs = new Map();
+    let done = 0;
+    let next = 0;
+    const runner = async () => {
+        while (next < jobs.length) {
+            const { image, entry } = jobs[next++];
+            const data = await readEntryData(file, entry);
+            image.sha256 = await sha256Hex(data);
+            image.size = data.byteLength;
+            blobs.set(image.sha256, entry);
+            onProgress(++done, jobs.length);
+        }
+    };
+    await Promise.all(Array.from({ length: MAX_BLOB_UPLOADS }, runner));
+
+    return { manifest: { folders, empty }, blobs };
+}
+
+/**
+ * Upload the given digests, a few at a time
+ * @param {File} file - The archive
+ * @param {Map} blobs - Digest -> archive entry
+ * @param {Array<string>} digests
+ * @param {Function} onProgress - Called with (done, total)
+ * @returns {Promise<void>}
+ */
+async function uploadBlobs(file, blobs, digests, onProgress) {
+    let done = 0;
+    let next = 0;
+    const runner = async () => {
+        while (next < digests.length) {
+            const digest = digests[next++];
+            const response = await fetch(`/blobs/${digest}`, {
+                method: 'PUT',
+                headers: { 'Content-Type': 'application/octet-stream' },
+                body: await readEntryData(file, blobs.get(digest))
+            });
+            const result = await response.json();
+            if (!result.success) throw new Error(result.error);
+            onProgress(++done, digests.length);
+        }
+    };
+    await Promise.all(Array.from({ length: MAX_BLOB_UPLOADS }, runner));
+}
+
+/**
+ * Start the job from the manifest: only new photos travel over the network
+ * @param {File} archive - The archive to read the photos from (possibly downscaled)
+ * @param {Object} options - The generation options (buildJobOptions)
+ * @param {Function} showProgress - Called with a status message
+ * @returns {Promise<Object>} The job response, like /upload-zip
+ */
+async function uploadByContent(archive, options, showProgress) {
+    const { manifest, blobs } = await buildContentManifest(archive, (done, total) =>
+        showProgress(`جاري حساب بصمات الصور ${done} / ${total}...`));
+
+    const postJson = (url, body) => fetch(url, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(body)
+    }).then(response => response.json());
+
+    const result = await postJson('/manifest', manifest);
+    if (!result.success) return result;
+    const onUpload = (done, total) => showProgress(`جاري رفع الصور الجديدة ${done} / ${total}...`);
+    await uploadBlobs(archive, blobs, result.missing, onUpload);
+
+    let response = await postJson('/manifest/submit', options);
+    if (response.missing) {
+        // Evicted from the store since the manifest was sent (or never sent by this browser): upload them once
+        await uploadBlobs(archive, blobs, response.missing, onUpload);
+        response = await postJson('/manifest/submit', options);
+    }
+    return response;
+}
@@ -0,0 +1,117 @@
+/**
+ * Downscale Worker
+ * Fits one photo to the largest placeholder that can receive it, off the main thread
+ */
+
+// Same quality as the server-side resize (engine.JPEG_QUALITY)
+const JPEG_QUALITY = 0.9;
+
+/**
+ * Find the APP1 Exif segment of a JPEG
+ * @param {Uint8Array} bytes - The JPEG file
+ * @returns {Uint8Array|null} The whole segment including its marker, or null
+ */
+function findExifSegment(bytes) {
+    if (bytes[0] !== 0xFF || bytes[1] !== 0xD8) return null;
+    let offset = 2;
+    while (offset + 4 <= bytes.length && bytes[offset] === 0xFF) {
+        const marker = bytes[offset + 1];
+        // Start of scan: no more metadata segments
+        if (marker === 0xDA) break;
+        const length = (bytes[offset + 2] << 8) | bytes[offset + 3];
+        if (marker === 0xE1 && String.fromCharCode(...bytes.subarray(offset + 4, offset + 8)) === 'Exif') {
+            return bytes.subarray(offset, offset + 2 + length);
+        }
+        offset += 2 + length;
+    }
+    return null;
+}
+
+/**
+ * Read the Exif orientation tag (0x0112)
+ * @param {Uint8Array} segment - The APP1 Exif segment
+ * @returns {number} The orientation, 1 when missing
+ */
+function readOrientation(segment) {
+    const tiff = 10;
+    const view = new DataView(segment.buffer, segment.byteOffset, segment.byteLength);
+    if (segment.length < tiff + 8) return 1;
+    const little = view.getUint16(tiff) === 0x4949;
+    const ifd = tiff + view.getUint32(tiff + 4, little);
+    if (ifd + 2 > segment.length) return 1;
+    const count = view.getUint16(ifd, little);
+    for (let i = 0; i < count; i++) {
+        const entry = ifd + 2 + i * 12;
+        if (entry + 12 > segment.length) break;
+        if (view.getUint16(entry, little) === 0x0112) {
+            return view.getUint16(entry + 8, little);
+        }
+    }
+    return 1;
+}
+
+/**
+ * Insert an Exif segment right after the start of image (and the JFIF header, if any)
+ * @param {Uint8Array} jpeg - The re-encoded JPEG
+ * @param {Uint8Array} segment - The original APP1 Exif segment
+ * @returns {Uint8Array} The JPEG with the Exif segment
+ */
+function insertExifSegment(jpeg, segment) {
+    let offset = 2;
+    if (jpeg[2] === 0xFF && jpeg[3] === 0xE0) {
+        offset += 2 + ((jpeg[4] << 8) | jpeg[5]);
+    }
+    const output = new Uint8Array(jpeg.length + segment.length);
+    output.set(jpeg.subarray(0, offset), 0);
+    output.set(segment, offset);
+    output.set(jpeg.subarray(offset), offset + segment.length);
+    return output;
+}
+
+/**
+ * Downscale one photo so it still covers every placeholder size (the server crops the same way)
+ *
+ * Replies with buffer = null when the photo is kept as is: already small enough,
+ * rotated by Exif (the browser would bake the rotation into the pixels), not
+ * decodable, or not smaller after re-encoding.
+ */
+self.onmessage = async event => {
+    const { id, buffer, type, sizes, keepExif } = event.data;
+    try {
+        const original = new Uint8Array(buffer);
+        const exif = type === 'image/jpeg' ? findExifSegment(original) : null;
+        if (exif && readOrientation(exif) !== 1) {
+            self.postMessage({ id, buffer: null });
+            return;
+        }
+
+        const bitmap = await createImageBitmap(new Blob([original], { type }));
+        const scale = Math.max(...sizes.map(([width, height]) =>
+            Math.max(width / bitmap.width, height / bitmap.height)));
+        if (scale >= 1) {
+            bitmap.close();
+            self.postMessage({ id, buffer: null });
+            return;
+        }
+
+        const canvas = new OffscreenCanvas(Math.max(1, Math.round(bitmap.width * scale)),
+                                           Math.max(1, Math.round(bitmap.height * scale)));
+        const context = canvas.getContext('2d');
+        context.imageSmoothingQuality = 'high';
+        context.drawImage(bitmap, 0, 0, canvas.width, canvas.height);
+        bitmap.close();
+
+        const blob = await canvas.convertToBlob({ type, quality: JPEG_QUALITY });
+        let output = new Uint8Array(await blob.arrayBuffer());
+        if (exif && keepExif) {
+            output = insertExifSegment(output, exif);
+        }
+        if (output.length >= original.length) {
+            self.postMessage({ id, buffer: null });
+            return;
+        }
+        self.postMessage({ id, buffer: output.buffer }, [output.buffer]);
+    } catch (error) {
+        self.postMessage({ id, buffer: null, error: String(error) });
+    }
+};
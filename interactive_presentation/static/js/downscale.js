@@ -0,0 +1,282 @@
+/**
+ * Downscale JavaScript
+ * Rebuilds the selected ZIP in the browser with photos fitted to the template's
+ * placeholder sizes, so only the pixels that will be used are uploaded
+ */
+
+const DOWNSCALE_WORKER_URL = '/static/js/downscale-worker.js';
+const DOWNSCALE_TYPES = { jpg: 'image/jpeg', jpeg: 'image/jpeg', png: 'image/png' };
+const MAX_DOWNSCALE_WORKERS = 4;
+
+/**
+ * Check that the browser has everything needed to downscale before upload
+ * @returns {boolean}
+ */
+function canDownscaleInBrowser() {
+    return typeof Worker !== 'undefined' &&
+        typeof OffscreenCanvas !== 'undefined' &&
+        typeof createImageBitmap !== 'undefined' &&
+        typeof DecompressionStream !== 'undefined';
+}
+
+let crcTable = null;
+
+/**
+ * CRC-32 of a byte array (as stored in ZIP headers)
+ * @param {Uint8Array} bytes
+ * @returns {number}
+ */
+function crc32(bytes) {
+    if (!crcTable) {
+        crcTable = new Uint32Array(256);
+        for (let n = 0; n < 256; n++) {
+            let c = n;
+            for (let k = 0; k < 8; k++) {
+                c = c & 1 ? 0xEDB88320 ^ (c >>> 1) : c >>> 1;
+            }
+            crcTable[n] = c >>> 0;
+        }
+    }
+    let crc = 0xFFFFFFFF;
+    for (let i = 0; i < bytes.length; i++) {
+        crc = crcTable[(crc ^ bytes[i]) & 0xFF] ^ (crc >>> 8);
+    }
+    return (crc ^ 0xFFFFFFFF) >>> 0;
+}
+
+/**
+ * Read the entries of a ZIP file from its central directory
+ * @param {File} file - The selected archive
+ * @returns {Promise<Array>} The entries with their raw header fields
+ */
+async function readZipEntries(file) {
+    const tailSize = Math.min(file.size, 65535 + 22);
+    const tail = new DataView(await file.slice(file.size - tailSize).arrayBuffer());
+    let end = -1;
+    for (let i = tailSize - 22; i >= 0; i--) {
+        if (tail.getUint32(i, true) === 0x06054B50) {
+            end = i;
+            break;
+        }
+    }
+    if (end < 0) throw new Error('Not a ZIP file');
+
+    const count = tail.getUint16(end + 10, true);
+    const directorySize = tail.getUint32(end + 12, true);
+    const directoryOffset = tail.getUint32(end + 16, true);
+    if (count === 0xFFFF || directoryOffset === 0xFFFFFFFF) throw new Error('ZIP64 is not supported');
+
+    const directory = new Uint8Array(await file.slice(directoryOffset, directoryOffset + directorySize).arrayBuffer());
+    const view = new DataView(directory.buffer);
+    const decoder = new TextDecoder();
+    const entries = [];
+    let offset = 0;
+    for (let i = 0; i < count; i++) {
+        if (view.getUint32(offset, true) !== 0x02014B50) throw new Error('Invalid central directory');
+        const nameLength = view.getUint16(offset + 28, true);
+        const extraLength = view.getUint16(offset + 30, true);
+        const commentLength = view.getUint16(offset + 32, true);
+        const nameBytes = directory.slice(offset + 46, offset + 46 + nameLength);
+        entries.push({
+            flags: view.getUint16(offset + 8, true),
+            method: view.getUint16(offset + 10, true),
+            time: view.getUint16(offset + 12, true),
+            date: view.getUint16(offset + 14, true),
+            crc: view.getUint32(offset + 16, true),
+            compressedSize: view.getUint32(offset + 20, true),
+            size: view.getUint32(offset + 24, true),
+            localOffset: view.getUint32(offset + 42, true),
+            nameBytes,
+            name: decoder.decode(nameBytes)
+        });
+        offset += 46 + nameLength + extraLength + commentLength;
+    }
+    return entries;
+}
+
+/**
+ * The compressed bytes of an entry, as a lazy slice of the file
+ * @param {File} file
+ * @param {Object} entry
+ * @returns {Promise<Blob>}
+ */
+async function readRawEntry(file, entry) {
+    const header = new DataView(await file.slice(entry.localOffset, entry.localOffset + 30).arrayBuffer());
+    const start = entry.localOffset + 30 + header.getUint16(26, true) + header.getUint16(28, true);
+    return file.slice(start, start + entry.compressedSize);
+}
+
+/**
+ * The uncompressed bytes of an entry (stored or deflated)
+ * @param {File} file
+ * @param {Object} entry
+ * @returns {Promise<ArrayBuffer>}
+ */
+async function readEntryData(file, entry) {
+    const raw = await readRawEntry(file, entry);
+    if (entry.method === 0) return raw.arrayBuffer();
+    if (entry.method === 8) {
+        return new Response(raw.stream().pipeThrough(new DecompressionStream('deflate-raw'))).arrayBuffer();
+    }
+    throw new Error(`Unsupported compression method ${entry.method}`);
+}
+
+/**
+ * Pool of downscale workers; each request resolves with the new bytes or null
+ */
+class DownscalePool {
+    constructor(size) {
+        this.workers = Array.from({ length: size }, () => new Worker(DOWNSCALE_WORKER_URL));
+        this.pending = new Map();
+        this.nextId = 0;
+        this.nextWorker = 0;
+        this.workers.forEach(worker => {
+            worker.onmessage = event => {
+                const resolve = this.pending.get(event.data.id);
+                this.pending.delete(event.data.id);
+                resolve(event.data.buffer);
+            };
+        });
+    }
+
+    downscale(buffer, type, sizes, keepExif) {
+        const id = this.nextId++;
+        const worker = this.workers[this.nextWorker++ % this.workers.length];
+        return new Promise(resolve => {
+            this.pending.set(id, resolve);
+            worker.postMessage({ id, buffer, type, sizes, keepExif }, [buffer]);
+        });
+    }
+
+    close() {
+        this.workers.forEach(worker => worker.terminate());
+    }
+}
+
+/**
+ * Local file header + data + central directory record for one entry
+ */
+function zipRecords(entry, data, offset) {
+    const local = new DataView(new ArrayBuffer(30));
+    local.setUint32(0, 0x04034B50, true);
+    local.setUint16(4, 20, true);
+    // Sizes are written in the header, so no data descriptor (bit 3)
+    local.setUint16(6, entry.flags & ~0x0008, true);
+    local.setUint16(8, entry.method, true);
+    local.setUint16(10, entry.time, true);
+    local.setUint16(12, entry.date, true);
+    local.setUint32(14, entry.crc, true);
+    local.setUint32(18, entry.compressedSize, true);
+    local.setUint32(22, entry.size, true);
+    local.setUint16(26, entry.nameBytes.length, true);
+
+    const central = new DataView(new ArrayBuffer(46));
+    central.setUint32(0, 0x02014B50, true);
+    central.setUint16(4, 20, true);
+    central.setUint16(6, 20, true);
+    for (let i = 6; i < 28; i++) {
+        central.setUint8(i + 2, local.getUint8(i));
+    }
+    central.setUint32(42, offset, true);
+
+    return {
+        local: [local, entry.nameBytes, data],
+        central: [central, entry.nameBytes],
+        length: 30 + entry.nameBytes.length + entry.compressedSize
+    };
+}
+
+/**
+ * Rebuild the archive with every JPEG/PNG fitted to the placeholder sizes
+ *
+ * Photos that are not shrunk and all other members are copied still compressed,
+ * so the result only differs where pixels were dropped.
+ * @param {File} file - The selected archive
+ * @param {Object} target - The /upload-sizes response
+ * @param {Function} onProgress - Called with (done, total)
+ * @returns {Promise<File>}
+ */
+async function downscaleArchive(file, target, onProgress) {
+    const entries = await readZipEntries(file);
+    const images = entries.filter(entry => {
+        const extension = entry.name.split('.').pop().toLowerCase();
+        return DOWNSCALE_TYPES[extension] && !(entry.flags & 0x0001) && !entry.name.endsWith('/');
+    });
+    const pool = new DownscalePool(Math.min(navigator.hardwareConcurrency || 2, MAX_DOWNSCALE_WORKERS));
+    const replaced = new Map();
+    let done = 0;
+
+    try {
+        let next = 0;
+        const runner = async () => {
+            while (next < images.length) {
+                const entry = images[next++];
+                const type = DOWNSCALE_TYPES[entry.name.split('.').pop().toLowerCase()];
+                const buffer = await pool.downscale(await readEntryData(file, entry), type, target.sizes,
+                                                    target.image_dates);
+                if (buffer) {
+                    replaced.set(entry, new Uint8Array(buffer));
+                }
+                onProgress(++done, images.length);
+            }
+        };
+        // Keep every worker busy while the next entries are read
+        await Promise.all(pool.workers.map(runner));
+    } finally {
+        pool.close();
+    }
+
+    const parts = [];
+    const directory = [];
+    let offset = 0;
+    for (const entry of entries) {
+        let written = entry;
+        let data;
+        const bytes = replaced.get(entry);
+        if (bytes) {
+            written = { ...entry, method: 0, crc: crc32(bytes), compressedSize: bytes.length, size: bytes.length };
+            data = bytes;
+        } else {
+            data = await readRawEntry(file, entry);
+        }
+        const records = zipRecords(written, data, offset);
+        parts.push(...records.local);
+        directory.push(...records.central);
+        offset += records.length;
+    }
+
+    const directorySize = directory.reduce((total, part) => total + part.byteLength, 0);
+    const end = new DataView(new ArrayBuffer(22));
+    end.setUint32(0, 0x06054B50, true);
+    end.setUint16(8, entries.length, true);
+    end.setUint16(10, entries.length, true);
+    end.setUint32(12, directorySize, true);
+    end.setUint32(16, offset, true);
+
+    return new File([...parts, ...directory, end], file.name, { type: 'application/zip' });
+}
+
+/**
+ * The archive to upload: downscaled when enabled and supported, the original otherwise
+ * @param {File} file - The selected archive
+ * @param {Function} onProgress - Called with (done, total) while downscaling
+ * @returns {Promise<File>}
+ */
+function prepareUploadArchive(file, onProgress) {
+    const enabled = document.getElementById('downscale-upload')?.checked;
+    if (!enabled || !canDownscaleInBrowser()) {
+        return Promise.resolve(file);
+    }
+
+    return fetch('/upload-sizes')
+    .then(response => response.json())
+    .then(target => {
+        if (!target.success || !target.sizes.length) return file;
+        return downscaleArchive(file, target, onProgress);
+    })
+    .catch(error => {
+        // Any unsupported archive (ZIP64, encryption...) is uploaded as is
+        console.warn('Uploading the original archive:', error);
+        return file;
+    });
+}
@@ -5,6 +5,10 @@
 
 // Global variables
 let outputFilename = null;
+let currentJobId = null;
+const DETAILS_PAGE_SIZE = 100;
+const JOB_POLL_INTERVAL = 1000;
+let detailsOffset = 0;
 
 // Wait for DOM to be fully loaded
 document.addEventListener('DOMContentLoaded', () => {
@@ -60,6 +64,36 @@ function initProcessPage() {
         startProcessingButton.addEventListener('click', startProcessing);
     }
     
+    const planProcessingButton = document.getElementById('plan-processing');
+    if (planProcessingButton) {
+        planProcessingButton.addEventListener('click', planProcessing);
+    }
+    
+    const browseArchiveButton = document.getElementById('browse-archive');
+    if (browseArchiveButton) {
+        browseArchiveButton.addEventListener('click', browseArchive);
+    }
+    
+    const startDirectoryButton = document.getElementById('start-directory-processing');
+    if (startDirectoryButton) {
+        startDirectoryButton.addEventListener('click', startDirectoryProcessing);
+    }
+    
+    const cancelJobButton = document.getElementById('cancel-job');
+    if (cancelJobButton) {
+        cancelJobButton.addEventListener('click', cancelJob);
+    }
+    
+    const addTargetButton = document.getElementById('add-extra-target');
+    if (addTargetButton) {
+        addTargetButton.addEventListener('click', addExtraTarget);
+    }
+    
+    const clearTargetsButton = document.getElementById('clear-extra-targets');
+    if (clearTargetsButton) {
+        clearTargetsButton.addEventListener('click', clearExtraTargets);
+    }
+    
     // Initialize template settings export/import buttons
     const exportSettingsButton = document.getElementById('export-template-settings');
     if (exportSettingsButton) {
@@ -117,6 +151,46 @@ function initProcessPage() {
         fullscreenBtn.addEventListener('click', openFullscreenSlideshow);
     }
     
+    // Initialize slideshow navigation buttons
+    const prevSlideBtn = document.getElementById('prev-slide');
+    const nextSlideBtn = document.getElementById('next-slide');
+    const fullscreenPrevBtn = document.getElementById('fullscreen-prev');
+    const fullscreenNextBtn = document.getElementById('fullscreen-next');
+    
+    if (prevSlideBtn) prevSlideBtn.addEventListener('click', showPreviousSlide);
+    if (nextSlideBtn) nextSlideBtn.addEventListener('click', showNextSlide);
+    if (fullscreenPrevBtn) fullscreenPrevBtn.addEventListener('click', showPreviousSlideFullscreen);
+    if (fullscreenNextBtn) fullscreenNextBtn.addEventListener('click', showNextSlideFullscreen);
+    
+    // Initialize fullscreen close button
+    const closeFullscreenBtn = document.querySelector('.close-fullscreen');
+    if (closeFullscreenBtn) {
+        closeFullscreenBtn.addEventListener('click', closeFullscreenSlideshow);
+    }
+    
+    // Close fullscreen when clicking outside
+    window.addEventListener('click', (event) => {
+        const fullscreenModal = document.getElementById('fullscreen-slideshow');
+        if (event.target === fullscreenModal) {
+            closeFullscreenSlideshow();
+        }
+    });
+    
+    // Initialize processing details filter and pagination
+    const detailsLevelFilter = document.getElementById('details-level-filter');
+    if (detailsLevelFilter) {
+        detailsLevelFilter.addEventListener('change', () => loadProcessingDetails(true));
+    }
+    
+    const detailsLoadMore = document.getElementById('details-load-more');
+    if (detailsLoadMore) {
+        detailsLoadMore.addEventListener('click', () => loadProcessingDetails(false));
+    }
+    
+    // Display configuration summary
+    updateProcessConfigSummary();
+}
+
 /**
  * Export template settings to a JSON file
  */
@@ -217,37 +291,6 @@ function importTemplateSettings() {
     
     reader.readAsText(file);
 }
-    }
-    }
-    
-    // Initialize slideshow navigation buttons
-    const prevSlideBtn = document.getElementById('prev-slide');
-    const nextSlideBtn = document.getElementById('next-slide');
-    const fullscreenPrevBtn = document.getElementById('fullscreen-prev');
-    const fullscreenNextBtn = document.getElementById('fullscreen-next');
-    
-    if (prevSlideBtn) prevSlideBtn.addEventListener('click', showPreviousSlide);
-    if (nextSlideBtn) nextSlideBtn.addEventListener('click', showNextSlide);
-    if (fullscreenPrevBtn) fullscreenPrevBtn.addEventListener('click', showPreviousSlideFullscreen);
-    if (fullscreenNextBtn) fullscreenNextBtn.addEventListener('click', showNextSlideFullscreen);
-    
-    // Initialize fullscreen close button
-    const closeFullscreenBtn = document.querySelector('.close-fullscreen');
-    if (closeFullscreenBtn) {
-        closeFullscreenBtn.addEventListener('click', closeFullscreenSlideshow);
-    }
-    
-    // Close fullscreen when clicking outside
-    window.addEventListener('click', (event) => {
-        const fullscreenModal = document.getElementById('fullscreen-slideshow');
-        if (event.target === fullscreenModal) {
-            closeFullscreenSlideshow();
-        }
-    });
-    
-    // Display configuration summary
-    updateProcessConfigSummary();
-}
 
 /**
  * Initialize zip file upload functionality
@@ -327,6 +370,16 @@ function handleZipFileSelection() {
     if (startProcessingButton) {
         startProcessingButton.disabled = false;
     }
+    
+    const planProcessingButton = document.getElementById('plan-processing');
+    if (planProcessingButton) {
+        planProcessingButton.disabled = false;
+    }
+    
+    const browseArchiveButton = document.getElementById('browse-archive');
+    if (browseArchiveButton) {
+        browseArchiveButton.disabled = false;
+    }
 }
 
 /**
@@ -439,126 +492,530 @@ function startProcessing() {
         if (progressText) progressText.textContent = 'جاري المعالجة...';
     }
     
-    // Get options
-    const imageOrder = document.querySelector('input[name="image-order"]:checked')?.value || 'alphabetical';
-    const skipEmptyFolders = document.getElementById('skip-empty-folders')?.checked || true;
+    const showProgress = message => {
+        const progressText = uploadProgress?.querySelector('.progress-text');
+        if (progressText) progressText.textContent = message;
+    };
     
-    // Create FormData and upload the file
+    // Fit the photos to the placeholders in the browser first (when enabled), then upload
+    // only the images the server does not have yet (or the whole archive);
+    // processing runs as a queued job on the server
+    prepareUploadArchive(file, (done, total) => showProgress(`جاري تصغير الصور ${done} / ${total}...`))
+    .then(archive => {
+        if (document.getElementById('content-upload')?.checked && canUploadByContent()) {
+            return uploadByContent(archive, buildJobOptions(), showProgress)
+            .catch(error => {
+                console.warn('Uploading the whole archive:', error);
+                return uploadArchive(archive);
+            });
+        }
+        return uploadArchive(archive);
+    })
+    .then(handleJobResponse)
+    .catch(error => {
+        console.error('Error processing files:', error);
+        handleProcessingFailure({});
+    });
+}
+
+/**
+ * Upload the whole archive as one job request
+ * @param {File} archive
+ * @returns {Promise<Object>} The job response
+ */
+function uploadArchive(archive) {
+    return fetch('/upload-zip', {
+        method: 'POST',
+        body: buildUploadFormData(archive)
+    })
+    .then(response => response.json());
+}
+
+/**
+ * Build the upload form with the selected file and the additional options
+ */
+function buildUploadFormData(file) {
     const formData = new FormData();
     formData.append('zip_file', file);
-    formData.append('image_order', imageOrder);
-    formData.append('skip_empty_folders', skipEmptyFolders);
-    
-    // Simulate progress
-    let progress = 0;
-    const progressInterval = setInterval(() => {
-        progress += 2;
-        if (progress > 90) {
-            clearInterval(progressInterval);
-        }
-        if (uploadProgress) {
-            const progressBar = uploadProgress.querySelector('.progress-bar');
-            if (progressBar) progressBar.style.width = `${progress}%`;
-        }
-    }, 200);
+    Object.entries(buildJobOptions()).forEach(([name, value]) => formData.append(name, value));
+    return formData;
+}
+
+/**
+ * The generation options shared by every way of starting a job
+ * @returns {Object}
+ */
+function buildJobOptions() {
+    return {
+        image_order: document.querySelector('input[name="image-order"]:checked')?.value || 'alphabetical',
+        skip_empty_folders: document.getElementById('skip-empty-folders')?.checked ?? true,
+        max_slides_per_deck: document.getElementById('max-slides-per-deck')?.value || 0,
+        max_deck_mb: document.getElementById('max-deck-mb')?.value || 0,
+        invalid_images: document.getElementById('invalid-images')?.value || 'skip',
+        duplicates: document.getElementById('duplicates')?.value || 'off',
+        trace: document.getElementById('trace-job')?.checked ?? false,
+        profile_token: document.getElementById('profile-token')?.value || ''
+    };
+}
+
+/**
+ * Dry run: estimate the job without building the deck
+ */
+function planProcessing() {
+    const fileInput = document.getElementById('zip-upload');
+    if (!fileInput || !fileInput.files.length) return;
+    
+    showLoading('جاري تقدير المهمة...');
     
-    // Upload the file and process
-    fetch('/upload-zip', {
+    fetch('/plan', {
         method: 'POST',
-        body: formData
+        body: buildUploadFormData(fileInput.files[0])
     })
     .then(response => response.json())
     .then(data => {
-        clearInterval(progressInterval);
-        
-        // Hide loading overlay
         hideLoading();
+        showPlanSummary(data);
+    })
+    .catch(error => {
+        hideLoading();
+        console.error('Error planning job:', error);
+        showNotification('حدث خطأ أثناء تقدير المهمة', 'error');
+    });
+}
+
+/**
+ * Show the dry-run result
+ * @param {Object} plan - The plan returned by the server
+ */
+function showPlanSummary(plan) {
+    const container = document.getElementById('plan-summary');
+    if (!container) return;
+    
+    container.style.display = 'block';
+    if (!plan.success) {
+        container.innerHTML = `<p class="error-message">❌ ${plan.error}</p>`;
+        return;
+    }
+    
+    const estimates = plan.estimates;
+    const incomplete = plan.slides.filter(slide => slide.missing.length).length;
+    container.innerHTML = `
+        <h3><i class="fas fa-calculator"></i> تقدير المهمة</h3>
+        <ul>
+            <li>الشرائح: ${plan.slides.length}</li>
+            <li>المجلدات المتخطاة: ${plan.skipped_folders.length}</li>
+            ${incomplete ? `<li>مجلدات لا تكفي صورها لكل المواضع: ${incomplete}</li>` : ''}
+            ${plan.parts ? `<li>عدد الملفات: ${plan.parts.length}</li>` : ''}
+            <li>الحجم المتوقع: ${formatFileSize(estimates.output_bytes)}</li>
+            <li>ذروة الذاكرة: ${formatFileSize(estimates.peak_memory_bytes)}</li>
+            <li>الزمن المتوقع: ${Math.ceil(estimates.runtime_seconds)} ثانية</li>
+        </ul>
+        <p class="plan-note">${estimates.calibrated
+            ? `التقديرات مبنية على ${estimates.calibration_samples} مهمة سابقة`
+            : 'التقديرات تقريبية (لا توجد مهام سابقة للمعايرة بعد)'}</p>
+    `;
+}
+
+/**
+ * Upload the archive for browsing: folders come from the ZIP central directory
+ */
+function browseArchive() {
+    const fileInput = document.getElementById('zip-upload');
+    if (!fileInput || !fileInput.files.length) return;
+    
+    const formData = new FormData();
+    formData.append('zip_file', fileInput.files[0]);
+    showLoading('جاري قراءة محتوى الملف...');
+    
+    fetch('/archive', { method: 'POST', body: formData })
+    .then(response => response.json())
+    .then(data => {
+        hideLoading();
+        const container = document.getElementById('archive-browser');
+        if (!container) return;
+        container.style.display = 'block';
         
-        if (data.success) {
-            // Complete progress bar
-            if (uploadProgress) {
-                const progressBar = uploadProgress.querySelector('.progress-bar');
-                const progressText = uploadProgress.querySelector('.progress-text');
-                if (progressBar) progressBar.style.width = '100%';
-                if (progressText) progressText.textContent = 'تم المعالجة بنجاح!';
-            }
-            
-            // Save output filename
-            outputFilename = data.output_filename;
-            
-            // Show results section
-            showResults(data);
-            
-            // Show processing details
-            showProcessingDetails(data.details);
-            
-            // Hide upload section
-            const uploadContainer = document.querySelector('.upload-container');
-            if (uploadContainer) {
-                uploadContainer.style.display = 'none';
-            }
-            
-            // Hide additional options
-            const additionalOptions = document.querySelector('.additional-options');
-            if (additionalOptions) {
-                additionalOptions.style.display = 'none';
-            }
-            
-            // Hide process buttons
-            const processButtons = document.querySelector('.process-buttons');
-            if (processButtons) {
-                processButtons.style.display = 'none';
-            }
-            
-            // Show success notification
-            showNotification('تم معالجة الملفات بنجاح!', 'success');
-        } else {
-            // Hide loading overlay
-            hideLoading();
-            
-            // Show error
-            if (uploadError) {
-                uploadError.textContent = data.error || 'حدث خطأ أثناء معالجة الملفات.';
-                uploadError.style.display = 'block';
-            }
-            
-            // Hide progress bar
-            if (uploadProgress) {
-                uploadProgress.style.display = 'none';
-            }
-            
-            // Show processing details if available
-            if (data.details) {
-                showProcessingDetails(data.details);
-            }
-            
-            // Show error notification
-            showNotification('حدث خطأ أثناء معالجة الملفات', 'error');
+        const summary = document.getElementById('archive-summary');
+        if (!data.success) {
+            summary.textContent = `❌ ${data.error}`;
+            return;
         }
+        summary.textContent = `${data.summary.folders} مجلد، ${data.summary.images} صورة (${formatFileSize(data.summary.image_bytes)})` +
+            (data.summary.empty_folders.length ? `، ${data.summary.empty_folders.length} مجلد فارغ` : '');
+        showArchiveFolders(data);
     })
     .catch(error => {
-        clearInterval(progressInterval);
-        console.error('Error processing files:', error);
-        
-        // Hide loading overlay
         hideLoading();
+        console.error('Error browsing archive:', error);
+        showNotification('حدث خطأ أثناء قراءة محتوى الملف', 'error');
+    });
+}
+
+/**
+ * Fill a pagination bar with previous/next buttons
+ * @param {string} containerId - The pagination container
+ * @param {Object} pagination - Page information returned by the server
+ * @param {Function} loadPage - Called with the requested page number
+ */
+function showArchivePagination(containerId, pagination, loadPage) {
+    const container = document.getElementById(containerId);
+    if (!container) return;
+    container.innerHTML = '';
+    if (pagination.pages < 2) return;
+    
+    const previous = document.createElement('button');
+    previous.className = 'btn secondary-btn';
+    previous.textContent = 'السابق';
+    previous.disabled = pagination.page <= 1;
+    previous.addEventListener('click', () => loadPage(pagination.page - 1));
+    
+    const label = document.createElement('span');
+    label.textContent = ` ${pagination.page} / ${pagination.pages} `;
+    
+    const next = document.createElement('button');
+    next.className = 'btn secondary-btn';
+    next.textContent = 'التالي';
+    next.disabled = pagination.page >= pagination.pages;
+    next.addEventListener('click', () => loadPage(pagination.page + 1));
+    
+    container.append(previous, label, next);
+}
+
+/**
+ * Show one page of archive folders
+ * @param {Object} data - Folders and pagination returned by the server
+ */
+function showArchiveFolders(data) {
+    const list = document.getElementById('archive-folders');
+    if (!list) return;
+    list.innerHTML = '';
+    
+    data.folders.forEach(folder => {
+        const item = document.createElement('li');
+        item.textContent = `${folder.name} — ${folder.images} صورة (${formatFileSize(folder.bytes)})`;
+        item.addEventListener('click', () => loadArchiveImages(folder.name, 1));
+        list.appendChild(item);
+    });
+    
+    showArchivePagination('archive-folders-pagination', data.pagination, page => {
+        fetch(`/archive/folders?page=${page}`)
+        .then(response => response.json())
+        .then(next => next.success && showArchiveFolders(next));
+    });
+}
+
+/**
+ * Show one page of a folder's images; thumbnails load only when scrolled into view
+ * @param {string} folder - The folder name inside the archive
+ * @param {number} page - The page number
+ */
+function loadArchiveImages(folder, page) {
+    fetch(`/archive/images?folder=${encodeURIComponent(folder)}&page=${page}`)
+    .then(response => response.json())
+    .then(data => {
+        const container = document.getElementById('archive-images');
+        if (!container || !data.success) return;
+        container.innerHTML = '';
         
-        // Show error
+        data.images.forEach(image => {
+            const figure = document.createElement('figure');
+            const img = document.createElement('img');
+            img.loading = 'lazy';
+            img.alt = image.name;
+            img.src = `/archive/thumbnail?folder=${encodeURIComponent(folder)}&image=${encodeURIComponent(image.name)}`;
+            const caption = document.createElement('figcaption');
+            caption.textContent = image.name;
+            figure.append(img, caption);
+            container.appendChild(figure);
+        });
+        
+        showArchivePagination('archive-images-pagination', data.pagination, next => loadArchiveImages(folder, next));
+    });
+}
+
+/**
+ * Generate directly from a directory on the server (no upload)
+ */
+function startDirectoryProcessing() {
+    const sourcePath = document.getElementById('source-path');
+    const uploadError = document.getElementById('zip-upload-error');
+    
+    if (!sourcePath || !sourcePath.value.trim()) {
         if (uploadError) {
-            uploadError.textContent = 'حدث خطأ أثناء معالجة الملفات. الرجاء المحاولة مرة أخرى.';
+            uploadError.textContent = 'الرجاء إدخال مسار المجلد أولاً.';
             uploadError.style.display = 'block';
         }
-        
-        // Hide progress bar
-        if (uploadProgress) {
-            uploadProgress.style.display = 'none';
-        }
-        
-        // Show error notification
-        showNotification('حدث خطأ أثناء معالجة الملفات', 'error');
+        return;
+    }
+    
+    if (uploadError) {
+        uploadError.style.display = 'none';
+    }
+    
+    showLoading('جاري قراءة المجلد...');
+    
+    fetch('/process-directory', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+            path: sourcePath.value.trim(),
+            ...buildJobOptions()
+        })
+    })
+    .then(response => response.json())
+    .then(handleJobResponse)
+    .catch(error => {
+        console.error('Error processing directory:', error);
+        handleProcessingFailure({});
     });
 }
 
+/**
+ * Handle the response of a generation request: a cached result or a queued job
+ */
+function handleJobResponse(data) {
+    if (!data.success) {
+        handleProcessingFailure(data);
+        return;
+    }
+    
+    // A cached result is returned right away without a job
+    if (data.status === 'done') {
+        handleProcessingSuccess(data);
+        return;
+    }
+    
+    setCurrentJob(data.job_id);
+    updateJobProgress(data);
+    pollJobStatus(data.status_url);
+}
+
+/**
+ * Add another template with its exported settings; the next job renders a deck for each
+ */
+function addExtraTarget() {
+    const pptxInput = document.getElementById('extra-target-pptx');
+    const configInput = document.getElementById('extra-target-config');
+    if (!pptxInput.files.length || !configInput.files.length) {
+        showNotification('الرجاء اختيار ملف القالب وملف إعداداته', 'error');
+        return;
+    }
+    
+    const formData = new FormData();
+    formData.append('pptx_file', pptxInput.files[0]);
+    formData.append('config_file', configInput.files[0]);
+    
+    fetch('/targets', { method: 'POST', body: formData })
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) {
+                showNotification(data.error || 'تعذرت إضافة القالب', 'error');
+                return;
+            }
+            pptxInput.value = '';
+            configInput.value = '';
+            renderExtraTargets(data.targets);
+            showNotification('تمت إضافة القالب', 'success');
+        })
+        .catch(error => {
+            console.error('Error adding template:', error);
+            showNotification('تعذرت إضافة القالب', 'error');
+        });
+}
+
+/**
+ * Remove all the extra templates
+ */
+function clearExtraTargets() {
+    fetch('/targets/clear', { method: 'POST' })
+        .then(response => response.json())
+        .then(data => renderExtraTargets(data.targets))
+        .catch(error => {
+            console.error('Error clearing templates:', error);
+        });
+}
+
+/**
+ * Show the names of the extra templates
+ * @param {Array<string>} targets - Template file names
+ */
+function renderExtraTargets(targets) {
+    const list = document.getElementById('extra-targets-list');
+    if (!list) return;
+    list.innerHTML = '';
+    targets.forEach(name => {
+        const item = document.createElement('li');
+        item.textContent = name;
+        list.appendChild(item);
+    });
+}
+
+/**
+ * Remember the running job and show the cancel button while it runs
+ * @param {string|null} jobId - The job id, or null when no job is running
+ */
+function setCurrentJob(jobId) {
+    currentJobId = jobId;
+    const cancelJobButton = document.getElementById('cancel-job');
+    if (cancelJobButton) {
+        cancelJobButton.style.display = jobId ? 'inline-block' : 'none';
+        cancelJobButton.disabled = false;
+    }
+}
+
+/**
+ * Ask the server to cancel the running job; polling reports the cancelled status
+ */
+function cancelJob() {
+    if (!currentJobId) return;
+    
+    const cancelJobButton = document.getElementById('cancel-job');
+    if (cancelJobButton) cancelJobButton.disabled = true;
+    showLoading('جاري إلغاء المهمة...');
+    
+    fetch(`/jobs/${currentJobId}/cancel`, { method: 'POST' })
+        .then(response => response.json())
+        .catch(error => {
+            console.error('Error cancelling job:', error);
+        });
+}
+
+/**
+ * Poll the job status until it finishes
+ * @param {string} statusUrl - The job status endpoint
+ */
+function pollJobStatus(statusUrl) {
+    fetch(statusUrl)
+        .then(response => response.json())
+        .then(data => {
+            if (data.status === 'done') {
+                handleProcessingSuccess(data);
+            } else if (data.status === 'failed' || data.status === 'cancelled' || !data.success) {
+                handleProcessingFailure(data);
+            } else {
+                updateJobProgress(data);
+                setTimeout(() => pollJobStatus(statusUrl), JOB_POLL_INTERVAL);
+            }
+        })
+        .catch(error => {
+            console.error('Error checking job status:', error);
+            handleProcessingFailure({});
+        });
+}
+
+/**
+ * Show the queue position or the folder progress of a running job
+ * @param {Object} data - The job status
+ */
+function updateJobProgress(data) {
+    const uploadProgress = document.getElementById('zip-upload-progress');
+    if (!uploadProgress) return;
+    
+    const progressBar = uploadProgress.querySelector('.progress-bar');
+    const progressText = uploadProgress.querySelector('.progress-text');
+    let message = 'جاري المعالجة...';
+    let percent = 0;
+    
+    if (data.queue_position > 0) {
+        message = `في انتظار دورك في الطابور: الموقع ${data.queue_position}`;
+    } else if (data.progress && data.progress.total > 0) {
+        percent = Math.round((data.progress.done / data.progress.total) * 100);
+        message = `جاري معالجة المجلدات: ${data.progress.done} / ${data.progress.total}`;
+    }
+    
+    if (progressBar) progressBar.style.width = `${percent}%`;
+    if (progressText) progressText.textContent = message;
+    showLoading(message);
+}
+
+/**
+ * Show the results of a finished job
+ * @param {Object} data - The finished job status
+ */
+function handleProcessingSuccess(data) {
+    const uploadProgress = document.getElementById('zip-upload-progress');
+    setCurrentJob(null);
+    
+    // Hide loading overlay
+    hideLoading();
+    
+    // Complete progress bar
+    if (uploadProgress) {
+        const progressBar = uploadProgress.querySelector('.progress-bar');
+        const progressText = uploadProgress.querySelector('.progress-text');
+        if (progressBar) progressBar.style.width = '100%';
+        if (progressText) progressText.textContent = 'تم المعالجة بنجاح!';
+    }
+    
+    // Save output filename
+    outputFilename = data.output_filename;
+    
+    // Show results section
+    showResults(data);
+    
+    // Show processing details
+    showProcessingSummary(data.summary, data.errors);
+    loadProcessingDetails(true);
+    
+    // Hide upload section
+    const uploadContainer = document.querySelector('.upload-container');
+    if (uploadContainer) {
+        uploadContainer.style.display = 'none';
+    }
+    
+    // Hide additional options
+    const additionalOptions = document.querySelector('.additional-options');
+    if (additionalOptions) {
+        additionalOptions.style.display = 'none';
+    }
+    
+    // Hide process buttons
+    const processButtons = document.querySelector('.process-buttons');
+    if (processButtons) {
+        processButtons.style.display = 'none';
+    }
+    
+    // Show success notification
+    showNotification('تم معالجة الملفات بنجاح!', 'success');
+}
+
+/**
+ * Show the error of a rejected or failed job
+ * @param {Object} data - The error response or failed job status
+ */
+function handleProcessingFailure(data) {
+    const uploadProgress = document.getElementById('zip-upload-progress');
+    const uploadError = document.getElementById('zip-upload-error');
+    setCurrentJob(null);
+    
+    // Hide loading overlay
+    hideLoading();
+    
+    // Show error
+    if (uploadError) {
+        uploadError.textContent = data.error || 'حدث خطأ أثناء معالجة الملفات. الرجاء المحاولة مرة أخرى.';
+        uploadError.style.display = 'block';
+    }
+    
+    // Hide progress bar
+    if (uploadProgress) {
+        uploadProgress.style.display = 'none';
+    }
+    
+    // Show processing details if available
+    if (data.summary) {
+        showProcessingSummary(data.summary, data.errors);
+        loadProcessingDetails(true);
+    }
+    
+    // Show error notification
+    if (data.status === 'cancelled') {
+        showNotification('تم إلغاء المهمة', 'warning');
+    } else {
+        showNotification('حدث خطأ أثناء معالجة الملفات', 'error');
+    }
+}
+
 /**
  * Show processing results
  * @param {Object} data - The processing results data
@@ -599,6 +1056,12 @@ function showResults(data) {
                     <div style="display: flex; flex-direction: column; align-items: center; justify-content: center; height: 100%;">
                         <i class="fas fa-file-powerpoint" style="font-size: 64px; color: #3498db; margin-bottom: 20px;"></i>
                         <h3>تم إنشاء ${data.stats.created_slides} شريحة بنجاح</h3>
+                        ${data.parts ? `<p>موزعة على ${data.parts.length} ملف داخل ملف مضغوط واحد</p>` : ''}
+                        ${data.parts && data.parts[0].template ? `<p>القوالب: ${data.parts.map(part => part.template).join('، ')}</p>` : ''}
+                        ${data.validation && data.validation.invalid_count ? `<p>صور تالفة: ${data.validation.invalid_count} من ${data.validation.checked} صورة مفحوصة</p>` : ''}
+                        ${data.duplicates && data.duplicates.removed_images ? `<p>لقطات متكررة محذوفة: ${data.duplicates.removed_images} (تم تجنب ${data.duplicates.avoided_images} صورة بحجم ${(data.duplicates.avoided_bytes / 1048576).toFixed(1)} ميجابايت)</p>` : ''}
+                        ${data.trace_url ? `<p><a href="${data.trace_url}">تحميل التتبع الزمني للمهمة</a></p>` : ''}
+                        ${data.profile_url ? `<p><a href="${data.profile_url}">تحميل تقرير تحليل الأداء</a> (<a href="${data.profile_url}?format=pstats">pstats</a>)</p>` : ''}
                         <p style="margin-top: 10px;">يمكنك تحميل الملف النهائي من خلال زر التحميل أدناه</p>
                     </div>
                 </div>
@@ -607,11 +1070,85 @@ function showResults(data) {
     }
 }
 
+/**
+ * Show the processing log counters and the retained errors
+ * @param {Object} summary - Counters returned by the server
+ * @param {Array} errors - The errors recorded during processing
+ */
+function showProcessingSummary(summary, errors) {
+    const summaryContainer = document.getElementById('processing-details-summary');
+    if (!summaryContainer || !summary) return;
+    
+    const labels = {
+        success: 'نجاح',
+        info: 'معلومات',
+        warning: 'تحذيرات',
+        error: 'أخطاء'
+    };
+    
+    let summaryHTML = '';
+    for (const level in labels) {
+        summaryHTML += `<span class="detail-count ${level}">${labels[level]}: ${summary.counts[level] || 0}</span>`;
+    }
+    
+    if (summary.dropped > 0) {
+        summaryHTML += `<span class="detail-count">تم الاحتفاظ بآخر ${summary.retained} رسالة من أصل ${summary.total}</span>`;
+    }
+    
+    summaryContainer.innerHTML = summaryHTML;
+    
+    // Make sure errors are visible even before the first page is loaded
+    if (errors && errors.length) {
+        showProcessingDetails(errors, false);
+    }
+    
+    const processingDetailsContainer = document.getElementById('processing-details-container');
+    if (processingDetailsContainer) {
+        processingDetailsContainer.style.display = 'block';
+    }
+}
+
+/**
+ * Load a page of the processing log from the server
+ * @param {boolean} reset - Start again from the first page
+ */
+function loadProcessingDetails(reset) {
+    if (reset) {
+        detailsOffset = 0;
+    }
+    
+    const levelFilter = document.getElementById('details-level-filter');
+    const level = levelFilter ? levelFilter.value : '';
+    const params = new URLSearchParams({
+        offset: detailsOffset,
+        limit: DETAILS_PAGE_SIZE,
+        level: level
+    });
+    
+    fetch(`/processing-log?${params.toString()}`)
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) return;
+            
+            showProcessingDetails(data.entries, !reset);
+            detailsOffset = data.offset + data.entries.length;
+            
+            const loadMoreButton = document.getElementById('details-load-more');
+            if (loadMoreButton) {
+                loadMoreButton.style.display = data.has_more ? 'inline-block' : 'none';
+            }
+        })
+        .catch(error => {
+            console.error('Error loading processing details:', error);
+        });
+}
+
 /**
  * Show processing details
  * @param {Array} details - The processing details
+ * @param {boolean} append - Append to the existing entries instead of replacing them
  */
-function showProcessingDetails(details) {
+function showProcessingDetails(details, append = false) {
     const detailsContainer = document.getElementById('processing-details');
     if (!detailsContainer || !details) return;
     
@@ -642,7 +1179,11 @@ function showProcessingDetails(details) {
         `;
     });
     
-    detailsContainer.innerHTML = detailsHTML;
+    if (append) {
+        detailsContainer.insertAdjacentHTML('beforeend', detailsHTML);
+    } else {
+        detailsContainer.innerHTML = detailsHTML;
+    }
 }
 
 /**
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""فهرس مكتبة القوالب: بصمات المواضع لكل شريحة وكل تخطيط في كل قالب
+
+analyze_slide_placeholders تحلل الشريحة الأولى فقط وعناصرها العليا، ويعاد
+تحليلها عند كل رفع. الفهرس يحلل كل الشرائح وكل تخطيطات (layouts) كل قالب في
+مجلد المكتبة، بما فيها العناصر داخل المجموعات، في عمليات متوازية، ويحفظ
+بصمة كل منها (عدد مواضع الصور والنصوص والعناوين ونسب أبعاد مواضع الصور) في
+ملف JSON. عند التحديث لا يعاد تحليل إلا القوالب التي تغير حجمها أو وقت
+تعديلها، واختيار القالب أو التخطيط المناسب لمجلد (حسب عدد صوره مثلاً) يصبح
+بحثاً في قاموس بدلاً من فتح القوالب:
+
+    python template_index.py /srv/templates
+    python template_index.py /srv/templates --images 4 --aspect 1.5
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from pptx import Presentation
+from pptx.enum.shapes import MSO_SHAPE_TYPE, PP_PLACEHOLDER
+
+from engine import move_slide
+
+INDEX_VERSION = 2
+
+KIND_SLIDE = 'slide'
+KIND_LAYOUT = 'layout'
+
+# عناصر الترويسة والتذييل في التخطيطات ليست مواضع يملؤها المستخدم
+CHROME_PLACEHOLDERS = (PP_PLACEHOLDER.DATE, PP_PLACEHOLDER.FOOTER, PP_PLACEHOLDER.SLIDE_NUMBER)
+TITLE_PLACEHOLDERS = (PP_PLACEHOLDER.TITLE, PP_PLACEHOLDER.CENTER_TITLE)
+
+
+def template_library_from_env(environ=None):
+    """مجلد مكتبة القوالب (PPTX_TEMPLATE_LIBRARY)؛ فارغ = الميزة معطلة"""
+    environ = os.environ if environ is None else environ
+    return environ.get('PPTX_TEMPLATE_LIBRARY', '')
+
+
+def template_index_path_from_env(environ=None):
+    """ملف الفهرس (PPTX_TEMPLATE_INDEX، الافتراضي في المجلد المؤقت)"""
+    environ = os.environ if environ is None else environ
+    return environ.get('PPTX_TEMPLATE_INDEX') or os.path.join(tempfile.gettempdir(), 'pptx_template_index.json')
+
+
+def index_workers_from_env(environ=None):
+    """عدد العمليات المستخدمة لتحليل القوالب (PPTX_INDEX_WORKERS، الافتراضي عدد المعالجات)"""
+    environ = os.environ if environ is None else environ
+    value = environ.get('PPTX_INDEX_WORKERS')
+    return int(value) if value else (os.cpu_count() or 1)
+
+
+def iter_shapes(shapes, transform=(0, 0, 1.0, 1.0)):
+    """كل العناصر مع المجموعات المتداخلة كأزواج (العنصر، (يسار، أعلى، عرض، ارتفاع) على الشريحة)
+
+    إحداثيات العناصر داخل المجموعة نسبية لفضاء المجموعة (chOff/chExt)، فيتم
+    تحويلها إلى إحداثيات الشريحة.
+    """
+    offset_x, offset_y, scale_x, scale_y = transform
+    for shape in shapes:
+        if shape.shape_type == MSO_SHAPE_TYPE.GROUP:
+            xfrm = shape._element.grpSpPr.xfrm
+            child_transform = transform
+            if xfrm is not None and xfrm.chOff is not None and xfrm.chExt is not None:
+                group_x = offset_x + xfrm.off.x * scale_x
+                group_y = offset_y + xfrm.off.y * scale_y
+                ratio_x = xfrm.ext.cx / xfrm.chExt.cx if xfrm.chExt.cx else 1.0
+                ratio_y = xfrm.ext.cy / xfrm.chExt.cy if xfrm.chExt.cy else 1.0
+                child_transform = (group_x - xfrm.chOff.x * scale_x * ratio_x,
+                                   group_y - xfrm.chOff.y * scale_y * ratio_y,
+                                   scale_x * ratio_x, scale_y * ratio_y)
+            yield from iter_shapes(shape.shapes, child_transform)
+            continue
+        if shape.width is None or shape.height is None:
+            continue
+        yield shape, (round(offset_x + (shape.left or 0) * scale_x),
+                      round(offset_y + (shape.top or 0) * scale_y),
+                      round(shape.width * scale_x),
+                      round(shape.height * scale_y))
+
+
+def shape_slots(shapes, pictures=True):
+    """المواضع القابلة للملء: مواضع الصور والصور العادية، والعناوين، ومواضع النصوص
+
+    مع pictures=False (التخطيطات) لا تحتسب الصور العادية: الشريحة الجديدة تنسخ
+    مواضع التخطيط فقط، أما صوره (الشعار مثلاً) فتبقى في الخلفية ولا تملأ.
+    """
+    slots = []
+    for shape, (left, top, width, height) in iter_shapes(shapes):
+        if shape.is_placeholder:
+            placeholder_type = shape.placeholder_format.type
+            if placeholder_type in CHROME_PLACEHOLDERS:
+                continue
+            if placeholder_type == PP_PLACEHOLDER.PICTURE:
+                kind = 'image'
+            elif placeholder_type in TITLE_PLACEHOLDERS:
+                kind = 'title'
+            elif shape.has_text_frame:
+                kind = 'text'
+            else:
+                continue
+        elif pictures and shape.shape_type == MSO_SHAPE_TYPE.PICTURE:
+            kind = 'image'
+        else:
+            continue
+        slots.append({
+            'kind': kind,
+            'placeholder': shape.is_placeholder,
+            'left': left,
+            'top': top,
+            'width': width,
+            'height': height
+        })
+    return slots
+
+
+def slots_signature(slots):
+    """بصمة المواضع: الأعداد حسب النوع ونسب أبعاد مواضع الصور (العرض/الارتفاع) مرتبة"""
+    images = [slot for slot in slots if slot['kind'] == 'image']
+    return {
+        'images': len(images),
+        'texts': sum(1 for slot in slots if slot['kind'] == 'text'),
+        'titles': sum(1 for slot in slots if slot['kind'] == 'title'),
+        'aspect_ratios': sorted(round(slot['width'] / slot['height'], 2)
+                                for slot in images if slot['height'])
+    }
+
+
+def analyze_template(path):
+    """تحليل كل الشرائح وكل التخطيطات في قالب واحد (يعمل داخل عملية منفصلة)"""
+    entry = {}
+    try:
+        prs = Presentation(path)
+        layouts = []
+        layout_numbers = {}
+        for master_index, master in enumerate(prs.slide_masters):
+            for layout in master.slide_layouts:
+                slots = shape_slots(layout.shapes, pictures=False)
+                layout_numbers[id(layout.part)] = len(layouts)
+                layouts.append({
+                    'index': len(layouts),
+                    'name': layout.name,
+                    'master': master_index,
+                    'signature': slots_signature(slots),
+                    'slots': slots
+                })
+        slides = []
+        for index, slide in enumerate(prs.slides):
+            slots = shape_slots(slide.shapes)
+            slides.append({
+                'index': index,
+                'layout': layout_numbers.get(id(slide.slide_layout.part)),
+                'signature': slots_signature(slots),
+                'slots': slots
+            })
+        entry.update({
+            'slide_width': prs.slide_width,
+            'slide_height': prs.slide_height,
+            'slides': slides,
+            'layouts': layouts
+        })
+    except Exception as e:
+        entry['error'] = str(e)
+    return entry
+
+
+def library_templates(library):
+    """مسارات القوالب النسبية في المكتبة (مع المجلدات الفرعية) مع الحجم ووقت التعديل"""
+    templates = {}
+    pending = [library]
+    while pending:
+        path = pending.pop()
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.name.startswith(('.', '~$')):
+                        continue
+                    if entry.is_dir():
+                        pending.append(entry.path)
+                    elif entry.is_file() and entry.name.lower().endswith('.pptx'):
+                        stat = entry.stat()
+                        name = os.path.relpath(entry.path, library).replace(os.sep, '/')
+                        templates[name] = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            continue
+    return templates
+
+
+def aspect_distance(ratios, aspect):
+    """متوسط البعد بين نسبة أبعاد الصور ونسب مواضعها (0 = تطابق تام)"""
+    if not ratios or not aspect:
+        return 0.0
+    return sum(abs(ratio - aspect) for ratio in ratios) / len(ratios)
+
+
+class TemplateIndex:
+    """فهرس مكتبة قوالب محفوظ في ملف JSON، مع قاموس في الذاكرة حسب عدد مواضع الصور
+
+    refresh تحدث الفهرس من المجلد (تحليل الجديد والمعدل فقط وحذف المحذوف)،
+    وfind تبحث في القاموس دون فتح أي قالب.
+    """
+
+    def __init__(self, library, path):
+        self.library = os.path.abspath(library) if library else ''
+        self.path = path
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self.templates = {}
+        self._by_images = {}
+        self.load()
+
+    @classmethod
+    def from_env(cls, environ=None):
+        return cls(template_library_from_env(environ), template_index_path_from_env(environ))
+
+    @property
+    def enabled(self):
+        return bool(self.library)
+
+    def load(self):
+        """قراءة الفهرس المحفوظ؛ يتم تجاهله إذا كان لمكتبة أخرى أو بإصدار آخر"""
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get('version') != INDEX_VERSION or data.get('library') != self.library:
+            return
+        self._install(data.get('templates') or {})
+
+    def save(self):
+        """كتابة الفهرس دفعة واحدة (ملف مؤقت ثم استبدال)"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'version': INDEX_VERSION, 'library': self.library, 'templates': self.templates},
+                          f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def _install(self, templates):
+        by_images = {}
+        for name, entry in templates.items():
+            for kind, items in ((KIND_SLIDE, entry.get('slides', ())), (KIND_LAYOUT, entry.get('layouts', ()))):
+                for item in items:
+                    by_images.setdefault(item['signature']['images'], []).append((name, kind, item))
+        with self._lock:
+            self.templates = templates
+            self._by_images = by_images
+
+    def refresh(self, max_workers=None):
+        """تحديث الفهرس من المكتبة وحفظه؛ يعيد عدد القوالب المحللة والمعاد استخدامها والمحذوفة"""
+        if not self.enabled:
+            raise ValueError('Template library is not configured')
+        with self._refresh_lock:
+            current = library_templates(self.library)
+            templates = {}
+            changed = []
+            for name, (mtime_ns, size) in current.items():
+                entry = self.templates.get(name)
+                if entry and entry['mtime_ns'] == mtime_ns and entry['size'] == size:
+                    templates[name] = entry
+                else:
+                    changed.append(name)
+
+            paths = [os.path.join(self.library, *name.split('/')) for name in changed]
+            max_workers = min(len(paths), max_workers or index_workers_from_env())
+            if max_workers > 1:
+                # spawn مثل عمليات الأجزاء: العملية الأم تحتوي على خيوط
+                context = multiprocessing.get_context('spawn')
+                with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as executor:
+                    results = list(executor.map(analyze_template, paths, chunksize=4))
+            else:
+                results = [analyze_template(path) for path in paths]
+            for name, entry in zip(changed, results):
+                # الحجم ووقت التعديل من المسح: إذا تغير القالب أثناء تحليله يعاد في التحديث التالي
+                entry['mtime_ns'], entry['size'] = current[name]
+                templates[name] = entry
+
+            removed = len(set(self.templates) - set(current))
+            self._install(dict(sorted(templates.items())))
+            self.save()
+            return {
+                'templates': len(templates),
+                'analyzed': len(changed),
+                'reused': len(templates) - len(changed),
+                'removed': removed,
+                'errors': sorted(name for name in changed if 'error' in templates[name])
+            }
+
+    def template_path(self, name):
+        """المسار الكامل لقالب مفهرس؛ ترفع KeyError إذا لم يكن في الفهرس"""
+        with self._lock:
+            if name not in self.templates:
+                raise KeyError(name)
+        return os.path.join(self.library, *name.split('/'))
+
+    def template_bytes(self, name, kind=KIND_SLIDE, index=0):
+        """القالب كبايتات بحيث تكون الشريحة أو التخطيط المختار هو الشريحة الأولى
+
+        المحرك يستخدم الشريحة الأولى كنموذج؛ للتخطيط يتم إضافة شريحة منه.
+        ترفع KeyError إذا لم يكن القالب في الفهرس وIndexError إذا لم يوجد العنصر.
+        """
+        prs = Presentation(self.template_path(name))
+        if kind == KIND_LAYOUT:
+            layouts = [layout for master in prs.slide_masters for layout in master.slide_layouts]
+            if not 0 <= index < len(layouts):
+                raise IndexError(f'No layout {index} in {name}')
+            move_slide(prs, prs.slides.add_slide(layouts[index]), 0)
+        else:
+            if not 0 <= index < len(prs.slides):
+                raise IndexError(f'No slide {index} in {name}')
+            if index:
+                move_slide(prs, prs.slides[index], 0)
+        output = io.BytesIO()
+        prs.save(output)
+        return output.getvalue()
+
+    def find(self, images, texts=None, aspect=None, kind=None, limit=20):
+        """الشرائح والتخطيطات التي تحتوي على عدد مواضع الصور المطلوب
+
+        الترتيب: الأقرب في عدد مواضع النصوص (إن حدد) ثم الأقرب في نسب الأبعاد
+        إلى aspect (نسبة أبعاد صور المجلد، إن حددت).
+        """
+        with self._lock:
+            candidates = list(self._by_images.get(images, ()))
+        matches = []
+        for name, item_kind, item in candidates:
+            if kind and item_kind != kind:
+                continue
+            signature = item['signature']
+            matches.append({
+                'template': name,
+                'kind': item_kind,
+                'index': item['index'],
+                'name': item.get('name', ''),
+                'signature': signature,
+                'text_distance': abs(signature['texts'] - texts) if texts is not None else 0,
+                'aspect_distance': round(aspect_distance(signature['aspect_ratios'], aspect), 3)
+            })
+        matches.sort(key=lambda match: (match['text_distance'], match['aspect_distance'],
+                                        match['template'], match['kind'], match['index']))
+        return matches[:limit] if limit else matches
+
+    def stats(self):
+        with self._lock:
+            return {
+                'templates': len(self.templates),
+                'slides': sum(len(entry.get('slides', ())) for entry in self.templates.values()),
+                'layouts': sum(len(entry.get('layouts', ())) for entry in self.templates.values()),
+                'errors': sum(1 for entry in self.templates.values() if 'error' in entry)
+            }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='فهرسة مكتبة القوالب والبحث فيها')
+    parser.add_argument('library', help='مجلد مكتبة القوالب')
+    parser.add_argument('--index', help='ملف الفهرس (الافتراضي PPTX_TEMPLATE_INDEX)')
+    parser.add_argument('--workers', type=int, help='عدد عمليات التحليل')
+    parser.add_argument('--images', type=int, help='البحث عن شرائح وتخطيطات بهذا العدد من مواضع الصور')
+    parser.add_argument('--texts', type=int, help='عدد مواضع النصوص المفضل')
+    parser.add_argument('--aspect', type=float, help='نسبة أبعاد الصور (العرض/الارتفاع)')
+    parser.add_argument('--kind', choices=[KIND_SLIDE, KIND_LAYOUT], help='الشرائح فقط أو التخطيطات فقط')
+    args = parser.parse_args(argv)
+
+    index = TemplateIndex(args.library, args.index or template_index_path_from_env())
+    result = index.refresh(max_workers=args.workers)
+    print(f"{result['templates']} templates: {result['analyzed']} analyzed, "
+          f"{result['reused']} unchanged, {result['removed']} removed")
+    for name in result['errors']:
+        print(f"[error] {name}: {index.templates[name]['error']}")
+
+    if args.images is not None:
+        for match in index.find(args.images, args.texts, args.aspect, args.kind, limit=0):
+            label = f"{match['kind']} {match['index']}" + (f" ({match['name']})" if match['name'] else '')
+            print(f"{match['template']}: {label} {match['signature']}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -2,7 +2,53 @@
 import unittest
 import os
 import tempfile
-from app import app
+import json
+import shutil
+import io
+import zipfile
+import threading
+import time
+import random
+import hashlib
+import copy
+import subprocess
+import sys
+from datetime import datetime
+from unittest import mock
+from PIL import Image, ImageFilter
+from pptx import Presentation
+from pptx.util import Inches
+
+# Keep the result cache of the tests away from the real one
+os.environ.setdefault('PPTX_CACHE_DIR', tempfile.mkdtemp(prefix='pptx_test_cache_'))
+os.environ.setdefault('PPTX_WORKSPACE_DIR', tempfile.mkdtemp(prefix='pptx_test_workspace_'))
+os.environ.setdefault('PPTX_IMAGE_CACHE_DIR', tempfile.mkdtemp(prefix='pptx_test_image_cache_'))
+os.environ.setdefault('PPTX_BLOB_DIR', tempfile.mkdtemp(prefix='pptx_test_blobs_'))
+os.environ.setdefault('PPTX_TEMPLATE_LIBRARY', tempfile.mkdtemp(prefix='pptx_test_library_'))
+os.environ.setdefault('PPTX_TEMPLATE_INDEX', os.path.join(tempfile.mkdtemp(prefix='pptx_test_index_'), 'index.json'))
+os.environ.setdefault('PPTX_CALIBRATION_FILE', os.path.join(tempfile.mkdtemp(prefix='pptx_test_calibration_'), 'calibration.json'))
+
+from app import app, create_app, warm_up, serve_cached_result, submit_generation_job
+from processing_log import ProcessingLog
+from admission import ResourceLimits, AdmissionError, admit_archive, extract_admitted
+from scheduler import JobScheduler, DONE, FAILED, CANCELLED
+from result_cache import ResultCache, normalize_zip_timestamps
+from image_cache import ImageCache
+from workspace import Workspace
+from engine import (generate, generate_multi, analyze_slide_placeholders, configured_image_sizes, placeholder_pixels,
+                    get_image_date)
+from sources import WatchedDeck, scan_directory, resolve_source_path
+from parts import plan_parts
+from planner import Calibration, folders_from_archive, plan_archive, plan_directory, used_images_selector
+from checkpoint import Checkpoint
+from loadtest import InProcessClient, Scenario, percentile, run_load_test
+from tracing import NULL_TRACER, Tracer
+from profiling import JobProfiler
+from archive_browser import ArchiveIndex, paginate
+from blob_store import BlobStore, Manifest, ManifestError
+from template_index import KIND_LAYOUT, KIND_SLIDE, TemplateIndex, analyze_template
+from validation import POLICY_ABORT, POLICY_SKIP, POLICY_SUBSTITUTE, ValidationError, validate_folders
+from duplicates import COMPARE_BLOCK, DUPLICATES_BEST, DUPLICATES_SKIP, dedupe_folders, find_clusters
 
 class InteractivePresentationTestCase(unittest.TestCase):
     def setUp(self):
@@ -24,5 +70,1391 @@ class InteractivePresentationTestCase(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn(b'error', response.data)
 
+class ServerTestCase(unittest.TestCase):
+    def test_liveness(self):
+        response = app.test_client().get('/healthz')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['status'], 'ok')
+        
+    def test_readiness_requires_warm_up(self):
+        fresh_app = create_app()
+        client = fresh_app.test_client()
+        self.assertEqual(client.get('/readyz').status_code, 503)
+        
+        warm_up(fresh_app)
+        response = client.get('/readyz')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('queue_depth', response.get_json())
+
+class ProcessingLogTestCase(unittest.TestCase):
+    def test_ring_buffer_keeps_counters(self):
+        log = ProcessingLog(max_entries=10, max_errors=2)
+        for i in range(50):
+            log.add(f"message {i}", "success")
+        for i in range(3):
+            log.add(f"error {i}", "error")
+        
+        summary = log.summary()
+        self.assertEqual(summary['counts']['success'], 50)
+        self.assertEqual(summary['counts']['error'], 3)
+        self.assertEqual(summary['retained'], 10)
+        self.assertEqual(summary['dropped'], 43)
+        self.assertEqual([e['message'] for e in log.errors()], ['error 1', 'error 2'])
+        
+    def test_page_filters_by_level(self):
+        log = ProcessingLog()
+        for i in range(5):
+            log.add(f"info {i}", "info")
+            log.add(f"warning {i}", "warning")
+        
+        page = log.page(offset=1, limit=2, levels=['warning'])
+        self.assertEqual(page['total'], 5)
+        self.assertTrue(page['has_more'])
+        self.assertEqual([e['message'] for e in page['entries']], ['warning 1', 'warning 2'])
+        
+    def test_processing_log_endpoint(self):
+        client = app.test_client()
+        client.get('/')
+        response = client.get('/processing-log?limit=10&level=error')
+        data = response.get_json()
+        self.assertTrue(data['success'])
+        self.assertEqual(data['entries'], [])
+        self.assertEqual(client.get('/processing-log?offset=x').status_code, 400)
+
+def make_image_bytes(size=(40, 30), color='red', image_format='JPEG'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, format=image_format)
+    return buffer.getvalue()
+
+def make_zip(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+def make_template_bytes():
+    prs = Presentation()
+    prs.slides.add_slide(prs.slide_layouts[8])
+    buffer = io.BytesIO()
+    prs.save(buffer)
+    return buffer.getvalue()
+
+def make_photos_zip(folder_count=3, images_per_folder=2):
+    members = {}
+    for i in range(folder_count):
+        for j in range(images_per_folder):
+            members[f'folder_{i}/photo_{j}.jpg'] = make_image_bytes()
+    return make_zip(members)
+
+def configure_session(client):
+    """رفع القالب وحفظ إعدادات تستخدم أول صورة واسم المجلد"""
+    client.get('/')
+    response = client.post('/upload-pptx', data={
+        'pptx_file': (io.BytesIO(make_template_bytes()), 'template.pptx')
+    }, content_type='multipart/form-data')
+    analysis = response.get_json()['slide_analysis']
+    config = {
+        'images': {
+            f"image_{p['id']}": {'use': True, 'order': 1, 'placeholder_info': p}
+            for p in analysis['image_placeholders']
+        },
+        'texts': {
+            f"text_{p['id']}": {'type': 'اسم المجلد', 'value': 'folder_name'}
+            for p in analysis['text_placeholders']
+        }
+    }
+    client.post('/save-config', json=config)
+    return config
+
+def wait_for_job(client, job_id, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        data = client.get(f'/jobs/{job_id}').get_json()
+        if data['status'] in (DONE, FAILED):
+            return data
+        time.sleep(0.05)
+    raise AssertionError('job did not finish in time')
+
+def upload_photos(client, archive=None, **form):
+    response = client.post('/upload-zip', data={
+        'zip_file': (archive or make_photos_zip(), 'photos.zip'),
+        **form
+    }, content_type='multipart/form-data')
+    data = response.get_json()
+    if not data['success']:
+        return data
+    return wait_for_job(client, data['job_id'])
+
+class UploadZipTestCase(unittest.TestCase):
+    def test_generates_one_slide_per_folder(self):
+        client = app.test_client()
+        configure_session(client)
+        data = upload_photos(client)
+        self.assertTrue(data['success'], data)
+        self.assertEqual(data['stats']['created_slides'], 3)
+        self.assertEqual(data['summary']['counts']['error'], 0)
+        
+        download = client.get(f"/download/{data['output_filename']}")
+        self.assertEqual(download.status_code, 200)
+        self.assertEqual(len(Presentation(io.BytesIO(download.data)).slides), 4)
+
+    def test_jobs_are_private_to_their_session(self):
+        client = app.test_client()
+        configure_session(client)
+        response = client.post('/upload-zip', data={
+            'zip_file': (make_photos_zip(folder_count=2), 'photos.zip')
+        }, content_type='multipart/form-data')
+        job_id = response.get_json()['job_id']
+        
+        other_client = app.test_client()
+        self.assertEqual(other_client.get(f'/jobs/{job_id}').status_code, 404)
+        wait_for_job(client, job_id)
+
+    def test_repeat_request_is_served_from_cache(self):
+        client = app.test_client()
+        configure_session(client)
+        archive = make_photos_zip(folder_count=4).getvalue()
+        first = upload_photos(client, io.BytesIO(archive), image_order='random')
+        self.assertTrue(first['success'], first)
+        first_deck = client.get(f"/download/{first['output_filename']}").data
+        
+        client.get('/reset')
+        configure_session(client)
+        response = client.post('/upload-zip', data={
+            'zip_file': (io.BytesIO(archive), 'photos.zip'),
+            'image_order': 'random'
+        }, content_type='multipart/form-data')
+        second = response.get_json()
+        self.assertTrue(second['cached'])
+        self.assertEqual(second['stats'], first['stats'])
+        self.assertEqual(client.get(f"/download/{second['output_filename']}").data, first_deck)
+        self.assertGreater(client.get('/cache/stats').get_json()['hits'], 0)
+
+class UploadSizesTestCase(unittest.TestCase):
+    def test_sizes_cover_used_placeholders_of_every_template(self):
+        info = {'width': 914400 * 2, 'height': 914400}
+        config = {'images': {'a': {'use': True, 'placeholder_info': info},
+                             'b': {'use': False, 'placeholder_info': {'width': 914400, 'height': 914400}}}}
+        self.assertEqual(configured_image_sizes(config), [(440, 220)])
+        self.assertEqual(placeholder_pixels(914400, 914400), (220, 220))
+        
+        client = app.test_client()
+        client.get('/')
+        self.assertFalse(client.get('/upload-sizes').get_json()['success'])
+        config = configure_session(client)
+        data = client.get('/upload-sizes').get_json()
+        self.assertTrue(data['success'], data)
+        self.assertEqual(data['sizes'], [list(size) for size in configured_image_sizes(config)])
+        self.assertFalse(data['image_dates'])
+
+def make_engine_config(template_bytes):
+    analysis = analyze_slide_placeholders(Presentation(io.BytesIO(template_bytes)))
+    return analysis, {
+        'images': {
+            f"image_{p['id']}": {'use': True, 'order': 1, 'placeholder_info': p}
+            for p in analysis['image_placeholders']
+        },
+        'texts': {}
+    }
+
+class EngineTestCase(unittest.TestCase):
+    def test_generates_from_in_memory_streams_one_folder_at_a_time(self):
+        template = make_template_bytes()
+        analysis, config = make_engine_config(template)
+        pulled = []
+        
+        def folders():
+            for i in range(3):
+                pulled.append(i)
+                yield f'folder_{i}', iter([
+                    (f'photo_{j}.png', io.BytesIO(make_image_bytes(image_format='PNG')))
+                    for j in range(2)
+                ])
+        
+        output = io.BytesIO()
+        events = generate(template, config, folders(), output=output, slide_analysis=analysis)
+        first = next(events)
+        self.assertEqual(first['folder'], 'folder_0')
+        self.assertEqual(pulled, [0])
+        
+        rest = list(events)
+        self.assertEqual([e['index'] for e in rest[:-1]], [2, 3])
+        self.assertEqual(rest[-1]['event'], 'done')
+        self.assertEqual(rest[-1]['stats'], {'created_slides': 3, 'processed_folders': 3, 'total_images': 6})
+        self.assertEqual(len(Presentation(io.BytesIO(output.getvalue())).slides), 4)
+
+    def test_unused_images_are_not_read_and_streams_are_closed(self):
+        template = make_template_bytes()
+        analysis, config = make_engine_config(template)
+        streams = [io.BytesIO(make_image_bytes()) for _ in range(3)]
+        folder = [(f'photo_{j}.jpg', stream) for j, stream in enumerate(streams)]
+        
+        events = list(generate(template, config, iter([('only', iter(folder))])))
+        self.assertIn('presentation', events[-1])
+        self.assertTrue(all(stream.closed for stream in streams))
+
+    def test_random_order_is_reproducible_and_applied(self):
+        template = make_template_bytes()
+        analysis, config = make_engine_config(template)
+        colors = ['red', 'green', 'blue', 'yellow', 'white', 'black']
+        
+        def picture_blob(seed):
+            folder = [(f'{c}.png', io.BytesIO(make_image_bytes(color=c, image_format='PNG'))) for c in colors]
+            events = list(generate(template, config, iter([('f', iter(folder))]),
+                                   image_order='random', seed=seed))
+            slide = events[-1]['presentation'].slides[1]
+            return [shape.image.blob for shape in slide.shapes if hasattr(shape, 'image')][0]
+        
+        blobs = {picture_blob(f'seed-{i}') for i in range(6)}
+        self.assertEqual(picture_blob('seed-0'), picture_blob('seed-0'))
+        self.assertGreater(len(blobs), 1)
+
+    def test_resume_from_checkpoint_matches_uninterrupted_run(self):
+        template = make_template_bytes()
+        analysis, config = make_engine_config(template)
+        with tempfile.TemporaryDirectory() as root:
+            write_photo_tree(root, {f'f{i}': 3 for i in range(6)})
+            folders, _ = scan_directory(root, include_root=False)
+            
+            def run(output, checkpoint=None, stop_at=None):
+                source = ((folder.name, folder.open_images()) for folder in folders)
+                events = generate(template, config, source, output=os.path.join(root, output),
+                                  image_order='random', seed='s', checkpoint=checkpoint)
+                seen = []
+                for event in events:
+                    seen.append(event)
+                    if event.get('index') == stop_at:
+                        events.close()
+                        break
+                return seen
+            
+            run('full.pptx')
+            checkpoint_dir = os.path.join(root, 'checkpoint')
+            run('resumed.pptx', Checkpoint(checkpoint_dir, 'key', interval=0), stop_at=4)
+            saved = Checkpoint(checkpoint_dir, 'key').restore()
+            self.assertIsNotNone(saved)
+            self.assertIsNone(Checkpoint(checkpoint_dir, 'other').restore())
+            
+            events = run('resumed.pptx', Checkpoint(checkpoint_dir, 'key', interval=0))
+            self.assertEqual(events[0], {'event': 'resumed', 'index': saved['folders']})
+            self.assertEqual(events[-1]['stats'], {'created_slides': 6, 'processed_folders': 6, 'total_images': 18})
+            with open(os.path.join(root, 'full.pptx'), 'rb') as a, open(os.path.join(root, 'resumed.pptx'), 'rb') as b:
+                self.assertEqual(a.read(), b.read())
+
+    def test_no_images_raises(self):
+        template = make_template_bytes()
+        analysis, config = make_engine_config(template)
+        with self.assertRaises(ValueError):
+            list(generate(template, config, iter([('empty', iter([]))])))
+
+def write_photo_tree(root, folders):
+    """إنشاء شجرة صور: folders قاموس من المسار النسبي إلى عدد الصور"""
+    for folder, count in folders.items():
+        path = os.path.join(root, *folder.split('/'))
+        os.makedirs(path, exist_ok=True)
+        for j in range(count):
+            with open(os.path.join(path, f'photo_{j}.png'), 'wb') as f:
+                f.write(make_image_bytes(image_format='PNG'))
+
+class DirectorySourceTestCase(unittest.TestCase):
+    def test_scan_includes_nested_folders(self):
+        with tempfile.TemporaryDirectory() as root:
+            write_photo_tree(root, {'a': 2, 'b/2023': 1, 'b/2024': 3, 'c': 0})
+            folders, empty = scan_directory(root, include_root=False)
+            self.assertEqual([f.name for f in folders], ['a', 'b/2023', 'b/2024'])
+            self.assertEqual(empty, ['c'])
+            
+            folders, _ = scan_directory(root, nested=False, include_root=False)
+            self.assertEqual([f.name for f in folders], ['a'])
+
+    def test_symlinked_images_are_not_followed(self):
+        with tempfile.TemporaryDirectory() as outside, tempfile.TemporaryDirectory() as root:
+            write_photo_tree(outside, {'secret': 1})
+            write_photo_tree(root, {'a': 1})
+            os.symlink(os.path.join(outside, 'secret', 'photo_0.png'), os.path.join(root, 'a', 'x.jpg'))
+            os.symlink(os.path.join(outside, 'secret'), os.path.join(root, 'linked'))
+            folders, empty = scan_directory(root, include_root=False)
+            self.assertEqual([(f.name, [name for name, _, _ in f.images]) for f in folders], [('a', ['photo_0.png'])])
+            self.assertEqual(empty, [])
+
+    def test_parallel_scan_reads_used_headers_in_the_same_pass(self):
+        template = make_template_bytes()
+        _, config = make_engine_config(template)
+        with tempfile.TemporaryDirectory() as root:
+            write_photo_tree(root, {f'year_{i}/day_{j}': 3 for i in range(4) for j in range(5)})
+            serial, serial_empty = scan_directory(root, include_root=False, max_workers=1)
+            folders, empty = scan_directory(root, include_root=False, max_workers=8,
+                                            dimensions=used_images_selector(config))
+            self.assertEqual([(f.name, f.images) for f in folders], [(f.name, f.images) for f in serial])
+            self.assertEqual(empty, serial_empty)
+            self.assertIsInstance(folders[0].images, tuple)
+            self.assertEqual([f.dimensions for f in folders], [{'photo_0.png': (40, 30)}] * 20)
+            self.assertEqual(serial[0].dimensions, {})
+            
+            model = Calibration(os.path.join(root, 'calibration.json')).model()
+            plan = plan_directory(folders, empty, config, {}, '', len(template), model)
+            self.assertTrue(plan['headers_complete'])
+            self.assertEqual({(fill['width'], fill['height']) for slide in plan['slides'] for fill in slide['fills']},
+                             {(40, 30)})
+            
+            # تاريخ الصورة دون EXIF من وقت التعديل المحفوظ في المسح
+            name, stream = next(folders[0].open_images())
+            mtime_ns = dict((image, mtime) for image, _, mtime in folders[0].images)[name]
+            self.assertEqual(stream.mtime_ns, mtime_ns)
+            expected = datetime.fromtimestamp(mtime_ns / 1e9).strftime('%Y-%m-%d')
+            self.assertEqual(get_image_date(io.BytesIO(stream.read()), fallback_mtime_ns=stream.mtime_ns), expected)
+            stream.close()
+
+    def test_source_path_must_be_inside_allowed_roots(self):
+        with tempfile.TemporaryDirectory() as root:
+            os.makedirs(os.path.join(root, 'photos'))
+            self.assertIsNotNone(resolve_source_path(os.path.join(root, 'photos'), [root]))
+            self.assertIsNone(resolve_source_path(os.path.join(root, 'photos', '..', '..'), [root]))
+            self.assertIsNone(resolve_source_path(root, []))
+
+    def test_watch_rebuilds_only_affected_slides(self):
+        template = make_template_bytes()
+        analysis, config = make_engine_config(template)
+        with tempfile.TemporaryDirectory() as root, tempfile.TemporaryDirectory() as out:
+            source = os.path.join(root, 'photos')
+            write_photo_tree(source, {'a': 1, 'b': 1, 'c': 1})
+            output = os.path.join(out, 'deck.pptx')
+            deck = WatchedDeck(template, config, source, output, slide_analysis=analysis)
+            
+            self.assertEqual(deck.refresh()['added'], ['a', 'b', 'c'])
+            untouched = deck._slides['a']
+            
+            write_photo_tree(source, {'b': 2, 'aa': 1})
+            shutil.rmtree(os.path.join(source, 'c'))
+            changes = deck.refresh()
+            self.assertEqual(changes, {'added': ['aa'], 'changed': ['b'], 'removed': ['c']})
+            self.assertIs(deck._slides['a'], untouched)
+            self.assertEqual(deck.refresh(), {'added': [], 'changed': [], 'removed': []})
+            
+            slides = Presentation(output).slides
+            titles = [slide.shapes.title.text for slide in list(slides)[1:]]
+            self.assertEqual(titles, ['a', 'aa', 'b'])
+
+    def test_process_directory_endpoint(self):
+        with tempfile.TemporaryDirectory() as root:
+            write_photo_tree(root, {'trip/day1': 2, 'trip/day2': 1})
+            app.config['SOURCE_ROOTS'] = [root]
+            try:
+                client = app.test_client()
+                configure_session(client)
+                rejected = client.post('/process-directory', json={'path': tempfile.gettempdir()}).get_json()
+                self.assertFalse(rejected['success'])
+                
+                data = client.post('/process-directory', json={'path': root}).get_json()
+                self.assertTrue(data['success'], data)
+                result = wait_for_job(client, data['job_id'])
+                self.assertEqual(result['stats']['created_slides'], 2)
+                self.assertEqual(result['stats']['total_images'], 3)
+                self.assertEqual(sorted(os.listdir(root)), ['trip'])
+            finally:
+                app.config['SOURCE_ROOTS'] = []
+
+class SplitOutputTestCase(unittest.TestCase):
+    def test_plan_respects_slide_and_byte_caps(self):
+        with tempfile.TemporaryDirectory() as root:
+            write_photo_tree(root, {f'f{i}': 2 for i in range(5)})
+            folders, _ = scan_directory(root, include_root=False)
+            config = {'images': {'a': {'use': True, 'order': 1}, 'b': {'use': True, 'order': 2}}}
+            
+            by_count = plan_parts(folders, config, max_slides=2)
+            self.assertEqual([[f.name for f in part] for part in by_count],
+                             [['f0', 'f1'], ['f2', 'f3'], ['f4']])
+            
+            folder_bytes = sum(size for _, size, _ in folders[0].images)
+            by_size = plan_parts(folders, config, max_bytes=folder_bytes * 3 + 10, base_bytes=10)
+            self.assertEqual([len(part) for part in by_size], [3, 2])
+            self.assertEqual(len(plan_parts(folders, config)), 1)
+
+    def test_parts_are_built_and_streamed_with_manifest(self):
+        client = app.test_client()
+        configure_session(client)
+        data = upload_photos(client, make_photos_zip(folder_count=5), max_slides_per_deck='2')
+        self.assertTrue(data['success'], data)
+        self.assertEqual(data['stats']['created_slides'], 5)
+        self.assertEqual([part['folders'] for part in data['parts']],
+                         [['folder_0', 'folder_1'], ['folder_2', 'folder_3'], ['folder_4']])
+        self.assertTrue(data['output_filename'].endswith('.zip'))
+        
+        download = client.get(f"/download/{data['output_filename']}")
+        self.assertEqual(download.status_code, 200)
+        with zipfile.ZipFile(io.BytesIO(download.data)) as bundle:
+            manifest = json.loads(bundle.read('manifest.json'))
+            self.assertEqual(len(manifest['parts']), 3)
+            for part in manifest['parts']:
+                deck = Presentation(io.BytesIO(bundle.read(part['filename'])))
+                self.assertEqual(len(deck.slides), 1 + part['slides'])
+
+    def test_part_workers_leave_other_job_dirs_alone(self):
+        # Spawned part workers re-import the entry script; importing the app must not sweep the workspace
+        with tempfile.TemporaryDirectory() as temp_dir:
+            photos = os.path.join(temp_dir, 'photos')
+            write_photo_tree(photos, {'f0': 1, 'f1': 1})
+            template = make_template_bytes()
+            with open(os.path.join(temp_dir, 'template.pptx'), 'wb') as f:
+                f.write(template)
+            with open(os.path.join(temp_dir, 'config.json'), 'w') as f:
+                json.dump(make_engine_config(template)[1], f)
+            script = os.path.join(temp_dir, 'entry.py')
+            with open(script, 'w') as f:
+                f.write(PART_WORKERS_ENTRY.format(package_dir=os.path.dirname(os.path.abspath(__file__))))
+            workspace_dir = os.path.join(temp_dir, 'workspace')
+            
+            subprocess.run([sys.executable, script, temp_dir], check=True, timeout=120,
+                           env={**os.environ, 'PPTX_WORKSPACE_DIR': workspace_dir})
+            self.assertTrue(os.path.isdir(os.path.join(workspace_dir, 'job_busy')))
+            self.assertEqual(sorted(name for name in os.listdir(temp_dir) if name.startswith('deck')),
+                             ['deck_part001.pptx', 'deck_part002.pptx'])
+
+PART_WORKERS_ENTRY = """
+import json, os, sys
+sys.path.insert(0, {package_dir!r})
+from app import app
+from parts import build_parts
+from sources import scan_directory
+
+if __name__ == '__main__':
+    temp_dir = sys.argv[1]
+    folders, _ = scan_directory(os.path.join(temp_dir, 'photos'), include_root=False)
+    with open(os.path.join(temp_dir, 'template.pptx'), 'rb') as f:
+        template = f.read()
+    with open(os.path.join(temp_dir, 'config.json')) as f:
+        config = json.load(f)
+    os.makedirs(os.path.join(os.environ['PPTX_WORKSPACE_DIR'], 'job_busy'))
+    for _ in build_parts(template, config, [folders[:1], folders[1:]], temp_dir, 'deck', max_workers=2):
+        pass
+"""
+
+class MultiTemplateTestCase(unittest.TestCase):
+    def test_images_are_decoded_and_resized_once_for_all_templates(self):
+        template = make_template_bytes()
+        analysis, config = make_engine_config(template)
+        photo = make_image_bytes(size=(4000, 3000))
+        folders = [(f'folder_{i}', iter([(f'photo_{i}.jpg', io.BytesIO(photo))])) for i in range(2)]
+        outputs = [io.BytesIO() for _ in range(3)]
+        targets = [{'template': template, 'config': config, 'slide_analysis': analysis, 'output': output}
+                   for output in outputs]
+        
+        done = list(generate_multi(targets, iter(folders)))[-1]
+        self.assertEqual(done['images'], {'reads': 2, 'decodes': 2, 'resizes': 2})
+        self.assertEqual([stats['created_slides'] for stats in done['stats']], [2, 2, 2])
+        for output in outputs:
+            slides = list(Presentation(io.BytesIO(output.getvalue())).slides)
+            self.assertEqual(len(slides), 3)
+            pictures = [shape for shape in slides[1].shapes if hasattr(shape, 'image')]
+            width, height = pictures[0].image.size
+            self.assertLess(width, 4000)
+            self.assertEqual(round(width / height, 2), round(4000 / 3000, 2))
+
+    def test_targets_endpoint_builds_one_deck_per_template(self):
+        client = app.test_client()
+        config = configure_session(client)
+        response = client.post('/targets', data={
+            'pptx_file': (io.BytesIO(make_template_bytes()), 'second.pptx'),
+            'config_file': (io.BytesIO(json.dumps(config).encode('utf-8')), 'second.json')
+        }, content_type='multipart/form-data')
+        self.assertEqual(response.get_json()['targets'], ['second.pptx'])
+        
+        rejected = upload_photos(client, max_slides_per_deck='2')
+        self.assertFalse(rejected['success'])
+        
+        data = upload_photos(client)
+        self.assertTrue(data['success'], data)
+        self.assertEqual([part['template'] for part in data['parts']], ['template', 'second.pptx'])
+        self.assertEqual(data['stats']['created_slides'], 6)
+        download = client.get(f"/download/{data['output_filename']}")
+        with zipfile.ZipFile(io.BytesIO(download.data)) as bundle:
+            manifest = json.loads(bundle.read('manifest.json'))
+            self.assertEqual([part['template'] for part in manifest['parts']], ['template', 'second.pptx'])
+            for part in manifest['parts']:
+                self.assertEqual(len(Presentation(io.BytesIO(bundle.read(part['filename']))).slides), 4)
+        
+        client.post('/targets/clear')
+        self.assertEqual(upload_photos(client, make_photos_zip(folder_count=1))['stats']['created_slides'], 1)
+
+class ArchiveBrowserTestCase(unittest.TestCase):
+    def test_paginate_clamps_to_range(self):
+        items = list(range(5))
+        self.assertEqual(paginate(items, 2, 2), ([2, 3], {'page': 2, 'per_page': 2, 'pages': 3, 'total': 5}))
+        self.assertEqual(paginate(items, 9, 2)[0], [4])
+        self.assertEqual(paginate([], 1, 10), ([], {'page': 1, 'per_page': 10, 'pages': 1, 'total': 0}))
+
+    def test_folders_are_listed_and_thumbnails_built_on_request(self):
+        client = app.test_client()
+        self.assertEqual(client.get('/archive/folders').status_code, 404)
+        archive = make_zip({
+            **{f'folder_{i}/photo_{j}.jpg': make_image_bytes(size=(800, 600)) for i in range(5) for j in range(3)},
+            'empty/': b''
+        })
+        data = client.post('/archive', data={'zip_file': (archive, 'photos.zip')},
+                           content_type='multipart/form-data').get_json()
+        self.assertTrue(data['success'], data)
+        self.assertEqual((data['summary']['folders'], data['summary']['images']), (5, 15))
+        self.assertEqual(data['summary']['empty_folders'], ['empty'])
+        
+        page = client.get('/archive/folders?page=2&per_page=2').get_json()
+        self.assertEqual([folder['name'] for folder in page['folders']], ['folder_2', 'folder_3'])
+        self.assertEqual(page['pagination']['pages'], 3)
+        images = client.get('/archive/images?folder=folder_1&per_page=2').get_json()
+        self.assertEqual([image['name'] for image in images['images']], ['photo_0.jpg', 'photo_1.jpg'])
+        self.assertEqual(client.get('/archive/images?folder=missing').status_code, 404)
+        
+        hits = client.get('/cache/stats').get_json()['images']['hits']
+        for _ in range(2):
+            response = client.get('/archive/thumbnail?folder=folder_1&image=photo_0.jpg&size=100')
+            self.assertEqual(response.mimetype, 'image/jpeg')
+            with Image.open(io.BytesIO(response.data)) as img:
+                self.assertEqual(img.size, (100, 75))
+        self.assertEqual(client.get('/cache/stats').get_json()['images']['hits'], hits + 1)
+        self.assertEqual(client.get('/archive/thumbnail?folder=folder_1&image=nope.jpg').status_code, 404)
+        self.assertEqual(app.test_client().get('/archive/images?folder=folder_1').status_code, 404)
+
+    def test_thumbnail_checks_size_before_decoding(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            zip_path = os.path.join(temp_dir, 'photos.zip')
+            with open(zip_path, 'wb') as f:
+                f.write(make_zip({'folder/photo.jpg': make_image_bytes(size=(800, 600))}).getvalue())
+            archive = ArchiveIndex(zip_path)
+            try:
+                with self.assertRaises(ValueError):
+                    archive.thumbnail('folder', 'photo.jpg', max_bytes=100)
+                with self.assertRaises(ValueError):
+                    archive.thumbnail('folder', 'photo.jpg', max_pixels=800 * 600 - 1)
+                with Image.open(io.BytesIO(archive.thumbnail('folder', 'photo.jpg', size=100))) as img:
+                    self.assertEqual(img.size, (100, 75))
+            finally:
+                archive.close()
+
+def make_manifest(folders):
+    """بيان للرفع حسب المحتوى وقاموس من البصمة إلى المحتوى؛ folders من اسم المجلد إلى {اسم الصورة: المحتوى}"""
+    blobs = {}
+    manifest = {'folders': []}
+    for name, images in folders.items():
+        entries = []
+        for image_name, data in images.items():
+            digest = hashlib.sha256(data).hexdigest()
+            blobs[digest] = data
+            entries.append({'name': image_name, 'sha256': digest, 'size': len(data)})
+        manifest['folders'].append({'name': name, 'images': entries})
+    return manifest, blobs
+
+class BlobUploadTestCase(unittest.TestCase):
+    def test_store_verifies_content_and_size(self):
+        with tempfile.TemporaryDirectory() as root:
+            store = BlobStore(root)
+            data = make_image_bytes()
+            digest = hashlib.sha256(data).hexdigest()
+            alice, bob = 'a' * 32, 'b' * 32
+            self.assertEqual(store.missing([digest], alice), [digest])
+            with self.assertRaises(ValueError):
+                store.put(digest, io.BytesIO(data + b'x'), len(data) + 1, alice)
+            with self.assertRaises(ValueError):
+                store.put(digest, io.BytesIO(data), len(data) - 1, alice)
+            self.assertEqual(store.missing([digest], alice), [digest])
+            store.put(digest, io.BytesIO(data), len(data), alice)
+            self.assertEqual(store.missing([digest], alice), [])
+            self.assertEqual(os.listdir(os.path.dirname(store._path(digest))), [digest])
+            
+            # Another owner cannot learn that the blob exists without sending its bytes
+            self.assertEqual(store.missing([digest], bob), [digest])
+            with self.assertRaises(ValueError):
+                store.put(digest, io.BytesIO(b'x' * len(data)), len(data), bob)
+            store.put(digest, io.BytesIO(data), len(data), bob)
+            self.assertEqual(store.size(), len(data))
+            # Ownership is on disk: it survives a restart and is shared by every worker
+            restarted = BlobStore(root)
+            self.assertEqual(restarted.missing([digest], alice), [])
+            self.assertEqual(restarted.missing([digest], 'c' * 32), [digest])
+            with self.assertRaises(ValueError):
+                restarted.missing([digest], '../owner')
+
+    def test_manifest_rejects_unsafe_names_and_limits(self):
+        limits = ResourceLimits(max_members=2)
+        digest = '0' * 64
+        for folders in ([{'name': '../up', 'images': []}],
+                        [{'name': 'a', 'images': [{'name': 'x.txt', 'sha256': digest, 'size': 1}]}],
+                        [{'name': 'a', 'images': [{'name': 'x.jpg', 'sha256': 'abc', 'size': 1}]}],
+                        [{'name': 'a', 'images': [{'name': f'{i}.jpg', 'sha256': digest, 'size': 1}
+                                                  for i in range(3)]}]):
+            with self.assertRaises(ManifestError):
+                Manifest.parse({'folders': folders}, limits)
+        manifest = Manifest.parse({'folders': [{'name': 'b', 'images': [
+            {'name': 'x.jpg', 'sha256': digest, 'size': 1}]}, {'name': 'a/c', 'images': []}]}, limits)
+        self.assertEqual([name for name, _ in manifest.folders], ['b'])
+
+    def test_rerun_uploads_only_new_images(self):
+        client = app.test_client()
+        configure_session(client)
+        shared = make_image_bytes(color='green')
+        manifest, blobs = make_manifest({
+            'day_1': {'a.jpg': shared, 'b.jpg': make_image_bytes(color='blue')},
+            'day_2': {'a.jpg': shared}
+        })
+        reply = client.post('/manifest', json=manifest).get_json()
+        self.assertTrue(reply['success'], reply)
+        self.assertEqual(sorted(reply['missing']), sorted(blobs))
+        
+        first = reply['missing'][0]
+        self.assertEqual(client.put(f'/blobs/{first}', data=b'not the image').status_code, 400)
+        self.assertEqual(client.put(f"/blobs/{'f' * 64}", data=b'x').status_code, 404)
+        incomplete = client.post('/manifest/submit', json={}).get_json()
+        self.assertEqual(sorted(incomplete['missing']), sorted(blobs))
+        for digest in reply['missing']:
+            self.assertEqual(client.put(f'/blobs/{digest}', data=blobs[digest]).status_code, 200)
+        
+        data = client.post('/manifest/submit', json={}).get_json()
+        data = wait_for_job(client, data['job_id'])
+        self.assertTrue(data['success'], data)
+        self.assertEqual(data['stats']['created_slides'], 2)
+        
+        # اليوم التالي في جلسة جديدة من المتصفح نفسه: مجلد جديد بصورة جديدة واحدة فقط
+        uploader = client.get_cookie('pptx_uploader').value
+        client = app.test_client()
+        client.set_cookie('pptx_uploader', uploader)
+        configure_session(client)
+        new_image = make_image_bytes(color='yellow')
+        manifest, blobs = make_manifest({
+            'day_1': {'a.jpg': shared, 'b.jpg': make_image_bytes(color='blue')},
+            'day_2': {'a.jpg': shared},
+            'day_3': {'c.jpg': new_image}
+        })
+        reply = client.post('/manifest', json=manifest).get_json()
+        self.assertEqual(reply['missing'], [hashlib.sha256(new_image).hexdigest()])
+        self.assertEqual(reply['missing_bytes'], len(new_image))
+        client.put(f"/blobs/{reply['missing'][0]}", data=new_image)
+        data = wait_for_job(client, client.post('/manifest/submit', json={}).get_json()['job_id'])
+        self.assertEqual(data['stats']['created_slides'], 3)
+        download = client.get(f"/download/{data['output_filename']}")
+        self.assertEqual(len(Presentation(io.BytesIO(download.data)).slides), 4)
+        
+        # جلسة أخرى لا تعرف بوجود الصور ولا تحصل على النتيجة المحفوظة دون رفعها
+        other = app.test_client()
+        configure_session(other)
+        reply = other.post('/manifest', json=manifest).get_json()
+        self.assertEqual(sorted(reply['missing']), sorted(blobs))
+        refused = other.post('/manifest/submit', json={}).get_json()
+        self.assertFalse(refused['success'])
+        self.assertEqual(sorted(refused['missing']), sorted(blobs))
+
+def write_library_template(path, pictures=2):
+    """قالب بشريحة عنوان ثم شريحة فيها مجموعة من الصور العادية"""
+    image_path = os.path.join(os.path.dirname(path), '.picture.png')
+    with open(image_path, 'wb') as f:
+        f.write(make_image_bytes(image_format='PNG'))
+    prs = Presentation()
+    prs.slides.add_slide(prs.slide_layouts[0])
+    group = prs.slides.add_slide(prs.slide_layouts[6]).shapes.add_group_shape()
+    for i in range(pictures):
+        group.shapes.add_picture(image_path, Inches(1 + 3 * i), Inches(1), Inches(3), Inches(2))
+    prs.save(path)
+
+class TemplateIndexTestCase(unittest.TestCase):
+    def test_every_slide_and_layout_with_groups(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, 'deck.pptx')
+            write_library_template(path)
+            entry = analyze_template(path)
+            self.assertNotIn('error', entry)
+            self.assertEqual(len(entry['layouts']), 11)
+            picture_layout = next(layout for layout in entry['layouts'] if layout['name'] == 'Picture with Caption')
+            self.assertEqual(picture_layout['signature']['images'], 1)
+            title, grouped = entry['slides']
+            self.assertEqual(title['signature'], {'images': 0, 'texts': 1, 'titles': 1, 'aspect_ratios': []})
+            self.assertEqual(grouped['signature']['images'], 2)
+            self.assertEqual(grouped['signature']['aspect_ratios'], [1.5, 1.5])
+            self.assertEqual(grouped['slots'][1]['left'], Inches(4))
+
+    def test_layout_pictures_are_not_slots(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, 'deck.pptx')
+            write_library_template(path)
+            prs = Presentation(path)
+            # A logo on the blank layout is drawn behind new slides but never copied onto them
+            logo = copy.deepcopy(prs.slides[1].shapes[0].shapes[0]._element)
+            prs.slide_layouts[6].shapes._spTree.append(logo)
+            prs.save(path)
+            
+            entry = analyze_template(path)
+            blank = next(layout for layout in entry['layouts'] if layout['name'] == 'Blank')
+            self.assertEqual(blank['signature']['images'], 0)
+            self.assertEqual(entry['slides'][1]['signature']['images'], 2)
+
+    def test_refresh_reanalyzes_only_changed_templates(self):
+        with tempfile.TemporaryDirectory() as root:
+            library = os.path.join(root, 'library')
+            os.makedirs(os.path.join(library, 'weddings'))
+            write_library_template(os.path.join(library, 'two.pptx'))
+            write_library_template(os.path.join(library, 'weddings', 'three.pptx'), pictures=3)
+            with open(os.path.join(library, 'broken.pptx'), 'wb') as f:
+                f.write(b'not a presentation')
+            index_path = os.path.join(root, 'index.json')
+            
+            index = TemplateIndex(library, index_path)
+            result = index.refresh(max_workers=2)
+            self.assertEqual((result['analyzed'], result['reused']), (3, 0))
+            self.assertEqual(result['errors'], ['broken.pptx'])
+            matches = index.find(3, kind=KIND_SLIDE)
+            self.assertEqual([(m['template'], m['index']) for m in matches], [('weddings/three.pptx', 1)])
+            
+            # فهرس جديد من الملف نفسه يجيب دون أي تحليل
+            os.remove(os.path.join(library, 'broken.pptx'))
+            write_library_template(os.path.join(library, 'two.pptx'), pictures=1)
+            reloaded = TemplateIndex(library, index_path)
+            self.assertEqual(len(reloaded.find(3)), 1)
+            result = reloaded.refresh()
+            self.assertEqual((result['analyzed'], result['reused'], result['removed']), (1, 1, 1))
+            self.assertEqual(reloaded.find(2, kind=KIND_SLIDE), [])
+
+    def test_select_layout_from_library(self):
+        client = app.test_client()
+        client.get('/')
+        library = os.environ['PPTX_TEMPLATE_LIBRARY']
+        write_library_template(os.path.join(library, 'gallery.pptx'))
+        self.assertTrue(client.post('/templates/reindex').get_json()['success'])
+        
+        data = client.get('/templates?images=1&kind=layout').get_json()
+        self.assertTrue(data['success'], data)
+        match = data['matches'][0]
+        self.assertEqual((match['template'], match['name']), ('gallery.pptx', 'Picture with Caption'))
+        
+        data = client.post('/templates/select', json={
+            'template': match['template'], 'kind': KIND_LAYOUT, 'index': match['index']
+        }).get_json()
+        self.assertTrue(data['success'], data)
+        self.assertEqual(len(data['slide_analysis']['image_placeholders']), 1)
+        missing = client.post('/templates/select', json={'template': '../gallery.pptx'})
+        self.assertEqual(missing.status_code, 404)
+
+class PlannerTestCase(unittest.TestCase):
+    def test_archive_folders_match_extracted_scan(self):
+        archive = make_zip({
+            'a/1.jpg': make_image_bytes(),
+            'b/x/2.jpg': make_image_bytes(),
+            'b/x/notes.txt': b'text',
+            'c/readme.txt': b'text',
+            'root.jpg': make_image_bytes()
+        })
+        with zipfile.ZipFile(archive) as zip_ref, tempfile.TemporaryDirectory() as temp_dir:
+            folders, empty, _ = folders_from_archive(zip_ref)
+            zip_ref.extractall(temp_dir)
+            scanned, scanned_empty = scan_directory(temp_dir, include_root=False)
+            self.assertEqual([f.name for f in folders], [f.name for f in scanned])
+            self.assertEqual(empty, scanned_empty)
+
+    def test_calibration_fits_recorded_runs(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            calibration = Calibration(os.path.join(temp_dir, 'calibration.json'))
+            self.assertEqual(calibration.model()['samples'], 0)
+            calibration.record_generation(10, 1024 * 1024, 0, 2 * 1024 * 1024, 1.0)
+            calibration.record_generation(20, 4 * 1024 * 1024, 0, 8 * 1024 * 1024, 2.2)
+            model = calibration.model()
+            self.assertEqual(model['samples'], 2)
+            self.assertAlmostEqual(model['output_ratio'], 2.0)
+            self.assertAlmostEqual(10 * model['seconds_per_slide'] + model['seconds_per_mb'], 1.0, places=5)
+
+    def test_plan_endpoint_maps_folders_without_building(self):
+        client = app.test_client()
+        configure_session(client)
+        members = {f'folder_{i}/photo_{j}.jpg': make_image_bytes(size=(64, 48)) for i in range(3) for j in range(2)}
+        members['empty/readme.txt'] = b'nothing here'
+        response = client.post('/plan', data={
+            'zip_file': (make_zip(members), 'photos.zip'),
+            'max_slides_per_deck': '2'
+        }, content_type='multipart/form-data')
+        data = response.get_json()
+        self.assertTrue(data['success'], data)
+        self.assertEqual([(s['folder'], s['slide']) for s in data['slides']],
+                         [('folder_0', 2), ('folder_1', 3), ('folder_2', 4)])
+        fill = data['slides'][0]['fills'][0]
+        self.assertEqual((fill['image'], fill['width'], fill['height']), ('photo_0.jpg', 64, 48))
+        self.assertEqual(data['skipped_folders'], [{'folder': 'empty', 'reason': 'لا يحتوي على صور'}])
+        self.assertEqual(data['parts'], [['folder_0', 'folder_1'], ['folder_2']])
+        self.assertTrue(data['headers_complete'])
+        for key in ('output_bytes', 'peak_memory_bytes', 'runtime_seconds'):
+            self.assertGreater(data['estimates'][key], 0)
+
+    def test_plan_uses_the_job_seed_with_extra_targets(self):
+        client = app.test_client()
+        config = configure_session(client)
+        client.post('/targets', data={
+            'pptx_file': (io.BytesIO(make_template_bytes()), 'second.pptx'),
+            'config_file': (io.BytesIO(json.dumps(config).encode('utf-8')), 'second.json')
+        }, content_type='multipart/form-data')
+        archive = make_photos_zip(folder_count=2).getvalue()
+        
+        with mock.patch('app.plan_archive', wraps=plan_archive) as planned, \
+                mock.patch('app.submit_generation_job', wraps=submit_generation_job) as submitted:
+            plan = client.post('/plan', data={'zip_file': (io.BytesIO(archive), 'photos.zip'), 'image_order': 'random'},
+                               content_type='multipart/form-data').get_json()
+            self.assertTrue(plan['success'], plan)
+            data = upload_photos(client, io.BytesIO(archive), image_order='random')
+            self.assertTrue(data['success'], data)
+        self.assertEqual(planned.call_args.args[4], submitted.call_args.args[1])
+        
+        with tempfile.TemporaryDirectory() as root:
+            write_photo_tree(root, {'f0': 2, 'f1': 2})
+            app.config['SOURCE_ROOTS'] = [root]
+            try:
+                with mock.patch('app.plan_directory', wraps=plan_directory) as planned, \
+                        mock.patch('app.submit_generation_job', wraps=submit_generation_job) as submitted:
+                    self.assertTrue(client.post('/plan', json={'path': root, 'image_order': 'random'}).get_json()['success'])
+                    data = client.post('/process-directory', json={'path': root, 'image_order': 'random'}).get_json()
+                    wait_for_job(client, data['job_id'])
+            finally:
+                app.config['SOURCE_ROOTS'] = []
+        self.assertEqual(planned.call_args.args[4], submitted.call_args.args[1])
+
+def write_broken_images(root, folder):
+    """صورة JPEG مقطوعة وصورة WebP (غير مدعومة في PowerPoint) تسبقان الصور السليمة"""
+    path = os.path.join(root, folder)
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, '0_cut.jpg'), 'wb') as f:
+        f.write(make_image_bytes(size=(200, 150))[:-200])
+    with open(os.path.join(path, '1_photo.png'), 'wb') as f:
+        f.write(make_image_bytes(image_format='WEBP'))
+
+class ValidationTestCase(unittest.TestCase):
+    def test_skip_uses_next_valid_image(self):
+        with tempfile.TemporaryDirectory() as root:
+            write_photo_tree(root, {'good': 1, 'mixed': 1})
+            write_broken_images(root, 'mixed')
+            write_broken_images(root, 'broken')
+            folders, _ = scan_directory(root, include_root=False)
+            config = {'images': {'a': {'use': True, 'order': 1}}}
+            
+            log = ProcessingLog()
+            valid, report = validate_folders(folders, config, POLICY_SKIP, log=log)
+            self.assertEqual([f.name for f in valid], ['good', 'mixed'])
+            self.assertEqual([name for name, _, _ in valid[1].images], ['photo_0.png'])
+            self.assertEqual(sorted((i['folder'], i['image']) for i in report.invalid),
+                             [('broken', '0_cut.jpg'), ('broken', '1_photo.png'),
+                              ('mixed', '0_cut.jpg'), ('mixed', '1_photo.png')])
+            self.assertEqual(report.checked, 6)
+            self.assertEqual(log.summary()['counts']['warning'], 5)
+
+    def test_abort_and_substitute(self):
+        with tempfile.TemporaryDirectory() as root:
+            write_photo_tree(root, {'good': 1})
+            write_broken_images(root, 'mixed')
+            folders, _ = scan_directory(root, include_root=False)
+            config = {'images': {'a': {'use': True, 'order': 1}, 'b': {'use': True, 'order': 2}}}
+            
+            with self.assertRaises(ValidationError) as raised:
+                validate_folders(folders, config, POLICY_ABORT)
+            self.assertEqual(len(raised.exception.report.invalid), 2)
+            
+            substituted, _ = validate_folders(folders, config, POLICY_SUBSTITUTE)
+            self.assertEqual([f.name for f in substituted], ['good', 'mixed'])
+            for _, stream in substituted[1].open_images():
+                self.assertEqual(Image.open(stream).format, 'PNG')
+
+    def test_abort_fails_job_before_building(self):
+        with tempfile.TemporaryDirectory() as root:
+            write_photo_tree(root, {'good': 2})
+            write_broken_images(root, 'mixed')
+            app.config['SOURCE_ROOTS'] = [root]
+            try:
+                client = app.test_client()
+                configure_session(client)
+                data = client.post('/process-directory', json={'path': root, 'invalid_images': 'abort'}).get_json()
+                result = wait_for_job(client, data['job_id'])
+                self.assertEqual(result['status'], FAILED)
+                
+                data = client.post('/process-directory', json={'path': root}).get_json()
+                result = wait_for_job(client, data['job_id'])
+                self.assertEqual(result['stats']['created_slides'], 1)
+                self.assertEqual(result['validation']['invalid_count'], 2)
+            finally:
+                app.config['SOURCE_ROOTS'] = []
+
+def make_pattern(seed, size=(320, 240)):
+    """صورة من مربعات عشوائية (تختلف بصمتها باختلاف seed)"""
+    rng = random.Random(seed)
+    blocks = Image.new('RGB', (8, 6))
+    blocks.putdata([tuple(rng.randrange(256) for _ in range(3)) for _ in range(48)])
+    return blocks.resize(size, Image.NEAREST)
+
+def write_burst(root, folder):
+    """لقطة ضبابية ثم واضحة ثم أفتح قليلاً، وصورة مختلفة في النهاية"""
+    path = os.path.join(root, folder)
+    os.makedirs(path, exist_ok=True)
+    frame = make_pattern(1)
+    frame.filter(ImageFilter.GaussianBlur(4)).save(os.path.join(path, 'a_0.jpg'), quality=95)
+    frame.save(os.path.join(path, 'a_1.jpg'), quality=95)
+    frame.point(lambda v: min(255, v + 6)).save(os.path.join(path, 'a_2.jpg'), quality=95)
+    make_pattern(2).save(os.path.join(path, 'b.jpg'), quality=95)
+
+class DuplicatesTestCase(unittest.TestCase):
+    def test_blocked_comparison_matches_all_pairs(self):
+        import numpy as np
+        rng = np.random.default_rng(7)
+        average_bits = rng.random((COMPARE_BLOCK * 3, 64)) > 0.5
+        # Near-copies spread across different row blocks
+        for source, copy_index in ((3, 600), (300, 301), (520, 5)):
+            average_bits[copy_index] = average_bits[source]
+            average_bits[copy_index, source % 64] ^= True
+        difference_bits = average_bits.copy()
+        
+        clusters = sorted(sorted(cluster) for cluster in find_clusters(np, average_bits, difference_bits, 2))
+        self.assertEqual(clusters, [[3, 600], [5, 520], [300, 301]])
+
+    def test_clusters_keep_first_or_sharpest_frame(self):
+        with tempfile.TemporaryDirectory() as root:
+            write_burst(root, 'burst')
+            folders, _ = scan_directory(root, include_root=False)
+            config = {'images': {'a': {'use': True, 'order': 1}, 'b': {'use': True, 'order': 2}}}
+            
+            skipped, report = dedupe_folders(folders, config, DUPLICATES_SKIP)
+            self.assertEqual([name for name, _, _ in skipped[0].images], ['a_0.jpg', 'b.jpg'])
+            self.assertEqual(report.hashed, 4)
+            self.assertEqual(report.to_dict()['details'],
+                             [{'folder': 'burst', 'kept': 'a_0.jpg', 'removed': ['a_1.jpg', 'a_2.jpg']}])
+            sizes = {name: size for name, size, _ in folders[0].images}
+            self.assertEqual((report.removed_images, report.removed_bytes),
+                             (2, sizes['a_1.jpg'] + sizes['a_2.jpg']))
+            # كان الموضعان سيأخذان a_0 وa_1
+            self.assertEqual((report.avoided_images, report.avoided_bytes), (1, sizes['a_1.jpg']))
+            
+            best, _ = dedupe_folders(folders, config, DUPLICATES_BEST)
+            self.assertIn(best[0].images[0][0], ('a_1.jpg', 'a_2.jpg'))
+            self.assertEqual(best[0].images[1][0], 'b.jpg')
+
+    def test_duplicates_option_in_job(self):
+        with tempfile.TemporaryDirectory() as root:
+            write_burst(root, 'burst')
+            app.config['SOURCE_ROOTS'] = [root]
+            try:
+                client = app.test_client()
+                configure_session(client)
+                data = client.post('/process-directory', json={'path': root, 'duplicates': 'skip'}).get_json()
+                result = wait_for_job(client, data['job_id'])
+                self.assertTrue(result['success'], result)
+                self.assertEqual(result['duplicates']['removed_images'], 2)
+                self.assertEqual(sorted(os.listdir(os.path.join(root, 'burst'))),
+                                 ['a_0.jpg', 'a_1.jpg', 'a_2.jpg', 'b.jpg'])
+            finally:
+                app.config['SOURCE_ROOTS'] = []
+
+class ResultCacheTestCase(unittest.TestCase):
+    def test_lru_eviction_respects_size_cap(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cache = ResultCache(os.path.join(temp_dir, 'cache'), max_bytes=250)
+            source = os.path.join(temp_dir, 'deck.pptx')
+            with open(source, 'wb') as f:
+                f.write(b'x' * 100)
+            
+            cache.put('a', source, {})
+            cache.put('b', source, {})
+            os.utime(os.path.join(cache.root, 'a.pptx'), (1, 1))
+            self.assertIsNotNone(cache.get('b'))
+            cache.put('c', source, {})
+            
+            self.assertIsNone(cache.get('a'))
+            self.assertIsNotNone(cache.get('c'))
+            stats = cache.stats()
+            self.assertEqual(stats['evictions'], 1)
+            self.assertLessEqual(stats['size_bytes'], 250)
+            
+    def test_entry_evicted_after_lookup_is_a_miss(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            evicted = (os.path.join(temp_dir, 'evicted.pptx'), {'slides': 1})
+            with app.test_request_context('/'), mock.patch('app.result_cache.get', return_value=evicted):
+                self.assertIsNone(serve_cached_result('key', temp_dir))
+            self.assertEqual(os.listdir(temp_dir), [])
+            
+    def test_normalized_zip_is_byte_identical(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            paths = []
+            for i, date_time in enumerate([(2020, 1, 1, 0, 0, 0), (2024, 6, 30, 12, 0, 0)]):
+                path = os.path.join(temp_dir, f'{i}.zip')
+                with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+                    zf.writestr(zipfile.ZipInfo('a.txt', date_time), b'content')
+                normalize_zip_timestamps(path)
+                paths.append(path)
+            
+            with open(paths[0], 'rb') as a, open(paths[1], 'rb') as b:
+                self.assertEqual(a.read(), b.read())
+            with zipfile.ZipFile(paths[0]) as zf:
+                self.assertEqual(zf.read('a.txt'), b'content')
+
+class ImageCacheTestCase(unittest.TestCase):
+    def test_lru_eviction_and_concurrent_writes(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cache = ImageCache(temp_dir, max_bytes=250)
+            threads = [threading.Thread(target=cache.put, args=('aa', b'x' * 100)) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(cache.get('aa'), b'x' * 100)
+            self.assertEqual(cache.size(), 100)
+            
+            cache.put('bb', b'y' * 100)
+            os.utime(cache._path('aa'), (1, 1))
+            cache.put('cc', b'z' * 100)
+            self.assertIsNone(cache.get('aa'))
+            self.assertEqual(cache.get('cc'), b'z' * 100)
+            stats = cache.stats()
+            self.assertEqual((stats['hits'], stats['misses'], stats['evictions']), (2, 1, 1))
+            self.assertLessEqual(stats['size_bytes'], 250)
+            self.assertFalse([name for _, _, files in os.walk(temp_dir) for name in files if name.endswith('.tmp')])
+
+    def test_repeat_run_reuses_resized_images(self):
+        template = make_template_bytes()
+        analysis, config = make_engine_config(template)
+        photos = [make_image_bytes(size=(3000, 2000), color=color) for color in ('red', 'blue')]
+        
+        def run(cache):
+            output = io.BytesIO()
+            folders = iter([(f'folder_{i}', iter([('photo.jpg', io.BytesIO(photo))]))
+                            for i, photo in enumerate(photos)])
+            targets = [{'template': template, 'config': config, 'slide_analysis': analysis, 'output': output}]
+            done = list(generate_multi(targets, folders, image_cache=cache))[-1]
+            slide = list(Presentation(io.BytesIO(output.getvalue())).slides)[1]
+            picture = [shape for shape in slide.shapes if hasattr(shape, 'image')][0]
+            return done['images'], picture.image.blob
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cache = ImageCache(temp_dir)
+            first_counters, first_blob = run(cache)
+            self.assertEqual(first_counters['resizes'], 2)
+            self.assertEqual(cache.stats()['stores'], 2)
+            
+            second_counters, second_blob = run(ImageCache(temp_dir))
+            self.assertEqual(second_counters, {'reads': 2, 'decodes': 0, 'resizes': 0})
+            self.assertEqual(second_blob, first_blob)
+
+class WorkspaceTestCase(unittest.TestCase):
+    def make_job_dir(self, workspace, size, age):
+        path = workspace.create()
+        with open(os.path.join(path, 'data.bin'), 'wb') as f:
+            f.write(b'x' * size)
+        os.utime(path, (time.time() - age, time.time() - age))
+        return path
+    
+    def test_sweep_removes_expired_and_enforces_quota(self):
+        with tempfile.TemporaryDirectory() as root:
+            workspace = Workspace(root, ttl=100, quota_bytes=250)
+            expired = self.make_job_dir(workspace, 10, age=500)
+            oldest = self.make_job_dir(workspace, 100, age=50)
+            pinned = self.make_job_dir(workspace, 100, age=40)
+            newest = self.make_job_dir(workspace, 100, age=10)
+            workspace.pin(pinned)
+            
+            self.assertEqual(workspace.sweep(), 2)
+            self.assertFalse(os.path.exists(expired))
+            self.assertFalse(os.path.exists(oldest))
+            self.assertTrue(os.path.exists(pinned))
+            self.assertTrue(os.path.exists(newest))
+            
+    def test_pin_marker_inside_job_dir_is_ignored(self):
+        with tempfile.TemporaryDirectory() as root:
+            workspace = Workspace(root, ttl=100)
+            forged = self.make_job_dir(workspace, 10, age=500)
+            # A ZIP extracted into the job dir cannot keep it alive with its own marker
+            with open(os.path.join(forged, '.pinned'), 'w') as f:
+                f.write(str(os.getpid()))
+            os.utime(forged, (time.time() - 500, time.time() - 500))
+            
+            self.assertFalse(workspace.is_pinned(forged))
+            self.assertEqual(workspace.sweep(), 1)
+            self.assertFalse(os.path.exists(forged))
+            
+    def test_ensure_space_and_startup_sweep(self):
+        with tempfile.TemporaryDirectory() as root:
+            workspace = Workspace(root, quota_bytes=250)
+            old = self.make_job_dir(workspace, 100, age=20)
+            new = self.make_job_dir(workspace, 100, age=10)
+            
+            self.assertTrue(workspace.ensure_space(100, keep=new))
+            self.assertFalse(os.path.exists(old))
+            self.assertFalse(workspace.ensure_space(1000, keep=new))
+            self.assertEqual(workspace.sweep_leftovers(), 1)
+            self.assertEqual(workspace.usage()['job_dirs'], 0)
+
+    def test_usage_is_measured_by_the_sweep_only(self):
+        with tempfile.TemporaryDirectory() as root:
+            workspace = Workspace(root, ttl=100)
+            self.make_job_dir(workspace, 100, age=10)
+            self.assertEqual(workspace.sweep(), 0)
+            self.assertEqual((workspace.usage()['job_dirs'], workspace.usage()['bytes']), (1, 100))
+            # Readiness probes read the last measurement instead of walking the tree
+            self.make_job_dir(workspace, 50, age=5)
+            self.assertEqual(workspace.usage()['bytes'], 100)
+            workspace.sweep()
+            self.assertEqual((workspace.usage()['job_dirs'], workspace.usage()['bytes']), (2, 150))
+
+    def test_checkpoints_survive_restart_but_expire(self):
+        with tempfile.TemporaryDirectory() as root:
+            workspace = Workspace(root, ttl=100)
+            checkpoint = workspace.checkpoint_dir('abc')
+            self.assertEqual(workspace.sweep_leftovers(), 0)
+            self.assertTrue(os.path.isdir(checkpoint))
+            
+            os.utime(checkpoint, (time.time() - 500, time.time() - 500))
+            self.assertEqual(workspace.sweep(), 1)
+            self.assertFalse(os.path.exists(checkpoint))
+
+class SchedulerTestCase(unittest.TestCase):
+    def test_fair_share_across_owners(self):
+        scheduler = JobScheduler(max_workers=1)
+        release = threading.Event()
+        started = []
+        
+        def blocking(job):
+            release.wait(5)
+        
+        def record(job):
+            started.append(job.label)
+        
+        first = scheduler.submit('alice', blocking, label='alice-0')
+        while scheduler.stats()['running'] == 0:
+            time.sleep(0.01)
+        for i in range(1, 4):
+            scheduler.submit('alice', record, label=f'alice-{i}')
+        bob_job = scheduler.submit('bob', record, label='bob-0')
+        
+        # Bob's job overtakes Alice's backlog because Alice already has a job running
+        self.assertEqual(scheduler.position(bob_job.id), 1)
+        release.set()
+        while len(started) < 4:
+            time.sleep(0.01)
+        self.assertEqual(started[0], 'bob-0')
+        self.assertEqual(first.status, DONE)
+        
+    def test_concurrency_limited_by_memory_budget(self):
+        mb = 1024 * 1024
+        scheduler = JobScheduler(max_workers=8, memory_budget=512 * mb, job_memory=256 * mb)
+        self.assertEqual(scheduler.max_concurrent, 2)
+        
+    def test_failed_job_records_error(self):
+        scheduler = JobScheduler(max_workers=1)
+        
+        def failing(job):
+            raise ValueError('boom')
+        
+        job = scheduler.submit('alice', failing)
+        while not job.finished:
+            time.sleep(0.01)
+        self.assertEqual(job.status, FAILED)
+        self.assertEqual(job.error, 'boom')
+        self.assertEqual(job.log.summary()['counts']['error'], 1)
+
+    def test_cancel_queued_and_running_jobs(self):
+        scheduler = JobScheduler(max_workers=1)
+        cancelled = []
+        folders_done = []
+        
+        def looping(job):
+            while True:
+                job.check()
+                folders_done.append(1)
+                time.sleep(0.01)
+        
+        running = scheduler.submit('alice', looping, on_cancel=cancelled.append)
+        while not folders_done:
+            time.sleep(0.01)
+        queued = scheduler.submit('alice', looping, on_cancel=cancelled.append)
+        
+        self.assertTrue(scheduler.cancel(queued.id))
+        self.assertEqual(queued.status, CANCELLED)
+        self.assertEqual(scheduler.stats()['queued'], 0)
+        self.assertTrue(scheduler.cancel(running.id))
+        while not running.finished:
+            time.sleep(0.01)
+        self.assertEqual(running.status, CANCELLED)
+        self.assertEqual(cancelled, [queued, running])
+        self.assertFalse(scheduler.cancel(running.id))
+        self.assertEqual(scheduler.stats()['running'], 0)
+        
+    def test_finished_job_dropped_after_retention(self):
+        scheduler = JobScheduler(max_workers=1, retention=60)
+        job = scheduler.submit('alice', lambda job: {'pages': 1})
+        while job.finished_at is None:
+            time.sleep(0.01)
+        self.assertIsNone(job.func)
+        
+        self.assertEqual(scheduler.expire_finished(now=job.finished_at + 30), 0)
+        self.assertIs(scheduler.get(job.id), job)
+        self.assertEqual(scheduler.expire_finished(now=job.finished_at + 61), 1)
+        self.assertIsNone(scheduler.get(job.id))
+        
+    def test_deadline_stops_job(self):
+        scheduler = JobScheduler(max_workers=1, job_timeout=0.05)
+        
+        def looping(job):
+            while True:
+                job.check()
+                time.sleep(0.01)
+        
+        job = scheduler.submit('alice', looping)
+        while not job.finished:
+            time.sleep(0.01)
+        self.assertEqual(job.status, CANCELLED)
+        self.assertTrue(job.expired)
+        
+    def test_cancel_endpoint(self):
+        client = app.test_client()
+        configure_session(client)
+        data = upload_photos(client)
+        self.assertEqual(app.test_client().post(f"/jobs/{data['job_id']}/cancel").status_code, 404)
+        response = client.post(f"/jobs/{data['job_id']}/cancel")
+        self.assertEqual(response.status_code, 409)
+
+class LoadTestTestCase(unittest.TestCase):
+    def test_percentile_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual([percentile(values, q) for q in (50, 95, 99)], [50, 95, 99])
+        self.assertEqual(percentile([7], 99), 7)
+        self.assertIsNone(percentile([], 50))
+
+    def test_in_process_stages_report_every_endpoint(self):
+        scenario = Scenario(make_template_bytes(), folders=2, images_per_folder=1, image_size=(40, 30))
+        report = run_load_test(lambda: InProcessClient(app), scenario, [1, 2], iterations=1,
+                               server_pid=os.getpid(), sample_interval=0.05)
+        self.assertEqual([stage['users'] for stage in report['stages']], [1, 2])
+        stage = report['stages'][1]
+        self.assertEqual((stage['scenarios'], stage['error_rate']), (2, 0.0))
+        self.assertEqual(stage['endpoints']['job']['requests'], 2)
+        for name in ('POST /upload-pptx', 'POST /upload-zip', 'GET /download/<filename>'):
+            endpoint = stage['endpoints'][name]
+            self.assertLessEqual(endpoint['p50_ms'], endpoint['p99_ms'])
+        if os.path.exists('/proc/self/status'):
+            self.assertGreater(stage['rss_peak_bytes'], 0)
+
+class TracingTestCase(unittest.TestCase):
+    def test_spans_are_complete_events(self):
+        tracer = Tracer('test')
+        with tracer.span('outer', folder='a'):
+            with tracer.span('inner', category='image'):
+                pass
+        events = [event for event in tracer.to_dict()['traceEvents'] if event['ph'] == 'X']
+        self.assertEqual([event['name'] for event in events], ['inner', 'outer'])
+        inner, outer = events
+        self.assertEqual(outer['args'], {'folder': 'a'})
+        self.assertGreaterEqual(inner['ts'], outer['ts'])
+        self.assertLessEqual(inner['ts'] + inner['dur'], outer['ts'] + outer['dur'])
+        self.assertFalse(NULL_TRACER)
+        with NULL_TRACER.span('ignored'):
+            pass
+
+    def test_traced_job_records_each_stage(self):
+        client = app.test_client()
+        configure_session(client)
+        untraced = upload_photos(client, make_photos_zip(folder_count=2))
+        self.assertNotIn('trace_url', untraced)
+        
+        # النتيجة محفوظة من الطلب السابق لكن المهمة المتتبعة تعمل فعلاً
+        data = upload_photos(client, make_photos_zip(folder_count=2), trace='true')
+        self.assertTrue(data['success'], data)
+        self.assertNotIn('cached', data)
+        download = client.get(data['trace_url'])
+        self.assertEqual(download.status_code, 200)
+        events = json.loads(download.data)['traceEvents']
+        names = {event['name'] for event in events}
+        for name in ('job', 'extract', 'scan folders', 'build slide', 'insert picture', 'save'):
+            self.assertIn(name, names)
+        self.assertEqual(app.test_client().get(data['trace_url']).status_code, 404)
+
+    def test_part_worker_spans_are_merged(self):
+        client = app.test_client()
+        configure_session(client)
+        data = upload_photos(client, make_photos_zip(folder_count=3), max_slides_per_deck='2', trace='true')
+        self.assertTrue(data['success'], data)
+        events = json.loads(client.get(data['trace_url']).data)['traceEvents']
+        parts = [event for event in events if event['name'] == 'build part']
+        self.assertEqual(len(parts), 2)
+        self.assertTrue(all(event['pid'] != os.getpid() for event in parts))
+
+class ProfilingTestCase(unittest.TestCase):
+    def test_profiler_reports_call_tree_and_stage_allocations(self):
+        import pstats
+        import tracemalloc
+        template = make_template_bytes()
+        _, config = make_engine_config(template)
+        folders = [(f'folder_{i}', iter([(f'photo_{i}.jpg', io.BytesIO(make_image_bytes()))])) for i in range(2)]
+        tracer = Tracer()
+        with JobProfiler(tracer) as profiler:
+            list(generate(template, config, iter(folders), output=io.BytesIO(), tracer=profiler))
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertEqual([stage['stage'] for stage in profiler.stages], ['load template', 'save'])
+        self.assertIn('build slide', {event['name'] for event in tracer.events})
+        
+        with tempfile.TemporaryDirectory() as out:
+            report_path, stats_path = os.path.join(out, 'profile.txt'), os.path.join(out, 'profile.prof')
+            profiler.write(report_path, stats_path)
+            with open(report_path, encoding='utf-8') as f:
+                report = f.read()
+            self.assertIn('Call tree', report)
+            self.assertIn('load template: current', report)
+            self.assertIn('build_folder_slide', report)
+            self.assertGreater(pstats.Stats(stats_path).total_calls, 0)
+
+    def test_profiling_needs_the_admin_token(self):
+        client = app.test_client()
+        configure_session(client)
+        self.assertNotIn('profile_url', upload_photos(client, make_photos_zip(folder_count=1)))
+        self.assertEqual(client.post('/upload-zip', data={
+            'zip_file': (make_photos_zip(folder_count=1), 'photos.zip'),
+            'profile_token': 'secret'
+        }, content_type='multipart/form-data').status_code, 403)
+        
+        app.config['PROFILE_TOKEN'] = 'secret'
+        self.addCleanup(app.config.update, PROFILE_TOKEN='')
+        data = upload_photos(client, make_photos_zip(folder_count=1), profile_token='secret')
+        self.assertTrue(data['success'], data)
+        report = client.get(data['profile_url']).data.decode('utf-8')
+        for stage in ('extract', 'scan folders', 'validate images', 'save', 'job'):
+            self.assertIn(f'{stage}: current', report)
+        self.assertEqual(client.get(data['profile_url'] + '?format=pstats').status_code, 200)
+
+class AdmissionTestCase(unittest.TestCase):
+    def test_rejects_too_many_members(self):
+        archive = make_zip({f'f/{i}.txt': b'x' for i in range(5)})
+        with zipfile.ZipFile(archive) as zf:
+            with self.assertRaises(AdmissionError):
+                admit_archive(zf, ResourceLimits(max_members=4))
+                
+    def test_rejects_path_traversal(self):
+        archive = make_zip({'../evil.jpg': make_image_bytes()})
+        with zipfile.ZipFile(archive) as zf:
+            with self.assertRaises(AdmissionError):
+                admit_archive(zf, ResourceLimits())
+                
+    def test_oversize_images_are_downscaled(self):
+        archive = make_zip({
+            'folder/big.jpg': make_image_bytes((400, 300)),
+            'folder/huge.jpg': make_image_bytes((1000, 800)),
+            'folder/small.jpg': make_image_bytes((10, 10))
+        })
+        limits = ResourceLimits(max_image_pixels=20000, hard_image_pixels=200000)
+        with zipfile.ZipFile(archive) as zf:
+            report = admit_archive(zf, limits)
+            self.assertEqual(list(report.downscale), ['folder/big.jpg'])
+            self.assertEqual(list(report.skipped), ['folder/huge.jpg'])
+            
+            with tempfile.TemporaryDirectory() as temp_dir:
+                extract_admitted(zf, temp_dir, report, limits)
+                self.assertFalse(os.path.exists(os.path.join(temp_dir, 'folder', 'huge.jpg')))
+                with Image.open(os.path.join(temp_dir, 'folder', 'big.jpg')) as img:
+                    self.assertLessEqual(img.size[0] * img.size[1], 20000)
+                    
+    def test_reject_policy(self):
+        archive = make_zip({'folder/big.jpg': make_image_bytes((400, 300))})
+        with zipfile.ZipFile(archive) as zf:
+            with self.assertRaises(AdmissionError):
+                admit_archive(zf, ResourceLimits(max_image_pixels=20000, oversize_policy='reject'))
+                
+    def test_limits_from_env(self):
+        limits = ResourceLimits.from_env({'PPTX_MAX_MEMBERS': '10', 'PPTX_MAX_UNCOMPRESSED_MB': '5'})
+        self.assertEqual(limits.max_members, 10)
+        self.assertEqual(limits.max_uncompressed_bytes, 5 * 1024 * 1024)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
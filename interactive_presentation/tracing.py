@@ -0,0 +1,84 @@
+"""تتبع زمني لمهمة واحدة بتنسيق Chrome trace-event (يفتح في Perfetto أو chrome://tracing)
+
+كل مرحلة (الاستخراج، مسح المجلدات، إنشاء كل شريحة، إدراج كل صورة، قراءة
+تاريخ الصورة، الحفظ) تسجل كفترة كاملة ('ph': 'X') مع رقم العملية والخيط.
+الأوقات من ساعة النظام بالميكروثانية، فتصطف فترات العمليات الفرعية (أجزاء
+العرض) مع فترات العملية الأم عند دمجها في ملف واحد.
+
+عند تعطيل التتبع يتم استخدام NULL_TRACER الذي لا يسجل شيئاً.
+"""
+import contextlib
+import json
+import os
+import threading
+import time
+
+
+def trace_jobs_from_env(environ=None):
+    """تسجيل تتبع زمني لكل المهام دون طلب ذلك (PPTX_TRACE_JOBS)"""
+    environ = os.environ if environ is None else environ
+    return environ.get('PPTX_TRACE_JOBS', '0').lower() in ('1', 'true', 'yes')
+
+
+class Tracer:
+    """مسجل فترات آمن بين الخيوط؛ process_name يظهر كاسم للعملية في العارض"""
+
+    def __init__(self, process_name=None):
+        self.pid = os.getpid()
+        self.events = []
+        self._lock = threading.Lock()
+        if process_name:
+            self.events.append({'name': 'process_name', 'ph': 'M', 'pid': self.pid,
+                                'args': {'name': process_name}})
+
+    @contextlib.contextmanager
+    def span(self, name, category='job', **args):
+        started = time.time_ns()
+        try:
+            yield
+        finally:
+            event = {
+                'name': name,
+                'cat': category,
+                'ph': 'X',
+                'ts': started // 1000,
+                'dur': (time.time_ns() - started) // 1000,
+                'pid': self.pid,
+                'tid': threading.get_native_id()
+            }
+            if args:
+                event['args'] = args
+            with self._lock:
+                self.events.append(event)
+
+    def extend(self, events):
+        """دمج فترات مسجلة في عملية أخرى"""
+        with self._lock:
+            self.events.extend(events)
+
+    def to_dict(self):
+        with self._lock:
+            return {'traceEvents': list(self.events), 'displayTimeUnit': 'ms'}
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+
+
+class NullTracer:
+    """مسجل معطل: span لا تقيس شيئاً"""
+
+    events = ()
+
+    def __bool__(self):
+        return False
+
+    def span(self, name, category='job', **args):
+        return _NULL_SPAN
+
+    def extend(self, events):
+        pass
+
+
+_NULL_SPAN = contextlib.nullcontext()
+NULL_TRACER = NullTracer()
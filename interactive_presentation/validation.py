@@ -0,0 +1,170 @@
+"""فحص الصور قبل إنشاء العرض: قراءة الترويسة وفحص سريع لكل صورة مستخدمة بالتوازي
+
+الصورة التالفة تجعل insert_picture يفشل في منتصف المعالجة، فيتم اكتشافها هنا
+قبل أي عمل مكلف، ثم يتم إيقاف المهمة أو تخطي الصورة أو استبدالها بصورة بديلة.
+"""
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from engine import ORDER_ALPHABETICAL
+from planner import select_images
+from sources import SourceFolder
+
+# سياسات التعامل مع الصور التالفة
+POLICY_ABORT = 'abort'
+POLICY_SKIP = 'skip'
+POLICY_SUBSTITUTE = 'substitute'
+POLICIES = (POLICY_ABORT, POLICY_SKIP, POLICY_SUBSTITUTE)
+
+# التنسيقات التي يستطيع python-pptx إدراجها
+SUPPORTED_FORMATS = ('BMP', 'GIF', 'JPEG', 'PNG', 'TIFF')
+
+# عدد الصور التالفة المرسلة في النتيجة (السجل يحتفظ بالباقي)
+MAX_REPORTED = 100
+
+JPEG_END_MARKER = b'\xff\xd9'
+JPEG_TAIL_BYTES = 1024
+
+_substitute_image = None
+
+
+class ValidationError(Exception):
+    """خطأ يعني إيقاف المهمة لوجود صور تالفة (سياسة abort)"""
+
+    def __init__(self, report):
+        self.report = report
+        super().__init__(
+            f'تم العثور على {len(report.invalid)} صورة تالفة، تم إيقاف المهمة قبل إنشاء العرض'
+        )
+
+
+class ValidationReport:
+    """نتيجة الفحص: عدد الصور المفحوصة والصور التالفة مع مجلداتها"""
+
+    def __init__(self):
+        self.checked = 0
+        self.invalid = []
+
+    def to_dict(self):
+        return {
+            'checked': self.checked,
+            'invalid_count': len(self.invalid),
+            'invalid': self.invalid[:MAX_REPORTED]
+        }
+
+
+def validation_workers_from_env(environ=None):
+    """عدد خيوط الفحص (PPTX_VALIDATION_WORKERS)؛ الفحص يعتمد على القراءة من القرص أساساً"""
+    environ = os.environ if environ is None else environ
+    value = environ.get('PPTX_VALIDATION_WORKERS')
+    return int(value) if value else min(32, (os.cpu_count() or 1) * 4)
+
+
+def jpeg_has_end_marker(path):
+    """ملف JPEG المقطوع لا يحتوي على علامة النهاية في آخره"""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - JPEG_TAIL_BYTES))
+        return JPEG_END_MARKER in f.read()
+
+
+def check_image(path):
+    """فحص صورة واحدة؛ يعيد سبب الرفض أو None إذا كانت سليمة"""
+    try:
+        with Image.open(path) as img:
+            image_format = img.format
+            # verify يفحص البنية (ومجاميع CRC في PNG) دون فك ترميز البكسلات
+            img.verify()
+    except Exception as e:
+        return f'صورة تالفة: {e}'
+
+    if image_format not in SUPPORTED_FORMATS:
+        return f'تنسيق غير مدعوم في PowerPoint: {image_format}'
+    try:
+        if image_format == 'JPEG' and not jpeg_has_end_marker(path):
+            return 'ملف JPEG مقطوع (لا توجد علامة النهاية)'
+    except OSError as e:
+        return f'تعذرت قراءة الملف: {e}'
+    return None
+
+
+def substitute_image_bytes():
+    """صورة بديلة محايدة تستخدم مكان الصور التالفة (سياسة substitute)"""
+    global _substitute_image
+    if _substitute_image is None:
+        buffer = io.BytesIO()
+        Image.new('RGB', (800, 600), (217, 217, 217)).save(buffer, format='PNG')
+        _substitute_image = buffer.getvalue()
+    return _substitute_image
+
+
+def validate_folders(folders, placeholders_config, policy=POLICY_SKIP, image_order=ORDER_ALPHABETICAL,
+                     seed='', max_workers=None, log=None, check=None):
+    """فحص الصور التي ستستخدمها المواضع في كل مجلد وتطبيق السياسة
+
+    يعيد (المجلدات بعد تطبيق السياسة، التقرير). مع سياسة skip يتم حذف الصور
+    التالفة من المجلد، ثم فحص الصور التي أخذت مكانها حتى لا يبقى موضع يشير
+    إلى صورة تالفة. ترفع ValidationError مع سياسة abort بعد فحص كل الصور.
+    check تستدعى مع كل نتيجة؛ إذا رفعت استثناءً يتم إلغاء الفحوص المتبقية فوراً.
+    """
+    report = ValidationReport()
+    checked = {}
+    bad = {}
+    current = list(folders)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers or validation_workers_from_env())
+    try:
+        while True:
+            pending = []
+            for folder in current:
+                fills, _ = select_images(folder, placeholders_config, image_order, seed)
+                for image_name in dict.fromkeys(fill['image'] for fill in fills):
+                    if (folder.name, image_name) not in checked:
+                        pending.append((folder, image_name))
+            if not pending:
+                break
+
+            paths = [os.path.join(folder.path, image_name) for folder, image_name in pending]
+            for (folder, image_name), reason in zip(pending, executor.map(check_image, paths)):
+                if check:
+                    check()
+                checked[(folder.name, image_name)] = reason
+                report.checked += 1
+                if reason:
+                    bad.setdefault(folder.name, set()).add(image_name)
+                    report.invalid.append({'folder': folder.name, 'image': image_name, 'reason': reason})
+                    if log:
+                        level = 'error' if policy == POLICY_ABORT else 'warning'
+                        log.add(f"⚠ صورة تالفة في المجلد '{folder.name}': {image_name} ({reason})", level)
+
+            if policy != POLICY_SKIP:
+                break
+            current = [
+                SourceFolder(folder.name, folder.path,
+                             [image for image in folder.images if image[0] not in bad.get(folder.name, ())],
+                             folder.replacements, folder.dimensions)
+                for folder in current
+            ]
+            for folder in current:
+                if not folder.images and log:
+                    log.add(f"⚠ تم تخطي المجلد '{folder.name}': جميع صوره تالفة", "warning")
+            current = [folder for folder in current if folder.images]
+    finally:
+        # عند الإلغاء لا داعي لانتظار الفحوص التي لم تبدأ
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    if policy == POLICY_ABORT and report.invalid:
+        raise ValidationError(report)
+
+    if policy == POLICY_SUBSTITUTE:
+        replacement = substitute_image_bytes()
+        current = [
+            SourceFolder(folder.name, folder.path, folder.images,
+                         {image_name: replacement for image_name in bad[folder.name]}, folder.dimensions)
+            if folder.name in bad else folder
+            for folder in current
+        ]
+    return current, report
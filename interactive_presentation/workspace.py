@@ -0,0 +1,235 @@
+"""مساحة العمل المؤقتة: مجلد لكل مهمة مع حذف تلقائي حسب العمر وحصة للقرص"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+MB = 1024 * 1024
+
+JOB_DIR_PREFIX = 'job_'
+CHECKPOINT_DIR_PREFIX = 'checkpoint_'
+# ملفات الحجز خارج مجلدات المهام (التي تستخرج إليها الملفات المضغوطة) حتى لا يزورها محتوى مرفوع
+PINS_DIR = 'pins'
+
+
+def directory_size(path):
+    """الحجم الكلي للملفات داخل المجلد"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class Workspace:
+    """مدير مجلدات المهام تحت جذر واحد
+
+    - كل مهمة تحصل على مجلد خاص بها (job_<id>).
+    - خيط خلفي يحذف المجلدات التي لم تستخدم منذ أكثر من ttl ثانية.
+    - عند تجاوز الحصة الكلية يتم حذف الأقدم استخداماً أولاً.
+    - عند بدء التشغيل يتم حذف المجلدات المتبقية من تشغيل سابق، عدا مجلدات
+      نقاط الحفظ (checkpoint_<key>) التي تسمح باستئناف المهام بعد التعطل.
+
+    المجلدات المحجوزة (مهام جارية) لا يتم حذفها أبداً.
+    """
+
+    def __init__(self, root, ttl=3600, quota_bytes=4096 * MB, sweep_interval=300, on_sweep=None):
+        self.root = root
+        self.ttl = ttl
+        self.quota_bytes = quota_bytes
+        self.sweep_interval = sweep_interval
+        self.on_sweep = on_sweep
+        self._pinned = set()
+        self._lock = threading.Lock()
+        # آخر قياس لاستخدام القرص (يحدثه الحذف الدوري)، حتى لا يمر فحص الجاهزية على الملفات
+        self._usage = {'job_dirs': 0, 'bytes': 0, 'measured_at': None}
+        self._sweeper = None
+        self._stop = threading.Event()
+        self.pins_dir = os.path.join(root, PINS_DIR)
+        os.makedirs(self.pins_dir, exist_ok=True)
+
+    @classmethod
+    def from_env(cls, environ=None):
+        environ = os.environ if environ is None else environ
+        root = environ.get('PPTX_WORKSPACE_DIR') or os.path.join(tempfile.gettempdir(), 'pptx_workspace')
+        return cls(
+            root,
+            ttl=int(environ.get('PPTX_WORKSPACE_TTL', 3600)),
+            quota_bytes=int(environ.get('PPTX_WORKSPACE_QUOTA_MB', 4096)) * MB,
+            sweep_interval=int(environ.get('PPTX_WORKSPACE_SWEEP_INTERVAL', 300))
+        )
+
+    def create(self):
+        """إنشاء مجلد جديد لمهمة"""
+        path = os.path.join(self.root, JOB_DIR_PREFIX + uuid.uuid4().hex)
+        os.makedirs(path)
+        return path
+
+    def checkpoint_dir(self, key):
+        """مجلد نقطة الحفظ لمهمة بمفتاح key (يبقى بعد إعادة التشغيل)"""
+        path = os.path.join(self.root, CHECKPOINT_DIR_PREFIX + key)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def owns(self, path):
+        return bool(path) and os.path.dirname(os.path.abspath(path)) == os.path.abspath(self.root)
+
+    def touch(self, path):
+        """تحديث وقت آخر استخدام للمجلد (يؤخر حذفه)"""
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _pin_file(self, path):
+        return os.path.join(self.pins_dir, os.path.basename(os.path.abspath(path)))
+
+    def pin(self, path):
+        """منع حذف المجلد أثناء استخدامه من مهمة جارية
+
+        يتم تسجيل الحجز في ملف باسم المجلد تحت pins/ مع رقم العملية، حتى
+        تحترمه العمال الأخرى التي تتشارك مجلد مساحة العمل نفسه.
+        """
+        with self._lock:
+            self._pinned.add(os.path.abspath(path))
+        with open(self._pin_file(path), 'w') as f:
+            f.write(str(os.getpid()))
+
+    def unpin(self, path):
+        with self._lock:
+            self._pinned.discard(os.path.abspath(path))
+        try:
+            os.remove(self._pin_file(path))
+        except OSError:
+            pass
+        self.touch(path)
+
+    def is_pinned(self, path):
+        with self._lock:
+            if os.path.abspath(path) in self._pinned:
+                return True
+        try:
+            with open(self._pin_file(path)) as f:
+                pid = int(f.read().strip())
+        except (OSError, ValueError):
+            return False
+        # الحجز من عملية انتهت (تعطل أو إعادة تشغيل) لا يمنع الحذف
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except OSError:
+            pass
+        return True
+
+    def remove(self, path):
+        """حذف مجلد مهمة (إذا لم يكن محجوزاً)"""
+        if not self.owns(path) or self.is_pinned(path):
+            return False
+        shutil.rmtree(path, ignore_errors=True)
+        try:
+            os.remove(self._pin_file(path))
+        except OSError:
+            pass
+        return True
+
+    def _job_dirs(self, prefixes=(JOB_DIR_PREFIX, CHECKPOINT_DIR_PREFIX)):
+        entries = []
+        for entry in os.scandir(self.root):
+            if entry.is_dir() and entry.name.startswith(prefixes):
+                try:
+                    entries.append((entry.stat().st_mtime, entry.path))
+                except OSError:
+                    pass
+        return sorted(entries)
+
+    def sweep(self, now=None):
+        """حذف المجلدات المنتهية الصلاحية ثم تطبيق الحصة؛ يعيد عدد المجلدات المحذوفة"""
+        now = time.time() if now is None else now
+        removed = 0
+        remaining = []
+        for mtime, path in self._job_dirs():
+            if now - mtime > self.ttl and self.remove(path):
+                removed += 1
+            else:
+                remaining.append((path, directory_size(path)))
+
+        total = sum(size for _, size in remaining)
+        kept = len(remaining)
+        for path, size in remaining:
+            if total <= self.quota_bytes:
+                break
+            if self.remove(path):
+                removed += 1
+                kept -= 1
+                total -= size
+        self._record_usage(kept, total)
+        return removed
+
+    def ensure_space(self, needed_bytes, keep=None):
+        """حذف الأقدم استخداماً حتى تتسع الحصة لـ needed_bytes؛ يعيد False إذا تعذر ذلك
+
+        المجلد keep (مجلد المهمة الجديدة عادةً) لا يتم حذفه.
+        """
+        keep = os.path.abspath(keep) if keep else None
+        dirs = [(path, directory_size(path)) for _, path in self._job_dirs()]
+        total = sum(size for _, size in dirs)
+        kept = len(dirs)
+        for path, size in dirs:
+            if total + needed_bytes <= self.quota_bytes:
+                break
+            if os.path.abspath(path) != keep and self.remove(path):
+                kept -= 1
+                total -= size
+        self._record_usage(kept, total)
+        return total + needed_bytes <= self.quota_bytes
+
+    def sweep_leftovers(self):
+        """حذف جميع مجلدات المهام المتبقية من تشغيل سابق (عند بدء التشغيل)
+
+        مجلدات المهام التي ما زالت عمليتها حية (عامل آخر يعمل) لا يتم حذفها.
+        """
+        removed = 0
+        for _, path in self._job_dirs((JOB_DIR_PREFIX,)):
+            if self.remove(path):
+                removed += 1
+        dirs = self._job_dirs()
+        self._record_usage(len(dirs), sum(directory_size(path) for _, path in dirs))
+        return removed
+
+    def _record_usage(self, job_dirs, total_bytes):
+        with self._lock:
+            self._usage = {'job_dirs': job_dirs, 'bytes': total_bytes, 'measured_at': time.time()}
+
+    def usage(self):
+        """استخدام القرص كما قاسه آخر حذف (دون المرور على الملفات)"""
+        with self._lock:
+            return {
+                **self._usage,
+                'quota_bytes': self.quota_bytes,
+                'pinned': len(self._pinned)
+            }
+
+    def start_sweeper(self):
+        """تشغيل خيط الحذف الدوري (مرة واحدة فقط)"""
+        if self._sweeper is not None:
+            return
+        self._sweeper = threading.Thread(target=self._sweep_loop, name='pptx-workspace-sweeper', daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self):
+        self._stop.set()
+
+    def _sweep_loop(self):
+        while not self._stop.wait(self.sweep_interval):
+            try:
+                self.sweep()
+                if self.on_sweep:
+                    self.on_sweep()
+            except Exception:
+                pass
@@ -0,0 +1,4 @@
+"""نقطة الدخول للإنتاج: gunicorn -c gunicorn.conf.py wsgi:app"""
+from app import create_app, warm_up
+
+app = warm_up(create_app())